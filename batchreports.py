@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# Vectorized DS4 report evaluation for long recorded sessions (needs numpy).
+#
+# Where replay.py steps HIDRunner one event at a time, this module evaluates a whole
+# session of fixed-rate frames in one pass. Each frame is one tick():
+#
+#   keys   bool array (N, 258): keycodes 0-255, then leftMouse and rightMouse (seprofile source ids)
+#   mouse  float array (N, 2): mouse movement (window coordinates) during the frame, or None
+#   dt     frame interval in seconds
+#
+# and produces the N 64-byte input reports (id 0x01, PSReport layout) that tick() would
+# send. Mouse acceleration is derived from the deltas the same way mouseMoved: does; the
+# time origin is one frame before the first frame. Decay takes one step of the planned
+# schedule (shockemu.plan_decay) per frame. Acceleration math is done in float64, so a
+# stick byte can differ by one step from the float32 runtime where a value lands exactly
+# on a quantization boundary.
+import argparse, json, sys, time
+
+import numpy as np
+
+import replay, seprofile, shockemu
+
+CHUNK_FRAMES = 1 << 16
+
+class BatchEngine(object):
+
+	def __init__(self, profile, release=False):
+		# The per-event reference already resolves the profile into tables; reuse its view.
+		emu = replay.Emulator(profile, release)
+		self.warnings = emu.warnings
+		self.sources = sorted(set(seprofile.source_id(s) for s in list(emu.masks) + list(emu.deltas)))
+		index = dict((source, i) for i, source in enumerate(self.sources))
+		self.masks = np.zeros(len(self.sources), np.uint32)
+		self.deltas = np.zeros((len(self.sources), 4), np.int32)
+		for source, names in emu.masks.items():
+			self.masks[index[seprofile.source_id(source)]] = sum(1 << shockemu.buttons.index(n) for n in names)
+		for source, d in emu.deltas.items():
+			self.deltas[index[seprofile.source_id(source)]] = d
+		self.boundButtons = sum(1 << shockemu.buttons.index(n) for n in emu.boundButtons)
+		self.boundSticks = emu.boundSticks
+		self.mouseLook = emu.mouseLook
+		self.curve = emu.curve
+		self.release = release
+		if self.mouseLook is not None:
+			self.decayScale = np.asarray(emu.decayScale, np.float32)
+			self.deadZone = emu.deadZone
+
+	def fold(self, keys):
+		# (N, 258) key state -> button mask (N,) and axis sums (N, 4), in chunks to bound memory.
+		n = len(keys)
+		mask = np.zeros(n, np.uint32)
+		axis = np.zeros((n, 4), np.float64)
+		if not self.sources:
+			return mask, axis
+		for start in range(0, n, CHUNK_FRAMES):
+			down = keys[start:start + CHUNK_FRAMES, self.sources]
+			mask[start:start + CHUNK_FRAMES] = np.bitwise_or.reduce(np.where(down, self.masks, 0).astype(np.uint32), axis=1)
+			axis[start:start + CHUNK_FRAMES] = down.astype(np.int32) @ self.deltas
+		return mask, axis
+
+	def shape(self, accel):
+		if self.curve is None:
+			return accel
+		lut, minAccel, maxAccel = self.curve
+		x = np.clip((np.abs(accel) - minAccel) / (maxAccel - minAccel), 0.0, 1.0)
+		y = np.interp(x * (len(lut) - 1), np.arange(len(lut)), np.asarray(lut, np.float64))
+		return np.where(accel < 0, -y, y)
+
+	def mouse_look(self, mouse, dt, sticks):
+		# Applies mouseLook to the (N, 2) stick columns in place. Frames between decays keep
+		# the key axis value already there, like the generated block does.
+		n = len(mouse)
+		frame = np.arange(n)
+		moved = np.any(mouse != 0, axis=1)
+		moves = np.flatnonzero(moved)
+		prev = np.concatenate(([-1], moves[:-1]))
+		elapsed = ((moves - prev) * dt)[:, None]
+		vel = mouse[moves] / elapsed
+		accel = (vel - np.concatenate((np.zeros((1, 2)), vel[:-1]))) / elapsed
+		kicked = np.stack((-self.shape(accel[:, 0]), self.shape(accel[:, 1])), axis=1).astype(np.float32)
+
+		scale = self.decayScale
+		steps = len(scale)
+		# Release builds start each decay at the first step that changes the report.
+		first = np.zeros(len(moves), np.int64)
+		if self.release:
+			with np.errstate(over='ignore', invalid='ignore'):
+				visible = (kicked[:, :, None] != 0) & (np.abs(kicked[:, :, None] * scale) < np.float32(shockemu.SATURATED))
+			visible = visible.any(axis=1)
+			first = np.where(visible.any(axis=1), visible.argmax(axis=1), steps - 1)
+
+		last = np.maximum.accumulate(np.where(moved, frame, -1))
+		has = last >= 0
+		slot = np.searchsorted(moves, last)[has]
+		since = (frame - last)[has]
+		step = first[slot] + since - 1
+		decaying = (since >= 1) & (step < steps)
+		with np.errstate(over='ignore', invalid='ignore'):
+			value = kicked[slot] * scale[np.minimum(np.maximum(step, 0), steps - 1)][:, None]
+			# A step is the last one when it runs out of table or lands in the dead zone;
+			# the schedule is decreasing, so the first such step ends the decay.
+			ends = (step + 1 >= steps) | (np.abs(value).max(axis=1) <= self.deadZone)
+		# Decay frames after the ending one are inactive: find the ending step per move.
+		endStep = np.full(len(moves), np.iinfo(np.int64).max)
+		np.minimum.at(endStep, slot[decaying & ends], step[decaying & ends])
+		active = decaying & (step <= endStep[slot])
+		value[ends] = 0
+		out = sticks[has]
+		out[active] = value[active]
+		out[since == 0] = kicked[slot[since == 0]]
+		sticks[has] = out
+
+	def evaluate(self, keys, mouse=None, dt=1 / 60.0, ticks=0):
+		keys = np.asarray(keys, bool)
+		n = len(keys)
+		mask, axis = self.fold(keys)
+		mask &= self.boundButtons
+		sticks = np.zeros((n, 4), np.float64)
+		for stick in self.boundSticks:
+			x = shockemu.axisSlots.index(stick + 'X')
+			sticks[:, x:x + 2] = axis[:, x:x + 2]
+		if self.mouseLook is not None:
+			x = shockemu.axisSlots.index(self.mouseLook['stick'] + 'X')
+			mouse = np.zeros((n, 2)) if mouse is None else np.asarray(mouse, np.float64)
+			stick = sticks[:, x:x + 2].copy()
+			self.mouse_look(mouse, dt, stick)
+			sticks[:, x:x + 2] = stick
+
+		bit = lambda name: ((mask >> shockemu.buttons.index(name)) & 1).astype(np.uint8)
+		up, down, left, right = bit('dpadUp'), bit('dpadDown'), bit('dpadLeft'), bit('dpadRight')
+		dpad = np.where(left == 1, np.where(up == 1, 7, np.where(down == 1, 5, 6)),
+			np.where(right == 1, np.where(up == 1, 1, np.where(down == 1, 3, 2)),
+			np.where(up == 1, 0, np.where(down == 1, 4, 8)))).astype(np.uint8)
+
+		reports = np.tile(np.frombuffer(replay.BASE_REPORT, np.uint8), (n, 1))
+		reports[:, 1:5] = np.clip(128 + sticks.astype(np.float32) * 127, 0, 255).astype(np.uint8)
+		reports[:, 5] = (bit('triangle') << 7) | (bit('O') << 6) | (bit('X') << 5) | (bit('square') << 4) | dpad
+		reports[:, 6] = (bit('R3') << 7) | (bit('L3') << 6) | (bit('options') << 5) | (bit('share') << 4) | \
+			(bit('R2') << 3) | (bit('L2') << 2) | (bit('R1') << 1) | bit('L1')
+		reports[:, 7] = (((np.arange(n, dtype=np.uint64) + ticks) << 2) & 0xFF).astype(np.uint8) | (bit('touchpad') << 1) | bit('PS')
+		reports[:, 8] = bit('L2') * 255
+		reports[:, 9] = bit('R2') * 255
+		return reports
+
+def frames_from_trace(events, dt):
+	# Samples a replay.py keyboard/mouse trace into (keys, mouse) frames of length dt.
+	events = list(events)
+	n = int(max([e.get('t', 0) for e in events] + [0]) / dt) + 1
+	keys = np.zeros((n, seprofile.SOURCE_COUNT), bool)
+	mouse = np.zeros((n, 2))
+	downSince = {}
+	lastMouse = (0.0, 0.0)
+	for event in events:
+		frame = int(event.get('t', 0) / dt)
+		kind = event['type']
+		if kind == 'mouseMoved':
+			x, y = float(event['x']), float(event['y'])
+			mouse[frame] += (x - lastMouse[0], y - lastMouse[1])
+			lastMouse = (x, y)
+			continue
+		if kind in ('keyDown', 'keyUp'):
+			source, down = replay.keycode(event['key']), kind == 'keyDown'
+		elif kind in ('mouseDown', 'mouseUp'):
+			source, down = seprofile.MOUSE_SOURCES['leftMouse'], kind == 'mouseDown'
+		elif kind in ('rightMouseDown', 'rightMouseUp'):
+			source, down = seprofile.MOUSE_SOURCES['rightMouse'], kind == 'rightMouseDown'
+		else:
+			raise ValueError('unknown event type %r' % kind)
+		if down:
+			downSince.setdefault(source, frame)
+		elif source in downSince:
+			keys[downSince.pop(source):frame, source] = True
+	for source, frame in downSince.items():
+		keys[frame:, source] = True
+	return keys, mouse
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Evaluate a keyboard/mouse trace against one or more profiles')
+	parser.add_argument('profiles', nargs='+')
+	source = parser.add_mutually_exclusive_group(required=True)
+	source.add_argument('--trace', help='Keyboard/mouse NDJSON trace (see replay.py)')
+	source.add_argument('--synthetic', type=int, metavar='N', help='Generate N random keyboard/mouse events')
+	parser.add_argument('--seed', type=int, default=1)
+	parser.add_argument('--fps', type=float, default=250.0, help='Frames (reports) per second')
+	args = parser.parse_args(argv)
+
+	profiles = []
+	for path in args.profiles:
+		with open(path) as fp:
+			# File-ordered lines, as shockemu.py and replay.py read them (shadowed keys reported).
+			profiles.append(shockemu.parse_items(fp.read()))
+	if args.trace:
+		with open(args.trace) as fp:
+			events = list(replay.read_trace(fp))
+	else:
+		events = list(replay.synthetic_trace(profiles[0], args.synthetic, args.seed))
+	dt = 1 / args.fps
+	keys, mouse = frames_from_trace(events, dt)
+
+	results = []
+	baseline = None
+	for path, profile in zip(args.profiles, profiles):
+		start = time.perf_counter()
+		engine = BatchEngine(profile)
+		reports = engine.evaluate(keys, mouse, dt)
+		elapsed = time.perf_counter() - start
+		if baseline is None:
+			baseline = reports
+		results.append(dict(
+			profile=path,
+			frames=len(reports),
+			seconds=elapsed,
+			frames_per_sec=len(reports) / elapsed if elapsed else 0.0,
+			frames_differing=int(np.any(reports[:, 1:10] != baseline[:, 1:10], axis=1).sum()),
+			warnings=engine.warnings,
+		))
+	print(json.dumps(results, indent=2, sort_keys=True))
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -1,6 +1,18 @@
-
 #!/bin/bash
 
+# Compiled profiles and dylibs are kept here, keyed by content, so switching
+# back to a profile that was already built skips codegen and the clang link.
+CACHE=${SHOCKEMU_CACHE:-.build-cache}
+DYLIB_FLAGS="-dynamiclib -std=gnu99 -current_version 1.0 -compatibility_version 1.0 -lobjc -framework Foundation -framework AppKit -framework CoreFoundation"
+
+# SHOCKEMU_RELEASE=1 builds without the per-tick mouseLook logging (shockemu.py --release).
 make
-python shockemu.py $1
-clang -dynamiclib -std=gnu99 iohid_wrap.m -current_version 1.0 -compatibility_version 1.0 -lobjc -framework Foundation -framework AppKit -framework CoreFoundation -o iohid_wrap.dylib
+python3 shockemu.py --cache-dir "$CACHE" ${SHOCKEMU_RELEASE:+--release} $1 || exit 1
+
+key=$( (echo "$DYLIB_FLAGS"; cat iohid_wrap.m seprofile.c seprofile.h gpad-protocol.h mapKeys.h) | shasum -a 256 | cut -d ' ' -f 1)
+if [ -f "$CACHE/dylib/$key" ]; then
+	echo "Using cached iohid_wrap.dylib"
+	cp "$CACHE/dylib/$key" iohid_wrap.dylib
+else
+	clang $DYLIB_FLAGS iohid_wrap.m seprofile.c -o iohid_wrap.dylib && mkdir -p "$CACHE/dylib" && cp iohid_wrap.dylib "$CACHE/dylib/$key"
+fi
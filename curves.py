@@ -0,0 +1,111 @@
+# Response curves for mouseLook, sampled at build time into lookup tables.
+#
+# A curve maps the normalized mouse acceleration x in [0, 1] to a stick deflection in
+# [0, 1]. The input is normalized with the profile's acceleration clamps:
+#
+#   x = clamp((|accel| - minAccel) / (maxAccel - minAccel), 0, 1)
+#
+# so accelerations below minAccel leave the stick centered and anything above maxAccel
+# is full deflection. The sign of the acceleration is applied afterwards. At runtime
+# seprofile_curve() in seprofile.c looks x up in the table with one index and one lerp;
+# lookup() below is the Python reference of that code.
+import math, struct
+
+LUT_SIZE = 256
+
+# Largest allowed difference between a table lookup and the analytic curve. Half a DS4
+# stick step is 1/254; staying well under it keeps the table invisible in reports.
+ERROR_BOUND = 1e-3
+
+DEFAULTS = dict(minAccel='0', maxAccel='1000', exponent='2', curvature='3', points='')
+
+def power(exponent):
+	if exponent < 1:
+		raise ValueError('power exponent must be >= 1, got %g' % exponent)
+	return lambda x: x ** exponent
+
+def exponential(curvature):
+	# (e^(kx) - 1) / (e^k - 1): k > 0 bends towards fine aim near the center.
+	if curvature == 0:
+		return lambda x: x
+	scale = math.expm1(curvature)
+	return lambda x: math.expm1(curvature * x) / scale
+
+def spline(points):
+	# Monotone cubic Hermite (Fritsch-Carlson) through (0, 0), the given points and (1, 1).
+	pts = [(0.0, 0.0)] + sorted(points) + [(1.0, 1.0)]
+	xs = [p[0] for p in pts]
+	ys = [p[1] for p in pts]
+	for a, b in zip(pts, pts[1:]):
+		if not a[0] < b[0]:
+			raise ValueError('spline points must have distinct x in (0, 1)')
+		if b[1] < a[1]:
+			raise ValueError('spline points must not decrease')
+	slopes = [(y1 - y0) / (x1 - x0) for x0, x1, y0, y1 in zip(xs, xs[1:], ys, ys[1:])]
+	tangents = [slopes[0]] + [0.0 if s0 * s1 <= 0 else (s0 + s1) / 2 for s0, s1 in zip(slopes, slopes[1:])] + [slopes[-1]]
+	for i, s in enumerate(slopes):
+		if s == 0:
+			tangents[i] = tangents[i + 1] = 0.0
+			continue
+		a, b = tangents[i] / s, tangents[i + 1] / s
+		if a * a + b * b > 9:
+			t = 3 / math.sqrt(a * a + b * b)
+			tangents[i], tangents[i + 1] = t * a * s, t * b * s
+
+	def curve(x):
+		i = 0
+		while i < len(slopes) - 1 and x > xs[i + 1]:
+			i += 1
+		h = xs[i + 1] - xs[i]
+		t = (x - xs[i]) / h
+		t2, t3 = t * t, t * t * t
+		return ((2 * t3 - 3 * t2 + 1) * ys[i] + (t3 - 2 * t2 + t) * h * tangents[i]
+			+ (-2 * t3 + 3 * t2) * ys[i + 1] + (t3 - t2) * h * tangents[i + 1])
+	return curve
+
+def parse_points(text):
+	# "0.25:0.1 0.5:0.3" -> [(0.25, 0.1), (0.5, 0.3)]
+	return [tuple(float(v) for v in pair.split(':', 1)) for pair in text.split()]
+
+def from_mouse_look(mouseLook):
+	# Returns (curve, minAccel, maxAccel) for a curved mouseLook section; raises ValueError.
+	params = dict(DEFAULTS, **mouseLook)
+	minAccel, maxAccel = float(params['minAccel']), float(params['maxAccel'])
+	if not 0 <= minAccel < maxAccel:
+		raise ValueError('mouseLook needs 0 <= minAccel < maxAccel')
+	kind = params['type']
+	if kind == 'power':
+		curve = power(float(params['exponent']))
+	elif kind == 'exponential':
+		curve = exponential(float(params['curvature']))
+	elif kind == 'spline':
+		curve = spline(parse_points(params['points']))
+	else:
+		raise ValueError('no curve for mouseLook type %s' % kind)
+	return curve, minAccel, maxAccel
+
+def to_float32(value):
+	return struct.unpack('<f', struct.pack('<f', value))[0]
+
+def sample(curve, size=LUT_SIZE):
+	return [to_float32(curve(i / float(size - 1))) for i in range(size)]
+
+def normalize(minAccel, maxAccel, value):
+	return min(max((abs(value) - minAccel) / (maxAccel - minAccel), 0.0), 1.0)
+
+def lookup(lut, minAccel, maxAccel, value):
+	# Reference for seprofile_curve(): signed table lookup with linear interpolation.
+	x = normalize(minAccel, maxAccel, value)
+	pos = x * (len(lut) - 1)
+	i = min(int(pos), len(lut) - 2)
+	y = lut[i] + (lut[i + 1] - lut[i]) * (pos - i)
+	return -y if value < 0 else y
+
+def max_error(curve, lut, probes=16):
+	# Largest |lookup - curve| over `probes` points per table interval plus the samples.
+	worst = 0.0
+	steps = (len(lut) - 1) * probes
+	for n in range(steps + 1):
+		x = n / float(steps)
+		worst = max(worst, abs(lookup(lut, 0.0, 1.0, x) - curve(x)))
+	return worst
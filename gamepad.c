@@ -1,4 +1,5 @@
 #include <IOKit/hid/IOHIDManager.h>
+#include <mach/mach_time.h>
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
@@ -13,6 +14,8 @@ struct gamepad_device {
 struct gamepad_context {
     IOHIDManagerRef hid_manager;
     void (*callback)(int type, int page, int usage, int value);
+    void (*timed_callback)(int type, int page, int usage, int value, uint64_t timestamp);
+    mach_timebase_info_data_t timebase;
     struct gamepad_device* devices_head;
     struct gamepad_device* devices_tail;
 };
@@ -38,6 +41,11 @@ static void device_input(void* ctx, IOReturn result, void* sender, IOHIDValueRef
         IOHIDElementRef element = IOHIDValueGetElement(value);
         c->callback((int)IOHIDElementGetType(element), (int)IOHIDElementGetUsagePage(element), (int)IOHIDElementGetUsage(element), (int)IOHIDValueGetIntegerValue(value));
     }
+    if (c->timed_callback) {
+        IOHIDElementRef element = IOHIDValueGetElement(value);
+        uint64_t timestamp = IOHIDValueGetTimeStamp(value) * c->timebase.numer / c->timebase.denom;
+        c->timed_callback((int)IOHIDElementGetType(element), (int)IOHIDElementGetUsagePage(element), (int)IOHIDElementGetUsage(element), (int)IOHIDValueGetIntegerValue(value), timestamp);
+    }
 }
 
 static void device_attached(void* ctx, IOReturn result, void* sender, IOHIDDeviceRef device)
@@ -109,6 +117,7 @@ void* gamepad_init(int useGamePad, int useKeybord, int useMouse)
     c = (struct gamepad_context*)malloc(sizeof(struct gamepad_context));
     if (!c) return NULL;
     memset(c, 0, sizeof(struct gamepad_context));
+    mach_timebase_info(&c->timebase);
 
     c->hid_manager = IOHIDManagerCreate(kCFAllocatorDefault, kIOHIDOptionsTypeNone);
     if (!c->hid_manager) {
@@ -148,6 +157,14 @@ void gamepad_set_callback(void* ctx, void (*callback)(int type, int page, int us
     c->callback = callback;
 }
 
+/* Like gamepad_set_callback, plus the event timestamp in nanoseconds of mach_absolute_time. */
+void gamepad_set_timed_callback(void* ctx, void (*callback)(int type, int page, int usage, int value, uint64_t timestamp))
+{
+    struct gamepad_context* c = (struct gamepad_context*)ctx;
+    if (!c) return;
+    c->timed_callback = callback;
+}
+
 void gamepad_term(void* ctx)
 {
     struct gamepad_context* c = (struct gamepad_context*)ctx;
@@ -2,16 +2,34 @@
 #include <unistd.h>
 #include <stdio.h>
 #include "gamepad.h"
+#include "gpad-protocol.h"
 
 int fd ;
 
-static void callback(int type, int page, int usage, int value)
+/* values of the current run loop pass, written as one frame when the loop goes idle */
+static struct gpad_frame frame = { { GPAD_FRAME_MAGIC, 0, 0 } };
+
+static void flush_frame(void)
 {
-    char data[50];
+    if (!frame.header.count)
+        return;
+    write(fd, &frame, gpad_frame_size(&frame));
+    frame.header.count = 0;
+}
+
+static void callback(int type, int page, int usage, int value, uint64_t timestamp)
+{
+    struct gpad_record* record;
     // printf("type=%d, page=%d, usage=%d, value=%d\n", type, page, usage, value);
-    sprintf(data, "%4d %4d", usage, value);
-    write(fd, data, strlen(data)+1);
-    fflush(stdout);
+    if (frame.header.count == GPAD_FRAME_MAX_RECORDS)
+        flush_frame();
+    record = &frame.records[frame.header.count++];
+    memset(record, 0, sizeof(*record));
+    record->timestamp = timestamp;
+    record->value = value;
+    record->page = page;
+    record->usage = usage;
+    record->type = type;
 
     /* end main loop if push esc key */
     if (2 == type && 7 == page && 41 == usage && 0 == value) {
@@ -19,13 +37,19 @@ static void callback(int type, int page, int usage, int value)
     }
 }
 
+static void before_waiting(CFRunLoopObserverRef observer, CFRunLoopActivity activity, void* info)
+{
+    flush_frame();
+}
+
 
 
 int main()
 {
     void* ctx;
+    CFRunLoopObserverRef observer;
 
-    fd = open("/tmp/gpad-daemon-data",O_WRONLY);
+    fd = open(GPAD_FIFO_PATH,O_WRONLY);
 
     /* initialize gamepad */
     ctx = gamepad_init(1, 0, 0);
@@ -35,10 +59,18 @@ int main()
     }
 
     /* set callback */
-    gamepad_set_callback(ctx, callback);
+    gamepad_set_timed_callback(ctx, callback);
+
+    /* one write per run loop pass instead of one per value */
+    observer = CFRunLoopObserverCreate(kCFAllocatorDefault, kCFRunLoopBeforeWaiting | kCFRunLoopExit, true, 0, before_waiting, NULL);
+    CFRunLoopAddObserver(CFRunLoopGetCurrent(), observer, kCFRunLoopCommonModes);
 
     CFRunLoopRun();
 
+    flush_frame();
+    CFRunLoopRemoveObserver(CFRunLoopGetCurrent(), observer, kCFRunLoopCommonModes);
+    CFRelease(observer);
+
     /* terminate gamepad */
     gamepad_term(ctx);
 
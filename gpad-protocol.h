@@ -0,0 +1,81 @@
+/*
+ * Binary protocol of the gpad-daemon FIFO.
+ *
+ * gpad-daemon batches the HID values of one run loop pass into a frame: a header
+ * followed by `count` fixed-size records, all little endian. Frames are at most
+ * GPAD_FRAME_MAX_SIZE bytes, which is below PIPE_BUF, so every frame is written
+ * with a single atomic write() and readers never see frames interleaved.
+ *
+ *   header  magic u32 'GPD1', count u16, reserved u16
+ *   record  timestamp u64 (ns, monotonic), value i32, page u16, usage u16, type u8, reserved u8[7]
+ *
+ * gpadproto.py is the Python reader; keep both in sync.
+ */
+#ifndef GPAD_PROTOCOL_H
+#define GPAD_PROTOCOL_H
+
+#include <stddef.h>
+#include <stdint.h>
+#include <string.h>
+
+#define GPAD_FIFO_PATH "/tmp/gpad-daemon-data"
+#define GPAD_FRAME_MAGIC 0x31445047u /* "GPD1" */
+#define GPAD_FRAME_MAX_RECORDS 20
+
+struct gpad_frame_header {
+    uint32_t magic;
+    uint16_t count;
+    uint16_t reserved;
+};
+
+struct gpad_record {
+    uint64_t timestamp;
+    int32_t value;
+    uint16_t page;
+    uint16_t usage;
+    uint8_t type;
+    uint8_t reserved[7];
+};
+
+#define GPAD_FRAME_MAX_SIZE (sizeof(struct gpad_frame_header) + GPAD_FRAME_MAX_RECORDS * sizeof(struct gpad_record))
+
+struct gpad_frame {
+    struct gpad_frame_header header;
+    struct gpad_record records[GPAD_FRAME_MAX_RECORDS];
+};
+
+/* Size of the frame in bytes, ready to be written. */
+static inline size_t gpad_frame_size(const struct gpad_frame* frame)
+{
+    return sizeof(struct gpad_frame_header) + frame->header.count * sizeof(struct gpad_record);
+}
+
+/*
+ * Decodes the complete frames at the start of buf and calls emit for every record.
+ * Returns the number of bytes consumed; the caller keeps the rest for the next read.
+ * Bytes that do not start a frame are skipped so a reader can resync mid-stream.
+ */
+static inline size_t gpad_decode(const uint8_t* buf, size_t len, void (*emit)(const struct gpad_record* record, void* ctx), void* ctx)
+{
+    size_t pos = 0;
+    while (len - pos >= sizeof(struct gpad_frame_header)) {
+        struct gpad_frame_header header;
+        memcpy(&header, buf + pos, sizeof(header));
+        if (header.magic != GPAD_FRAME_MAGIC || header.count > GPAD_FRAME_MAX_RECORDS) {
+            pos++;
+            continue;
+        }
+        size_t size = sizeof(header) + header.count * sizeof(struct gpad_record);
+        if (len - pos < size)
+            break;
+        for (int i = 0; i < header.count; i++) {
+            struct gpad_record record;
+            memcpy(&record, buf + pos + sizeof(header) + i * sizeof(record), sizeof(record));
+            emit(&record, ctx);
+        }
+        pos += size;
+    }
+    return pos;
+}
+
+#endif
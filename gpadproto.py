@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# Reader for the binary gpad-daemon FIFO protocol (layout in gpad-protocol.h).
+#
+# Frames are a header (magic 'GPD1', record count) followed by fixed-size records of
+# (timestamp ns, value, page, usage, type). Records are yielded as plain tuples straight
+# from struct.iter_unpack over a memoryview of the read buffer, so parsing does not copy
+# record bytes.
+import argparse, json, struct, sys
+
+FIFO_PATH = '/tmp/gpad-daemon-data'
+FRAME_MAGIC = 0x31445047
+FRAME_MAX_RECORDS = 20
+
+FRAME_HEADER = struct.Struct('<IHH')
+RECORD = struct.Struct('<QiHHB7x')
+FRAME_MAX_SIZE = FRAME_HEADER.size + FRAME_MAX_RECORDS * RECORD.size
+MAGIC_BYTES = FRAME_HEADER.pack(FRAME_MAGIC, 0, 0)[:4]
+
+# Field order of the yielded record tuples.
+TIMESTAMP, VALUE, PAGE, USAGE, TYPE = range(5)
+
+def pack_frames(records):
+	# [(timestamp, value, page, usage, type)] -> frames of up to FRAME_MAX_RECORDS records.
+	records = list(records)
+	out = []
+	for start in range(0, len(records), FRAME_MAX_RECORDS):
+		batch = records[start:start + FRAME_MAX_RECORDS]
+		out.append(FRAME_HEADER.pack(FRAME_MAGIC, len(batch), 0))
+		out.extend(RECORD.pack(*r) for r in batch)
+	return b''.join(out)
+
+def decode(buf):
+	# Yields the records of the complete frames in buf, then returns the number of bytes
+	# consumed (StopIteration.value). Bytes that do not start a frame are skipped, like
+	# gpad_decode() in gpad-protocol.h.
+	view = memoryview(buf)
+	pos = 0
+	end = len(view)
+	while end - pos >= FRAME_HEADER.size:
+		magic, count, _ = FRAME_HEADER.unpack_from(view, pos)
+		if magic != FRAME_MAGIC or count > FRAME_MAX_RECORDS:
+			found = bytes(view[pos + 1:]).find(MAGIC_BYTES)
+			pos = end - 3 if found < 0 else pos + 1 + found
+			continue
+		size = FRAME_HEADER.size + count * RECORD.size
+		if end - pos < size:
+			break
+		for record in RECORD.iter_unpack(view[pos + FRAME_HEADER.size:pos + size]):
+			yield record
+		pos += size
+	return pos
+
+def read_records(fp, chunk=65536):
+	# Generator over the records of a binary stream (file or FIFO), across partial reads.
+	buf = bytearray()
+	while True:
+		data = fp.read(chunk)
+		if not data:
+			return
+		buf += data
+		used = yield from decode(buf)
+		del buf[:used]
+
+def iter_records(data):
+	# All records of an in-memory capture.
+	yield from decode(data)
+
+def is_binary(data):
+	return bytes(data[:4]) == MAGIC_BYTES
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Dump gpad-daemon FIFO records as NDJSON')
+	parser.add_argument('path', nargs='?', default=FIFO_PATH)
+	args = parser.parse_args(argv)
+	names = ('timestamp', 'value', 'page', 'usage', 'type')
+	with open(args.path, 'rb') as fp:
+		for record in read_records(fp):
+			print(json.dumps(dict(zip(names, record)), sort_keys=True))
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
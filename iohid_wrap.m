@@ -16,6 +16,9 @@
 #include <sys/stat.h> 
 #include <sys/types.h> 
 
+#include "seprofile.h"
+#include "gpad-protocol.h"
+
 
 typedef struct {
 	uint8_t id, 
@@ -137,8 +140,17 @@ IOReturn IOHIDDeviceSetReport( IOHIDDeviceRef device, IOHIDReportType reportType
 	uint8_t uleftX, uleftY, urightX, urightY;
 
 	bool keys[256], leftMouse, rightMouse;
+	uint8_t pressed[256]; // keycodes currently down, in press order
+	int numPressed;
 	bool kicked, decayKicked;
 
+	const char *profilePath; // SHOCKEMU_PROFILE, replaces the compiled mapKeys.h when set
+	struct seprofile *profile;
+	struct seprofile_decay profileDecay;
+	ino_t profileInode;
+	struct timespec profileMtime;
+	CFAbsoluteTime profileChecked;
+
 	bool mouseMoved;
 	NSPoint lastMouse;
 	CFAbsoluteTime lastMouseTime;
@@ -192,26 +204,25 @@ static int fd;
 }
 
 
+static void gpadrecord(const struct gpad_record *record, void *ctx) {
+	[hid tickpad:record->usage :record->value];
+}
+
 +(void)gpadloop:(id)param{
 
-	char rdbuf[50];
-	int code,val;
-	fd = open("/tmp/gpad-daemon-data",O_RDONLY);
+	uint8_t rdbuf[4 * GPAD_FRAME_MAX_SIZE];
+	size_t len = 0;
+	fd = open(GPAD_FIFO_PATH, O_RDONLY);
 	
 	while (true) {
 
-		while (read(fd, rdbuf, 50)) {
-
-		if (strlen(rdbuf) > 0) {
-			// printf("GPAD Server: has been entered : [%s] \n",rdbuf);
-			int n = sscanf(rdbuf, "%d %d", &code, &val) ;
-			if (n >0) {
-				// printf("\t\t[%d][%d] \n",code, val);
-				[hid tickpad:code :val];
-			}
-			sprintf(rdbuf, "%s", "\0");
-			fflush(stdout);
-		} 
+		ssize_t n;
+		while ((n = read(fd, rdbuf + len, sizeof(rdbuf) - len)) > 0) {
+			len += n;
+			size_t used = gpad_decode(rdbuf, len, gpadrecord, NULL);
+			// keep a partial frame for the next read
+			memmove(rdbuf, rdbuf + used, len - used);
+			len -= used;
 		}
 		
 		usleep(10000);
@@ -274,6 +285,12 @@ static GPadManager *gpadmanager;
 
 	for(int i = 0; i < 256; ++i)
 		keys[i] = false;
+	numPressed = 0;
+
+	profileDecay.step = SEPROFILE_MAX_DECAY_STEPS;
+	profilePath = getenv("SHOCKEMU_PROFILE");
+	if(profilePath)
+		[self reloadProfile];
 
 	gpadmanager = [GPadManager new];
 	[gpadmanager start];
@@ -422,19 +439,133 @@ static GPadManager *gpadmanager;
 #define DEADZONE .1
 
 #define DOWN(key) keys[key]
+
+// Bit positions for the button masks used by the table codegen in shockemu.py
+enum {
+	BUTTON_dpadUp, BUTTON_dpadLeft, BUTTON_dpadRight, BUTTON_dpadDown,
+	BUTTON_X, BUTTON_O, BUTTON_square, BUTTON_triangle, BUTTON_PS, BUTTON_touchpad,
+	BUTTON_options, BUTTON_share, BUTTON_L1, BUTTON_L2, BUTTON_L3, BUTTON_R1, BUTTON_R2, BUTTON_R3
+};
+#define BUTTON(name) (1u << BUTTON_##name)
+
 - (void)mapKeys {
+	if(profilePath)
+		[self reloadProfile];
+	if(profile) {
+		[self mapProfile];
+		return;
+	}
 #include "mapKeys.h"
 }
 
+// Picks up a new .sebin when the file at profilePath was replaced. Writers rename the
+// new file into place, so a changed inode/mtime means a complete profile; the swap
+// happens between two reports on the run loop thread.
+- (void)reloadProfile {
+	CFAbsoluteTime now = CFAbsoluteTimeGetCurrent();
+	if(now - profileChecked < 0.25)
+		return;
+	profileChecked = now;
+
+	struct stat st;
+	if(stat(profilePath, &st) != 0)
+		return;
+	if(st.st_ino == profileInode && st.st_mtimespec.tv_sec == profileMtime.tv_sec && st.st_mtimespec.tv_nsec == profileMtime.tv_nsec)
+		return;
+	profileInode = st.st_ino;
+	profileMtime = st.st_mtimespec;
+
+	struct seprofile *next = seprofile_load(profilePath);
+	if(!next) {
+		NSLog(@"Ignoring invalid profile %s", profilePath);
+		return;
+	}
+	struct seprofile *old = profile;
+	profile = next;
+	seprofile_free(old);
+	// A decay in flight belongs to the old schedule.
+	profileDecay.step = SEPROFILE_MAX_DECAY_STEPS;
+	NSLog(@"Loaded profile %s", profilePath);
+}
+
+static inline void foldSource(const struct seprofile *p, int source, uint32_t *mask, int *axis) {
+	*mask |= p->buttons[source];
+	for(int i = 0; i < 4; ++i)
+		axis[i] += p->axes[source][i];
+}
+
+#define PROFILE_BUTTON(name) if(profile->bound_buttons & BUTTON(name)) name = (mask & BUTTON(name)) != 0
+
+// The table codegen and mouseLook block of shockemu.py, driven by the loaded profile: the
+// decay follows the schedule (and --release skips) stored in it.
+- (void)mapProfile {
+	uint32_t mask = 0;
+	int axis[4] = {0, 0, 0, 0};
+	for(int i = 0; i < numPressed; ++i)
+		foldSource(profile, pressed[i], &mask, axis);
+	if(leftMouse)
+		foldSource(profile, SEPROFILE_LEFT_MOUSE, &mask, axis);
+	if(rightMouse)
+		foldSource(profile, SEPROFILE_RIGHT_MOUSE, &mask, axis);
+
+	PROFILE_BUTTON(dpadUp); PROFILE_BUTTON(dpadLeft); PROFILE_BUTTON(dpadRight); PROFILE_BUTTON(dpadDown);
+	PROFILE_BUTTON(X); PROFILE_BUTTON(O); PROFILE_BUTTON(square); PROFILE_BUTTON(triangle);
+	PROFILE_BUTTON(PS); PROFILE_BUTTON(touchpad); PROFILE_BUTTON(options); PROFILE_BUTTON(share);
+	PROFILE_BUTTON(L1); PROFILE_BUTTON(L2); PROFILE_BUTTON(L3); PROFILE_BUTTON(R1); PROFILE_BUTTON(R2); PROFILE_BUTTON(R3);
+	if(profile->bound_sticks & 1) {
+		leftX = axis[0];
+		leftY = axis[1];
+	}
+	if(profile->bound_sticks & 2) {
+		rightX = axis[2];
+		rightY = axis[3];
+	}
+
+	if(profile->mouse_look) {
+		float *x = profile->mouse_look_stick ? &rightX : &leftX;
+		float *y = profile->mouse_look_stick ? &rightY : &leftY;
+		if(mouseMoved) {
+			if(profile->has_curve) {
+				*x = -seprofile_curve(profile->curve, profile->min_accel, profile->max_accel, mouseAccelX);
+				*y = seprofile_curve(profile->curve, profile->min_accel, profile->max_accel, mouseAccelY);
+			} else {
+				*x = -mouseAccelX;
+				*y = mouseAccelY;
+			}
+			seprofile_decay_start(&profileDecay, *x, *y);
+			mouseMoved = false;
+		} else if(seprofile_decay_step(profile, &profileDecay, x, y))
+			[self decayKick];
+	}
+}
+
+
+- (void)keyPressed:(uint8_t)code {
+	if(keys[code])
+		return;
+	keys[code] = true;
+	pressed[numPressed++] = code;
+}
+
+- (void)keyReleased:(uint8_t)code {
+	if(!keys[code])
+		return;
+	keys[code] = false;
+	for(int i = 0; i < numPressed; ++i)
+		if(pressed[i] == code) {
+			pressed[i] = pressed[--numPressed];
+			break;
+		}
+}
 
 - (void)keyDown:(NSEvent *)event {
 	NSLog(@"down %i", [event keyCode]);
-	hid->keys[[event keyCode]] = true;
+	[hid keyPressed:[event keyCode]];
 	[hid kick];
 }
 - (void)keyUp:(NSEvent *)event {
 	//NSLog(@"up %i", [event keyCode]);
-	hid->keys[[event keyCode]] = false;
+	[hid keyReleased:[event keyCode]];
 	[hid kick];
 }
 
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+# Offline replay of input traces through a pure-Python reference of the code shockemu.py
+# generates, so mappings can be checked and timed without a Mac or Remote Play.
+#
+# Inputs:
+#   --fifo FILE    a capture of /tmp/gpad-daemon-data, fed to tickpad like GPadManager does:
+#                  binary frames (gpadproto.py) or the older NUL-terminated "%4d %4d" text records
+#   --trace FILE   keyboard/mouse NDJSON, one event per line:
+#                  {"t": 0.016, "type": "keyDown", "key": "w"}       (keyUp; key may be a keycode)
+#                  {"t": 0.020, "type": "mouseMoved", "x": 10, "y": 4} (window coordinates)
+#                  {"t": 0.030, "type": "mouseDown"}                 (mouseUp, rightMouseDown, rightMouseUp)
+#   --synthetic N  N random keyboard/mouse events over the profile's bound keys
+#
+# Prints a JSON summary (per-event latency percentiles, events/s, final state) and with
+# --timeline writes one NDJSON line per emitted report.
+import argparse, json, random, sys, time
+
+import curves, gpadproto, shockemu
+
+# Input report 0x01 as sent by a real DS4; tick() overwrites the first bytes.
+BASE_REPORT = bytes([0x01, 0x7f, 0x81, 0x82, 0x7d, 0x08, 0x00, 0xb4, 0x00, 0x00, 0xc8, 0xad, 0xf9, 0x04, 0x00, 0xfe, 0xff, 0xfc, 0xff, 0xe5, 0xfe, 0xcb, 0x1f, 0x69, 0x08, 0x00, 0x00, 0x00, 0x00, 0x00, 0x1b, 0x00, 0x00, 0x01, 0x63, 0x8b, 0x80, 0xc1, 0x2e, 0x80, 0x00, 0x00, 0x00, 0x00, 0x80, 0x00, 0x00, 0x00, 0x80, 0x00, 0x00, 0x00, 0x00, 0x80, 0x00, 0x00, 0x00, 0x80, 0x00, 0x00, 0x00, 0x00, 0x80, 0x00])
+
+# gpad-daemon usages handled by tickpad.
+PAD_BUTTONS = {2: 'X', 3: 'O', 1: 'square', 4: 'triangle', 5: 'L1', 6: 'R1', 7: 'L2', 8: 'R2',
+	9: 'share', 10: 'options', 11: 'L3', 12: 'R3', 13: 'PS'}
+PAD_AXES = {48: 'uleftX', 49: 'uleftY', 50: 'urightX', 53: 'urightY'}
+PAD_HAT = 57
+
+# Guard against runaway kick chains; planned decays end well before this.
+MAX_DECAY_TICKS = shockemu.MAX_DECAY_STEPS + 2
+
+f32 = curves.to_float32
+
+def stick_byte(value):
+	return int(min(max(128 + value * 127, 0), 255))
+
+def dpad_hat(up, down, left, right):
+	if left:
+		return 7 if up else 5 if down else 6
+	if right:
+		return 1 if up else 3 if down else 2
+	return 0 if up else 4 if down else 8
+
+class Emulator(object):
+	# Mirrors HIDRunner in iohid_wrap.m together with the table codegen of a profile
+	# (release=True follows the --release mouseLook block).
+
+	def __init__(self, profile, release=False):
+		program = shockemu.build_program(profile)
+		mouseLook, self.warnings = program.mouseLook, program.warnings
+		self.masks = dict((source, set(names)) for source, names in program.masks.items())
+		self.deltas = program.deltas
+		self.boundButtons = program.boundButtons
+		self.boundSticks = program.boundSticks
+		self.mouseLook = None
+		self.curve = None
+		if mouseLook is not None:
+			# Same checks, in the same order, as shockemu.emit_mouse_look().
+			try:
+				self.decayScale, warning = shockemu.plan_decay(mouseLook)
+				if warning:
+					self.warnings.append(warning)
+				if mouseLook['type'] != 'linear':
+					self.curve = shockemu.mouse_curve(mouseLook)
+				self.mouseLook = mouseLook
+				self.deadZone = float(mouseLook['deadZone'])
+			except ValueError as exc:
+				self.warnings.append('Bad mouseLook: %s' % exc)
+		self.release = release
+		self.decayStep = len(self.decayScale) if self.mouseLook is not None else 0
+		self.decayStart = (0.0, 0.0)
+
+		self.state = dict((b, False) for b in shockemu.buttons)
+		self.state.update(leftX=0.0, leftY=0.0, rightX=0.0, rightY=0.0, uleftX=0, uleftY=0, urightX=0, urightY=0)
+		self.pressed = []
+		self.leftMouse = self.rightMouse = False
+		self.mouseMoved = False
+		self.lastMouse = (0.0, 0.0)
+		self.lastMouseTime = 0.0
+		self.mouseAccel = [0.0, 0.0]
+		self.mouseVel = [0.0, 0.0]
+		self.ticks = 0
+		self.pending = 0
+		self.decayKicked = False
+		self.reports = []
+
+	# Input handlers, as swizzled into RPWindowStreaming.
+
+	def key_down(self, code):
+		if code not in self.pressed:
+			self.pressed.append(code)
+		self.kick()
+
+	def key_up(self, code):
+		if code in self.pressed:
+			i = self.pressed.index(code)
+			self.pressed[i] = self.pressed[-1]
+			self.pressed.pop()
+		self.kick()
+
+	def mouse_button(self, name, down):
+		setattr(self, name, down)
+		self.kick()
+
+	def mouse_moved(self, x, y, t):
+		dt = t - self.lastMouseTime
+		if dt <= 0:
+			dt = 1e-6
+		vel = [f32((x - self.lastMouse[0]) / dt), f32((y - self.lastMouse[1]) / dt)]
+		self.mouseAccel = [f32((vel[0] - self.mouseVel[0]) / dt), f32((vel[1] - self.mouseVel[1]) / dt)]
+		self.mouseVel = vel
+		self.lastMouseTime = t
+		self.lastMouse = (x, y)
+		self.mouseMoved = True
+		self.kick()
+		self.decay_kick()
+
+	def kick(self):
+		self.pending += 1
+
+	def decay_kick(self):
+		if not self.decayKicked:
+			self.decayKicked = True
+			self.pending += 1
+
+	def run(self):
+		# Drains the run loop: every kick is one tick, decay kicks chain until the dead zone.
+		ticks = 0
+		while self.pending and ticks < MAX_DECAY_TICKS:
+			self.pending -= 1
+			self.decayKicked = False
+			self.tick()
+			ticks += 1
+		self.pending = 0
+
+	def map_keys(self):
+		s = self.state
+		mask = set()
+		axis = [0, 0, 0, 0]
+		sources = list(self.pressed)
+		if self.leftMouse:
+			sources.append('leftMouse')
+		if self.rightMouse:
+			sources.append('rightMouse')
+		for source in sources:
+			mask |= self.masks.get(source, set())
+			for i, d in enumerate(self.deltas.get(source, ())):
+				axis[i] += d
+		for name in self.boundButtons:
+			s[name] = name in mask
+		for stick in self.boundSticks:
+			x = shockemu.axisSlots.index(stick + 'X')
+			s[stick + 'X'], s[stick + 'Y'] = float(axis[x]), float(axis[x + 1])
+
+		if self.mouseLook is not None:
+			stick = self.mouseLook['stick']
+			if self.mouseMoved:
+				ax, ay = self.mouseAccel
+				if self.curve is not None:
+					lut, minAccel, maxAccel = self.curve
+					ax, ay = curves.lookup(lut, minAccel, maxAccel, ax), curves.lookup(lut, minAccel, maxAccel, ay)
+				s[stick + 'X'], s[stick + 'Y'] = self.decayStart = f32(-ax), f32(ay)
+				self.decayStep = 0
+				self.mouseMoved = False
+			elif self.decayStep < len(self.decayScale):
+				scale, (x, y) = self.decayScale, self.decayStart
+				if self.release:
+					while self.decayStep + 1 < len(scale) and all(c == 0 or abs(f32(c * scale[self.decayStep])) >= f32(shockemu.SATURATED) for c in (x, y)):
+						self.decayStep += 1
+				s[stick + 'X'], s[stick + 'Y'] = f32(x * scale[self.decayStep]), f32(y * scale[self.decayStep])
+				self.decayStep += 1
+				if self.decayStep < len(scale) and (abs(s[stick + 'X']) > self.deadZone or abs(s[stick + 'Y']) > self.deadZone):
+					self.decay_kick()
+				else:
+					s[stick + 'X'] = s[stick + 'Y'] = 0.0
+					self.decayStep = len(scale)
+
+	def emit(self, dpad, sticks):
+		s = self.state
+		report = bytearray(BASE_REPORT)
+		report[1:5] = bytes(sticks)
+		report[5] = (s['triangle'] << 7) | (s['O'] << 6) | (s['X'] << 5) | (s['square'] << 4) | dpad
+		report[6] = (s['R3'] << 7) | (s['L3'] << 6) | (s['options'] << 5) | (s['share'] << 4) | \
+			(s['R2'] << 3) | (s['L2'] << 2) | (s['R1'] << 1) | s['L1']
+		report[7] = ((self.ticks << 2) & 0xFF) | (s['touchpad'] << 1) | s['PS']
+		report[8] = 255 if s['L2'] else 0
+		report[9] = 255 if s['R2'] else 0
+		self.reports.append(bytes(report))
+		self.ticks += 1
+
+	def tick(self):
+		self.map_keys()
+		s = self.state
+		dpad = dpad_hat(s['dpadUp'], s['dpadDown'], s['dpadLeft'], s['dpadRight'])
+		self.emit(dpad, [stick_byte(s[n]) for n in ('leftX', 'leftY', 'rightX', 'rightY')])
+
+	def tickpad(self, code, val):
+		s = self.state
+		dpad = val if code == PAD_HAT else 8
+		if code in PAD_BUTTONS:
+			s[PAD_BUTTONS[code]] = val == 1
+		elif code in PAD_AXES:
+			s[PAD_AXES[code]] = min(max(val, 0), 255)
+		self.emit(dpad, [s['uleftX'], s['uleftY'], s['urightX'], s['urightY']])
+
+def read_fifo(data):
+	# Yields (usage, value) from a gpad-daemon capture in either protocol.
+	if gpadproto.is_binary(data):
+		for record in gpadproto.iter_records(data):
+			yield record[gpadproto.USAGE], record[gpadproto.VALUE]
+		return
+	for record in data.split(b'\0'):
+		fields = record.split()
+		if len(fields) >= 2:
+			yield int(fields[0]), int(fields[1])
+
+def read_trace(fp):
+	for line in fp:
+		line = line.strip()
+		if line:
+			yield json.loads(line)
+
+def synthetic_trace(profile, count, seed):
+	# Random key presses over the bound keys mixed with mouse motion at ~1 kHz.
+	rng = random.Random(seed)
+	bindings, mouseLook, _ = shockemu.compile_profile(profile)
+	keycodes = sorted(set(s for s, _ in bindings if s not in shockemu.mouseButtons)) or [0]
+	held = set()
+	t, x, y = 0.0, 0.0, 0.0
+	for _ in range(count):
+		t += 0.001
+		roll = rng.random()
+		if mouseLook is not None and roll < 0.5:
+			x += rng.uniform(-20, 20)
+			y += rng.uniform(-20, 20)
+			yield dict(t=t, type='mouseMoved', x=x, y=y)
+		elif roll < 0.55:
+			yield dict(t=t, type=rng.choice(['mouseDown', 'mouseUp', 'rightMouseDown', 'rightMouseUp']))
+		else:
+			code = rng.choice(keycodes)
+			yield dict(t=t, type='keyUp' if code in held else 'keyDown', key=code)
+			held ^= set([code])
+
+def keycode(key):
+	return key if isinstance(key, int) else shockemu.keys[key]
+
+def apply_event(emu, event):
+	kind = event['type']
+	if kind == 'pad':
+		emu.tickpad(event['usage'], event['value'])
+		return
+	if kind == 'keyDown':
+		emu.key_down(keycode(event['key']))
+	elif kind == 'keyUp':
+		emu.key_up(keycode(event['key']))
+	elif kind == 'mouseMoved':
+		emu.mouse_moved(float(event['x']), float(event['y']), float(event['t']))
+	elif kind in ('mouseDown', 'mouseUp'):
+		emu.mouse_button('leftMouse', kind == 'mouseDown')
+	elif kind in ('rightMouseDown', 'rightMouseUp'):
+		emu.mouse_button('rightMouse', kind == 'rightMouseDown')
+	else:
+		raise ValueError('unknown event type %r' % kind)
+	emu.run()
+
+def report_state(report):
+	return dict(left_x=report[1], left_y=report[2], right_x=report[3], right_y=report[4],
+		buttons1=report[5], buttons2=report[6], buttons3=report[7], left_trigger=report[8], right_trigger=report[9])
+
+def percentile(sorted_values, q):
+	if not sorted_values:
+		return 0.0
+	return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+def replay(profile, events, timeline=None):
+	# Runs events through a fresh Emulator and returns the summary dict.
+	emu = Emulator(profile)
+	latencies = []
+	clock = time.perf_counter_ns
+	start = clock()
+	for n, event in enumerate(events):
+		first = len(emu.reports)
+		t0 = clock()
+		apply_event(emu, event)
+		latencies.append(clock() - t0)
+		if timeline is not None:
+			for report in emu.reports[first:]:
+				timeline.write(json.dumps(dict(event=n, t=event.get('t'), type=event['type'], **report_state(report))) + '\n')
+		del emu.reports[:-1]
+	elapsed = (clock() - start) / 1e9
+	latencies.sort()
+	return dict(
+		events=len(latencies),
+		reports=emu.ticks,
+		seconds=elapsed,
+		events_per_sec=len(latencies) / elapsed if elapsed else 0.0,
+		latency_us=dict((name, percentile(latencies, q) / 1e3) for name, q in (('p50', .5), ('p95', .95), ('p99', .99), ('max', 1.0))),
+		final=report_state(emu.reports[-1]) if emu.reports else None,
+		warnings=emu.warnings,
+	)
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Replay recorded or synthetic input through a profile')
+	parser.add_argument('profile')
+	source = parser.add_mutually_exclusive_group(required=True)
+	source.add_argument('--fifo', help='Capture of the gpad-daemon FIFO')
+	source.add_argument('--trace', help='Keyboard/mouse NDJSON trace')
+	source.add_argument('--synthetic', type=int, metavar='N', help='Generate N random keyboard/mouse events')
+	parser.add_argument('--seed', type=int, default=1)
+	parser.add_argument('--timeline', help='Write per-report state as NDJSON to this path')
+	args = parser.parse_args(argv)
+
+	with open(args.profile) as fp:
+		# Lines in file order, as shockemu.py compiles them: shadowed keys are reported with
+		# their line numbers instead of collapsing in a dict.
+		profile = shockemu.parse_items(fp.read())
+	if args.fifo:
+		with open(args.fifo, 'rb') as fp:
+			events = [dict(type='pad', usage=u, value=v) for u, v in read_fifo(fp.read())]
+	elif args.trace:
+		with open(args.trace) as fp:
+			events = list(read_trace(fp))
+	else:
+		events = list(synthetic_trace(profile, args.synthetic, args.seed))
+
+	if args.timeline:
+		with open(args.timeline, 'w') as timeline:
+			summary = replay(profile, events, timeline)
+	else:
+		summary = replay(profile, events)
+	print(json.dumps(summary, indent=2, sort_keys=True))
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
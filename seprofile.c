@@ -0,0 +1,192 @@
+#include <fcntl.h>
+#include <math.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include "seprofile.h"
+
+#define SEPROFILE_VERSION 3
+#define SEPROFILE_FLAG_RELEASE 1
+#define SEPROFILE_SATURATED (128 / 127.0f) /* shockemu.SATURATED */
+#define SEPROFILE_MOUSE_LOOK_TYPES 4 /* linear power exponential spline */
+
+#pragma pack(push, 1)
+struct seprofile_header {
+    char magic[4];
+    uint16_t version, header_size;
+    uint32_t body_size, crc;
+    uint16_t button_count, axis_count, mouse_look_count, curve_count, decay_steps;
+};
+
+struct seprofile_button {
+    uint16_t source, pad;
+    uint32_t mask;
+};
+
+struct seprofile_axis {
+    uint16_t source, pad;
+    int8_t deltas[4];
+};
+
+struct seprofile_mouse_look {
+    uint8_t type, stick, flags, pad;
+    double dead_zone;
+    float decay, mult_x, mult_y;
+    float min_accel, max_accel;
+};
+#pragma pack(pop)
+
+static uint32_t seprofile_crc32(const uint8_t* data, size_t size)
+{
+    uint32_t crc = 0xFFFFFFFF;
+    for (size_t i = 0; i < size; i++) {
+        crc ^= data[i];
+        for (int k = 0; k < 8; k++)
+            crc = (crc >> 1) ^ (0xEDB88320 & -(crc & 1));
+    }
+    return ~crc;
+}
+
+static struct seprofile* decode(const uint8_t* data, size_t size)
+{
+    const struct seprofile_header* h = (const struct seprofile_header*)data;
+    struct seprofile* p;
+    const uint8_t* body;
+    size_t expected;
+    uint8_t seen[SEPROFILE_SOURCES];
+
+    if (size < sizeof(*h) || memcmp(h->magic, "SEPF", 4) != 0) return NULL;
+    if (h->version != SEPROFILE_VERSION || h->header_size != sizeof(*h)) return NULL;
+    if (size != h->header_size + (size_t)h->body_size) return NULL;
+    if (h->button_count > SEPROFILE_SOURCES || h->axis_count > SEPROFILE_SOURCES || h->mouse_look_count > 1 ||
+        h->curve_count > h->mouse_look_count) return NULL;
+    if ((h->decay_steps == 0) != (h->mouse_look_count == 0) || h->decay_steps > SEPROFILE_MAX_DECAY_STEPS) return NULL;
+    expected = h->button_count * sizeof(struct seprofile_button) + h->axis_count * sizeof(struct seprofile_axis) +
+               h->mouse_look_count * sizeof(struct seprofile_mouse_look) + h->curve_count * sizeof(float) * SEPROFILE_CURVE_SIZE +
+               h->decay_steps * sizeof(float);
+    body = data + h->header_size;
+    if (expected != h->body_size || seprofile_crc32(body, h->body_size) != h->crc) return NULL;
+
+    p = (struct seprofile*)calloc(1, sizeof(struct seprofile));
+    if (!p) return NULL;
+
+    /* Same checks as seprofile.py unpack: a source appears at most once per record kind. */
+    memset(seen, 0, sizeof(seen));
+    for (int i = 0; i < h->button_count; i++, body += sizeof(struct seprofile_button)) {
+        struct seprofile_button r;
+        memcpy(&r, body, sizeof(r));
+        if (r.source >= SEPROFILE_SOURCES || seen[r.source]) goto invalid;
+        seen[r.source] = 1;
+        p->buttons[r.source] = r.mask;
+        p->bound_buttons |= r.mask;
+    }
+    memset(seen, 0, sizeof(seen));
+    for (int i = 0; i < h->axis_count; i++, body += sizeof(struct seprofile_axis)) {
+        struct seprofile_axis r;
+        memcpy(&r, body, sizeof(r));
+        if (r.source >= SEPROFILE_SOURCES || seen[r.source]) goto invalid;
+        seen[r.source] = 1;
+        memcpy(p->axes[r.source], r.deltas, 4);
+        if (r.deltas[0] || r.deltas[1]) p->bound_sticks |= 1;
+        if (r.deltas[2] || r.deltas[3]) p->bound_sticks |= 2;
+    }
+    if (h->mouse_look_count) {
+        struct seprofile_mouse_look r;
+        memcpy(&r, body, sizeof(r));
+        body += sizeof(r);
+        if (r.type >= SEPROFILE_MOUSE_LOOK_TYPES || r.stick > 1 || (r.flags & ~SEPROFILE_FLAG_RELEASE) ||
+            (r.type != 0) != (h->curve_count == 1)) goto invalid;
+        p->mouse_look = 1;
+        p->mouse_look_type = r.type;
+        p->mouse_look_stick = r.stick;
+        p->release = (r.flags & SEPROFILE_FLAG_RELEASE) != 0;
+        p->dead_zone = r.dead_zone;
+        p->decay = r.decay;
+        p->mult_x = r.mult_x;
+        p->mult_y = r.mult_y;
+        p->min_accel = r.min_accel;
+        p->max_accel = r.max_accel;
+    }
+    if (h->curve_count) {
+        if (!(p->min_accel < p->max_accel)) goto invalid;
+        memcpy(p->curve, body, sizeof(p->curve));
+        body += sizeof(p->curve);
+        p->has_curve = 1;
+    }
+    memcpy(p->decay_scale, body, h->decay_steps * sizeof(float));
+    p->decay_steps = h->decay_steps;
+    return p;
+
+invalid:
+    free(p);
+    return NULL;
+}
+
+struct seprofile* seprofile_load(const char* path)
+{
+    struct seprofile* p = NULL;
+    struct stat st;
+    void* data;
+    int fd = open(path, O_RDONLY);
+
+    if (fd < 0) return NULL;
+    if (fstat(fd, &st) == 0 && st.st_size > 0) {
+        data = mmap(NULL, (size_t)st.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+        if (data != MAP_FAILED) {
+            p = decode((const uint8_t*)data, (size_t)st.st_size);
+            munmap(data, (size_t)st.st_size);
+        }
+    }
+    close(fd);
+    return p;
+}
+
+void seprofile_free(struct seprofile* profile)
+{
+    free(profile);
+}
+
+void seprofile_decay_start(struct seprofile_decay* decay, float x, float y)
+{
+    decay->x = x;
+    decay->y = y;
+    decay->step = 0;
+}
+
+bool seprofile_decay_step(const struct seprofile* p, struct seprofile_decay* d, float* x, float* y)
+{
+    const float* scale = p->decay_scale;
+    int steps = p->decay_steps;
+
+    if (d->step >= steps) return false;
+    if (p->release) {
+        /* Steps where every nonzero component is still saturated report the same bytes. */
+        while (d->step + 1 < steps && (d->x == 0 || fabsf(d->x * scale[d->step]) >= SEPROFILE_SATURATED) &&
+               (d->y == 0 || fabsf(d->y * scale[d->step]) >= SEPROFILE_SATURATED))
+            d->step++;
+    }
+    *x = d->x * scale[d->step];
+    *y = d->y * scale[d->step];
+    d->step++;
+    if (d->step < steps && (fabs(*x) > p->dead_zone || fabs(*y) > p->dead_zone)) return true;
+    *x = *y = 0;
+    d->step = steps;
+    return false;
+}
+
+float seprofile_curve(const float* curve, float min_accel, float max_accel, float value)
+{
+    float x = (fabsf(value) - min_accel) / (max_accel - min_accel);
+    float pos, y;
+    int i;
+
+    if (!(x > 0)) return 0;
+    if (x > 1) x = 1;
+    pos = x * (SEPROFILE_CURVE_SIZE - 1);
+    i = (int)pos;
+    if (i > SEPROFILE_CURVE_SIZE - 2) i = SEPROFILE_CURVE_SIZE - 2;
+    y = curve[i] + (curve[i + 1] - curve[i]) * (pos - i);
+    return value < 0 ? -y : y;
+}
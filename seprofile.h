@@ -0,0 +1,55 @@
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+#include <stdbool.h>
+#include <stdint.h>
+
+/* Binary profile (.sebin) written by shockemu.py --binary, see seprofile.py for the layout. */
+
+#define SEPROFILE_SOURCES 258
+#define SEPROFILE_LEFT_MOUSE 256
+#define SEPROFILE_RIGHT_MOUSE 257
+#define SEPROFILE_CURVE_SIZE 256
+#define SEPROFILE_MAX_DECAY_STEPS 1024
+
+struct seprofile {
+    uint32_t buttons[SEPROFILE_SOURCES];    /* source -> button mask */
+    int8_t axes[SEPROFILE_SOURCES][4];      /* source -> leftX leftY rightX rightY deltas */
+    uint32_t bound_buttons;                 /* buttons driven by the profile */
+    int bound_sticks;                       /* bit 0 left, bit 1 right */
+    int mouse_look;
+    int mouse_look_type;
+    int mouse_look_stick;                   /* 0 left, 1 right */
+    int release;                            /* skip decay ticks that repeat the report */
+    double dead_zone;
+    float decay, mult_x, mult_y;
+    float min_accel, max_accel;             /* acceleration clamps for the curve input */
+    int has_curve;
+    float curve[SEPROFILE_CURVE_SIZE];      /* response curve table for the curved types */
+    int decay_steps;
+    float decay_scale[SEPROFILE_MAX_DECAY_STEPS]; /* shockemu.plan_decay schedule */
+};
+
+/* Decay of the mouseLook stick after the last mouse move. */
+struct seprofile_decay {
+    int step;                               /* decay_steps or more: not decaying */
+    float x, y;                             /* deflection set by the last mouse move */
+};
+
+struct seprofile* seprofile_load(const char* path);
+void seprofile_free(struct seprofile* profile);
+
+/* A mouse move set the stick to (x, y): restart the decay from there. */
+void seprofile_decay_start(struct seprofile_decay* decay, float x, float y);
+/* One tick without a mouse move, like the mouseLook block shockemu.py generates: writes
+   the stick and returns true when another tick is needed. Leaves the stick alone once
+   the decay has ended. */
+bool seprofile_decay_step(const struct seprofile* profile, struct seprofile_decay* decay, float* x, float* y);
+
+/* Signed response curve lookup: one table index and one lerp, see curves.py. */
+float seprofile_curve(const float* curve, float min_accel, float max_accel, float value);
+
+#ifdef __cplusplus
+};
+#endif
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# Binary profile format (.sebin) read by iohid_wrap.dylib at runtime.
+#
+# All fields are little endian. A file is a header followed by fixed-size records:
+#
+#   header     magic 'SEPF', version u16, header size u16, body size u32, body crc32 u32,
+#              button record count u16, axis record count u16, mouseLook record count u16,
+#              curve record count u16, decay step count u16
+#   button     source u16, pad u16, button mask u32            (one per source with button bindings)
+#   axis       source u16, pad u16, deltas i8[4]               (leftX leftY rightX rightY)
+#   mouseLook  type u8, stick u8, flags u8 (bit 0: release), pad u8, deadZone f64, decay f32,
+#              multX f32, multY f32, minAccel f32, maxAccel f32
+#   curve      f32[256]                                        (response curve table, see curves.py)
+#   decay      f32[decay step count]                           (shockemu.plan_decay schedule)
+#
+# The decay schedule and the release flag are the ones the mouseLook codegen of
+# shockemu.py bakes into mapKeys.h, so a loaded profile decays tick for tick like the
+# compiled one. deadZone is kept as a double because the generated code compares with
+# the profile's literal.
+#
+# Sources are keycodes 0-255, then 256 = leftMouse and 257 = rightMouse. Button masks use
+# bit i for shockemu.buttons[i]. Writers replace the file with a rename so the runtime
+# never maps a half-written profile.
+import argparse, json, os, struct, sys, zlib
+
+import curves
+
+MAGIC = b'SEPF'
+VERSION = 3
+
+HEADER = struct.Struct('<4sHHIIHHHHH')
+BUTTON_RECORD = struct.Struct('<HxxI')
+AXIS_RECORD = struct.Struct('<Hxx4b')
+MOUSE_LOOK_RECORD = struct.Struct('<BBBxdfffff')
+CURVE_RECORD = struct.Struct('<%if' % curves.LUT_SIZE)
+DECAY_STEP = struct.Struct('<f')
+MAX_DECAY_STEPS = 1024
+FLAG_RELEASE = 1
+
+SOURCE_COUNT = 258
+MOUSE_SOURCES = {'leftMouse': 256, 'rightMouse': 257}
+MOUSE_LOOK_TYPES = ['linear', 'power', 'exponential', 'spline']
+STICKS = ['left', 'right']
+
+class ProfileFormatError(ValueError):
+	pass
+
+def source_id(source):
+	return MOUSE_SOURCES.get(source, source)
+
+def pack(masks, deltas, mouseLook=None, curve=None):
+	# masks: source -> button mask, deltas: source -> [4 axis deltas], mouseLook: dict with
+	# the numeric fields of MOUSE_LOOK_RECORD (type and stick as names), release and
+	# decayScale (the plan_decay schedule), curve: sampled table for the curved mouseLook types.
+	body = b''.join(BUTTON_RECORD.pack(source_id(s), mask) for s, mask in sorted(masks.items(), key=lambda i: source_id(i[0])))
+	body += b''.join(AXIS_RECORD.pack(source_id(s), *d) for s, d in sorted(deltas.items(), key=lambda i: source_id(i[0])))
+	if mouseLook is not None:
+		body += MOUSE_LOOK_RECORD.pack(
+			MOUSE_LOOK_TYPES.index(mouseLook['type']), STICKS.index(mouseLook['stick']),
+			FLAG_RELEASE if mouseLook.get('release') else 0,
+			mouseLook['deadZone'], mouseLook['decay'], mouseLook['multX'], mouseLook['multY'],
+			mouseLook['minAccel'], mouseLook['maxAccel'])
+	if curve is not None:
+		body += CURVE_RECORD.pack(*curve)
+	decayScale = mouseLook['decayScale'] if mouseLook is not None else []
+	body += b''.join(DECAY_STEP.pack(v) for v in decayScale)
+	header = HEADER.pack(MAGIC, VERSION, HEADER.size, len(body), zlib.crc32(body) & 0xffffffff,
+		len(masks), len(deltas), 0 if mouseLook is None else 1, 0 if curve is None else 1, len(decayScale))
+	return header + body
+
+def unpack(data):
+	# Validates and decodes a profile. Returns dict(masks, deltas, mouseLook, curve) keyed by source id.
+	data = memoryview(data)
+	if len(data) < HEADER.size:
+		raise ProfileFormatError('truncated header')
+	magic, version, headerSize, bodySize, crc, buttonCount, axisCount, mouseLookCount, curveCount, decaySteps = HEADER.unpack_from(data)
+	if magic != MAGIC:
+		raise ProfileFormatError('bad magic %r' % bytes(magic))
+	if version != VERSION:
+		raise ProfileFormatError('unsupported version %i' % version)
+	if headerSize != HEADER.size or len(data) != headerSize + bodySize:
+		raise ProfileFormatError('size mismatch')
+	if mouseLookCount > 1 or curveCount > mouseLookCount or buttonCount > SOURCE_COUNT or axisCount > SOURCE_COUNT:
+		raise ProfileFormatError('bad record counts')
+	if (decaySteps == 0) != (mouseLookCount == 0) or decaySteps > MAX_DECAY_STEPS:
+		raise ProfileFormatError('bad decay step count')
+	if bodySize != buttonCount * BUTTON_RECORD.size + axisCount * AXIS_RECORD.size + mouseLookCount * MOUSE_LOOK_RECORD.size + \
+			curveCount * CURVE_RECORD.size + decaySteps * DECAY_STEP.size:
+		raise ProfileFormatError('record counts do not match body size')
+	body = data[headerSize:]
+	if zlib.crc32(body) & 0xffffffff != crc:
+		raise ProfileFormatError('crc mismatch')
+
+	masks = {}
+	for source, mask in BUTTON_RECORD.iter_unpack(body[:buttonCount * BUTTON_RECORD.size]):
+		if source >= SOURCE_COUNT or source in masks:
+			raise ProfileFormatError('bad button record source %i' % source)
+		masks[source] = mask
+	offset = buttonCount * BUTTON_RECORD.size
+	deltas = {}
+	for record in AXIS_RECORD.iter_unpack(body[offset:offset + axisCount * AXIS_RECORD.size]):
+		if record[0] >= SOURCE_COUNT or record[0] in deltas:
+			raise ProfileFormatError('bad axis record source %i' % record[0])
+		deltas[record[0]] = list(record[1:])
+	offset += axisCount * AXIS_RECORD.size
+	mouseLook = None
+	curve = None
+	if mouseLookCount:
+		kind, stick, flags, deadZone, decay, multX, multY, minAccel, maxAccel = MOUSE_LOOK_RECORD.unpack_from(body, offset)
+		if kind >= len(MOUSE_LOOK_TYPES) or stick >= len(STICKS) or flags & ~FLAG_RELEASE or (kind != 0) != (curveCount == 1):
+			raise ProfileFormatError('bad mouseLook record')
+		offset += MOUSE_LOOK_RECORD.size
+		if curveCount:
+			if not minAccel < maxAccel:
+				raise ProfileFormatError('bad mouseLook acceleration clamps')
+			curve = list(CURVE_RECORD.unpack_from(body, offset))
+			offset += CURVE_RECORD.size
+		mouseLook = dict(type=MOUSE_LOOK_TYPES[kind], stick=STICKS[stick], release=bool(flags & FLAG_RELEASE),
+			deadZone=deadZone, decay=decay, multX=multX, multY=multY, minAccel=minAccel, maxAccel=maxAccel,
+			decayScale=[v for v, in DECAY_STEP.iter_unpack(body[offset:offset + decaySteps * DECAY_STEP.size])])
+	return dict(masks=masks, deltas=deltas, mouseLook=mouseLook, curve=curve)
+
+def load(path):
+	with open(path, 'rb') as fp:
+		return unpack(fp.read())
+
+def write(path, data):
+	# Atomic replace: a running process sees either the old or the new profile.
+	tmp = '%s.%i.tmp' % (path, os.getpid())
+	with open(tmp, 'wb') as fp:
+		fp.write(data)
+		fp.flush()
+		os.fsync(fp.fileno())
+	os.replace(tmp, path)
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Validate a binary .sebin profile and dump it as JSON')
+	parser.add_argument('profile')
+	args = parser.parse_args(argv)
+	try:
+		profile = load(args.profile)
+	except (IOError, ProfileFormatError) as exc:
+		print('Invalid profile: %s' % exc)
+		return 1
+	print(json.dumps(profile, indent=2, sort_keys=True))
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -1,77 +1,565 @@
-import json, string, sys
+import argparse, collections, concurrent.futures, glob, hashlib, io, json, math, os, sys, time
+
+import curves, seprofile
+
+# Bump whenever the generated code changes for the same profile; part of the build cache key.
+GENERATOR_VERSION = 5
 
 letters = 0, 11, 8, 2, 14, 3, 5, 4, 34, 38, 40, 37, 46, 45, 31, 35, 12, 15, 1, 17, 32, 9, 13, 7, 16, 6
 nums = 29, 18, 19, 20, 21, 23, 22, 26, 28, 25
 
 keys = dict(
-	space=49, 
-	enter=36, 
-	control=59, option=58, command=55, 
-	up=126, 
-	down=125, 
-	left=123, 
-	right=124, 
-	shift=56, 
-	capslock=57, 
-	tab=48, 
-	backtick=50, 
-	comma=43, period=47, slash=44, backslash=42, 
-	delete=51, 
-	escape=53, 
+	space=49,
+	enter=36,
+	control=59, option=58, command=55,
+	up=126,
+	down=125,
+	left=123,
+	right=124,
+	shift=56,
+	capslock=57,
+	tab=48,
+	backtick=50,
+	comma=43, period=47, slash=44, backslash=42,
+	delete=51,
+	escape=53,
 )
 
 buttons = 'dpadUp dpadLeft dpadRight dpadDown X O square triangle PS touchpad options share L1 L2 L3 R1 R2 R3'.split(' ')
 
 axes = 'leftX- leftX+ leftY- leftY+ rightX- rightX+ rightY- rightY+'.split(' ')
 
+# Column order of the per-key axis delta table.
+axisSlots = 'leftX leftY rightX rightY'.split(' ')
+
+mouseButtons = 'leftMouse', 'rightMouse'
+
+# RemotePlay only hands keyDown:/keyUp: to the dylib; these keys arrive as flagsChanged:.
+modifierKeys = 'shift', 'control', 'option', 'command', 'capslock'
+
 for i, x in enumerate(letters):
 	keys[chr(ord('a') + i)] = x
 for i, x in enumerate(nums):
 	keys[str(i)] = x
 
+def parse_items(data):
+	# [(key, value, line number)] in file order, repeated keys included.
+	items = []
+	for n, line in enumerate(data.split('\n'), 1):
+		line = line.split('#', 1)[0].strip()
+		if line:
+			k, v = line.split('=', 1)
+			items.append((k.strip(), v.strip(), n))
+	return items
+
 def parse(data):
-	lines = (line.split('#', 1)[0].strip() for line in data.split('\n'))
-	return dict(map(string.strip, line.split('=', 1)) for line in lines if line)
+	return dict((k, v) for k, v, _ in parse_items(data))
+
+def profile_items(profile):
+	# Accepts a parse() dict or parse_items() list.
+	if isinstance(profile, dict):
+		return [(k, v, None) for k, v in profile.items()]
+	return list(profile)
+
+# Profile IR. lower() turns parsed lines into bindings, the passes below clean them up
+# and merge() derives the per-source tables and per-target source lists the backends use.
 
-with file('mapKeys.h', 'w') as fp:
-	keysticks = []
+Binding = collections.namedtuple('Binding', 'source target key line')
+
+class Program(object):
+	def __init__(self, bindings, mouseLook=None, warnings=None):
+		self.bindings = list(bindings)
+		self.mouseLook = mouseLook
+		self.warnings = list(warnings or [])
+		self.hotness = {}
+		self.masks = {}
+		self.deltas = {}
+		self.targets = {}
+		self.boundButtons = []
+		self.boundSticks = []
+
+def where(binding):
+	return '%s = %s' % (binding.key, binding.target) if binding.line is None else \
+		'line %i (%s = %s)' % (binding.line, binding.key, binding.target)
+
+def lower(profile):
+	bindings = []
 	mouseLook = None
-	for k, v in parse(file(sys.argv[1]).read()).items():
-		if k in keys or k == 'leftMouse' or k == 'rightMouse':
-			if k in keys:
-				k = 'DOWN(%i)' % keys[k]
-			if v in buttons:
-				print >>fp, '%s = %s;' % (v, k)
-			elif v in axes:
-				stick = v[:-2]
-				if stick not in keysticks:
-					print >>fp, '%sX = %sY = 0;' % (stick, stick)
-					keysticks.append(stick)
-				print >>fp, 'if(%s) %s %s= 1;' % (k, v[:-1], v[-1])
+	warnings = []
+	for k, v, line in profile_items(profile):
+		if k in keys or k in mouseButtons:
+			if v in buttons or v in axes:
+				bindings.append(Binding(keys.get(k, k), v, k, line))
 			else:
-				print 'Unknown button:', v
+				warnings.append('Unknown button: %s' % v)
 		elif k.startswith('mouseLook.'):
 			if mouseLook is None:
 				mouseLook = dict(type='linear', deadZone='.1', decay='10', multX='1', multY='1', stick='right')
 			mouseLook[k.split('.', 1)[1]] = v
 		else:
-			print 'Unknown key:', k
+			warnings.append('Unknown key: %s' % k)
+	return Program(bindings, mouseLook, warnings)
 
-	if mouseLook is not None:
-		if mouseLook['type'] == 'linear':
-			print >>fp, \
-'''if(mouseMoved) {{
-	{stick}X = -mouseAccelX;
-	{stick}Y = mouseAccelY;
+def drop_shadowed(program):
+	# A key bound again further down replaces the earlier binding, as the dict always did;
+	# now it is reported instead of silently lost.
+	last = {}
+	for b in program.bindings:
+		last[b.key] = b
+	for b in program.bindings:
+		if last[b.key] is not b:
+			program.warnings.append('Conflict: %s is shadowed by %s' % (where(b), where(last[b.key])))
+	program.bindings = [b for b in program.bindings if last[b.key] is b]
+
+def drop_dead(program):
+	live = []
+	for b in program.bindings:
+		if b.key in modifierKeys:
+			program.warnings.append('Dead binding: %s never fires, modifier keys do not send keyDown' % where(b))
+		else:
+			live.append(b)
+	program.bindings = live
+
+def flag_conflicts(program):
+	if program.mouseLook is None:
+		return
+	stick = program.mouseLook['stick']
+	shared = [b for b in program.bindings if b.target in axes and b.target.startswith(stick)]
+	if shared:
+		program.warnings.append('Conflict: mouseLook.stick = %s is also bound to %s; mouse moves override them until the decay ends' %
+			(stick, ', '.join(where(b) for b in shared)))
+
+def source_order(source):
+	return seprofile.source_id(source)
+
+def sort_hotness(program):
+	# Hottest sources first (see --hotness), then by source and target for a canonical
+	# order that does not depend on how the profile file is laid out.
+	program.bindings.sort(key=lambda b: (-program.hotness.get(b.source, 0), source_order(b.source),
+		(buttons + axes).index(b.target)))
+
+def merge(program):
+	bindings = [(b.source, b.target) for b in program.bindings]
+	program.masks, program.deltas = build_tables(bindings)
+	program.targets = {}
+	for source, target in bindings:
+		program.targets.setdefault(target, []).append(source)
+	program.boundButtons = [name for name in buttons if name in program.targets]
+	program.boundSticks = [stick for stick in ('left', 'right') if any(v.startswith(stick) for v in program.targets if v in axes)]
+
+PASSES = [drop_shadowed, drop_dead, flag_conflicts, sort_hotness, merge]
+
+def optimize(program, hotness=None):
+	program.hotness = dict(hotness or {})
+	for p in PASSES:
+		p(program)
+	return program
+
+def build_program(profile, hotness=None):
+	return optimize(lower(profile), hotness)
+
+def program_for(bindings):
+	# IR for bare (source, target) pairs, as used by benchmarks and tests.
+	return optimize(Program(Binding(s, t, s if s in mouseButtons else 'key %i' % s, None) for s, t in bindings))
+
+def compile_profile(profile):
+	# Returns (bindings, mouseLook, warnings) after the IR passes. A binding is (source, target)
+	# where source is a keycode or one of mouseButtons and target is a button or axis name.
+	program = build_program(profile)
+	return [(b.source, b.target) for b in program.bindings], program.mouseLook, program.warnings
+
+def hotness_from_trace(fp):
+	# Press counts per source from a replay.py NDJSON trace.
+	counts = collections.Counter()
+	for line in fp:
+		line = line.strip()
+		if not line:
+			continue
+		event = json.loads(line)
+		if event['type'] == 'keyDown':
+			counts[keys.get(event['key'], event['key'])] += 1
+		elif event['type'] in ('mouseDown', 'rightMouseDown'):
+			counts['leftMouse' if event['type'] == 'mouseDown' else 'rightMouse'] += 1
+	return counts
+
+def source_expr(source):
+	return source if source in mouseButtons else 'DOWN(%i)' % source
+
+def emit_branches(fp, program):
+	# Straight-line code: a button is the OR of its sources, hottest first so the test
+	# stops early; a stick axis is the branch-free sum of its + and - sources.
+	for name in program.boundButtons:
+		print('%s = %s;' % (name, ' || '.join(source_expr(s) for s in program.targets[name])), file=fp)
+	for stick in program.boundSticks:
+		for axis in ('X', 'Y'):
+			terms = ['+ %s' % source_expr(s) for s in program.targets.get(stick + axis + '+', [])]
+			terms += ['- %s' % source_expr(s) for s in program.targets.get(stick + axis + '-', [])]
+			expr = ' '.join(terms).lstrip('+ ') if terms else '0'
+			print('%s%s = %s;' % (stick, axis, expr), file=fp)
+
+def build_tables(bindings):
+	# Packs bindings into keycode -> button mask and keycode -> axis delta tables.
+	# Mouse buttons are kept apart since they are not part of keys[].
+	masks = {}
+	deltas = {}
+	for source, v in bindings:
+		if v in buttons:
+			masks.setdefault(source, []).append(v)
+		else:
+			delta = deltas.setdefault(source, [0] * len(axisSlots))
+			delta[axisSlots.index(v[:-1])] += 1 if v[-1] == '+' else -1
+	return masks, deltas
+
+def mask_expr(names):
+	return ' | '.join('BUTTON(%s)' % name for name in sorted(set(names), key=buttons.index))
+
+def emit_tables(fp, program):
+	# Table lookups folded over the pressed keys only; cost is O(pressed keys).
+	if not program.bindings:
+		return
+	masks, deltas = program.masks, program.deltas
+	keyMasks = sorted(k for k in masks if k not in mouseButtons)
+	keyDeltas = sorted(k for k in deltas if k not in mouseButtons)
+
+	if keyMasks:
+		print('static const uint32_t keyButtons[256] = {', file=fp)
+		for code in keyMasks:
+			print('\t[%i] = %s,' % (code, mask_expr(masks[code])), file=fp)
+		print('};', file=fp)
+	if keyDeltas:
+		print('static const int8_t keyAxes[256][%i] = {' % len(axisSlots), file=fp)
+		for code in keyDeltas:
+			print('\t[%i] = {%s},' % (code, ', '.join(str(d) for d in deltas[code])), file=fp)
+		print('};', file=fp)
+
+	if masks:
+		print('uint32_t mask = 0;', file=fp)
+	if deltas:
+		print('int axis[%i] = {%s};' % (len(axisSlots), ', '.join('0' for _ in axisSlots)), file=fp)
+	if keyMasks or keyDeltas:
+		print('for(int i = 0; i < numPressed; ++i) {', file=fp)
+		print('\tuint8_t code = pressed[i];', file=fp)
+		if keyMasks:
+			print('\tmask |= keyButtons[code];', file=fp)
+		if keyDeltas:
+			for i in range(len(axisSlots)):
+				print('\taxis[%i] += keyAxes[code][%i];' % (i, i), file=fp)
+		print('}', file=fp)
+	for source in mouseButtons:
+		body = []
+		if source in masks:
+			body.append('mask |= %s;' % mask_expr(masks[source]))
+		if source in deltas:
+			body.extend('axis[%i] += %i;' % (i, d) for i, d in enumerate(deltas[source]) if d)
+		if body:
+			print('if(%s) {' % source, file=fp)
+			for line in body:
+				print('\t' + line, file=fp)
+			print('}', file=fp)
+
+	for name in program.boundButtons:
+		print('%s = (mask & BUTTON(%s)) != 0;' % (name, name), file=fp)
+	for stick in program.boundSticks:
+		x = axisSlots.index(stick + 'X')
+		print('%sX = axis[%i];' % (stick, x), file=fp)
+		print('%sY = axis[%i];' % (stick, x + 1), file=fp)
+
+# Decay runs from a schedule worked out by plan_decay(): the stick is the value set by the
+# last mouse move times decayScale[decayStep], and the table ends where even the largest
+# possible deflection is inside the dead zone, so every decay ends in a bounded number of ticks.
+mouseLookTemplate = \
+'''static const float decayScale[{steps}] = {{
+{scale}
+}};
+static int decayStep = {steps};
+static float decayX, decayY;
+if(mouseMoved) {{
+	{stick}X = decayX = {inputX};
+	{stick}Y = decayY = {inputY};
+	decayStep = 0;
 	mouseMoved = false;
-}} else {{
-	{stick}X /= {decay};
-	{stick}Y /= {decay};
-	if(fabs({stick}X) > {deadZone} || fabs({stick}Y) > {deadZone}) {{
-		NSLog(@"Still decaying... %f %f", {stick}X, {stick}Y);
-		[self decayKick];
-	}} else
+}} else if(decayStep < {steps}) {{
+{skip}	{stick}X = decayX * decayScale[decayStep];
+	{stick}Y = decayY * decayScale[decayStep];
+	decayStep++;
+	if(decayStep < {steps} && (fabs({stick}X) > {deadZone} || fabs({stick}Y) > {deadZone})) {{
+{log}		[self decayKick];
+	}} else {{
 		{stick}X = {stick}Y = 0;
-}}'''.format(**mouseLook)
+		decayStep = {steps};
+	}}
+}}'''
+
+# Debug builds log every decay tick like the original generated code did.
+decayLog = '\t\tNSLog(@"Still decaying... %f %f", {stick}X, {stick}Y);\n'
+
+# Release builds skip decay steps whose report would repeat the previous one: a component
+# at or beyond SATURATED already reports full deflection, so only the first step where a
+# nonzero component drops below it changes the output.
+decaySkip = '''\twhile(decayStep + 1 < {steps} && (decayX == 0 || fabs(decayX * decayScale[decayStep]) >= {saturated})
+		&& (decayY == 0 || fabs(decayY * decayScale[decayStep]) >= {saturated}))
+		decayStep++;
+'''
+
+# Stick values at or beyond this magnitude map to 0 or 255 in the report.
+SATURATED = 128 / 127.0
+
+# The largest deflection a mouse move can set: curves are bounded to 1, linear
+# acceleration only by the float range.
+FLT_MAX = 3.4028234663852886e38
+
+# Longest decay schedule emitted; slower decays are cut off at this many ticks.
+MAX_DECAY_STEPS = seprofile.MAX_DECAY_STEPS
+
+def plan_decay(mouseLook):
+	# Returns (scale, warning): the multipliers decay^-1, decay^-2, ... applied to the
+	# deflection of the last mouse move, up to the tick where the peak deflection falls
+	# inside the dead zone. Raises ValueError for parameters that never settle.
+	decay, deadZone = float(mouseLook['decay']), float(mouseLook['deadZone'])
+	if not decay > 1:
+		raise ValueError('decay must be greater than 1, got %g' % decay)
+	if not deadZone > 0:
+		raise ValueError('deadZone must be positive, got %g' % deadZone)
+	peak = FLT_MAX if mouseLook['type'] == 'linear' else 1.0
+	steps = max(1, int(math.ceil(math.log(peak / deadZone) / math.log(decay))))
+	warning = None
+	if steps > MAX_DECAY_STEPS:
+		warning = 'mouseLook decay %g needs %i ticks; cut off after %i' % (decay, steps, MAX_DECAY_STEPS)
+		steps = MAX_DECAY_STEPS
+	return [curves.to_float32(decay ** -(k + 1)) for k in range(steps)], warning
+
+def c_float(value):
+	text = '%.9g' % value
+	return text + ('f' if '.' in text or 'e' in text else '.0f')
+
+def mouse_curve(mouseLook):
+	# Samples a curved mouseLook type into (lut, minAccel, maxAccel). Raises ValueError
+	# for bad parameters or when the table strays from the analytic curve.
+	curve, minAccel, maxAccel = curves.from_mouse_look(mouseLook)
+	lut = curves.sample(curve)
+	error = curves.max_error(curve, lut)
+	if error > curves.ERROR_BOUND:
+		raise ValueError('curve table error %g exceeds %g' % (error, curves.ERROR_BOUND))
+	return lut, minAccel, maxAccel
+
+def emit_mouse_look(fp, mouseLook, release=False):
+	# Returns a list of warnings; the block is left out when the section cannot be compiled.
+	if mouseLook['type'] not in seprofile.MOUSE_LOOK_TYPES:
+		return ['Unknown mouseLook type: %s' % mouseLook]
+	try:
+		scale, warning = plan_decay(mouseLook)
+	except ValueError as exc:
+		return ['Bad mouseLook decay: %s' % exc]
+	if mouseLook['type'] == 'linear':
+		inputX, inputY = '-mouseAccelX', 'mouseAccelY'
+	else:
+		try:
+			lut, minAccel, maxAccel = mouse_curve(mouseLook)
+		except ValueError as exc:
+			return ['Bad mouseLook %s curve: %s' % (mouseLook['type'], exc)]
+		print('static const float mouseCurve[%i] = {' % len(lut), file=fp)
+		for i in range(0, len(lut), 8):
+			print('\t' + ', '.join(c_float(v) for v in lut[i:i + 8]) + ',', file=fp)
+		print('};', file=fp)
+		lookup = 'seprofile_curve(mouseCurve, %s, %s, %%s)' % (c_float(minAccel), c_float(maxAccel))
+		inputX, inputY = '-' + lookup % 'mouseAccelX', lookup % 'mouseAccelY'
+	fields = dict(mouseLook, steps=len(scale), saturated=c_float(SATURATED), inputX=inputX, inputY=inputY,
+		scale='\n'.join('\t' + ', '.join(c_float(v) for v in scale[i:i + 8]) + ',' for i in range(0, len(scale), 8)))
+	fields['log'] = '' if release else decayLog.format(**fields)
+	fields['skip'] = decaySkip.format(**fields) if release else ''
+	print(mouseLookTemplate.format(**fields), file=fp)
+	return [warning] if warning else []
+
+codegens = dict(tables=emit_tables, branches=emit_branches)
+
+def render(profile, codegen='tables', release=False, hotness=None):
+	fp = io.StringIO()
+	program = build_program(profile, hotness)
+	warnings = program.warnings
+	codegens[codegen](fp, program)
+	if program.mouseLook is not None:
+		warnings.extend(emit_mouse_look(fp, program.mouseLook, release))
+	return fp.getvalue(), warnings
+
+def binary_profile(profile, release=False):
+	# The same bindings and decay schedule as the generated header, packed for
+	# seprofile/iohid_wrap runtime loading.
+	program = build_program(profile)
+	mouseLook, deltas = program.mouseLook, program.deltas
+	masks = dict((source, sum(1 << buttons.index(name) for name in set(names))) for source, names in program.masks.items())
+	lut = None
+	if mouseLook is not None:
+		try:
+			if mouseLook['stick'] not in seprofile.STICKS:
+				raise ValueError(mouseLook['stick'])
+			scale, _ = plan_decay(mouseLook)
+			if mouseLook['type'] == 'linear':
+				minAccel, maxAccel = 0.0, 0.0
+			else:
+				lut, minAccel, maxAccel = mouse_curve(mouseLook)
+			mouseLook = dict(mouseLook, minAccel=minAccel, maxAccel=maxAccel, release=release, decayScale=scale,
+				**dict((k, float(mouseLook[k])) for k in ('deadZone', 'decay', 'multX', 'multY')))
+		except (KeyError, ValueError):
+			# Already reported by render(); the binary profile simply has no mouseLook.
+			mouseLook = lut = None
+	return seprofile.pack(masks, deltas, mouseLook, lut)
+
+def profile_key(profile, codegen, release=False, hotness=None):
+	# Content address of a compiled profile: the parsed bindings in file order plus
+	# everything else that shapes the output. Comments and whitespace do not count.
+	data = json.dumps([GENERATOR_VERSION, codegen, release, [(k, v) for k, v, _ in profile_items(profile)],
+		sorted((str(k), n) for k, n in (hotness or {}).items())])
+	return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+def write_if_changed(path, data):
+	# Leaves the file (and its mtime) alone when the content is already right.
+	try:
+		with open(path) as fp:
+			if fp.read() == data:
+				return False
+	except IOError:
+		pass
+	tmp = path + '.tmp'
+	with open(tmp, 'w') as fp:
+		fp.write(data)
+	os.replace(tmp, path)
+	return True
+
+def render_cached(profile, codegen, cacheDir, release=False, hotness=None):
+	# Returns (header, warnings, hit). Entries live in <cacheDir>/profiles/<key>/.
+	entry = os.path.join(cacheDir, 'profiles', profile_key(profile, codegen, release, hotness))
+	try:
+		with open(os.path.join(entry, 'mapKeys.h')) as fp:
+			header = fp.read()
+		with open(os.path.join(entry, 'warnings.json')) as fp:
+			warnings = json.load(fp)
+		return header, warnings, True
+	except (IOError, ValueError):
+		pass
+	header, warnings = render(profile, codegen, release, hotness)
+	os.makedirs(entry, exist_ok=True)
+	write_if_changed(os.path.join(entry, 'warnings.json'), json.dumps(warnings))
+	write_if_changed(os.path.join(entry, 'mapKeys.h'), header)
+	return header, warnings, False
+
+# Batch mode: every profile under a directory (or matching a glob) compiled in a process
+# pool. Profiles that parse to the same bindings are compiled once.
+
+def find_profiles(pattern):
+	# [(path, output name)]; output names keep the layout below the directory or glob root.
+	if os.path.isdir(pattern):
+		paths = sorted(os.path.join(root, name) for root, _, names in os.walk(pattern) for name in names if name.endswith('.se'))
+		base = pattern
+	else:
+		paths = sorted(p for p in glob.glob(pattern, recursive=True) if os.path.isfile(p))
+		base = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in paths]) if paths else ''
+	return [(p, os.path.splitext(os.path.relpath(os.path.abspath(p), os.path.abspath(base)))[0] + '.h') for p in paths]
+
+def compile_job(profile, codegen, release, hotness, cacheDir):
+	start = time.perf_counter()
+	if cacheDir:
+		header, warnings, hit = render_cached(profile, codegen, cacheDir, release, hotness)
+	else:
+		(header, warnings), hit = render(profile, codegen, release, hotness), False
+	return header, warnings, hit, time.perf_counter() - start
+
+def unknown(warnings, kind):
+	prefix = 'Unknown %s: ' % kind
+	return [w[len(prefix):] for w in warnings if w.startswith(prefix)]
+
+def compile_batch(pattern, outDir, codegen='tables', release=False, hotness=None, cacheDir=None, jobs=None):
+	# Returns the report dict written by --batch.
+	start = time.perf_counter()
+	entries = []
+	firsts = {}
+	for path, name in find_profiles(pattern):
+		entry = dict(profile=path, output=os.path.join(outDir, name))
+		try:
+			with open(path) as fp:
+				profile = parse_items(fp.read())
+		except (IOError, UnicodeDecodeError, ValueError) as e:
+			entry['error'] = '%s: %s' % (type(e).__name__, e)
+			entries.append(entry)
+			continue
+		entry['key'] = key = profile_key(profile, codegen, release, hotness)
+		if key in firsts:
+			entry['duplicate_of'] = firsts[key][0]['profile']
 		else:
-			print 'Unknown mouseLook type:', mouseLook
+			firsts[key] = entry, profile
+		entries.append(entry)
+
+	results = {}
+	with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+		futures = dict((pool.submit(compile_job, profile, codegen, release, hotness, cacheDir), key)
+			for key, (_, profile) in firsts.items())
+		for future in concurrent.futures.as_completed(futures):
+			key = futures[future]
+			try:
+				results[key] = future.result()
+			except Exception as e:
+				results[key] = e
+
+	for entry in entries:
+		result = results.get(entry.get('key'))
+		if isinstance(result, Exception):
+			entry['error'] = '%s: %s' % (type(result).__name__, result)
+		if 'error' in entry:
+			continue
+		header, warnings, hit, seconds = result
+		if 'duplicate_of' not in entry:
+			entry.update(seconds=round(seconds, 6), cached=hit)
+		entry.update(warnings=warnings, unknown_keys=unknown(warnings, 'key'), unknown_buttons=unknown(warnings, 'button'))
+		os.makedirs(os.path.dirname(entry['output']) or '.', exist_ok=True)
+		write_if_changed(entry['output'], header)
+	return dict(generator=GENERATOR_VERSION, codegen=codegen, release=release,
+		seconds=round(time.perf_counter() - start, 6), profiles=entries, unique=len(firsts),
+		errors=sum('error' in e for e in entries), warnings=sum(len(e.get('warnings', ())) for e in entries))
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Compile a .se profile into mapKeys.h')
+	parser.add_argument('profile')
+	parser.add_argument('-o', '--output', default='mapKeys.h')
+	parser.add_argument('--codegen', choices=sorted(codegens), default='tables',
+		help='tables: packed keycode lookup tables (default); branches: one statement per target')
+	parser.add_argument('--release', action='store_true',
+		help='Leave out per-tick logging and decay ticks that would repeat the previous report')
+	parser.add_argument('--hotness', metavar='TRACE',
+		help='replay.py NDJSON trace; sources pressed most often are tested first by the branches codegen')
+	parser.add_argument('--cache-dir', help='Reuse compiled output for profiles already seen (see build.sh)')
+	parser.add_argument('--binary', metavar='PATH',
+		help='Also write a .sebin profile; a running dylib started with SHOCKEMU_PROFILE=PATH reloads it')
+	parser.add_argument('--batch', metavar='OUTDIR',
+		help='profile is a directory or glob; compile every profile into OUTDIR/<name>.h in parallel')
+	parser.add_argument('--report', help='JSON report of a --batch run (default OUTDIR/report.json)')
+	parser.add_argument('-j', '--jobs', type=int, help='Worker processes for --batch (default: CPU count)')
+	args = parser.parse_args(argv)
+
+	hotness = None
+	if args.hotness:
+		with open(args.hotness) as fp:
+			hotness = hotness_from_trace(fp)
+	if args.batch:
+		report = compile_batch(args.profile, args.batch, args.codegen, args.release, hotness, args.cache_dir, args.jobs)
+		reportPath = args.report or os.path.join(args.batch, 'report.json')
+		os.makedirs(os.path.dirname(reportPath) or '.', exist_ok=True)
+		write_if_changed(reportPath, json.dumps(report, indent=2, sort_keys=True) + '\n')
+		print('Compiled %i profiles (%i unique) in %.2fs, %i warnings, %i errors; report in %s' %
+			(len(report['profiles']), report['unique'], report['seconds'], report['warnings'], report['errors'], reportPath))
+		return 1 if report['errors'] else 0
+	with open(args.profile) as fp:
+		profile = parse_items(fp.read())
+	if args.cache_dir:
+		header, warnings, hit = render_cached(profile, args.codegen, args.cache_dir, args.release, hotness)
+		if hit:
+			print('Using cached %s for %s' % (args.output, args.profile))
+	else:
+		header, warnings = render(profile, args.codegen, args.release, hotness)
+	write_if_changed(args.output, header)
+	if args.binary:
+		seprofile.write(args.binary, binary_profile(profile, args.release))
+	for warning in warnings:
+		print(warning)
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Benchmarks shockemu.py --batch against a scripted serial loop over a profile library."""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_codegen import synthetic_bindings
+from codegen_harness import REPO_ROOT
+
+import shockemu
+
+NAMES = dict((code, name) for name, code in shockemu.keys.items())
+
+
+def write_library(root, count, bindings, duplicates):
+    for i in range(count):
+        # Every duplicates-th profile repeats the previous one, like per-game copies of a base profile.
+        seed = i - 1 if duplicates and i % duplicates == duplicates - 1 else i
+        lines = ["%s = %s" % (NAMES.get(source, source), target)
+                 for source, target in synthetic_bindings(bindings, seed) if source in NAMES or source in shockemu.mouseButtons]
+        lines += ["mouseLook.type = power", "mouseLook.maxAccel = 400", "mouseLook.decay = 3", "mouseLook.deadZone = .02"]
+        with open(os.path.join(root, "profile%03i.se" % i), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare a serial per-profile loop with shockemu.py --batch")
+    parser.add_argument("--profiles", type=int, default=60)
+    parser.add_argument("--bindings", type=int, default=120)
+    parser.add_argument("--duplicates", type=int, default=5, help="Every Nth profile repeats the previous one (0: none)")
+    parser.add_argument("--jobs", type=int)
+    args = parser.parse_args()
+
+    script = os.path.join(REPO_ROOT, "shockemu.py")
+    with tempfile.TemporaryDirectory() as td:
+        library = os.path.join(td, "library")
+        os.makedirs(library)
+        write_library(library, args.profiles, args.bindings, args.duplicates)
+
+        start = time.perf_counter()
+        for name in sorted(os.listdir(library)):
+            subprocess.check_call([sys.executable, script, os.path.join(library, name),
+                                   "-o", os.path.join(td, name[:-3] + ".h")], stdout=subprocess.DEVNULL)
+        serial = time.perf_counter() - start
+
+        start = time.perf_counter()
+        command = [sys.executable, script, library, "--batch", os.path.join(td, "out")]
+        if args.jobs:
+            command += ["--jobs", str(args.jobs)]
+        subprocess.check_call(command, stdout=subprocess.DEVNULL)
+        batch = time.perf_counter() - start
+        with open(os.path.join(td, "out", "report.json"), encoding="utf-8") as f:
+            report = json.load(f)
+
+    print(json.dumps({
+        "profiles": args.profiles,
+        "unique": report["unique"],
+        "serial_seconds": round(serial, 3),
+        "batch_seconds": round(batch, 3),
+        "speedup": round(serial / batch, 2),
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
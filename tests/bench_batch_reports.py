@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""Benchmarks vectorized batch report evaluation against the per-tick Python reference."""
+import argparse
+import json
+import os
+import sys
+import time
+
+from codegen_harness import REPO_ROOT
+from test_batch_reports import load, random_frames, reference
+
+try:
+    import numpy as np  # noqa: F401
+except ImportError:
+    np = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-tick replay with batch report evaluation")
+    parser.add_argument("--profile", default=os.path.join(REPO_ROOT, "example.se"))
+    parser.add_argument("--frames", type=int, nargs="+", default=[10000, 1000000])
+    parser.add_argument("--reference-frames", type=int, default=20000, help="Cap for the slow per-tick run")
+    parser.add_argument("--dt", type=float, default=0.004)
+    args = parser.parse_args()
+
+    if np is None:
+        print(json.dumps({"operation": "error", "reason": "numpy_not_installed"}, indent=2))
+        return 1
+    import batchreports
+
+    profile = load(args.profile)
+    results = []
+    for frames in args.frames:
+        keys, mouse = random_frames(profile, frames, seed=1)
+        row = {"frames": frames}
+        start = time.perf_counter()
+        batchreports.BatchEngine(profile).evaluate(keys, mouse, args.dt)
+        row["batch_frames_per_sec"] = round(frames / (time.perf_counter() - start))
+        if frames <= args.reference_frames:
+            start = time.perf_counter()
+            reference(profile, keys, mouse, args.dt)
+            row["reference_frames_per_sec"] = round(frames / (time.perf_counter() - start))
+            row["speedup"] = round(row["batch_frames_per_sec"] / row["reference_frames_per_sec"], 1)
+        results.append(row)
+
+    print(json.dumps({"profile": os.path.basename(args.profile), "results": results}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""Benchmarks the branch and table mapKeys.h generators on synthetic large profiles."""
+import argparse
+import io
+import json
+import random
+import sys
+import tempfile
+
+from codegen_harness import build, compiler, key_pool, run
+
+import shockemu
+
+
+def synthetic_bindings(count, seed):
+    rng = random.Random(seed)
+    targets = shockemu.buttons + shockemu.axes
+    sources = list(range(256)) + list(shockemu.mouseButtons)
+    rng.shuffle(sources)
+    return [(source, rng.choice(targets)) for source in sources[:count]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare branch vs table codegen cost per input report")
+    parser.add_argument("--bindings", type=int, nargs="+", default=[100, 150, 250])
+    parser.add_argument("--reports", type=int, default=1000000)
+    parser.add_argument("--max-down", type=int, default=4, help="Maximum keys held at once")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if not compiler():
+        print(json.dumps({"operation": "error", "reason": "no_c_compiler"}, indent=2))
+        return 1
+
+    results = []
+    for count in args.bindings:
+        bindings = synthetic_bindings(count, args.seed)
+        row = {"bindings": len(bindings)}
+        for codegen in ("branches", "tables"):
+            fp = io.StringIO()
+            shockemu.codegens[codegen](fp, shockemu.program_for(bindings))
+            with tempfile.TemporaryDirectory() as td:
+                _, ns = run(build(td, fp.getvalue(), key_pool(bindings)), args.reports, args.max_down)
+            row[codegen] = {"ns_per_report": ns, "header_bytes": len(fp.getvalue())}
+        row["speedup"] = round(row["branches"]["ns_per_report"] / row["tables"]["ns_per_report"], 2)
+        results.append(row)
+
+    print(json.dumps({"reports": args.reports, "max_down": args.max_down, "results": results}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Benchmarks the binary gpad-daemon FIFO protocol against the old text records over a pipe."""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+from test_gpad_fifo import sample_records
+
+import gpadproto
+
+
+def text_writer(fd, records, per_pass):
+    # Old daemon: sprintf + one write() per value.
+    writes = 0
+    for _, value, _, usage, _ in records:
+        os.write(fd, b"%4d %4d\0" % (usage, value))
+        writes += 1
+    return writes
+
+
+def binary_writer(fd, records, per_pass):
+    # New daemon: the values of one run loop pass go out as frames.
+    writes = 0
+    for start in range(0, len(records), per_pass):
+        batch = records[start:start + per_pass]
+        for frame_start in range(0, len(batch), gpadproto.FRAME_MAX_RECORDS):
+            os.write(fd, gpadproto.pack_frames(batch[frame_start:frame_start + gpadproto.FRAME_MAX_RECORDS]))
+            writes += 1
+    return writes
+
+
+def text_reader(fp):
+    pending = b""
+    count = 0
+    while True:
+        data = fp.read(65536)
+        if not data:
+            return count
+        parts = (pending + data).split(b"\0")
+        pending = parts.pop()
+        for part in parts:
+            fields = part.split()
+            if len(fields) >= 2:
+                int(fields[0]), int(fields[1])
+                count += 1
+
+
+def binary_reader(fp):
+    count = 0
+    for _ in gpadproto.read_records(fp):
+        count += 1
+    return count
+
+
+def run_pipe(writer, reader, records, per_pass):
+    rfd, wfd = os.pipe()
+    result = {}
+
+    def produce():
+        result["writes"] = writer(wfd, records, per_pass)
+        os.close(wfd)
+
+    start = time.perf_counter()
+    thread = threading.Thread(target=produce)
+    thread.start()
+    with os.fdopen(rfd, "rb", buffering=0) as fp:
+        result["records"] = reader(fp)
+    thread.join()
+    result["seconds"] = time.perf_counter() - start
+    result["records_per_sec"] = round(result["records"] / result["seconds"])
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare text and binary gpad-daemon FIFO protocols")
+    parser.add_argument("--records", type=int, default=200000)
+    parser.add_argument("--per-pass", type=int, default=6, help="HID values delivered per run loop pass")
+    args = parser.parse_args()
+
+    records = sample_records(args.records)
+    results = {
+        "text": run_pipe(text_writer, text_reader, records, args.per_pass),
+        "binary": run_pipe(binary_writer, binary_reader, records, args.per_pass),
+    }
+    for name, result in results.items():
+        assert result["records"] == args.records, (name, result)
+    results["speedup"] = round(results["binary"]["records_per_sec"] / results["text"]["records_per_sec"], 2)
+    print(json.dumps({"records": args.records, "per_pass": args.per_pass, "results": results}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""Compiles generated mapKeys.h code into a standalone C program so it can be run off-Mac."""
+import os
+import shutil
+import subprocess
+import sys
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO_ROOT)
+
+import shockemu  # noqa: E402
+
+
+HARNESS_TEMPLATE = r"""
+#include <stdbool.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <math.h>
+#include <time.h>
+
+static bool keys[256], leftMouse, rightMouse;
+static uint8_t pressed[256];
+static int numPressed;
+static bool {buttons};
+static float leftX, leftY, rightX, rightY;
+
+#define DOWN(key) keys[key]
+enum {{ {button_enum} }};
+#define BUTTON(name) (1u << BUTTON_##name)
+
+static void mapKeys(void) {{
+#include "mapKeys.h"
+}}
+
+static void keyPressed(uint8_t code) {{
+	if(keys[code])
+		return;
+	keys[code] = true;
+	pressed[numPressed++] = code;
+}}
+
+static void keyReleased(uint8_t code) {{
+	if(!keys[code])
+		return;
+	keys[code] = false;
+	for(int i = 0; i < numPressed; ++i)
+		if(pressed[i] == code) {{
+			pressed[i] = pressed[--numPressed];
+			break;
+		}}
+}}
+
+static const int16_t pool[] = {{ {pool} }};
+#define POOL_SIZE (sizeof(pool) / sizeof(pool[0]))
+
+int main(int argc, char **argv) {{
+	long reports = atol(argv[1]);
+	int maxDown = atoi(argv[2]);
+	uint32_t seed = 2463534242u;
+	int16_t *toggles = malloc(sizeof(int16_t) * reports);
+	int down = 0;
+	bool held[258] = {{false}};
+	for(long i = 0; i < reports; ++i) {{
+		int16_t code;
+		do {{
+			seed ^= seed << 13; seed ^= seed >> 17; seed ^= seed << 5;
+			code = pool[seed % POOL_SIZE];
+		}} while(!held[code] && down >= maxDown);
+		held[code] = !held[code];
+		down += held[code] ? 1 : -1;
+		toggles[i] = code;
+	}}
+
+	uint64_t digest = 1469598103934665603ull;
+	struct timespec t0, t1;
+	clock_gettime(CLOCK_MONOTONIC, &t0);
+	for(long i = 0; i < reports; ++i) {{
+		int16_t code = toggles[i];
+		if(code == 256)
+			leftMouse = !leftMouse;
+		else if(code == 257)
+			rightMouse = !rightMouse;
+		else if(keys[code])
+			keyReleased(code);
+		else
+			keyPressed(code);
+		mapKeys();
+		uint32_t state = {state_bits};
+		digest = (digest ^ state) * 1099511628211ull;
+		digest = (digest ^ (uint32_t) (int32_t) (leftX * 16 + 64) ^ ((uint32_t) (int32_t) (leftY * 16 + 64) << 8)
+			^ ((uint32_t) (int32_t) (rightX * 16 + 64) << 16) ^ ((uint32_t) (int32_t) (rightY * 16 + 64) << 24)) * 1099511628211ull;
+	}}
+	clock_gettime(CLOCK_MONOTONIC, &t1);
+	double ns = (t1.tv_sec - t0.tv_sec) * 1e9 + (t1.tv_nsec - t0.tv_nsec);
+	printf("%016llx %.3f\n", (unsigned long long) digest, ns / reports);
+	free(toggles);
+	return 0;
+}}
+"""
+
+
+def compiler():
+    return os.environ.get("CC") or shutil.which("cc") or shutil.which("gcc") or shutil.which("clang")
+
+
+def key_pool(bindings):
+    pool = []
+    for source, _ in bindings:
+        code = 256 + shockemu.mouseButtons.index(source) if source in shockemu.mouseButtons else source
+        if code not in pool:
+            pool.append(code)
+    return pool
+
+
+def build(workdir, header, pool, opt="-O2"):
+    """Writes header + harness into workdir, compiles it and returns the binary path."""
+    with open(os.path.join(workdir, "mapKeys.h"), "w", encoding="utf-8") as f:
+        f.write(header)
+    source = HARNESS_TEMPLATE.format(
+        buttons=", ".join(shockemu.buttons),
+        button_enum=", ".join("BUTTON_{0}".format(name) for name in shockemu.buttons),
+        pool=", ".join(str(code) for code in pool) or "0",
+        state_bits=" | ".join("({0} << {1})".format(name, i) for i, name in enumerate(shockemu.buttons)),
+    )
+    src_path = os.path.join(workdir, "harness.c")
+    bin_path = os.path.join(workdir, "harness")
+    with open(src_path, "w", encoding="utf-8") as f:
+        f.write(source)
+    subprocess.check_call([compiler(), opt, "-std=gnu99", "-I", workdir, "-o", bin_path, src_path, "-lm"])
+    return bin_path
+
+
+def run(bin_path, reports, max_down):
+    """Returns (state digest, ns per report)."""
+    out = subprocess.check_output([bin_path, str(reports), str(max_down)], text=True).split()
+    return out[0], float(out[1])
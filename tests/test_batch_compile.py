@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+from codegen_harness import REPO_ROOT
+
+import shockemu
+
+PROFILES = ("example.se", "gamepad.se", "only_keyboard.se")
+
+
+def make_library(root):
+    for name in PROFILES:
+        shutil.copy(os.path.join(REPO_ROOT, name), os.path.join(root, name))
+    os.makedirs(os.path.join(root, "shooters"))
+    with open(os.path.join(REPO_ROOT, "example.se"), encoding="utf-8") as f:
+        example = f.read()
+    # Same bindings as example.se, different comments and spacing.
+    with open(os.path.join(root, "shooters", "copy.se"), "w", encoding="utf-8") as f:
+        f.write("# copied\n" + example.replace(" = ", "="))
+    with open(os.path.join(root, "shooters", "typos.se"), "w", encoding="utf-8") as f:
+        f.write("w = leftY-\nq = triangel\nhyper = X\n")
+    with open(os.path.join(root, "broken.se"), "w", encoding="utf-8") as f:
+        f.write("w = leftY-\nno equals sign here\n")
+    with open(os.path.join(root, "notes.txt"), "w", encoding="utf-8") as f:
+        f.write("not a profile\n")
+
+
+def run(argv):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        status = shockemu.main(argv)
+    return status, out.getvalue()
+
+
+def main():
+    with tempfile.TemporaryDirectory() as td:
+        library = os.path.join(td, "library")
+        out = os.path.join(td, "out")
+        os.makedirs(library)
+        make_library(library)
+
+        status, text = run([library, "--batch", out, "--jobs", "2"])
+        assert status == 1 and "6 profiles (4 unique)" in text and "1 errors" in text, (status, text)
+        with open(os.path.join(out, "report.json"), encoding="utf-8") as f:
+            report = json.load(f)
+        entries = dict((os.path.relpath(e["profile"], library), e) for e in report["profiles"])
+        assert sorted(entries) == sorted(list(PROFILES) + ["broken.se", "shooters/copy.se", "shooters/typos.se"]), entries
+        assert report["unique"] == 4 and report["errors"] == 1 and report["generator"] == shockemu.GENERATOR_VERSION
+
+        for name in PROFILES:
+            with open(os.path.join(library, name), encoding="utf-8") as f:
+                expected, warnings = shockemu.render(shockemu.parse_items(f.read()))
+            entry = entries[name]
+            with open(entry["output"], encoding="utf-8") as f:
+                assert f.read() == expected, name
+            assert entry["output"] == os.path.join(out, name[:-3] + ".h") and entry["warnings"] == warnings, entry
+            assert entry["seconds"] >= 0 and entry["cached"] is False, entry
+        print("PASS: batch output matches single-profile compiles")
+
+        copy = entries["shooters/copy.se"]
+        assert copy["duplicate_of"] == entries["example.se"]["profile"] and copy["key"] == entries["example.se"]["key"], copy
+        assert "seconds" not in copy, copy
+        with open(copy["output"], encoding="utf-8") as f, open(entries["example.se"]["output"], encoding="utf-8") as g:
+            assert copy["output"] == os.path.join(out, "shooters", "copy.h") and f.read() == g.read()
+        print("PASS: identical profiles are compiled once and written to each output")
+
+        typos = entries["shooters/typos.se"]
+        assert typos["unknown_keys"] == ["hyper"] and typos["unknown_buttons"] == ["triangel"], typos
+        assert entries["broken.se"]["error"].startswith("ValueError"), entries["broken.se"]
+        assert not os.path.exists(os.path.join(out, "broken.h"))
+        print("PASS: report lists unknown keys, unknown buttons and unparsable profiles")
+
+        # Globs work too; outputs are named relative to the matched files' common directory.
+        status, _ = run([os.path.join(library, "**", "*.se"), "--batch", out, "--report", os.path.join(td, "r.json"),
+                         "--codegen", "branches", "--release"])
+        with open(os.path.join(td, "r.json"), encoding="utf-8") as f:
+            report = json.load(f)
+        assert status == 1 and len(report["profiles"]) == 6 and report["codegen"] == "branches" and report["release"], report
+        with open(os.path.join(library, "gamepad.se"), encoding="utf-8") as f:
+            expected, _ = shockemu.render(shockemu.parse_items(f.read()), "branches", True)
+        with open(os.path.join(out, "gamepad.h"), encoding="utf-8") as f:
+            assert f.read() == expected
+
+        os.remove(os.path.join(library, "broken.se"))
+        cache = os.path.join(td, "cache")
+        for hit in (False, True):
+            status, _ = run([library, "--batch", out, "--cache-dir", cache])
+            with open(os.path.join(out, "report.json"), encoding="utf-8") as f:
+                report = json.load(f)
+            assert status == 0 and all(e["cached"] is hit for e in report["profiles"] if "duplicate_of" not in e), report
+    print("PASS: glob input, codegen options and the build cache apply to batches")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+
+from codegen_harness import REPO_ROOT
+
+import replay
+import seprofile
+import shockemu
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def load(name):
+    with open(os.path.join(REPO_ROOT, name), encoding="utf-8") as f:
+        return shockemu.parse(f.read())
+
+
+def random_frames(profile, frames, seed):
+    rng = random.Random(seed)
+    bindings, _, _ = shockemu.compile_profile(profile)
+    sources = sorted(set(seprofile.source_id(s) for s, _ in bindings))
+    keys = np.zeros((frames, seprofile.SOURCE_COUNT), bool)
+    mouse = np.zeros((frames, 2))
+    held = set()
+    for i in range(frames):
+        if sources and rng.random() < 0.3:
+            held ^= {rng.choice(sources)}
+        keys[i, sorted(held)] = True
+        if rng.random() < 0.2:
+            mouse[i] = rng.uniform(-0.02, 0.02), rng.uniform(-0.02, 0.02)
+    return keys, mouse
+
+
+def reference(profile, keys, mouse, dt, release=False):
+    """One Emulator tick per frame, driven the way BatchEngine models frames."""
+    emu = replay.Emulator(profile, release)
+    x = y = 0.0
+    for i in range(len(keys)):
+        emu.pressed = [code for code in range(256) if keys[i, code]]
+        emu.leftMouse, emu.rightMouse = bool(keys[i, 256]), bool(keys[i, 257])
+        if mouse[i].any():
+            x, y = x + mouse[i, 0], y + mouse[i, 1]
+            emu.mouse_moved(x, y, (i + 1) * dt)
+        emu.pending = 0
+        emu.tick()
+    return np.frombuffer(b"".join(emu.reports), np.uint8).reshape(-1, 64)
+
+
+def check(name, profile, frames=3000, dt=0.004, release=False):
+    import batchreports
+
+    keys, mouse = random_frames(profile, frames, seed=len(name))
+    got = batchreports.BatchEngine(profile, release).evaluate(keys, mouse, dt)
+    expected = reference(profile, keys, mouse, dt, release)
+    assert got.shape == expected.shape == (frames, 64), (name, got.shape)
+    other = np.ones(64, bool)
+    other[1:5] = False
+    assert (got[:, other] == expected[:, other]).all(), (name, np.argwhere(got[:, other] != expected[:, other])[:5])
+    # float64 vs float32 decay can land one quantization step apart.
+    diff = np.abs(got[:, 1:5].astype(int) - expected[:, 1:5].astype(int))
+    assert diff.max() <= 1 and (diff != 0).mean() < 0.01, (name, diff.max(), (diff != 0).mean())
+
+
+def main():
+    if np is None:
+        print("SKIP: numpy not installed")
+        return
+
+    for name in ("example.se", "gamepad.se", "only_keyboard.se"):
+        check(name, load(name))
+    print("PASS: batch reports match the per-tick reference on shipped profiles")
+
+    curved = dict(load("example.se"), **{"mouseLook.type": "power", "mouseLook.maxAccel": "2000"})
+    check("curved", curved)
+    keyed = dict(load("example.se"), **{"mouseLook.stick": "left"})
+    check("keyed", keyed)
+    print("PASS: batch reports match for curved and key-bound mouseLook sticks")
+
+    for name, profile in (("release", load("example.se")), ("release curved", curved), ("release keyed", keyed)):
+        check(name, profile, release=True)
+    print("PASS: batch reports match the --release decay schedule")
+
+    import batchreports
+
+    # A key bound twice: the CLI lowers the file like shockemu.py and replay.py, so the
+    # last binding wins and the shadowed line is reported.
+    with tempfile.TemporaryDirectory() as td:
+        path = os.path.join(td, "shadowed.se")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("w = leftY-\nd = rightX+\nw = X\nd = O\nleftMouse = R2\n")
+        with open(path, encoding="utf-8") as f:
+            shadowed = shockemu.parse_items(f.read())
+        check("shadowed", shadowed)
+        stdout = sys.stdout
+        sys.stdout = io.StringIO()
+        try:
+            assert batchreports.main([path, "--synthetic", "200"]) == 0
+            results = json.loads(sys.stdout.getvalue())
+        finally:
+            sys.stdout = stdout
+    assert results[0]["warnings"] == replay.Emulator(shadowed).warnings == [
+        "Conflict: line 1 (w = leftY-) is shadowed by line 3 (w = X)",
+        "Conflict: line 2 (d = rightX+) is shadowed by line 4 (d = O)",
+    ], results[0]["warnings"]
+    print("PASS: batch reports resolve shadowed bindings like replay.Emulator")
+
+    events = [
+        {"t": 0.0, "type": "keyDown", "key": "w"},
+        {"t": 0.01, "type": "mouseMoved", "x": 4, "y": 0},
+        {"t": 0.011, "type": "mouseMoved", "x": 6, "y": 1},
+        {"t": 0.02, "type": "keyUp", "key": "w"},
+        {"t": 0.03, "type": "mouseDown"},
+    ]
+    keys, mouse = batchreports.frames_from_trace(events, 0.004)
+    w = shockemu.keys["w"]
+    assert keys.shape == (8, seprofile.SOURCE_COUNT), keys.shape
+    assert keys[:5, w].all() and not keys[5:, w].any(), keys[:, w]
+    assert keys[7, 256] and not keys[:7, 256].any(), keys[:, 256]
+    assert mouse[2].tolist() == [6, 1] and mouse.sum() == 7, mouse
+    print("PASS: traces sample into frames")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+import os
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO_ROOT)
+
+import shockemu  # noqa: E402
+
+
+def compile_profile(profile_path, output, cache_dir):
+    cmd = [sys.executable, os.path.join(REPO_ROOT, "shockemu.py"), "--cache-dir", cache_dir, "-o", output, profile_path]
+    return subprocess.check_output(cmd, text=True)
+
+
+def main():
+    with open(os.path.join(REPO_ROOT, "example.se"), encoding="utf-8") as f:
+        source = f.read()
+
+    with tempfile.TemporaryDirectory() as td:
+        profile_path = os.path.join(td, "profile.se")
+        output = os.path.join(td, "mapKeys.h")
+        cache_dir = os.path.join(td, "cache")
+        with open(profile_path, "w", encoding="utf-8") as f:
+            f.write(source)
+
+        first = compile_profile(profile_path, output, cache_dir)
+        assert "Using cached" not in first, first
+        mtime = os.stat(output).st_mtime_ns
+
+        second = compile_profile(profile_path, output, cache_dir)
+        assert "Using cached" in second, second
+        assert os.stat(output).st_mtime_ns == mtime, "unchanged output must not be rewritten"
+
+        # Comments and whitespace do not change the parsed profile, so the key holds.
+        with open(profile_path, "w", encoding="utf-8") as f:
+            f.write("# reformatted\n\n" + source.replace(" = ", "="))
+        third = compile_profile(profile_path, output, cache_dir)
+        assert "Using cached" in third, third
+
+        with open(profile_path, "w", encoding="utf-8") as f:
+            f.write(source.replace("y = X", "y = O"))
+        fourth = compile_profile(profile_path, output, cache_dir)
+        assert "Using cached" not in fourth, fourth
+        assert len(os.listdir(os.path.join(cache_dir, "profiles"))) == 2
+        print("PASS: profile cache hit/miss by parsed content")
+
+    profile = shockemu.parse(source)
+    key = shockemu.profile_key(profile, "tables")
+    assert key != shockemu.profile_key(profile, "branches")
+    shockemu.GENERATOR_VERSION += 1
+    try:
+        assert key != shockemu.profile_key(profile, "tables")
+    finally:
+        shockemu.GENERATOR_VERSION -= 1
+    print("PASS: cache key covers codegen mode and generator version")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+import math
+import os
+import subprocess
+import sys
+import tempfile
+
+from codegen_harness import REPO_ROOT, compiler
+
+import curves
+import replay
+import shockemu
+
+# Runs the generated mouseLook block outside of HIDRunner: NSLog counts, decayKick re-arms.
+C_DRIVER = r"""
+#include <math.h>
+#include <stdbool.h>
+#include <stdint.h>
+#include <stdio.h>
+#include "seprofile.h"
+
+static bool mouseMoved;
+static float mouseAccelX, mouseAccelY, leftX, leftY, rightX, rightY;
+static int kicked, logs;
+#define NSLog(...) (logs++)
+static void decayKick(void) { kicked = 1; }
+
+static void mapKeys(void) {
+#include "mapKeys.h"
+}
+
+int main(void) {
+	float ax, ay;
+	while(scanf("%f %f", &ax, &ay) == 2) {
+		mouseAccelX = ax;
+		mouseAccelY = ay;
+		mouseMoved = true;
+		kicked = 1;
+		for(int ticks = 0; kicked || ticks == 0; ++ticks) {
+			if(ticks)
+				kicked = 0;
+			mapKeys();
+			printf("%d %d ", (uint8_t) fmin(fmax(128 + rightX * 127, 0), 255), (uint8_t) fmin(fmax(128 + rightY * 127, 0), 255));
+		}
+		printf("\n");
+	}
+	printf("%d\n", logs);
+	return 0;
+}
+"""
+
+ACCELS = [(0.0, 0.0), (2.5, -0.75), (-400.0, 12.0), (1e6, 0.0), (-3e38, 3e38), (0.3, 0.01), (99999.0, -5.0)]
+
+
+def mouse_look(**params):
+    profile = {"mouseLook.%s" % k: v for k, v in params.items()}
+    _, mouseLook, _ = shockemu.compile_profile(profile)
+    return profile, mouseLook
+
+
+def reference(profile, release):
+    emu = replay.Emulator(profile, release)
+    runs = []
+    for ax, ay in ACCELS:
+        emu.reports = []
+        emu.mouseAccel = [curves.to_float32(ax), curves.to_float32(ay)]
+        emu.mouseMoved = True
+        emu.kick()
+        emu.decay_kick()
+        emu.run()
+        runs.append([b for r in emu.reports for b in r[3:5]])
+    return runs
+
+
+def run_c(cc, td, profile, release):
+    header, warnings = shockemu.render(profile, release=release)
+    assert not warnings, warnings
+    with open(os.path.join(td, "mapKeys.h"), "w", encoding="utf-8") as f:
+        f.write(header.replace("[self decayKick];", "decayKick();"))
+    binary = os.path.join(td, "driver")
+    subprocess.check_call([cc, "-std=gnu99", "-I", td, "-I", REPO_ROOT, "-o", binary, os.path.join(td, "driver.c"),
+                           os.path.join(REPO_ROOT, "seprofile.c"), "-lm"])
+    stdin = "".join("%r %r\n" % a for a in ACCELS)
+    lines = subprocess.check_output([binary], input=stdin, text=True).splitlines()
+    return [[int(v) for v in line.split()] for line in lines[:-1]], int(lines[-1])
+
+
+def main():
+    # The schedule ends where the largest deflection falls inside the dead zone.
+    for kind, peak in (("linear", shockemu.FLT_MAX), ("power", 1.0)):
+        for decay, dead_zone in (("10", ".1"), ("5", ".05"), ("1.5", ".01")):
+            _, ml = mouse_look(type=kind, decay=decay, deadZone=dead_zone)
+            scale, warning = shockemu.plan_decay(ml)
+            assert warning is None
+            assert peak * scale[-1] <= float(dead_zone) * 1.0001, (kind, decay, len(scale))
+            assert len(scale) == 1 or peak * scale[-2] > float(dead_zone), (kind, decay, len(scale))
+            assert all(a > b for a, b in zip(scale, scale[1:])), (kind, decay)
+            assert len(scale) == max(1, math.ceil(math.log(peak / float(dead_zone)) / math.log(float(decay))))
+    _, ml = mouse_look(decay="1.01")
+    scale, warning = shockemu.plan_decay(ml)
+    assert len(scale) == shockemu.MAX_DECAY_STEPS and "cut off" in warning, warning
+    for decay, dead_zone in (("1", ".1"), ("0.5", ".1"), ("10", "0")):
+        profile, ml = mouse_look(decay=decay, deadZone=dead_zone)
+        header, warnings = shockemu.render(profile)
+        assert "decayScale" not in header and warnings[0].startswith("Bad mouseLook decay"), (decay, warnings)
+    print("PASS: decay schedules are bounded and reject settings that never settle")
+
+    profiles = [
+        ("linear", mouse_look(decay="10", deadZone=".1")[0]),
+        ("slow", mouse_look(decay="1.5", deadZone=".02")[0]),
+        ("curve", mouse_look(type="exponential", decay="4", deadZone=".05", maxAccel="500")[0]),
+    ]
+    for name, profile in profiles:
+        header, _ = shockemu.render(profile)
+        release, _ = shockemu.render(profile, release=True)
+        assert "NSLog" in header and "NSLog" not in release, name
+        assert header.count("[self decayKick];") == release.count("[self decayKick];") == 1, name
+
+    cc = compiler()
+    if not cc:
+        print("SKIP: no C compiler available")
+        return
+    with tempfile.TemporaryDirectory() as td:
+        with open(os.path.join(td, "driver.c"), "w", encoding="utf-8") as f:
+            f.write(C_DRIVER)
+        for name, profile in profiles:
+            debug, debug_logs = run_c(cc, td, profile, False)
+            fast, fast_logs = run_c(cc, td, profile, True)
+            assert debug == reference(profile, False), name
+            assert fast == reference(profile, True), name
+            assert fast_logs == 0 and debug_logs > 0, (name, debug_logs)
+            for full, skipped in zip(debug, fast):
+                pairs = list(zip(full[::2], full[1::2]))
+                # Release drops exactly the saturated decay ticks that repeat the move's report.
+                repeats = 0
+                while 1 + repeats < len(pairs) - 1 and pairs[1 + repeats] == pairs[0]:
+                    repeats += 1
+                assert list(zip(skipped[::2], skipped[1::2])) == [pairs[0]] + pairs[1 + repeats:], (name, full, skipped)
+            # Curves never push the stick past full deflection, so only linear decays get shorter.
+            if name != "curve":
+                assert sum(map(len, fast)) < sum(map(len, debug)), name
+    print("PASS: generated decay matches the reference; --release drops logging and repeated ticks")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
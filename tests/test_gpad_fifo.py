@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+import io
+import os
+import subprocess
+import sys
+import tempfile
+
+from codegen_harness import REPO_ROOT, compiler
+
+import gpadproto
+import replay
+
+C_DRIVER = r"""
+#include <stdio.h>
+#include "gpad-protocol.h"
+
+static void print_record(const struct gpad_record* r, void* ctx)
+{
+    printf("%llu %d %u %u %u\n", (unsigned long long) r->timestamp, r->value, r->page, r->usage, r->type);
+}
+
+int main(int argc, char** argv)
+{
+    if (argc > 1) {
+        /* encode: one frame with three records */
+        struct gpad_frame frame = { { GPAD_FRAME_MAGIC, 0, 0 } };
+        for (int i = 0; i < 3; i++) {
+            struct gpad_record* r = &frame.records[frame.header.count++];
+            memset(r, 0, sizeof(*r));
+            r->timestamp = 1000000000ull * (i + 1);
+            r->value = -i;
+            r->page = 9;
+            r->usage = 48 + i;
+            r->type = 2;
+        }
+        fwrite(&frame, 1, gpad_frame_size(&frame), stdout);
+        return 0;
+    }
+    static uint8_t buf[1 << 16];
+    size_t len = fread(buf, 1, sizeof(buf), stdin);
+    size_t used = gpad_decode(buf, len, print_record, NULL);
+    printf("%zu %zu %zu %zu\n", used, sizeof(struct gpad_frame_header), sizeof(struct gpad_record), GPAD_FRAME_MAX_SIZE);
+    return 0;
+}
+"""
+
+
+def sample_records(count):
+    return [(10**9 + i * 125000, (i * 37) % 256 - 128, 1 if i % 3 else 9, 48 + i % 10, 2) for i in range(count)]
+
+
+def main():
+    records = sample_records(45)
+    data = gpadproto.pack_frames(records)
+    assert len(data) == 3 * gpadproto.FRAME_HEADER.size + 45 * gpadproto.RECORD.size, len(data)
+    assert list(gpadproto.iter_records(data)) == records
+    assert gpadproto.FRAME_MAX_SIZE <= 512, gpadproto.FRAME_MAX_SIZE
+    print("PASS: frames round trip")
+
+    # Partial reads keep incomplete frames; garbage between frames is skipped.
+    for chunk in (1, 7, 24, 4096):
+        assert list(gpadproto.read_records(io.BytesIO(data), chunk)) == records, chunk
+    boundary = gpadproto.FRAME_HEADER.size + gpadproto.FRAME_MAX_RECORDS * gpadproto.RECORD.size
+    noisy = b"\x00junk GPD" + data[:boundary] + b"\xff" * 5 + data[boundary:]
+    assert list(gpadproto.read_records(io.BytesIO(noisy), 13)) == records
+    assert list(gpadproto.iter_records(data[:-1])) == records[:40]
+    print("PASS: streaming reader handles partial reads and resyncs")
+
+    # The dylib's replay path reads both protocols.
+    text = b"".join(b"%4d %4d\0" % (usage, value) for _, value, _, usage, _ in records)
+    pairs = [(usage, value) for _, value, _, usage, _ in records]
+    assert list(replay.read_fifo(text)) == pairs
+    assert list(replay.read_fifo(data)) == pairs
+    print("PASS: replay reads binary and text captures")
+
+    cc = compiler()
+    if not cc:
+        print("SKIP: no C compiler available")
+        return
+    with tempfile.TemporaryDirectory() as td:
+        src = os.path.join(td, "driver.c")
+        binary = os.path.join(td, "driver")
+        with open(src, "w", encoding="utf-8") as f:
+            f.write(C_DRIVER)
+        subprocess.check_call([cc, "-std=gnu99", "-I", REPO_ROOT, "-o", binary, src])
+
+        encoded = subprocess.check_output([binary, "encode"])
+        assert list(gpadproto.iter_records(encoded)) == [(10**9 * (i + 1), -i, 9, 48 + i, 2) for i in range(3)]
+
+        out = subprocess.check_output([binary], input=noisy[:-10]).decode().splitlines()
+        used, header, record, frame_max = (int(v) for v in out[-1].split())
+        assert (header, record, frame_max) == (gpadproto.FRAME_HEADER.size, gpadproto.RECORD.size, gpadproto.FRAME_MAX_SIZE)
+        decoded = [tuple(int(v) for v in line.split()) for line in out[:-1]]
+        python = []
+        gen = gpadproto.decode(noisy[:-10])
+        while True:
+            try:
+                python.append(next(gen))
+            except StopIteration as stop:
+                python_used = stop.value
+                break
+        assert decoded == python and used == python_used, (len(decoded), len(python), used, python_used)
+    print("PASS: C gpad_decode and Python reader agree")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+import os
+import subprocess
+import sys
+import tempfile
+
+from codegen_harness import REPO_ROOT, compiler
+
+import curves
+import shockemu
+
+CURVES = [
+    ("power", {"exponent": "1"}),
+    ("power", {"exponent": "2"}),
+    ("power", {"exponent": "3.5"}),
+    ("exponential", {"curvature": "0"}),
+    ("exponential", {"curvature": "3"}),
+    ("exponential", {"curvature": "6"}),
+    ("spline", {"points": ""}),
+    ("spline", {"points": "0.25:0.05 0.5:0.2 0.8:0.7"}),
+    ("spline", {"points": "0.1:0.3 0.2:0.3 0.9:0.95"}),
+]
+
+C_DRIVER = r"""
+#include <stdio.h>
+#include <stdlib.h>
+#include "seprofile.h"
+
+static const float lut[SEPROFILE_CURVE_SIZE] = { %s };
+
+int main(int argc, char **argv) {
+	float minAccel = atof(argv[1]), maxAccel = atof(argv[2]);
+	float value;
+	while(scanf("%%f", &value) == 1)
+		printf("%%.9g\n", seprofile_curve(lut, minAccel, maxAccel, value));
+	return 0;
+}
+"""
+
+
+def main():
+    probes = [v * s for v in (0, 10, 55.5, 100, 333, 499.9, 500, 640, 999, 1000, 5000) for s in (1, -1)]
+    cc = compiler()
+    for kind, params in CURVES:
+        mouse_look = dict(type=kind, minAccel="100", maxAccel="900", **params)
+        curve, min_accel, max_accel = curves.from_mouse_look(mouse_look)
+        lut = curves.sample(curve)
+        error = curves.max_error(curve, lut)
+        assert error <= curves.ERROR_BOUND, (kind, params, error)
+        assert lut[0] == 0 and abs(lut[-1] - 1) < 1e-6, (kind, params)
+
+        for value in probes:
+            x = curves.normalize(min_accel, max_accel, value)
+            expected = curve(x) if value >= 0 else -curve(x)
+            assert abs(curves.lookup(lut, min_accel, max_accel, value) - expected) <= curves.ERROR_BOUND, (kind, value)
+
+        if cc:
+            with tempfile.TemporaryDirectory() as td:
+                src = os.path.join(td, "driver.c")
+                binary = os.path.join(td, "driver")
+                with open(src, "w", encoding="utf-8") as f:
+                    f.write(C_DRIVER % ", ".join(shockemu.c_float(v) for v in lut))
+                subprocess.check_call([cc, "-std=gnu99", "-I", REPO_ROOT, "-o", binary, src, os.path.join(REPO_ROOT, "seprofile.c"), "-lm"])
+                out = subprocess.run(
+                    [binary, "100", "900"], input="\n".join(repr(v) for v in probes), capture_output=True, text=True, check=True
+                ).stdout.split()
+            for value, got in zip(probes, out):
+                assert abs(float(got) - curves.lookup(lut, min_accel, max_accel, value)) < 1e-5, (kind, value, got)
+        print("PASS: {0} {1} table error {2:.2e} <= {3:g}".format(kind, params, error, curves.ERROR_BOUND))
+
+    for kind, params in [("power", {"exponent": "0.5"}), ("spline", {"points": "0.5:0.8 0.6:0.2"}), ("power", {"maxAccel": "0"})]:
+        try:
+            curves.from_mouse_look(dict(type=kind, **params))
+        except ValueError:
+            continue
+        raise AssertionError("accepted bad curve parameters {0} {1}".format(kind, params))
+    print("PASS: bad curve parameters are rejected")
+
+    header, warnings = shockemu.render(shockemu.parse("mouseLook.type = exponential\nmouseLook.maxAccel = 800\n"))
+    assert not warnings, warnings
+    assert "static const float mouseCurve[256]" in header and "seprofile_curve(mouseCurve, 0.0f, 800.0f, mouseAccelX)" in header, header
+    _, warnings = shockemu.render(shockemu.parse("mouseLook.type = wobbly\n"))
+    assert warnings and warnings[0].startswith("Unknown mouseLook type"), warnings
+    _, warnings = shockemu.render(shockemu.parse("mouseLook.type = power\nmouseLook.exponent = 0.5\n"))
+    assert warnings and warnings[0].startswith("Bad mouseLook power curve"), warnings
+    print("PASS: curved mouseLook codegen")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+import os
+import subprocess
+import sys
+import tempfile
+import zlib
+
+from codegen_harness import REPO_ROOT, compiler
+
+import curves
+import replay
+import seprofile
+import shockemu
+
+C_DRIVER = r"""
+#include <stdio.h>
+#include <stdlib.h>
+#include "seprofile.h"
+
+int main(int argc, char **argv) {
+	struct seprofile *p = seprofile_load(argv[1]);
+	if(!p) {
+		puts("invalid");
+		return 1;
+	}
+	if(argc == 4) {
+		/* driver PROFILE X Y: the decay ticks after a mouse move set the stick to (X, Y). */
+		struct seprofile_decay decay;
+		float x = 0, y = 0;
+		bool more;
+		seprofile_decay_start(&decay, strtof(argv[2], NULL), strtof(argv[3], NULL));
+		do {
+			more = seprofile_decay_step(p, &decay, &x, &y);
+			printf("%.9g %.9g\n", x, y);
+		} while(more);
+		seprofile_free(p);
+		return 0;
+	}
+	for(int i = 0; i < SEPROFILE_SOURCES; ++i) {
+		if(p->buttons[i])
+			printf("button %d %u\n", i, p->buttons[i]);
+		if(p->axes[i][0] || p->axes[i][1] || p->axes[i][2] || p->axes[i][3])
+			printf("axis %d %d %d %d %d\n", i, p->axes[i][0], p->axes[i][1], p->axes[i][2], p->axes[i][3]);
+	}
+	if(p->mouse_look)
+		printf("mouseLook %d %d %g %g %g %g %g %g\n", p->mouse_look_type, p->mouse_look_stick, p->dead_zone, p->decay,
+			p->mult_x, p->mult_y, p->min_accel, p->max_accel);
+	if(p->mouse_look)
+		printf("decay %d %d %.9g %.9g\n", p->release, p->decay_steps, p->decay_scale[0], p->decay_scale[p->decay_steps - 1]);
+	if(p->has_curve)
+		printf("curve %g %g %g\n", p->curve[0], p->curve[SEPROFILE_CURVE_SIZE / 2], p->curve[SEPROFILE_CURVE_SIZE - 1]);
+	seprofile_free(p);
+	return 0;
+}
+"""
+
+
+def f32_text(value):
+    # printf("%.9g") of a float: enough digits to read back the same float.
+    return "%.9g" % value
+
+
+def emulator_decay(profile, release, start):
+    # The decay ticks replay.Emulator (the reference for the compiled mapKeys.h) produces
+    # after a mouse move set the stick to start.
+    emu = replay.Emulator(profile, release)
+    stick = emu.mouseLook["stick"]
+    emu.decayStart, emu.decayStep = start, 0
+    frames = []
+    while emu.decayStep < len(emu.decayScale):
+        emu.map_keys()
+        frames.append((emu.state[stick + "X"], emu.state[stick + "Y"]))
+    return frames
+
+
+def expected_lines(decoded):
+    lines = ["button {0} {1}".format(s, m) for s, m in decoded["masks"].items()]
+    lines += ["axis {0} {1}".format(s, " ".join(str(d) for d in ds)) for s, ds in decoded["deltas"].items()]
+    ml = decoded["mouseLook"]
+    if ml:
+        lines.append(
+            "mouseLook {0} {1} {2:g} {3:g} {4:g} {5:g} {6:g} {7:g}".format(
+                seprofile.MOUSE_LOOK_TYPES.index(ml["type"]),
+                seprofile.STICKS.index(ml["stick"]),
+                ml["deadZone"],
+                ml["decay"],
+                ml["multX"],
+                ml["multY"],
+                ml["minAccel"],
+                ml["maxAccel"],
+            )
+        )
+        scale = ml["decayScale"]
+        lines.append("decay {0} {1} {2} {3}".format(int(ml["release"]), len(scale), f32_text(scale[0]), f32_text(scale[-1])))
+    curve = decoded["curve"]
+    if curve:
+        lines.append("curve {0:g} {1:g} {2:g}".format(curve[0], curve[len(curve) // 2], curve[-1]))
+    return sorted(lines)
+
+
+def expect_invalid(data, reason):
+    try:
+        seprofile.unpack(data)
+    except seprofile.ProfileFormatError:
+        return
+    raise AssertionError("accepted corrupt profile: {0}".format(reason))
+
+
+def forged(buttons, axes, mouse_look=None, decay=(0.5,)):
+    # A profile with a valid header and crc whose records seprofile.pack would never write.
+    body = b"".join(seprofile.BUTTON_RECORD.pack(s, m) for s, m in buttons)
+    body += b"".join(seprofile.AXIS_RECORD.pack(s, *d) for s, d in axes)
+    if mouse_look is None:
+        decay = ()
+    else:
+        body += seprofile.MOUSE_LOOK_RECORD.pack(*mouse_look)
+    body += b"".join(seprofile.DECAY_STEP.pack(v) for v in decay)
+    header = seprofile.HEADER.pack(seprofile.MAGIC, seprofile.VERSION, seprofile.HEADER.size, len(body),
+                                   zlib.crc32(body) & 0xFFFFFFFF, len(buttons), len(axes),
+                                   0 if mouse_look is None else 1, 0, len(decay))
+    return header + body
+
+
+def main():
+    cc = compiler()
+    with tempfile.TemporaryDirectory() as td:
+        driver = None
+        if cc:
+            src = os.path.join(td, "driver.c")
+            driver = os.path.join(td, "driver")
+            with open(src, "w", encoding="utf-8") as f:
+                f.write(C_DRIVER)
+            subprocess.check_call([cc, "-std=gnu99", "-I", REPO_ROOT, "-o", driver, src, os.path.join(REPO_ROOT, "seprofile.c")])
+
+        with open(os.path.join(REPO_ROOT, "example.se"), encoding="utf-8") as f:
+            curved = f.read().replace("mouseLook.type = linear", "mouseLook.type = power\nmouseLook.maxAccel = 800")
+        profiles = []
+        for name in ("example.se", "gamepad.se", "only_keyboard.se"):
+            with open(os.path.join(REPO_ROOT, name), encoding="utf-8") as f:
+                profiles.append((name, f.read()))
+        profiles.append(("curved.se", curved))
+
+        for name, source in profiles:
+            profile = shockemu.parse(source)
+            bindings, mouse_look, _ = shockemu.compile_profile(profile)
+            masks, deltas = shockemu.build_tables(bindings)
+
+            path = os.path.join(td, name + "bin")
+            seprofile.write(path, shockemu.binary_profile(profile))
+            decoded = seprofile.load(path)
+
+            assert set(decoded["masks"]) == set(seprofile.source_id(s) for s in masks), name
+            for source, names in masks.items():
+                mask = decoded["masks"][seprofile.source_id(source)]
+                assert [b for i, b in enumerate(shockemu.buttons) if mask >> i & 1] == sorted(set(names), key=shockemu.buttons.index)
+            assert decoded["deltas"] == dict((seprofile.source_id(s), d) for s, d in deltas.items()), name
+            if mouse_look is None:
+                assert decoded["mouseLook"] is None, name
+            else:
+                assert decoded["mouseLook"]["stick"] == mouse_look["stick"], name
+                for field in ("deadZone", "decay", "multX", "multY"):
+                    assert abs(decoded["mouseLook"][field] - float(mouse_look[field])) < 1e-6, (name, field)
+                assert decoded["mouseLook"]["decayScale"] == shockemu.plan_decay(mouse_look)[0], name
+                assert decoded["mouseLook"]["release"] is False, name
+                if mouse_look["type"] == "linear":
+                    assert decoded["curve"] is None, name
+                else:
+                    assert decoded["curve"] == shockemu.mouse_curve(mouse_look)[0], name
+
+            if driver:
+                out = subprocess.check_output([driver, path], text=True).splitlines()
+                assert sorted(out) == expected_lines(decoded), (name, out)
+        print("PASS: .sebin round trip through Python{0} loader".format(" and C" if driver else ""))
+
+        if driver:
+            # The runtime decay of a loaded profile matches the compiled one tick for tick,
+            # with and without --release, for a saturating and a small deflection.
+            for name, source in (("example.se", profiles[0][1]), ("curved.se", curved)):
+                items = shockemu.parse_items(source)
+                for release in (False, True):
+                    path = os.path.join(td, "decay.sebin")
+                    seprofile.write(path, shockemu.binary_profile(items, release))
+                    for start in ((-250.5, 3.25), (0.75, -0.125), (1e6, 0.0)):
+                        start = tuple(curves.to_float32(v) for v in start)
+                        expected = emulator_decay(items, release, start)
+                        out = subprocess.check_output([driver, path] + [f32_text(v) for v in start], text=True).splitlines()
+                        assert out == ["{0} {1}".format(f32_text(x), f32_text(y)) for x, y in expected], (name, release, start, out)
+                        if release and start[0] == 1e6:
+                            assert len(out) < len(emulator_decay(items, False, start)), (name, out)
+            print("PASS: decay of a loaded .sebin matches replay.Emulator frame by frame")
+
+        with open(os.path.join(td, "example.sebin"), "rb") as f:
+            data = f.read()
+        expect_invalid(data[:-1], "truncated")
+        expect_invalid(b"XXXX" + data[4:], "bad magic")
+        expect_invalid(data[:4] + b"\x63\x00" + data[6:], "future version")
+        flipped = bytearray(data)
+        flipped[-1] ^= 0xFF
+        expect_invalid(bytes(flipped), "crc")
+        corrupt = [bytes(flipped),
+                   forged([(4, 1), (4, 2)], []),
+                   forged([], [(4, [0, 0, 1, 0]), (4, [0, 0, 0, 1])]),
+                   forged([], [], (4, 0, 0, 0.1, 1.5, 1.0, 1.0, 0.0, 0.0)),
+                   forged([], [], (0, 0, 2, 0.1, 1.5, 1.0, 1.0, 0.0, 0.0)),
+                   forged([], [], (0, 0, 0, 0.1, 1.5, 1.0, 1.0, 0.0, 0.0), decay=())]
+        for data in corrupt[1:]:
+            expect_invalid(data, "duplicate source, unknown mouseLook type or flag, or no decay schedule")
+        assert seprofile.unpack(forged([(4, 1)], [(4, [0, 0, 1, 0])], (0, 0, 0, 0.1, 1.5, 1.0, 1.0, 0.0, 0.0)))
+        if driver:
+            bad = os.path.join(td, "bad.sebin")
+            for data in corrupt:
+                with open(bad, "wb") as f:
+                    f.write(data)
+                assert subprocess.run([driver, bad], capture_output=True).returncode == 1
+        print("PASS: corrupt profiles are rejected")
+
+        seprofile.write(path, seprofile.pack({}, {}))
+        assert not [n for n in os.listdir(td) if n.endswith(".tmp")], "atomic write left a temp file"
+        assert seprofile.load(path) == {"masks": {}, "deltas": {}, "mouseLook": None, "curve": None}
+        print("PASS: atomic replace of an existing profile")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
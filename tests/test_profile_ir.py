@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+
+from bench_codegen import synthetic_bindings
+from codegen_harness import REPO_ROOT, build, compiler, key_pool, run
+
+import seprofile
+import shockemu
+
+PROFILE = """
+w = leftY-
+a = leftX-
+y = X
+shift = O
+w = X
+leftMouse = X
+mouseLook.stick = left
+"""
+
+
+def generate(codegen, profile, **kwargs):
+    header, warnings = shockemu.render(profile, codegen, **kwargs)
+    return header, warnings
+
+
+def main():
+    program = shockemu.build_program(shockemu.parse_items(PROFILE))
+    assert [(b.key, b.target) for b in program.bindings] == [("a", "leftX-"), ("w", "X"), ("y", "X"), ("leftMouse", "X")], program.bindings
+    warnings = program.warnings
+    assert "Conflict: line 2 (w = leftY-) is shadowed by line 6 (w = X)" in warnings, warnings
+    assert "Dead binding: line 5 (shift = O) never fires, modifier keys do not send keyDown" in warnings, warnings
+    assert any(w.startswith("Conflict: mouseLook.stick = left is also bound to line 3 (a = leftX-)") for w in warnings), warnings
+    assert program.targets["X"] == [13, 16, "leftMouse"] and program.boundButtons == ["X"], program.targets
+    assert program.boundSticks == ["left"] and program.deltas[0] == [-1, 0, 0, 0], program.deltas
+    print("PASS: passes drop shadowed and dead bindings and flag conflicts")
+
+    branches, _ = generate("branches", shockemu.parse_items(PROFILE))
+    assert "X = DOWN(13) || DOWN(16) || leftMouse;" in branches, branches
+    assert "leftX = - DOWN(0);" in branches and "leftY = 0;" in branches, branches
+    assert "O =" not in branches and "DOWN(56)" not in branches, branches
+    binary = seprofile.unpack(shockemu.binary_profile(shockemu.parse_items(PROFILE)))
+    assert 56 not in binary["masks"] and 13 not in binary["deltas"], binary
+    print("PASS: both backends consume the optimized IR")
+
+    # Output depends on the bindings, not on the order of lines in the file.
+    with open(os.path.join(REPO_ROOT, "example.se"), encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    shuffled = list(lines)
+    random.Random(3).shuffle(shuffled)
+    for codegen in ("tables", "branches"):
+        a, _ = generate(codegen, shockemu.parse_items("\n".join(lines)))
+        b, _ = generate(codegen, shockemu.parse_items("\n".join(shuffled)))
+        assert a == b, codegen
+    print("PASS: generated code is independent of profile line order")
+
+    # Hotter sources are tested first.
+    trace = "\n".join(json.dumps(e) for e in [{"t": 0, "type": "keyDown", "key": "y"}] * 3 + [{"t": 1, "type": "mouseDown"}])
+    hotness = shockemu.hotness_from_trace(io.StringIO(trace))
+    assert hotness == {16: 3, "leftMouse": 1}, hotness
+    hot, _ = generate("branches", shockemu.parse_items(PROFILE), hotness=hotness)
+    assert "X = DOWN(16) || leftMouse || DOWN(13);" in hot, hot
+    with tempfile.TemporaryDirectory() as td:
+        profile_path = os.path.join(td, "profile.se")
+        trace_path = os.path.join(td, "trace.ndjson")
+        output = os.path.join(td, "mapKeys.h")
+        with open(profile_path, "w", encoding="utf-8") as f:
+            f.write(PROFILE)
+        with open(trace_path, "w", encoding="utf-8") as f:
+            f.write(trace)
+        assert shockemu.main([profile_path, "-o", output, "--codegen", "branches", "--hotness", trace_path]) == 0
+        with open(output, encoding="utf-8") as f:
+            assert f.read() == hot
+    print("PASS: hotness orders branch tests")
+
+    # Many-to-one and mixed-axis profiles behave the same in both backends.
+    cc = compiler()
+    if not cc:
+        print("SKIP: no C compiler available")
+        return
+    for count in (40, 150):
+        bindings = synthetic_bindings(count, seed=count)
+        digests = {}
+        for codegen in ("branches", "tables"):
+            fp = io.StringIO()
+            shockemu.codegens[codegen](fp, shockemu.program_for(bindings))
+            with tempfile.TemporaryDirectory() as td:
+                digests[codegen], _ = run(build(td, fp.getvalue(), key_pool(bindings), opt="-O0"), 20000, 6)
+        assert digests["branches"] == digests["tables"], (count, digests)
+    print("PASS: branch and table backends agree on many-to-one bindings")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
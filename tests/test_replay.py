@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+import io
+import json
+import os
+import sys
+import tempfile
+
+from codegen_harness import REPO_ROOT, build, compiler, key_pool, run
+
+import replay
+import shockemu
+
+FNV_PRIME = 1099511628211
+MASK64 = (1 << 64) - 1
+
+
+def load(name):
+    with open(os.path.join(REPO_ROOT, name), encoding="utf-8") as f:
+        return shockemu.parse(f.read())
+
+
+def reference_digest(profile, pool, reports, max_down):
+    """Replays the codegen harness toggle sequence through replay.Emulator and digests it the same way."""
+    emu = replay.Emulator(profile)
+    seed = 2463534242
+    held = set()
+    digest = 1469598103934665603
+    for _ in range(reports):
+        while True:
+            seed ^= (seed << 13) & 0xFFFFFFFF
+            seed ^= seed >> 17
+            seed ^= (seed << 5) & 0xFFFFFFFF
+            code = pool[seed % len(pool)]
+            if code in held or len(held) < max_down:
+                break
+        held ^= {code}
+        if code >= 256:
+            name = shockemu.mouseButtons[code - 256]
+            emu.mouse_button(name, not getattr(emu, name))
+        elif code in emu.pressed:
+            emu.key_up(code)
+        else:
+            emu.key_down(code)
+        emu.pending = 0
+        emu.map_keys()
+        state = 0
+        for i, name in enumerate(shockemu.buttons):
+            state |= emu.state[name] << i
+        digest = ((digest ^ state) * FNV_PRIME) & MASK64
+        sticks = 0
+        for i, name in enumerate(("leftX", "leftY", "rightX", "rightY")):
+            sticks ^= (int(emu.state[name] * 16 + 64) & 0xFFFFFFFF) << (8 * i)
+        digest = ((digest ^ (sticks & 0xFFFFFFFF)) * FNV_PRIME) & MASK64
+    return "%016x" % digest
+
+
+def main():
+    # Key and mouse button mappings agree with the compiled table codegen.
+    if compiler():
+        for name in ("example.se", "gamepad.se", "only_keyboard.se"):
+            profile = dict((k, v) for k, v in load(name).items() if not k.startswith("mouseLook"))
+            bindings, _, _ = shockemu.compile_profile(profile)
+            pool = key_pool(bindings)
+            header = io.StringIO()
+            shockemu.emit_tables(header, shockemu.program_for(bindings))
+            with tempfile.TemporaryDirectory() as td:
+                expected, _ = run(build(td, header.getvalue(), pool, opt="-O0"), 5000, 4)
+            assert reference_digest(profile, pool, 5000, 4) == expected, name
+        print("PASS: replay reference matches compiled mapKeys.h")
+    else:
+        print("SKIP: no C compiler available")
+
+    # gpad-daemon records drive tickpad; the hat resets on every non-hat event.
+    fifo = b"  48  200\0  57    2\0   2    1\0  49  -10\0"
+    events = list(replay.read_fifo(fifo))
+    assert events == [(48, 200), (57, 2), (2, 1), (49, -10)], events
+    emu = replay.Emulator(load("gamepad.se"))
+    for usage, value in events:
+        emu.tickpad(usage, value)
+    reports = [replay.report_state(r) for r in emu.reports]
+    assert reports[0]["left_x"] == 200 and reports[0]["buttons1"] & 0xF == 8, reports[0]
+    assert reports[1]["buttons1"] & 0xF == 2, reports[1]
+    assert reports[2]["buttons1"] == 0x20 | 8, reports[2]
+    assert reports[3]["left_y"] == 0 and [r["buttons3"] >> 2 for r in reports] == [0, 1, 2, 3], reports
+    print("PASS: FIFO records replay through tickpad")
+
+    # Keyboard: w holds leftY at -1, releasing it recenters.
+    emu = replay.Emulator(load("example.se"))
+    replay.apply_event(emu, {"t": 0.0, "type": "keyDown", "key": "w"})
+    assert replay.report_state(emu.reports[-1])["left_y"] == 1, emu.reports[-1]
+    replay.apply_event(emu, {"t": 0.01, "type": "keyUp", "key": "w"})
+    assert replay.report_state(emu.reports[-1])["left_y"] == 128, emu.reports[-1]
+
+    # Mouse motion deflects the mouseLook stick, then decays back to center in a finite chain of ticks.
+    replay.apply_event(emu, {"t": 1.0, "type": "mouseMoved", "x": 0, "y": 0})
+    before = emu.ticks
+    emu.reports = []
+    replay.apply_event(emu, {"t": 1.01, "type": "mouseMoved", "x": 0.05, "y": 0})
+    assert replay.report_state(emu.reports[0])["right_x"] == 0, emu.reports[0]
+    assert emu.state["rightX"] == 0 and emu.state["rightY"] == 0, emu.state
+    assert emu.ticks - before > 4, emu.ticks - before
+    print("PASS: keyboard and mouseLook replay")
+
+    # The CLI summary covers latency, throughput and the final report.
+    with tempfile.TemporaryDirectory() as td:
+        timeline = os.path.join(td, "timeline.ndjson")
+        stdout = sys.stdout
+        sys.stdout = io.StringIO()
+        try:
+            assert replay.main([os.path.join(REPO_ROOT, "example.se"), "--synthetic", "500", "--timeline", timeline]) == 0
+            summary = json.loads(sys.stdout.getvalue())
+        finally:
+            sys.stdout = stdout
+        with open(timeline, encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f]
+    assert summary["events"] == 500 and summary["reports"] == len(lines) >= 500, summary
+    assert set(summary["latency_us"]) == {"p50", "p95", "p99", "max"}, summary
+    assert summary["final"] == {k: v for k, v in lines[-1].items() if k not in ("event", "t", "type")}, summary
+    print("PASS: replay CLI summary and timeline")
+
+    # The CLI lowers the profile file like shockemu.py: a key bound twice keeps its last
+    # binding and the shadowed one is reported by line.
+    with tempfile.TemporaryDirectory() as td:
+        profile = os.path.join(td, "shadowed.se")
+        trace = os.path.join(td, "trace.ndjson")
+        with open(profile, "w", encoding="utf-8") as f:
+            f.write("w = leftY-\nw = X\nleftMouse = R2\n")
+        with open(trace, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"t": 0.0, "type": "keyDown", "key": "w"}) + "\n")
+        stdout = sys.stdout
+        sys.stdout = io.StringIO()
+        try:
+            assert replay.main([profile, "--trace", trace]) == 0
+            summary = json.loads(sys.stdout.getvalue())
+        finally:
+            sys.stdout = stdout
+    assert summary["warnings"] == ["Conflict: line 1 (w = leftY-) is shadowed by line 2 (w = X)"], summary["warnings"]
+    assert summary["final"]["buttons1"] == 0x20 | 8 and summary["final"]["left_y"] == 128, summary["final"]
+    print("PASS: replay CLI reports shadowed bindings like shockemu.py")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+DEFAULT_CONCURRENCY = 8
+
+
+class KeyedExecutor:
+    # Runs blocking jobs (the scripts' live_action calls) on worker threads from an asyncio
+    # loop. Jobs with different keys run concurrently, up to `concurrency` at a time; jobs
+    # that share a key run one after another in submission order. A key of None has no
+    # ordering constraint.
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY):
+        self.concurrency = concurrency
+        self.slots = asyncio.Semaphore(concurrency)
+        self.tails = {}
+        self.threads = ThreadPoolExecutor(max_workers=concurrency)
+        self.counters = {"submitted": 0, "waited_on_key": 0, "max_in_flight": 0}
+        self.in_flight = 0
+
+    def submit(self, key, fn, *args):
+        self.counters["submitted"] += 1
+        previous = self.tails.get(key) if key is not None else None
+        if previous is not None:
+            self.counters["waited_on_key"] += 1
+        task = asyncio.ensure_future(self._run(previous, fn, args))
+        if key is not None:
+            self.tails[key] = task
+            task.add_done_callback(lambda done: self.tails.get(key) is done and self.tails.pop(key))
+        return task
+
+    async def _run(self, previous, fn, args):
+        if previous is not None:
+            # Only the order matters here; the previous job's own errors are its caller's.
+            await asyncio.wait([previous])
+        async with self.slots:
+            self.in_flight += 1
+            self.counters["max_in_flight"] = max(self.counters["max_in_flight"], self.in_flight)
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self.threads, fn, *args)
+            finally:
+                self.in_flight -= 1
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats["concurrency"] = self.concurrency
+        return stats
+
+    def close(self):
+        self.threads.shutdown(wait=True)
@@ -3,7 +3,11 @@ import argparse
 import json
 import os
 import sys
-from urllib import error, request
+from urllib import error
+
+import http_pool
+import rate_limit
+import schema_cache
 
 
 NOTION_VERSION = "2022-06-28"
@@ -66,13 +70,7 @@ def notion_request(method, url, token, payload=None):
         "Content-Type": "application/json",
         "User-Agent": "bootstrap-notion-schema",
     }
-    data = None
-    if payload is not None:
-        data = json.dumps(payload).encode("utf-8")
-    req = request.Request(url=url, method=method, headers=headers, data=data)
-    with request.urlopen(req, timeout=30) as resp:
-        body = resp.read().decode("utf-8")
-        return json.loads(body) if body else {}
+    return http_pool.request_json(method, url, headers, payload, timeout=30)
 
 
 def read_error(exc):
@@ -85,7 +83,7 @@ def read_error(exc):
     return {"message": str(exc)}
 
 
-def ensure_props(db_id, target_props, token, notion_api_base, dry_run):
+def ensure_props(db_id, target_props, token, notion_api_base, dry_run, cache):
     db_url = "{0}/v1/databases/{1}".format(notion_api_base.rstrip("/"), db_id)
     db = notion_request("GET", db_url, token)
     existing = db.get("properties", {})
@@ -104,6 +102,8 @@ def ensure_props(db_id, target_props, token, notion_api_base, dry_run):
         return {"added": sorted(add_props.keys()), "updated": False}
 
     notion_request("PATCH", db_url, token, {"properties": add_props})
+    # event2/3 must not keep resolving properties from the schema before the PATCH.
+    cache.invalidate(db_id)
     return {"added": sorted(add_props.keys()), "updated": True}
 
 
@@ -111,7 +111,14 @@ def main():
     parser = argparse.ArgumentParser(description="Bootstrap required Notion DB properties for Event2/3")
     parser.add_argument("--mode", choices=["dry-run", "live"], default="dry-run")
     parser.add_argument("--notion-api-base", default=DEFAULT_NOTION_API_BASE)
+    parser.add_argument("--notion-rps", type=float, default=rate_limit.DEFAULT_NOTION_RPS)
+    parser.add_argument(
+        "--schema-cache",
+        default=schema_cache.DEFAULT_SCHEMA_CACHE_PATH,
+        help="event2/3 schema cache to invalidate for databases that get new properties",
+    )
     args = parser.parse_args()
+    rate_limit.configure(args.notion_api_base, max(0.0, args.notion_rps))
 
     token = os.getenv("NOTION_TOKEN", "")
     knowledge_db_id = os.getenv("NOTION_KNOWLEDGE_DB_ID", "")
@@ -129,10 +136,11 @@ def main():
         return 1
 
     dry_run = args.mode == "dry-run"
+    cache = schema_cache.SchemaCache(args.schema_cache)
 
     try:
-        k = ensure_props(knowledge_db_id, KNOWLEDGE_PROPERTIES, token, args.notion_api_base, dry_run)
-        t = ensure_props(tasks_db_id, TASK_PROPERTIES, token, args.notion_api_base, dry_run)
+        k = ensure_props(knowledge_db_id, KNOWLEDGE_PROPERTIES, token, args.notion_api_base, dry_run, cache)
+        t = ensure_props(tasks_db_id, TASK_PROPERTIES, token, args.notion_api_base, dry_run, cache)
     except error.HTTPError as exc:
         print(
             json.dumps(
@@ -153,6 +161,8 @@ def main():
                 "mode": args.mode,
                 "knowledge_db": k,
                 "tasks_db": t,
+                "http": http_pool.stats(),
+                "rate_limit": rate_limit.stats(),
             },
             ensure_ascii=True,
             indent=2,
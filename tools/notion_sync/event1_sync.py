@@ -5,19 +5,32 @@ import os
 import re
 import socket
 import sys
+import threading
 import time
 from datetime import datetime, timezone
-from urllib import error, parse, request
+from urllib import error, parse
+
+import http_pool
+import issue_index
+import event_queue
+import ndjson_batch
+import rate_limit
+import state_store
+import write_fingerprints
 
 
 TASK_KEY_RE = re.compile(r"^TSK-[0-9]{8}-[0-9]{4}$")
 LABEL_RE = re.compile(r"^taskkey:TSK-[0-9]{8}-[0-9]{4}$")
+SYNCED_AT_RE = re.compile(r"^SyncedAtUTC: .*$", re.MULTILINE)
 ALLOWED_EVENTS = {"notion.task.created", "notion.task.updated"}
 RETRYABLE_HTTP_STATUS = {408, 425, 429, 500, 502, 503, 504}
 DEFAULT_MAX_RETRIES = 3
 DEFAULT_BACKOFF_BASE_SEC = 1.0
 DEFAULT_BACKOFF_FACTOR = 2.0
 DEFAULT_GITHUB_API_BASE = "https://api.github.com"
+# Guards opening the state stores and the dry-run check-then-create when --concurrency
+# runs events on several threads; the stores lock their own reads and writes.
+STATE_LOCK = threading.Lock()
 
 
 def load_json(path):
@@ -25,28 +38,14 @@ def load_json(path):
         return json.load(f)
 
 
-def save_json(path, data):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=True, indent=2, sort_keys=True)
-
-
 def load_state(path):
-    if not os.path.exists(path):
-        return {"issues_by_task_key": {}}
-    data = load_json(path)
-    if "issues_by_task_key" not in data or not isinstance(data["issues_by_task_key"], dict):
-        return {"issues_by_task_key": {}}
-    return data
+    # task_key -> simulated issue id (or a list of them, to simulate duplicates)
+    return state_store.open_store(path, "issues_by_task_key")
 
 
 def load_live_state(path):
-    if not os.path.exists(path):
-        return {"issue_number_by_task_key": {}}
-    data = load_json(path)
-    if "issue_number_by_task_key" not in data or not isinstance(data["issue_number_by_task_key"], dict):
-        return {"issue_number_by_task_key": {}}
-    return data
+    # task_key -> issue number; the backend follows the file name (JSON or SQLite).
+    return state_store.open_store(path, "issue_number_by_task_key")
 
 
 def make_error(task_key, reason, extra=None):
@@ -160,7 +159,7 @@ def normalize_event(event):
 
 def dry_run_action(norm, state):
     task_key = norm["task_key"]
-    matched = state["issues_by_task_key"].get(task_key)
+    matched = state.get(task_key)
 
     if isinstance(matched, list):
         if len(matched) >= 2:
@@ -184,7 +183,7 @@ def dry_run_action(norm, state):
         action["matched_issue"] = matched_issue
     else:
         issue_id = "SIM-{0}".format(task_key)
-        state["issues_by_task_key"][task_key] = issue_id
+        state.put(task_key, issue_id)
         action["operation"] = "create"
         action["matched_issue"] = issue_id
 
@@ -208,25 +207,20 @@ def github_request(method, url, token, data=None):
         "X-GitHub-Api-Version": "2022-11-28",
         "User-Agent": "event1-sync-script",
     }
-    body = None
     if data is not None:
-        body = json.dumps(data).encode("utf-8")
         headers["Content-Type"] = "application/json"
-
-    req = request.Request(url=url, method=method, headers=headers, data=body)
-    with request.urlopen(req, timeout=30) as resp:
-        payload = resp.read().decode("utf-8")
-        return json.loads(payload) if payload else {}
+    return http_pool.request_json(method, url, headers, data, timeout=30)
 
 
 def _is_retryable_http_error(exc):
-    return isinstance(exc, error.HTTPError) and exc.code in RETRYABLE_HTTP_STATUS
+    return isinstance(exc, error.HTTPError) and (exc.code in RETRYABLE_HTTP_STATUS or rate_limit.is_rate_limited(exc))
 
 
 def _is_retryable_network_error(exc):
     if isinstance(exc, TimeoutError):
         return True
-    if isinstance(exc, error.URLError):
+    # HTTPError is a URLError too; its status decides via _is_retryable_http_error.
+    if isinstance(exc, error.URLError) and not isinstance(exc, error.HTTPError):
         return True
     if isinstance(exc, socket.timeout):
         return True
@@ -246,39 +240,112 @@ def _request_with_retry(method, url, token, retry_policy, data=None):
             retryable = _is_retryable_http_error(exc) or _is_retryable_network_error(exc)
             if (not retryable) or attempt >= max_retries:
                 raise
-            sleep_sec = backoff_base_sec * (backoff_factor ** attempt)
-            time.sleep(sleep_sec)
+            if not rate_limit.has_wait_hint(exc):
+                sleep_sec = backoff_base_sec * (backoff_factor ** attempt)
+                time.sleep(sleep_sec)
             retries_used += 1
 
     raise RuntimeError("request retry loop failed unexpectedly")
 
 
-def live_action(norm, cfg, retry_policy, github_api_base, live_state):
+def _issue_action(norm, operation, query, issue_number, issue, retries, retry_policy, lookup):
+    retry = {"list": 0, "search": 0, "write": 0}
+    retry.update(retries)
+    retry["policy"] = retry_policy
+    return {
+        "target": "github.issue",
+        "operation": operation,
+        "task_key": norm["task_key"],
+        "idempotency_key": norm["task_key"],
+        "search_query": query,
+        "matched_issue": "ISSUE-{0}".format(issue_number),
+        "issue_number": issue_number,
+        "issue_url": issue.get("html_url", ""),
+        "lookup": lookup,
+        "fields": norm["fields"],
+        "ignored_fields": norm["ignored_fields"],
+        "timestamp_utc": norm["timestamp_utc"],
+        "retry": retry,
+    }
+
+
+def _mapping_mismatch(issue, issue_number):
+    # The PATCH landed, but not on the issue the mapping was made for.
+    if "pull_request" in issue:
+        return "pull_request"
+    if issue.get("number") != issue_number:
+        return "number_changed"
+    return None
+
+
+def live_action(norm, cfg, retry_policy, github_api_base, live_state, cache_first=False, index=None):
     task_key = norm["task_key"]
     owner = cfg["github_owner"]
     repo = cfg["github_repo"]
     token = cfg["github_token"]
+    api_base = github_api_base.rstrip("/")
 
     query = "repo:{0}/{1} is:issue label:{2}".format(owner, repo, norm["label"])
     list_url = "{0}/repos/{1}/{2}/issues?state=all&labels={3}&per_page=100".format(
-        github_api_base.rstrip("/"),
+        api_base,
         owner,
         repo,
         parse.quote(norm["label"], safe=""),
     )
     encoded_query = parse.quote(query, safe="")
-    search_url = "{0}/search/issues?q={1}".format(github_api_base.rstrip("/"), encoded_query)
+    search_url = "{0}/search/issues?q={1}".format(api_base, encoded_query)
 
-    try:
+    payload = {
+        "title": norm["fields"]["issue.title"],
+        "body": norm["fields"]["issue.body"],
+        "labels": norm["fields"]["issue.labels"],
+    }
+
+    def list_or_search():
         listed, list_retries = _request_with_retry("GET", list_url, token, retry_policy)
-        if isinstance(listed, list):
-            items = listed
-        else:
-            items = []
+        items = listed if isinstance(listed, list) else []
         search_retries = 0
         if len(items) == 0:
             result, search_retries = _request_with_retry("GET", search_url, token, retry_policy)
             items = result.get("items", [])
+        return items, list_retries, search_retries
+
+    mapped_issue_number = live_state.get(task_key)
+    cache_fallback = None
+    if cache_first and mapped_issue_number:
+        # Steady state: one PATCH on the cached number. Duplicates are left to --reconcile.
+        mapped_update_url = "{0}/repos/{1}/{2}/issues/{3}".format(api_base, owner, repo, mapped_issue_number)
+        try:
+            updated, write_retries = _request_with_retry("PATCH", mapped_update_url, token, retry_policy, payload)
+            cache_fallback = _mapping_mismatch(updated, mapped_issue_number)
+        except error.HTTPError as exc:
+            if exc.code not in (301, 404, 410):
+                return make_error(task_key, "github_write_http_error", {"http_status": exc.code})
+            cache_fallback = "not_found" if exc.code == 404 else "moved"
+        except Exception as exc:
+            return make_error(task_key, "github_write_error", {"detail": str(exc)})
+        if cache_fallback is None:
+            if index is not None:
+                index.record(updated)
+            return _issue_action(
+                norm, "update", query, mapped_issue_number, updated, {"write": write_retries}, retry_policy, "cache"
+            )
+        live_state.pop(task_key)
+        if index is not None:
+            index.forget(mapped_issue_number)
+        mapped_issue_number = None
+
+    lookup = "search"
+    list_retries = 0
+    search_retries = 0
+    try:
+        if index is not None:
+            # Zero API calls unless the index is older than its max age.
+            lookup = "index"
+            index.refresh(lambda page, since: _list_issues_page(cfg, retry_policy, github_api_base, page, since))
+            items = [{"number": number} for number in index.lookup(task_key)]
+        else:
+            items, list_retries, search_retries = list_or_search()
     except error.HTTPError as exc:
         return make_error(task_key, "github_search_http_error", {"http_status": exc.code})
     except Exception as exc:
@@ -287,112 +354,366 @@ def live_action(norm, cfg, retry_policy, github_api_base, live_state):
     if len(items) >= 2:
         return make_error(task_key, "duplicate_issue_match", {"match_count": len(items)})
 
-    payload = {
-        "title": norm["fields"]["issue.title"],
-        "body": norm["fields"]["issue.body"],
-        "labels": norm["fields"]["issue.labels"],
-    }
-
-    mapped_issue_number = live_state.get("issue_number_by_task_key", {}).get(task_key)
+    retries = {"list": list_retries, "search": search_retries}
+    action = None
     if mapped_issue_number:
-        mapped_update_url = "{0}/repos/{1}/{2}/issues/{3}".format(
-            github_api_base.rstrip("/"),
-            owner,
-            repo,
-            mapped_issue_number,
-        )
+        mapped_update_url = "{0}/repos/{1}/{2}/issues/{3}".format(api_base, owner, repo, mapped_issue_number)
         try:
-            updated, write_retries = _request_with_retry("PATCH", mapped_update_url, token, retry_policy, payload)
-            return {
-                "target": "github.issue",
-                "operation": "update",
-                "task_key": task_key,
-                "idempotency_key": task_key,
-                "search_query": query,
-                "matched_issue": "ISSUE-{0}".format(mapped_issue_number),
-                "issue_number": mapped_issue_number,
-                "issue_url": updated.get("html_url", ""),
-                "fields": norm["fields"],
-                "ignored_fields": norm["ignored_fields"],
-                "timestamp_utc": norm["timestamp_utc"],
-                "retry": {
-                    "list": list_retries,
-                    "search": search_retries,
-                    "write": write_retries,
-                    "policy": retry_policy,
-                },
-            }
+            updated, retries["write"] = _request_with_retry("PATCH", mapped_update_url, token, retry_policy, payload)
+            action = _issue_action(norm, "update", query, mapped_issue_number, updated, retries, retry_policy, lookup)
+            written = updated
         except error.HTTPError as exc:
             if exc.code == 404:
-                live_state.get("issue_number_by_task_key", {}).pop(task_key, None)
+                live_state.pop(task_key)
+                if index is not None:
+                    index.forget(mapped_issue_number)
             else:
                 return make_error(task_key, "github_write_http_error", {"http_status": exc.code})
         except Exception as exc:
             return make_error(task_key, "github_write_error", {"detail": str(exc)})
 
+    if action is None and lookup == "index" and len(items) == 1:
+        issue_number = items[0]["number"]
+        update_url = "{0}/repos/{1}/{2}/issues/{3}".format(api_base, owner, repo, issue_number)
+        evicted = False
+        try:
+            updated, retries["write"] = _request_with_retry("PATCH", update_url, token, retry_policy, payload)
+        except error.HTTPError as exc:
+            if exc.code not in (301, 404, 410):
+                return make_error(task_key, "github_write_http_error", {"http_status": exc.code})
+            evicted = True
+        except Exception as exc:
+            return make_error(task_key, "github_write_error", {"detail": str(exc)})
+        if not evicted:
+            if cache_first:
+                live_state.put(task_key, issue_number)
+            action = _issue_action(norm, "update", query, issue_number, updated, retries, retry_policy, lookup)
+            written = updated
+        else:
+            # Deleted or transferred since the index saw it: drop the entry and look the
+            # task up by label, as without an index.
+            index.forget(issue_number)
+            lookup = "search"
+            try:
+                items, retries["list"], retries["search"] = list_or_search()
+            except error.HTTPError as exc:
+                return make_error(task_key, "github_search_http_error", {"http_status": exc.code})
+            except Exception as exc:
+                return make_error(task_key, "github_search_error", {"detail": str(exc)})
+            if len(items) >= 2:
+                return make_error(task_key, "duplicate_issue_match", {"match_count": len(items)})
+
     try:
-        if len(items) == 1:
+        if action is None and len(items) == 1:
             issue_number = items[0]["number"]
-            update_url = "{0}/repos/{1}/{2}/issues/{3}".format(github_api_base.rstrip("/"), owner, repo, issue_number)
-            updated, write_retries = _request_with_retry("PATCH", update_url, token, retry_policy, payload)
-            return {
-                "target": "github.issue",
-                "operation": "update",
-                "task_key": task_key,
-                "idempotency_key": task_key,
-                "search_query": query,
-                "matched_issue": "ISSUE-{0}".format(issue_number),
-                "issue_number": issue_number,
-                "issue_url": updated.get("html_url", ""),
-                "fields": norm["fields"],
-                "ignored_fields": norm["ignored_fields"],
-                "timestamp_utc": norm["timestamp_utc"],
-                "retry": {
-                    "list": list_retries,
-                    "search": search_retries,
-                    "write": write_retries,
-                    "policy": retry_policy,
-                },
-            }
-
-        create_url = "{0}/repos/{1}/{2}/issues".format(github_api_base.rstrip("/"), owner, repo)
-        created, write_retries = _request_with_retry("POST", create_url, token, retry_policy, payload)
-        issue_number = created.get("number")
-        if issue_number:
-            live_state.setdefault("issue_number_by_task_key", {})[task_key] = issue_number
-        return {
-            "target": "github.issue",
-            "operation": "create",
-            "task_key": task_key,
-            "idempotency_key": task_key,
-            "search_query": query,
-            "matched_issue": "ISSUE-{0}".format(issue_number),
-            "issue_number": issue_number,
-            "issue_url": created.get("html_url", ""),
-            "fields": norm["fields"],
-            "ignored_fields": norm["ignored_fields"],
-            "timestamp_utc": norm["timestamp_utc"],
-            "retry": {
-                "list": list_retries,
-                "search": search_retries,
-                "write": write_retries,
-                "policy": retry_policy,
-            },
-        }
+            update_url = "{0}/repos/{1}/{2}/issues/{3}".format(api_base, owner, repo, issue_number)
+            updated, retries["write"] = _request_with_retry("PATCH", update_url, token, retry_policy, payload)
+            if cache_first:
+                live_state.put(task_key, issue_number)
+            action = _issue_action(norm, "update", query, issue_number, updated, retries, retry_policy, lookup)
+            written = updated
+        elif action is None:
+            create_url = "{0}/repos/{1}/{2}/issues".format(api_base, owner, repo)
+            created, retries["write"] = _request_with_retry("POST", create_url, token, retry_policy, payload)
+            issue_number = created.get("number")
+            if issue_number:
+                live_state.put(task_key, issue_number)
+            action = _issue_action(norm, "create", query, issue_number, created, retries, retry_policy, lookup)
+            written = created
     except error.HTTPError as exc:
         return make_error(task_key, "github_write_http_error", {"http_status": exc.code})
     except Exception as exc:
         return make_error(task_key, "github_write_error", {"detail": str(exc)})
 
+    if index is not None:
+        index.record(written)
+        action["issue_index"] = index.stats()
+    if cache_fallback:
+        action["cache_fallback"] = cache_fallback
+    return action
 
-def main():
+
+def _list_issues_page(cfg, retry_policy, github_api_base, page, since):
+    # One page of every issue in the repo; with since, only those updated since then.
+    url = "{0}/repos/{1}/{2}/issues?state=all&per_page={3}&page={4}".format(
+        github_api_base.rstrip("/"), cfg["github_owner"], cfg["github_repo"], issue_index.PAGE_SIZE, page
+    )
+    if since:
+        url += "&sort=updated&direction=asc&since={0}".format(parse.quote(since, safe=""))
+    else:
+        # Oldest first: issues created during the scan land on the last page instead of
+        # shifting the pages not fetched yet (GitHub's default is newest first).
+        url += "&sort=created&direction=asc"
+    items, _ = _request_with_retry("GET", url, cfg["github_token"], retry_policy)
+    return items if isinstance(items, list) else []
+
+
+def reconcile(cfg, retry_policy, github_api_base, live_state, index=None):
+    # Background pass for --cache-first: refresh the issue index (a full listing when
+    # there is none yet), then find duplicate taskkey labels and repair issue_number_by_task_key.
+    if index is None:
+        index = issue_index.IssueIndex(None, "{0}/{1}".format(cfg["github_owner"], cfg["github_repo"]))
+    seen = index.stats()["issues_seen"]
+    pages = index.refresh(lambda page, since: _list_issues_page(cfg, retry_policy, github_api_base, page, since), force=True)
+    scanned = index.stats()["issues_seen"] - seen
+    found = index.by_task_key()
+
+    duplicates = {}
+    remapped = {}
+    added = []
+    dropped = []
+    mapping = dict(live_state.items())
+    for task_key, numbers in sorted(found.items()):
+        numbers = sorted(numbers)
+        mapped = mapping.get(task_key)
+        if len(numbers) >= 2:
+            duplicates[task_key] = numbers
+            if mapped is not None and mapped not in numbers:
+                live_state.pop(task_key)
+                dropped.append(task_key)
+        elif mapped is None:
+            live_state.put(task_key, numbers[0])
+            added.append(task_key)
+        elif mapped != numbers[0]:
+            live_state.put(task_key, numbers[0])
+            remapped[task_key] = {"from": mapped, "to": numbers[0]}
+    for task_key in sorted(set(mapping) - set(found)):
+        live_state.pop(task_key)
+        dropped.append(task_key)
+    reconciled_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    live_state.set_meta("reconciled_at_utc", reconciled_at)
+
+    return {
+        "target": "github.issue",
+        "operation": "reconcile",
+        "pages": pages,
+        "issues_scanned": scanned,
+        "task_keys": len(found),
+        "duplicates": duplicates,
+        "remapped": remapped,
+        "added": added,
+        "dropped": dropped,
+        "reconciled_at_utc": reconciled_at,
+    }
+
+
+def idempotency_key(event):
+    # Events with the same key are applied in input order by --concurrency.
+    norm, _ = normalize_event(event)
+    return norm["task_key"] if norm else None
+
+
+def write_fingerprint(norm):
+    # The issue payload without the SyncedAtUTC line, which changes on every event.
+    return write_fingerprints.digest(
+        {
+            "title": norm["fields"]["issue.title"],
+            "body": SYNCED_AT_RE.sub("SyncedAtUTC:", norm["fields"]["issue.body"]),
+            "labels": norm["fields"]["issue.labels"],
+        }
+    )
+
+
+def noop_action(norm, last, fingerprints):
+    return {
+        "target": "github.issue",
+        "operation": "noop",
+        "task_key": norm["task_key"],
+        "idempotency_key": norm["task_key"],
+        "matched_issue": "ISSUE-{0}".format(last["target"]),
+        "issue_number": last["target"],
+        "issue_url": last["url"],
+        "fingerprint": last["fingerprint"],
+        "fields": norm["fields"],
+        "timestamp_utc": norm["timestamp_utc"],
+        "fingerprints": fingerprints.stats(),
+    }
+
+
+def open_fingerprints(args, cfg):
+    if not args.skip_unchanged:
+        return None
+    scope = "github.issue:{0}/{1}".format(cfg["github_owner"], cfg["github_repo"])
+    return write_fingerprints.FingerprintStore(args.skip_unchanged, scope)
+
+
+def open_issue_index(args, cfg):
+    if not args.issue_index:
+        return None
+    repo = "{0}/{1}".format(cfg["github_owner"], cfg["github_repo"])
+    return issue_index.IssueIndex(args.issue_index, repo, args.issue_index_max_age_sec)
+
+
+def close_stores(context):
+    # A JSON issue index or fingerprint file is written here, once per run.
+    with STATE_LOCK:
+        stores = [context.pop(name) for name in ("index", "fingerprints") if context.get(name) is not None]
+    for store in stores:
+        store.close()
+
+
+def run_event(event, args, retry_policy, context):
+    # context keeps the loaded state files across the events of one process.
+    norm, err = normalize_event(event)
+    if err:
+        return err
+
+    if args.mode == "dry-run":
+        with STATE_LOCK:
+            if "state" not in context:
+                context["state"] = load_state(args.state)
+            action = dry_run_action(norm, context["state"])
+            if action.get("operation") != "error":
+                context["state"].flush()
+        return action
+
+    cfg, missing = read_live_config()
+    if missing:
+        return make_error(norm["task_key"], "missing_live_config", {"missing": missing})
+    with STATE_LOCK:
+        if "live_state" not in context:
+            context["live_state"] = load_live_state(args.live_state)
+            context["index"] = open_issue_index(args, cfg)
+            context["fingerprints"] = open_fingerprints(args, cfg)
+    fingerprints = context["fingerprints"]
+    if fingerprints is not None:
+        # Same content as the last write for this task key: no lookup, no PATCH.
+        fingerprint = write_fingerprint(norm)
+        last = fingerprints.unchanged(norm["task_key"], fingerprint)
+        if last is not None:
+            return noop_action(norm, last, fingerprints)
+    action = live_action(
+        norm, cfg, retry_policy, args.github_api_base, context["live_state"], args.cache_first, context["index"]
+    )
+    action["rate_limit"] = rate_limit.report()
+    if action.get("operation") in {"create", "update"}:
+        context["live_state"].flush()
+        if fingerprints is not None:
+            fingerprints.record(norm["task_key"], fingerprint, action["issue_number"], action["issue_url"])
+            action["fingerprints"] = fingerprints.stats()
+    elif fingerprints is not None:
+        # What the issue holds after a failed write is unknown.
+        fingerprints.forget(norm["task_key"])
+    return action
+
+
+def run_reconcile(args, retry_policy):
+    if args.mode != "live":
+        print(json.dumps(make_error("", "reconcile_requires_live_mode"), ensure_ascii=True, indent=2))
+        return 2
+    cfg, missing = read_live_config()
+    if missing:
+        print(json.dumps(make_error("", "missing_live_config", {"missing": missing}), ensure_ascii=True, indent=2))
+        return 1
+    live_state = load_live_state(args.live_state)
+    index = open_issue_index(args, cfg)
+    try:
+        result = reconcile(cfg, retry_policy, args.github_api_base, live_state, index)
+    except error.HTTPError as exc:
+        print(json.dumps(make_error("", "github_list_http_error", {"http_status": exc.code}), ensure_ascii=True, indent=2))
+        return 1
+    except Exception as exc:
+        print(json.dumps(make_error("", "github_list_error", {"detail": str(exc)}), ensure_ascii=True, indent=2))
+        return 1
+    finally:
+        if index is not None:
+            index.close()
+    live_state.flush()
+    live_state.close()
+    result["http"] = http_pool.stats()
+    result["rate_limit"] = rate_limit.report()
+    print(json.dumps(result, ensure_ascii=True, indent=2, sort_keys=True))
+    return 1 if result["duplicates"] else 0
+
+
+def run_queue(args, process):
+    if args.concurrency < 1 or args.queue_lease_sec <= 0 or args.queue_max_attempts < 1:
+        print(json.dumps(make_error("", "invalid_queue_options"), ensure_ascii=True, indent=2))
+        return 2
+    if args.drain and args.mode != "live":
+        print(json.dumps(make_error("", "drain_requires_live_mode"), ensure_ascii=True, indent=2))
+        return 2
+    queue = event_queue.EventQueue(args.queue)
+    try:
+        if args.enqueue:
+            return event_queue.enqueue_file(
+                queue, args.enqueue, "github.issue", idempotency_key, lambda reason, extra=None: make_error("", reason, extra)
+            )
+        http_pool.POOL.max_per_host = max(http_pool.POOL.max_per_host, args.concurrency)
+        return event_queue.drain(
+            queue,
+            "github.issue",
+            process,
+            lambda reason, extra=None: make_error("", reason, extra),
+            lambda event: normalize_event(event)[1] is not None,
+            lambda: {"http": http_pool.stats(), "rate_limit": rate_limit.stats()},
+            args.concurrency,
+            args.queue_lease_sec,
+            args.queue_max_attempts,
+            args.follow,
+        )
+    finally:
+        queue.close()
+
+
+def build_parser():
     parser = argparse.ArgumentParser(description="Event1 Notion->GitHub issue sync (dry-run/live)")
-    parser.add_argument("--event", required=True, help="Input event JSON path")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--event", help="Input event JSON path")
+    source.add_argument(
+        "--events-ndjson",
+        help="NDJSON file of input events ('-' for stdin); prints one action line per event and a summary line",
+    )
+    source.add_argument(
+        "--enqueue",
+        help="Append the events of an NDJSON file ('-' for stdin) to --queue instead of processing them",
+    )
+    source.add_argument(
+        "--drain",
+        action="store_true",
+        help="Live only: process the events waiting in --queue (lease, ack, retry with delay, dead-letter)",
+    )
+    source.add_argument(
+        "--reconcile",
+        action="store_true",
+        help="Live only: scan all issues once, report duplicate taskkey labels and repair the live-state mapping",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="With --events-ndjson: events with different idempotency keys processed at once (same key stays in order)",
+    )
+    parser.add_argument(
+        "--coalesce-window-sec",
+        type=float,
+        default=0.0,
+        help="With --events-ndjson: hold events per idempotency key this long and apply only the latest "
+        "(terminal events are never dropped; 0 disables)",
+    )
+    parser.add_argument(
+        "--queue",
+        default=event_queue.DEFAULT_QUEUE_PATH,
+        help="Durable event queue (SQLite) for --enqueue/--drain",
+    )
+    parser.add_argument(
+        "--queue-lease-sec",
+        type=float,
+        default=event_queue.DEFAULT_LEASE_SEC,
+        help="With --drain: an event not acked within this long (worker crash) is leased again",
+    )
+    parser.add_argument(
+        "--queue-max-attempts",
+        type=int,
+        default=event_queue.DEFAULT_MAX_ATTEMPTS,
+        help="With --drain: attempts before a failing event is dead-lettered",
+    )
+    parser.add_argument("--follow", action="store_true", help="With --drain: keep polling when the queue is empty")
     parser.add_argument("--mode", choices=["dry-run", "live"], default="dry-run")
     parser.add_argument(
         "--state",
         default="tools/notion_sync/.dry_run_state.json",
-        help="State JSON path for dry-run idempotency simulation",
+        help="State path for dry-run idempotency simulation (*.sqlite3/*.sqlite/*.db: SQLite, else JSON)",
     )
     parser.add_argument("--reset-state", action="store_true", help="Reset dry-run state before processing")
     parser.add_argument("--check-config", action="store_true", help="Validate live mode env config and exit")
@@ -422,9 +743,38 @@ def main():
     parser.add_argument(
         "--live-state",
         default="tools/notion_sync/.live_state.json",
-        help="Local live idempotency cache path",
+        help="Local live idempotency cache path (*.sqlite3/*.sqlite/*.db: SQLite, else JSON)",
+    )
+    parser.add_argument(
+        "--cache-first",
+        action="store_true",
+        help="PATCH the issue number cached in --live-state without list/search; falls back on 404/mismatch",
+    )
+    parser.add_argument(
+        "--issue-index",
+        nargs="?",
+        const=issue_index.DEFAULT_ISSUE_INDEX_PATH,
+        help="Look task keys up in a local index of taskkey-labeled issues instead of list/search "
+        "(default path: {0})".format(issue_index.DEFAULT_ISSUE_INDEX_PATH),
+    )
+    parser.add_argument(
+        "--issue-index-max-age-sec",
+        type=float,
+        default=issue_index.DEFAULT_MAX_AGE_SEC,
+        help="Refresh the issue index incrementally (since=) when it is older than this",
+    )
+    parser.add_argument(
+        "--skip-unchanged",
+        nargs="?",
+        const=write_fingerprints.DEFAULT_FINGERPRINTS_PATH,
+        help="Skip the write (operation: noop) when title/body/labels match the last write for the task key "
+        "(default path: {0})".format(write_fingerprints.DEFAULT_FINGERPRINTS_PATH),
     )
-    args = parser.parse_args()
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
 
     if args.max_retries < 0:
         print(json.dumps(make_error("", "invalid_max_retries"), ensure_ascii=True, indent=2))
@@ -439,8 +789,8 @@ def main():
         "backoff_factor": args.backoff_factor,
     }
 
-    if args.mode == "dry-run" and args.reset_state and os.path.exists(args.state):
-        os.remove(args.state)
+    if args.mode == "dry-run" and args.reset_state:
+        state_store.remove(args.state)
 
     if args.mode == "live" and args.check_config:
         cfg, missing = read_live_config()
@@ -463,34 +813,47 @@ def main():
         )
         return 0
 
+    if args.reconcile:
+        return run_reconcile(args, retry_policy)
+
+    context = {}
     try:
-        event = load_json(args.event)
-    except Exception as exc:
-        print(json.dumps(make_error("", "invalid_event_json:{0}".format(str(exc))), ensure_ascii=True, indent=2))
-        return 2
+        if args.enqueue or args.drain:
+            return run_queue(args, lambda event: run_event(event, args, retry_policy, context))
+        if args.events_ndjson:
+            if args.concurrency < 1:
+                print(json.dumps(make_error("", "invalid_concurrency"), ensure_ascii=True, indent=2))
+                return 2
+            if args.coalesce_window_sec < 0:
+                print(json.dumps(make_error("", "invalid_coalesce_window"), ensure_ascii=True, indent=2))
+                return 2
+            http_pool.POOL.max_per_host = max(http_pool.POOL.max_per_host, args.concurrency)
+            return ndjson_batch.run_batch(
+                args.events_ndjson,
+                "github.issue",
+                lambda event: run_event(event, args, retry_policy, context),
+                lambda reason, extra=None: make_error("", reason, extra),
+                (lambda: {"http": http_pool.stats(), "rate_limit": rate_limit.stats()}) if args.mode == "live" else None,
+                idempotency_key,
+                args.concurrency,
+                args.coalesce_window_sec,
+                None,
+            )
 
-    norm, err = normalize_event(event)
-    if err:
-        print(json.dumps(err, ensure_ascii=True, indent=2))
-        return 1
+        try:
+            event = load_json(args.event)
+        except Exception as exc:
+            print(json.dumps(make_error("", "invalid_event_json:{0}".format(str(exc))), ensure_ascii=True, indent=2))
+            return 2
 
-    if args.mode == "dry-run":
-        state = load_state(args.state)
-        action = dry_run_action(norm, state)
-        if action.get("operation") != "error":
-            save_json(args.state, state)
-    else:
-        cfg, missing = read_live_config()
-        if missing:
-            action = make_error(norm["task_key"], "missing_live_config", {"missing": missing})
-        else:
-            live_state = load_live_state(args.live_state)
-            action = live_action(norm, cfg, retry_policy, args.github_api_base, live_state)
-            if action.get("operation") in {"create", "update"}:
-                save_json(args.live_state, live_state)
+        action = run_event(event, args, retry_policy, context)
+        if args.mode == "live" and "live_state" in context:
+            action["http"] = http_pool.stats()
 
-    print(json.dumps(action, ensure_ascii=True, indent=2, sort_keys=True))
-    return 0 if action.get("operation") not in {"error"} else 1
+        print(json.dumps(action, ensure_ascii=True, indent=2, sort_keys=True))
+        return 0 if action.get("operation") not in {"error"} else 1
+    finally:
+        close_stores(context)
 
 
 if __name__ == "__main__":
@@ -5,9 +5,18 @@ import os
 import re
 import socket
 import sys
+import threading
 import time
 from datetime import datetime, timezone
-from urllib import error, parse, request
+from urllib import error, parse
+
+import http_pool
+import knowledge_index
+import event_queue
+import ndjson_batch
+import rate_limit
+import schema_cache
+import write_fingerprints
 
 
 ALLOWED_EVENTS = {
@@ -34,6 +43,8 @@ CANDIDATE_LINK_PROPERTIES = [
 CANDIDATE_SUMMARY_PROPERTIES = ["Summary", "要約", "Description", "説明"]
 
 URL_RE = re.compile(r"^https?://")
+STORES_LOCK = threading.Lock()
+STORES = {}
 
 
 def load_json(path):
@@ -165,34 +176,33 @@ def notion_request(method, url, token, data=None):
         "Content-Type": "application/json",
         "User-Agent": "event2-sync-script",
     }
-    body = None
-    if data is not None:
-        body = json.dumps(data).encode("utf-8")
-    req = request.Request(url=url, method=method, headers=headers, data=body)
-    with request.urlopen(req, timeout=30) as resp:
-        payload = resp.read().decode("utf-8")
-        return json.loads(payload) if payload else {}
+    return http_pool.request_json(method, url, headers, data, timeout=30)
 
 
 def _read_http_error_json(exc):
+    # The body can only be read once; keep the parsed error on the exception.
+    if hasattr(exc, "notion_error"):
+        return exc.notion_error
+    exc.notion_error = {}
     try:
         body = exc.read().decode("utf-8")
         parsed = json.loads(body) if body else {}
         if isinstance(parsed, dict):
-            return parsed
+            exc.notion_error = parsed
     except Exception:
         pass
-    return {}
+    return exc.notion_error
 
 
 def _is_retryable_http_error(exc):
-    return isinstance(exc, error.HTTPError) and exc.code in RETRYABLE_HTTP_STATUS
+    return isinstance(exc, error.HTTPError) and (exc.code in RETRYABLE_HTTP_STATUS or rate_limit.is_rate_limited(exc))
 
 
 def _is_retryable_network_error(exc):
     if isinstance(exc, TimeoutError):
         return True
-    if isinstance(exc, error.URLError):
+    # HTTPError is a URLError too; its status decides via _is_retryable_http_error.
+    if isinstance(exc, error.URLError) and not isinstance(exc, error.HTTPError):
         return True
     if isinstance(exc, socket.timeout):
         return True
@@ -212,7 +222,9 @@ def _request_with_retry(method, url, token, retry_policy, data=None):
             retryable = _is_retryable_http_error(exc) or _is_retryable_network_error(exc)
             if (not retryable) or attempt >= max_retries:
                 raise
-            time.sleep(backoff_base_sec * (backoff_factor ** attempt))
+            if not rate_limit.has_wait_hint(exc):
+                # Without Retry-After/X-RateLimit-* the rate limiter has nothing to wait on.
+                time.sleep(backoff_base_sec * (backoff_factor ** attempt))
             retries_used += 1
 
     raise RuntimeError("notion retry loop failed unexpectedly")
@@ -290,43 +302,92 @@ def _build_notion_properties_payload(resolved_props, fields):
     return payload
 
 
-def _resolve_database_meta(token, db_id, notion_api_base, retry_policy):
+def _resolve_database_meta(token, db_id, notion_api_base, retry_policy, cache):
     db_url = "{0}/v1/databases/{1}".format(notion_api_base.rstrip("/"), db_id)
     try:
-        db_info, _ = _request_with_retry("GET", db_url, token, retry_policy)
+        db_info, hit = cache.get(db_id, lambda: _request_with_retry("GET", db_url, token, retry_policy)[0])
     except error.HTTPError as exc:
         err = _read_http_error_json(exc)
-        return None, make_error("notion_db_http_error", {"http_status": exc.code, "notion_error": err})
+        return None, False, make_error("notion_db_http_error", {"http_status": exc.code, "notion_error": err})
     except Exception as exc:
-        return None, make_error("notion_db_error", {"detail": str(exc)})
+        return None, False, make_error("notion_db_error", {"detail": str(exc)})
+
+    return db_info, hit, None
+
+
+def _schema_error(cache, db_id, reason, exc, extra=None):
+    # A validation_error about properties means the cached schema is stale: drop it.
+    err = _read_http_error_json(exc)
+    output = {"http_status": exc.code, "notion_error": err}
+    if schema_cache.is_schema_error(err):
+        cache.invalidate(db_id)
+        output["schema_invalidated"] = True
+    if extra:
+        output.update(extra)
+    return make_error(reason, output)
 
-    return db_info, None
 
+def live_action(norm, cfg, retry_policy, notion_api_base, link_property_name, cache=None, index=None):
+    if cache is None:
+        cache = schema_cache.SchemaCache(ttl_sec=0)
+    action, hit = _live_action_once(norm, cfg, retry_policy, notion_api_base, cache, index)
+    if hit and action.get("schema_invalidated"):
+        # The write failed against a cached schema; resolve it again and retry once.
+        action, hit = _live_action_once(norm, cfg, retry_policy, notion_api_base, cache, index)
+    if "retry" in action:
+        action["retry"]["schema_cache"] = cache.stats(hit)
+    if index is not None and action.get("operation") != "error":
+        action["knowledge_index"] = index.stats()
+    return action
 
-def live_action(norm, cfg, retry_policy, notion_api_base, link_property_name):
+
+def _live_action_once(norm, cfg, retry_policy, notion_api_base, cache, index=None):
     token = cfg["notion_token"]
     db_id = cfg["notion_knowledge_db_id"]
-    db_info, db_err = _resolve_database_meta(token, db_id, notion_api_base, retry_policy)
+    db_info, hit, db_err = _resolve_database_meta(token, db_id, notion_api_base, retry_policy, cache)
     if db_err:
-        return db_err
+        return db_err, hit
+    return _live_write(norm, db_id, db_info, token, retry_policy, notion_api_base, cache, index), hit
+
+
+def _index_lookup(norm, db_id, link_name, token, retry_policy, notion_api_base, index):
+    # Returns the indexed page ids for the canonical link ([] on a miss).
+    query_url = "{0}/v1/databases/{1}/query".format(notion_api_base.rstrip("/"), db_id)
+    index.refresh(lambda body: _request_with_retry("POST", query_url, token, retry_policy, body)[0], link_name)
+    return index.lookup(norm["canonical_link"])
+
+
+def _live_write(norm, db_id, db_info, token, retry_policy, notion_api_base, cache, index=None, use_index=True):
     resolved_props, prop_err = _resolve_db_properties(db_info)
     if prop_err:
         return prop_err
 
+    # The index needs a URL property; with the title fallback every event queries.
+    if not resolved_props["link"]:
+        index = None
     query_url = "{0}/v1/databases/{1}/query".format(notion_api_base.rstrip("/"), db_id)
     filter_payload = _build_query_filter(resolved_props, norm)
+    query_retries = 0
+    lookup = "query"
     try:
-        query_result, query_retries = _request_with_retry("POST", query_url, token, retry_policy, filter_payload)
-        results = query_result.get("results", [])
+        results = []
+        if index is not None and use_index:
+            results = [{"id": page_id} for page_id in _index_lookup(
+                norm, db_id, resolved_props["link"], token, retry_policy, notion_api_base, index
+            )]
+            lookup = "index" if results else "query"
+        if not results:
+            query_result, query_retries = _request_with_retry("POST", query_url, token, retry_policy, filter_payload)
+            results = query_result.get("results", [])
+            if index is not None and len(results) == 1:
+                index.record(norm["canonical_link"], results[0]["id"])
     except error.HTTPError as exc:
-        err = _read_http_error_json(exc)
-        return make_error(
+        return _schema_error(
+            cache,
+            db_id,
             "notion_query_http_error",
-            {
-                "http_status": exc.code,
-                "notion_error": err,
-                "link_property_name": resolved_props["link"] or "(title_fallback)",
-            },
+            exc,
+            {"link_property_name": resolved_props["link"] or "(title_fallback)"},
         )
     except Exception as exc:
         return make_error("notion_query_error", {"detail": str(exc)})
@@ -339,13 +400,23 @@ def live_action(norm, cfg, retry_policy, notion_api_base, link_property_name):
         if len(results) == 1:
             page_id = results[0]["id"]
             patch_url = "{0}/v1/pages/{1}".format(notion_api_base.rstrip("/"), page_id)
-            _, write_retries = _request_with_retry("PATCH", patch_url, token, retry_policy, {"properties": props})
+            try:
+                _, write_retries = _request_with_retry("PATCH", patch_url, token, retry_policy, {"properties": props})
+            except error.HTTPError as exc:
+                # An indexed page that was deleted or archived since: drop it and query.
+                if lookup != "index" or exc.code not in (400, 404):
+                    raise
+                if exc.code == 400 and "archived" not in str(_read_http_error_json(exc).get("message", "")):
+                    raise
+                index.forget(page_id)
+                return _live_write(norm, db_id, db_info, token, retry_policy, notion_api_base, cache, index, False)
             return {
                 "target": "notion.knowledge",
                 "operation": "update",
                 "idempotency_key": norm["idempotency_key"],
                 "notion_page_id": page_id,
                 "link_property_name": resolved_props["link"] or "(title_fallback)",
+                "lookup": lookup,
                 "fields": norm["fields"],
                 "retry": {"query": query_retries, "write": write_retries, "policy": retry_policy},
             }
@@ -353,37 +424,236 @@ def live_action(norm, cfg, retry_policy, notion_api_base, link_property_name):
         create_url = "{0}/v1/pages".format(notion_api_base.rstrip("/"))
         create_payload = {"parent": {"database_id": db_id}, "properties": props}
         created, write_retries = _request_with_retry("POST", create_url, token, retry_policy, create_payload)
+        if index is not None and created.get("id"):
+            index.record(norm["canonical_link"], created["id"])
         return {
             "target": "notion.knowledge",
             "operation": "create",
             "idempotency_key": norm["idempotency_key"],
             "notion_page_id": created.get("id", ""),
             "link_property_name": resolved_props["link"] or "(title_fallback)",
+            "lookup": lookup,
             "fields": norm["fields"],
             "retry": {"query": query_retries, "write": write_retries, "policy": retry_policy},
         }
     except error.HTTPError as exc:
-        err = _read_http_error_json(exc)
-        return make_error("notion_write_http_error", {"http_status": exc.code, "notion_error": err})
+        return _schema_error(cache, db_id, "notion_write_http_error", exc)
     except Exception as exc:
         return make_error("notion_write_error", {"detail": str(exc)})
 
 
-def main():
+def idempotency_key(event):
+    # Events with the same key are applied in input order by --concurrency.
+    norm, _ = normalize_event(event)
+    return norm["idempotency_key"] if norm else None
+
+
+def write_fingerprint(norm, link_property_name):
+    # The page content without Last Sync, which changes on every event.
+    fields = {k: v for k, v in norm["fields"].items() if k != "Last Sync"}
+    return write_fingerprints.digest({"fields": fields, "link_property": link_property_name})
+
+
+def noop_action(norm, last, fingerprints):
+    return {
+        "target": "notion.knowledge",
+        "operation": "noop",
+        "idempotency_key": norm["idempotency_key"],
+        "notion_page_id": last["target"],
+        "fingerprint": last["fingerprint"],
+        "fields": norm["fields"],
+        "fingerprints": fingerprints.stats(),
+    }
+
+
+def _open_store(kind, path, factory):
+    # One store per process and path, shared by the --concurrency workers.
+    with STORES_LOCK:
+        if (kind, path) not in STORES:
+            STORES[(kind, path)] = factory()
+        return STORES[(kind, path)]
+
+
+def close_stores():
+    # A JSON index or fingerprint file is written here, once per run.
+    with STORES_LOCK:
+        stores = list(STORES.values())
+        STORES.clear()
+    for store in stores:
+        store.close()
+
+
+def run_event(event, args, retry_policy, cache):
+    norm, err = normalize_event(event)
+    if err:
+        return err
+    if args.mode == "dry-run":
+        return norm
+
+    cfg, missing = read_live_config()
+    if missing:
+        return make_error("missing_live_config", {"missing": missing})
+    db_id = cfg["notion_knowledge_db_id"]
+    index = None
+    if args.knowledge_index:
+        index = _open_store(
+            "index",
+            args.knowledge_index,
+            lambda: knowledge_index.KnowledgeIndex(args.knowledge_index, db_id, args.knowledge_index_max_age_sec),
+        )
+    fingerprints = None
+    if args.skip_unchanged:
+        fingerprints = _open_store(
+            "fingerprints",
+            args.skip_unchanged,
+            lambda: write_fingerprints.FingerprintStore(args.skip_unchanged, "notion.knowledge:{0}".format(db_id)),
+        )
+        # Same content as the last write for this PR: no query, no PATCH.
+        fingerprint = write_fingerprint(norm, args.knowledge_link_property)
+        last = fingerprints.unchanged(norm["idempotency_key"], fingerprint)
+        if last is not None:
+            return noop_action(norm, last, fingerprints)
+    action = live_action(norm, cfg, retry_policy, args.notion_api_base, args.knowledge_link_property, cache, index)
+    action["rate_limit"] = rate_limit.report()
+    if fingerprints is not None and action.get("operation") in {"create", "update"}:
+        fingerprints.record(norm["idempotency_key"], fingerprint, action["notion_page_id"])
+        action["fingerprints"] = fingerprints.stats()
+    elif fingerprints is not None:
+        # What the page holds after a failed write is unknown.
+        fingerprints.forget(norm["idempotency_key"])
+    return action
+
+
+def run_queue(args, process):
+    if args.concurrency < 1 or args.queue_lease_sec <= 0 or args.queue_max_attempts < 1:
+        print(json.dumps(make_error("invalid_queue_options"), ensure_ascii=True, indent=2))
+        return 2
+    if args.drain and args.mode != "live":
+        print(json.dumps(make_error("drain_requires_live_mode"), ensure_ascii=True, indent=2))
+        return 2
+    queue = event_queue.EventQueue(args.queue)
+    try:
+        if args.enqueue:
+            return event_queue.enqueue_file(queue, args.enqueue, "notion.knowledge", idempotency_key, make_error)
+        http_pool.POOL.max_per_host = max(http_pool.POOL.max_per_host, args.concurrency)
+        return event_queue.drain(
+            queue,
+            "notion.knowledge",
+            process,
+            make_error,
+            lambda event: normalize_event(event)[1] is not None,
+            lambda: {"http": http_pool.stats(), "rate_limit": rate_limit.stats()},
+            args.concurrency,
+            args.queue_lease_sec,
+            args.queue_max_attempts,
+            args.follow,
+        )
+    finally:
+        queue.close()
+
+
+def build_parser():
     parser = argparse.ArgumentParser(description="Event2 GitHub PR -> Notion Knowledge sync")
-    parser.add_argument("--event", required=True, help="Input event JSON path")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--event", help="Input event JSON path")
+    source.add_argument(
+        "--events-ndjson",
+        help="NDJSON file of input events ('-' for stdin); prints one action line per event and a summary line",
+    )
+    source.add_argument(
+        "--enqueue",
+        help="Append the events of an NDJSON file ('-' for stdin) to --queue instead of processing them",
+    )
+    source.add_argument(
+        "--drain",
+        action="store_true",
+        help="Live only: process the events waiting in --queue (lease, ack, retry with delay, dead-letter)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="With --events-ndjson: events with different idempotency keys processed at once (same key stays in order)",
+    )
+    parser.add_argument(
+        "--coalesce-window-sec",
+        type=float,
+        default=0.0,
+        help="With --events-ndjson: hold events per idempotency key this long and apply only the latest "
+        "(terminal events are never dropped; 0 disables)",
+    )
+    parser.add_argument(
+        "--queue",
+        default=event_queue.DEFAULT_QUEUE_PATH,
+        help="Durable event queue (SQLite) for --enqueue/--drain",
+    )
+    parser.add_argument(
+        "--queue-lease-sec",
+        type=float,
+        default=event_queue.DEFAULT_LEASE_SEC,
+        help="With --drain: an event not acked within this long (worker crash) is leased again",
+    )
+    parser.add_argument(
+        "--queue-max-attempts",
+        type=int,
+        default=event_queue.DEFAULT_MAX_ATTEMPTS,
+        help="With --drain: attempts before a failing event is dead-lettered",
+    )
+    parser.add_argument("--follow", action="store_true", help="With --drain: keep polling when the queue is empty")
     parser.add_argument("--mode", choices=["dry-run", "live"], default="dry-run")
     parser.add_argument("--check-config", action="store_true")
     parser.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES)
     parser.add_argument("--backoff-base-sec", type=float, default=DEFAULT_BACKOFF_BASE_SEC)
     parser.add_argument("--backoff-factor", type=float, default=DEFAULT_BACKOFF_FACTOR)
     parser.add_argument("--notion-api-base", default=DEFAULT_NOTION_API_BASE)
+    parser.add_argument(
+        "--notion-rps",
+        type=float,
+        default=rate_limit.DEFAULT_NOTION_RPS,
+        help="Average Notion requests per second shared by all workers (0 only honors Retry-After)",
+    )
+    parser.add_argument(
+        "--schema-cache",
+        default=schema_cache.DEFAULT_SCHEMA_CACHE_PATH,
+        help="Notion database schema cache JSON path",
+    )
+    parser.add_argument(
+        "--schema-ttl-sec",
+        type=float,
+        default=schema_cache.DEFAULT_SCHEMA_TTL_SEC,
+        help="Seconds a cached database schema stays valid (0 disables the cache)",
+    )
+    parser.add_argument("--refresh-schema", action="store_true", help="Fetch the database schema again and update the cache")
     parser.add_argument(
         "--knowledge-link-property",
         default=os.getenv("NOTION_KNOWLEDGE_LINK_PROPERTY", DEFAULT_LINK_PROPERTY_NAME),
         help="Knowledge DB URL property name for canonical link filter",
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--knowledge-index",
+        nargs="?",
+        const=knowledge_index.DEFAULT_KNOWLEDGE_INDEX_PATH,
+        help="Look pages up in a local canonical link -> page id index; query Notion only on a miss "
+        "(default path: {0})".format(knowledge_index.DEFAULT_KNOWLEDGE_INDEX_PATH),
+    )
+    parser.add_argument(
+        "--knowledge-index-max-age-sec",
+        type=float,
+        default=knowledge_index.DEFAULT_MAX_AGE_SEC,
+        help="Refresh the index incrementally (last_edited_time) when it is older than this",
+    )
+    parser.add_argument(
+        "--skip-unchanged",
+        nargs="?",
+        const=write_fingerprints.DEFAULT_FINGERPRINTS_PATH,
+        help="Skip the write (operation: noop) when the fields other than Last Sync match the last write for the PR "
+        "(default path: {0})".format(write_fingerprints.DEFAULT_FINGERPRINTS_PATH),
+    )
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
 
     if args.max_retries < 0:
         print(json.dumps(make_error("invalid_max_retries"), ensure_ascii=True, indent=2))
@@ -391,6 +661,10 @@ def main():
     if args.backoff_base_sec <= 0 or args.backoff_factor <= 0:
         print(json.dumps(make_error("invalid_backoff_values"), ensure_ascii=True, indent=2))
         return 2
+    if args.notion_rps < 0:
+        print(json.dumps(make_error("invalid_notion_rps"), ensure_ascii=True, indent=2))
+        return 2
+    rate_limit.configure(args.notion_api_base, args.notion_rps)
 
     retry_policy = {
         "max_retries": args.max_retries,
@@ -420,29 +694,43 @@ def main():
         )
         return 0
 
+    cache = schema_cache.SchemaCache(args.schema_cache, args.schema_ttl_sec, args.refresh_schema)
     try:
-        event = load_json(args.event)
-    except Exception as exc:
-        print(json.dumps(make_error("invalid_event_json", {"detail": str(exc)}), ensure_ascii=True, indent=2))
-        return 2
-
-    norm, err = normalize_event(event)
-    if err:
-        print(json.dumps(err, ensure_ascii=True, indent=2, sort_keys=True))
-        return 1
-
-    if args.mode == "dry-run":
-        print(json.dumps(norm, ensure_ascii=True, indent=2, sort_keys=True))
-        return 0
-
-    cfg, missing = read_live_config()
-    if missing:
-        print(json.dumps(make_error("missing_live_config", {"missing": missing}), ensure_ascii=True, indent=2))
-        return 1
+        if args.enqueue or args.drain:
+            return run_queue(args, lambda event: run_event(event, args, retry_policy, cache))
+        if args.events_ndjson:
+            if args.concurrency < 1:
+                print(json.dumps(make_error("invalid_concurrency"), ensure_ascii=True, indent=2))
+                return 2
+            if args.coalesce_window_sec < 0:
+                print(json.dumps(make_error("invalid_coalesce_window"), ensure_ascii=True, indent=2))
+                return 2
+            http_pool.POOL.max_per_host = max(http_pool.POOL.max_per_host, args.concurrency)
+            return ndjson_batch.run_batch(
+                args.events_ndjson,
+                "notion.knowledge",
+                lambda event: run_event(event, args, retry_policy, cache),
+                make_error,
+                (lambda: {"http": http_pool.stats(), "rate_limit": rate_limit.stats()}) if args.mode == "live" else None,
+                idempotency_key,
+                args.concurrency,
+                args.coalesce_window_sec,
+                None,
+            )
 
-    action = live_action(norm, cfg, retry_policy, args.notion_api_base, args.knowledge_link_property)
-    print(json.dumps(action, ensure_ascii=True, indent=2, sort_keys=True))
-    return 0 if action.get("operation") != "error" else 1
+        try:
+            event = load_json(args.event)
+        except Exception as exc:
+            print(json.dumps(make_error("invalid_event_json", {"detail": str(exc)}), ensure_ascii=True, indent=2))
+            return 2
+
+        action = run_event(event, args, retry_policy, cache)
+        if args.mode == "live":
+            action["http"] = http_pool.stats()
+        print(json.dumps(action, ensure_ascii=True, indent=2, sort_keys=True))
+        return 0 if action.get("operation") != "error" else 1
+    finally:
+        close_stores()
 
 
 if __name__ == "__main__":
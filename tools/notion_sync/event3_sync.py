@@ -7,10 +7,18 @@ import socket
 import sys
 import time
 from datetime import datetime, timezone
-from urllib import error, request
+from urllib import error
+
+import http_pool
+import event_queue
+import ndjson_batch
+import rate_limit
+import schema_cache
 
 
 ALLOWED_EVENTS = {"github.pr.merged", "github.ci.failed"}
+# Each one is a state transition of its own, so none is coalesced away.
+TERMINAL_EVENTS = {"github.pr.merged", "github.ci.failed"}
 RETRYABLE_HTTP_STATUS = {408, 425, 429, 500, 502, 503, 504}
 DEFAULT_MAX_RETRIES = 3
 DEFAULT_BACKOFF_BASE_SEC = 1.0
@@ -108,23 +116,18 @@ def notion_request(method, url, token, data=None):
         "Content-Type": "application/json",
         "User-Agent": "event3-sync-script",
     }
-    body = None
-    if data is not None:
-        body = json.dumps(data).encode("utf-8")
-    req = request.Request(url=url, method=method, headers=headers, data=body)
-    with request.urlopen(req, timeout=30) as resp:
-        payload = resp.read().decode("utf-8")
-        return json.loads(payload) if payload else {}
+    return http_pool.request_json(method, url, headers, data, timeout=30)
 
 
 def _is_retryable_http_error(exc):
-    return isinstance(exc, error.HTTPError) and exc.code in RETRYABLE_HTTP_STATUS
+    return isinstance(exc, error.HTTPError) and (exc.code in RETRYABLE_HTTP_STATUS or rate_limit.is_rate_limited(exc))
 
 
 def _is_retryable_network_error(exc):
     if isinstance(exc, TimeoutError):
         return True
-    if isinstance(exc, error.URLError):
+    # HTTPError is a URLError too; its status decides via _is_retryable_http_error.
+    if isinstance(exc, error.URLError) and not isinstance(exc, error.HTTPError):
         return True
     if isinstance(exc, socket.timeout):
         return True
@@ -144,7 +147,9 @@ def _request_with_retry(method, url, token, retry_policy, data=None):
             retryable = _is_retryable_http_error(exc) or _is_retryable_network_error(exc)
             if (not retryable) or attempt >= max_retries:
                 raise
-            time.sleep(backoff_base_sec * (backoff_factor ** attempt))
+            if not rate_limit.has_wait_hint(exc):
+                # Without Retry-After/X-RateLimit-* the rate limiter has nothing to wait on.
+                time.sleep(backoff_base_sec * (backoff_factor ** attempt))
             retries_used += 1
 
     raise RuntimeError("notion retry loop failed unexpectedly")
@@ -221,20 +226,46 @@ def _build_task_create_payload(resolved_props, norm):
     return properties
 
 
-def live_action(norm, cfg, retry_policy, notion_api_base):
+def _schema_error(cache, db_id, task_key, reason, exc):
+    # A validation_error about properties means the cached schema is stale: drop it.
+    err = _read_http_error_json(exc)
+    extra = {"http_status": exc.code, "notion_error": err}
+    if schema_cache.is_schema_error(err):
+        cache.invalidate(db_id)
+        extra["schema_invalidated"] = True
+    return make_error(task_key, reason, extra)
+
+
+def live_action(norm, cfg, retry_policy, notion_api_base, cache=None):
+    if cache is None:
+        cache = schema_cache.SchemaCache(ttl_sec=0)
+    action, hit = _live_action_once(norm, cfg, retry_policy, notion_api_base, cache)
+    if hit and action.get("schema_invalidated"):
+        # The write failed against a cached schema; resolve it again and retry once.
+        action, hit = _live_action_once(norm, cfg, retry_policy, notion_api_base, cache)
+    if "retry" in action:
+        action["retry"]["schema_cache"] = cache.stats(hit)
+    return action
+
+
+def _live_action_once(norm, cfg, retry_policy, notion_api_base, cache):
     token = cfg["notion_token"]
     db_id = cfg["notion_tasks_db_id"]
     db_url = "{0}/v1/databases/{1}".format(notion_api_base.rstrip("/"), db_id)
 
     try:
-        db_info, _ = _request_with_retry("GET", db_url, token, retry_policy)
+        db_info, hit = cache.get(db_id, lambda: _request_with_retry("GET", db_url, token, retry_policy)[0])
         resolved_props, prop_err = _resolve_task_properties(db_info)
         if prop_err:
-            return prop_err
+            return prop_err, hit
     except error.HTTPError as exc:
-        return make_error(norm["task_key"], "notion_db_http_error", {"http_status": exc.code, "notion_error": _read_http_error_json(exc)})
+        return make_error(norm["task_key"], "notion_db_http_error", {"http_status": exc.code, "notion_error": _read_http_error_json(exc)}), False
     except Exception as exc:
-        return make_error(norm["task_key"], "notion_db_error", {"detail": str(exc)})
+        return make_error(norm["task_key"], "notion_db_error", {"detail": str(exc)}), False
+    return _live_write(norm, db_id, resolved_props, token, retry_policy, notion_api_base, cache), hit
+
+
+def _live_write(norm, db_id, resolved_props, token, retry_policy, notion_api_base, cache):
 
     query_url = "{0}/v1/databases/{1}/query".format(notion_api_base.rstrip("/"), db_id)
     query_payload = {
@@ -248,7 +279,7 @@ def live_action(norm, cfg, retry_policy, notion_api_base):
         query_result, query_retries = _request_with_retry("POST", query_url, token, retry_policy, query_payload)
         results = query_result.get("results", [])
     except error.HTTPError as exc:
-        return make_error(norm["task_key"], "notion_query_http_error", {"http_status": exc.code, "notion_error": _read_http_error_json(exc)})
+        return _schema_error(cache, db_id, norm["task_key"], "notion_query_http_error", exc)
     except Exception as exc:
         return make_error(norm["task_key"], "notion_query_error", {"detail": str(exc)})
 
@@ -270,11 +301,7 @@ def live_action(norm, cfg, retry_policy, notion_api_base):
                 "retry": {"query": query_retries, "write": write_retries, "policy": retry_policy},
             }
         except error.HTTPError as exc:
-            return make_error(
-                norm["task_key"],
-                "notion_create_http_error",
-                {"http_status": exc.code, "notion_error": _read_http_error_json(exc)},
-            )
+            return _schema_error(cache, db_id, norm["task_key"], "notion_create_http_error", exc)
         except Exception as exc:
             return make_error(norm["task_key"], "notion_create_error", {"detail": str(exc)})
     if len(results) >= 2:
@@ -288,7 +315,7 @@ def live_action(norm, cfg, retry_policy, notion_api_base):
     try:
         _, write_retries = _request_with_retry("PATCH", patch_url, token, retry_policy, patch_payload)
     except error.HTTPError as exc:
-        return make_error(norm["task_key"], "notion_write_http_error", {"http_status": exc.code, "notion_error": _read_http_error_json(exc)})
+        return _schema_error(cache, db_id, norm["task_key"], "notion_write_http_error", exc)
     except Exception as exc:
         return make_error(norm["task_key"], "notion_write_error", {"detail": str(exc)})
 
@@ -303,16 +330,138 @@ def live_action(norm, cfg, retry_policy, notion_api_base):
     }
 
 
-def main():
+def is_terminal(event):
+    return event.get("event_type") in TERMINAL_EVENTS
+
+
+def idempotency_key(event):
+    # Events with the same key are applied in input order by --concurrency.
+    norm, _ = normalize_event(event)
+    return norm["idempotency_key"] if norm else None
+
+
+def run_event(event, args, retry_policy, cache):
+    norm, err = normalize_event(event)
+    if err:
+        return err
+    if args.mode == "dry-run":
+        return norm
+
+    cfg, missing = read_live_config()
+    if missing:
+        return make_error(norm["task_key"], "missing_live_config", {"missing": missing})
+    action = live_action(norm, cfg, retry_policy, args.notion_api_base, cache)
+    action["rate_limit"] = rate_limit.report()
+    return action
+
+
+def run_queue(args, process):
+    if args.concurrency < 1 or args.queue_lease_sec <= 0 or args.queue_max_attempts < 1:
+        print(json.dumps(make_error("", "invalid_queue_options"), ensure_ascii=True, indent=2))
+        return 2
+    if args.drain and args.mode != "live":
+        print(json.dumps(make_error("", "drain_requires_live_mode"), ensure_ascii=True, indent=2))
+        return 2
+    queue = event_queue.EventQueue(args.queue)
+    try:
+        if args.enqueue:
+            return event_queue.enqueue_file(
+                queue, args.enqueue, "notion.task", idempotency_key, lambda reason, extra=None: make_error("", reason, extra)
+            )
+        http_pool.POOL.max_per_host = max(http_pool.POOL.max_per_host, args.concurrency)
+        return event_queue.drain(
+            queue,
+            "notion.task",
+            process,
+            lambda reason, extra=None: make_error("", reason, extra),
+            lambda event: normalize_event(event)[1] is not None,
+            lambda: {"http": http_pool.stats(), "rate_limit": rate_limit.stats()},
+            args.concurrency,
+            args.queue_lease_sec,
+            args.queue_max_attempts,
+            args.follow,
+        )
+    finally:
+        queue.close()
+
+
+def build_parser():
     parser = argparse.ArgumentParser(description="Event3 GitHub merged/ci-failed -> Notion Task.Execution State")
-    parser.add_argument("--event", required=True, help="Input event JSON path")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--event", help="Input event JSON path")
+    source.add_argument(
+        "--events-ndjson",
+        help="NDJSON file of input events ('-' for stdin); prints one action line per event and a summary line",
+    )
+    source.add_argument(
+        "--enqueue",
+        help="Append the events of an NDJSON file ('-' for stdin) to --queue instead of processing them",
+    )
+    source.add_argument(
+        "--drain",
+        action="store_true",
+        help="Live only: process the events waiting in --queue (lease, ack, retry with delay, dead-letter)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="With --events-ndjson: events with different idempotency keys processed at once (same key stays in order)",
+    )
+    parser.add_argument(
+        "--coalesce-window-sec",
+        type=float,
+        default=0.0,
+        help="With --events-ndjson: hold events per idempotency key this long and apply only the latest "
+        "(terminal events are never dropped; 0 disables)",
+    )
+    parser.add_argument(
+        "--queue",
+        default=event_queue.DEFAULT_QUEUE_PATH,
+        help="Durable event queue (SQLite) for --enqueue/--drain",
+    )
+    parser.add_argument(
+        "--queue-lease-sec",
+        type=float,
+        default=event_queue.DEFAULT_LEASE_SEC,
+        help="With --drain: an event not acked within this long (worker crash) is leased again",
+    )
+    parser.add_argument(
+        "--queue-max-attempts",
+        type=int,
+        default=event_queue.DEFAULT_MAX_ATTEMPTS,
+        help="With --drain: attempts before a failing event is dead-lettered",
+    )
+    parser.add_argument("--follow", action="store_true", help="With --drain: keep polling when the queue is empty")
     parser.add_argument("--mode", choices=["dry-run", "live"], default="dry-run")
     parser.add_argument("--check-config", action="store_true")
     parser.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES)
     parser.add_argument("--backoff-base-sec", type=float, default=DEFAULT_BACKOFF_BASE_SEC)
     parser.add_argument("--backoff-factor", type=float, default=DEFAULT_BACKOFF_FACTOR)
     parser.add_argument("--notion-api-base", default=DEFAULT_NOTION_API_BASE)
-    args = parser.parse_args()
+    parser.add_argument(
+        "--notion-rps",
+        type=float,
+        default=rate_limit.DEFAULT_NOTION_RPS,
+        help="Average Notion requests per second shared by all workers (0 only honors Retry-After)",
+    )
+    parser.add_argument(
+        "--schema-cache",
+        default=schema_cache.DEFAULT_SCHEMA_CACHE_PATH,
+        help="Notion database schema cache JSON path",
+    )
+    parser.add_argument(
+        "--schema-ttl-sec",
+        type=float,
+        default=schema_cache.DEFAULT_SCHEMA_TTL_SEC,
+        help="Seconds a cached database schema stays valid (0 disables the cache)",
+    )
+    parser.add_argument("--refresh-schema", action="store_true", help="Fetch the database schema again and update the cache")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
 
     if args.max_retries < 0:
         print(json.dumps(make_error("", "invalid_max_retries"), ensure_ascii=True, indent=2))
@@ -320,6 +469,10 @@ def main():
     if args.backoff_base_sec <= 0 or args.backoff_factor <= 0:
         print(json.dumps(make_error("", "invalid_backoff_values"), ensure_ascii=True, indent=2))
         return 2
+    if args.notion_rps < 0:
+        print(json.dumps(make_error("", "invalid_notion_rps"), ensure_ascii=True, indent=2))
+        return 2
+    rate_limit.configure(args.notion_api_base, args.notion_rps)
 
     retry_policy = {
         "max_retries": args.max_retries,
@@ -348,27 +501,38 @@ def main():
         )
         return 0
 
+    cache = schema_cache.SchemaCache(args.schema_cache, args.schema_ttl_sec, args.refresh_schema)
+    if args.enqueue or args.drain:
+        return run_queue(args, lambda event: run_event(event, args, retry_policy, cache))
+    if args.events_ndjson:
+        if args.concurrency < 1:
+            print(json.dumps(make_error("", "invalid_concurrency"), ensure_ascii=True, indent=2))
+            return 2
+        if args.coalesce_window_sec < 0:
+            print(json.dumps(make_error("", "invalid_coalesce_window"), ensure_ascii=True, indent=2))
+            return 2
+        http_pool.POOL.max_per_host = max(http_pool.POOL.max_per_host, args.concurrency)
+        return ndjson_batch.run_batch(
+            args.events_ndjson,
+            "notion.task",
+            lambda event: run_event(event, args, retry_policy, cache),
+            lambda reason, extra=None: make_error("", reason, extra),
+            (lambda: {"http": http_pool.stats(), "rate_limit": rate_limit.stats()}) if args.mode == "live" else None,
+            idempotency_key,
+            args.concurrency,
+            args.coalesce_window_sec,
+            is_terminal,
+        )
+
     try:
         event = load_json(args.event)
     except Exception as exc:
         print(json.dumps(make_error("", "invalid_event_json", {"detail": str(exc)}), ensure_ascii=True, indent=2))
         return 2
 
-    norm, err = normalize_event(event)
-    if err:
-        print(json.dumps(err, ensure_ascii=True, indent=2, sort_keys=True))
-        return 1
-
-    if args.mode == "dry-run":
-        print(json.dumps(norm, ensure_ascii=True, indent=2, sort_keys=True))
-        return 0
-
-    cfg, missing = read_live_config()
-    if missing:
-        print(json.dumps(make_error(norm["task_key"], "missing_live_config", {"missing": missing}), ensure_ascii=True, indent=2))
-        return 1
-
-    action = live_action(norm, cfg, retry_policy, args.notion_api_base)
+    action = run_event(event, args, retry_policy, cache)
+    if args.mode == "live":
+        action["http"] = http_pool.stats()
     print(json.dumps(action, ensure_ascii=True, indent=2, sort_keys=True))
     return 0 if action.get("operation") != "error" else 1
 
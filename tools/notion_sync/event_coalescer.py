@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+
+READ_AHEAD = 1000
+_EOF = object()
+
+
+class Coalescer:
+    # Holds events per idempotency key for window_sec after the first one arrives, then
+    # releases only the latest (latest wins). Terminal events are never held or dropped:
+    # one releases the pending event of its key first, then passes through, so the order
+    # per key is kept. Events without a key (invalid lines) pass through at once.
+    def __init__(self, window_sec, key, terminal=None):
+        self.window_sec = window_sec
+        self.key = key
+        self.terminal = terminal or (lambda event: False)
+        self.held = OrderedDict()
+        self.merged = {}
+        self.counters = {"held": 0, "collapsed": 0, "terminal": 0}
+
+    def _key_of(self, event):
+        if isinstance(event, ValueError):
+            return None
+        try:
+            return self.key(event)
+        except Exception:
+            return None
+
+    def _release(self, event_key):
+        line_no, event, earlier = self.held.pop(event_key)[1:]
+        if earlier:
+            self.merged[line_no] = earlier
+        return line_no, event
+
+    def collapsed_lines(self, line_no):
+        # The input lines an emitted event replaced, oldest first.
+        return self.merged.pop(line_no, None)
+
+    def run(self, items):
+        # items yields (line_no, event) and may block (stdin); it is read on a thread so
+        # that held events are released on time while the input is idle.
+        inbox = queue.Queue(maxsize=READ_AHEAD)
+
+        def read():
+            try:
+                for item in items:
+                    inbox.put(item)
+            finally:
+                inbox.put(_EOF)
+
+        threading.Thread(target=read, daemon=True).start()
+        while True:
+            # Every key gets the same window, so insertion order is deadline order.
+            timeout = None
+            if self.held:
+                timeout = max(0.0, next(iter(self.held.values()))[0] - time.monotonic())
+            try:
+                item = inbox.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            now = time.monotonic()
+            while self.held and next(iter(self.held.values()))[0] <= now:
+                yield self._release(next(iter(self.held)))
+            if item is None:
+                continue
+            if item is _EOF:
+                break
+            line_no, event = item
+            event_key = self._key_of(event)
+            if event_key is None:
+                yield item
+            elif self.terminal(event):
+                self.counters["terminal"] += 1
+                if event_key in self.held:
+                    yield self._release(event_key)
+                yield item
+            elif event_key in self.held:
+                entry = self.held[event_key]
+                entry[3].append(entry[1])
+                entry[1], entry[2] = line_no, event
+                self.counters["collapsed"] += 1
+            else:
+                self.held[event_key] = [now + self.window_sec, line_no, event, []]
+                self.counters["held"] += 1
+        while self.held:
+            yield self._release(next(iter(self.held)))
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats["window_sec"] = self.window_sec
+        return stats
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import ndjson_batch
+
+
+DEFAULT_QUEUE_PATH = "tools/notion_sync/.event_queue.sqlite3"
+DEFAULT_LEASE_SEC = 300.0
+DEFAULT_MAX_ATTEMPTS = 5
+RETRY_BASE_SEC = 30.0
+RETRY_MAX_SEC = 3600.0
+FOLLOW_POLL_SEC = 1.0
+STATUSES = ("ready", "leased", "done", "dead")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    topic TEXT NOT NULL,
+    event_key TEXT,
+    body TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'ready',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    available_at REAL NOT NULL,
+    lease_until REAL,
+    worker TEXT,
+    last_error TEXT,
+    done_at REAL
+);
+CREATE INDEX IF NOT EXISTS events_pending ON events (topic, status, available_at);
+CREATE INDEX IF NOT EXISTS events_by_key ON events (topic, event_key, id);
+"""
+
+
+class EventQueue:
+    # Events waiting for a script, in a SQLite file shared by producers and workers.
+    # A lease hides an event from other workers until it is acked (done), nacked (ready
+    # again after a delay, or dead after max attempts) or the lease runs out; a worker that
+    # crashes mid-event therefore only delays it (at-least-once), until max attempts. Only
+    # the worker holding the lease can ack or nack it. Events of one key are leased one at
+    # a time, in enqueue order.
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def enqueue(self, topic, event, event_key=None):
+        now = time.time()
+        with self.lock:
+            cur = self.db.execute(
+                "INSERT INTO events (topic, event_key, body, enqueued_at, available_at) VALUES (?, ?, ?, ?, ?)",
+                (topic, event_key, json.dumps(event, ensure_ascii=True, sort_keys=True), now, now),
+            )
+            return cur.lastrowid
+
+    def lease(self, topic, worker, lease_sec=DEFAULT_LEASE_SEC, limit=1, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        # Returns [(id, event, attempts)]. BEGIN IMMEDIATE keeps two workers (or processes)
+        # from leasing the same rows. An expired lease that already used max_attempts (a
+        # worker crashing on the event every time) is dead instead of leased again.
+        now = time.time()
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                self.db.execute(
+                    "UPDATE events SET status = 'dead', lease_until = NULL, last_error = 'lease_expired' "
+                    "WHERE topic = ? AND status = 'leased' AND lease_until <= ? AND attempts >= ?",
+                    (topic, now, max_attempts),
+                )
+                rows = self.db.execute(
+                    "SELECT id, body, attempts FROM events e WHERE topic = ? AND ("
+                    "(status = 'ready' AND available_at <= ?) OR (status = 'leased' AND lease_until <= ?)"
+                    ") AND (event_key IS NULL OR NOT EXISTS ("
+                    "SELECT 1 FROM events p WHERE p.topic = e.topic AND p.event_key = e.event_key AND p.id < e.id "
+                    "AND p.status IN ('ready', 'leased'))) ORDER BY id LIMIT ?",
+                    (topic, now, now, limit),
+                ).fetchall()
+                self.db.executemany(
+                    "UPDATE events SET status = 'leased', lease_until = ?, worker = ?, attempts = attempts + 1 WHERE id = ?",
+                    [(now + lease_sec, worker, row[0]) for row in rows],
+                )
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        return [(row[0], json.loads(row[1]), row[2] + 1) for row in rows]
+
+    def ack(self, event_id, worker):
+        # ack/nack return False when the worker no longer holds the lease (it ran out and
+        # the event was leased again, or dead-lettered): the row is left as it is.
+        with self.lock:
+            cur = self.db.execute(
+                "UPDATE events SET status = 'done', done_at = ?, lease_until = NULL, last_error = NULL "
+                "WHERE id = ? AND status = 'leased' AND worker = ?",
+                (time.time(), event_id, worker),
+            )
+            return cur.rowcount > 0
+
+    def nack(self, event_id, worker, reason, retry_after_sec=None):
+        # retry_after_sec=None dead-letters the event.
+        with self.lock:
+            if retry_after_sec is None:
+                cur = self.db.execute(
+                    "UPDATE events SET status = 'dead', lease_until = NULL, last_error = ? "
+                    "WHERE id = ? AND status = 'leased' AND worker = ?",
+                    (reason, event_id, worker),
+                )
+            else:
+                cur = self.db.execute(
+                    "UPDATE events SET status = 'ready', lease_until = NULL, available_at = ?, last_error = ? "
+                    "WHERE id = ? AND status = 'leased' AND worker = ?",
+                    (time.time() + retry_after_sec, reason, event_id, worker),
+                )
+            return cur.rowcount > 0
+
+    def replay(self, topic, first_id, last_id, statuses=("done", "dead")):
+        # Puts finished events of an id range back in the queue, attempts reset.
+        marks = ", ".join("?" for _ in statuses)
+        with self.lock:
+            cur = self.db.execute(
+                "UPDATE events SET status = 'ready', attempts = 0, available_at = ?, lease_until = NULL, done_at = NULL "
+                "WHERE topic = ? AND id BETWEEN ? AND ? AND status IN ({0})".format(marks),
+                (time.time(), topic, first_id, last_id) + tuple(statuses),
+            )
+            return cur.rowcount
+
+    def events(self, topic, status=None, limit=100):
+        query = "SELECT id, event_key, status, attempts, last_error, body FROM events WHERE topic = ?"
+        params = (topic,)
+        if status:
+            query += " AND status = ?"
+            params += (status,)
+        with self.lock:
+            rows = self.db.execute(query + " ORDER BY id LIMIT ?", params + (limit,)).fetchall()
+        return [
+            {"id": r[0], "event_key": r[1], "status": r[2], "attempts": r[3], "last_error": r[4], "event": json.loads(r[5])}
+            for r in rows
+        ]
+
+    def stats(self, topic):
+        now = time.time()
+        with self.lock:
+            counts = dict(self.db.execute("SELECT status, COUNT(*) FROM events WHERE topic = ? GROUP BY status", (topic,)))
+            oldest = self.db.execute(
+                "SELECT MIN(enqueued_at) FROM events WHERE topic = ? AND status IN ('ready', 'leased')", (topic,)
+            ).fetchone()[0]
+        stats = {status: counts.get(status, 0) for status in STATUSES}
+        stats["depth"] = stats["ready"] + stats["leased"]
+        stats["oldest_pending_sec"] = round(now - oldest, 3) if oldest is not None else None
+        return stats
+
+
+def retry_delay(attempts):
+    return min(RETRY_MAX_SEC, RETRY_BASE_SEC * 2 ** (attempts - 1))
+
+
+def enqueue_file(queue, path, topic, key, make_error):
+    # Each NDJSON line (or a single JSON document) becomes one queued event.
+    counts = {"enqueued": 0, "errors": 0}
+    stream = ndjson_batch.open_events(path)
+    try:
+        for line_no, event in ndjson_batch.read_lines(stream):
+            if isinstance(event, ValueError):
+                action = make_error("invalid_event_json", {"detail": str(event)})
+                action["line"] = line_no
+                ndjson_batch.emit(action)
+                counts["errors"] += 1
+                continue
+            try:
+                event_key = key(event)
+            except Exception:
+                event_key = None
+            queue.enqueue(topic, event, event_key)
+            counts["enqueued"] += 1
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    summary = {"target": topic, "operation": "enqueue", "queue": queue.stats(topic)}
+    summary.update(counts)
+    ndjson_batch.emit(summary)
+    return 1 if counts["errors"] else 0
+
+
+def drain(queue, topic, process, make_error, permanent, summary_extra=None, concurrency=1,
+          lease_sec=DEFAULT_LEASE_SEC, max_attempts=DEFAULT_MAX_ATTEMPTS, follow=False):
+    # Worker loop: lease up to `concurrency` events (distinct keys), run them, ack or nack.
+    # An error action is retried with a growing delay, unless permanent(event) says the
+    # event can never succeed (it does not normalize); after max_attempts it is dead.
+    started = time.monotonic()
+    worker = "{0}:{1}".format(socket.gethostname(), os.getpid())
+    counts = {}
+    outcomes = {"acked": 0, "retried": 0, "dead": 0, "lost_lease": 0}
+
+    def handle(item):
+        event_id, event, attempts = item
+        action = ndjson_batch.process_line(event_id, event, process, make_error)
+        action["queue_id"] = action.pop("line")
+        action["attempts"] = attempts
+        if action.get("operation") != "error":
+            held = queue.ack(event_id, worker)
+            action["queue"] = "acked"
+        elif attempts >= max_attempts or permanent(event):
+            held = queue.nack(event_id, worker, action.get("reason", "error"))
+            action["queue"] = "dead"
+        else:
+            held = queue.nack(event_id, worker, action.get("reason", "error"), retry_delay(attempts))
+            action["queue"] = "retried"
+        if not held:
+            # Ran past --queue-lease-sec: another worker owns the event now.
+            action["queue"] = "lost_lease"
+        return action
+
+    with ThreadPoolExecutor(max_workers=concurrency) as threads:
+        while True:
+            leased = queue.lease(topic, worker, lease_sec, concurrency, max_attempts)
+            if not leased:
+                if not follow:
+                    break
+                time.sleep(FOLLOW_POLL_SEC)
+                continue
+            for action in threads.map(handle, leased):
+                outcomes[action["queue"]] += 1
+                counts[action.get("operation", "")] = counts.get(action.get("operation", ""), 0) + 1
+                ndjson_batch.emit(action)
+
+    summary = {
+        "target": topic,
+        "operation": "drain",
+        "events": sum(counts.values()),
+        "operations": counts,
+        "errors": counts.get("error", 0),
+        "seconds": round(time.monotonic() - started, 6),
+        "queue": queue.stats(topic),
+    }
+    summary.update(outcomes)
+    if summary_extra:
+        summary.update(summary_extra())
+    ndjson_batch.emit(summary)
+    return 1 if outcomes["dead"] else 0
+
+
+def main():
+    # Inspection and replay; enqueue and drain are --enqueue/--drain of the event scripts.
+    parser = argparse.ArgumentParser(description="notion_sync durable event queue admin")
+    parser.add_argument("command", choices=["stats", "list", "replay"])
+    parser.add_argument("--queue", default=DEFAULT_QUEUE_PATH, help="Queue SQLite path")
+    parser.add_argument("--topic", required=True, help="github.issue (event1), notion.knowledge (event2), notion.task (event3)")
+    parser.add_argument("--status", choices=STATUSES, help="list: only events with this status")
+    parser.add_argument("--limit", type=int, default=100, help="list: maximum events shown")
+    parser.add_argument("--from-id", type=int, default=0, help="replay: first event id")
+    parser.add_argument("--to-id", type=int, default=sys.maxsize, help="replay: last event id")
+    parser.add_argument("--include", default="done,dead", help="replay: statuses put back in the queue")
+    args = parser.parse_args()
+
+    queue = EventQueue(args.queue)
+    try:
+        if args.command == "stats":
+            result = {"target": args.topic, "operation": "stats", "queue": queue.stats(args.topic)}
+        elif args.command == "list":
+            result = {"target": args.topic, "operation": "list", "events": queue.events(args.topic, args.status, args.limit)}
+        else:
+            statuses = tuple(s for s in args.include.split(",") if s)
+            if not statuses or any(s not in ("done", "dead") for s in statuses):
+                print(json.dumps({"operation": "error", "reason": "invalid_replay_status"}, ensure_ascii=True, indent=2))
+                return 2
+            replayed = queue.replay(args.topic, args.from_id, args.to_id, statuses)
+            result = {"target": args.topic, "operation": "replay", "replayed": replayed, "queue": queue.stats(args.topic)}
+    finally:
+        queue.close()
+    print(json.dumps(result, ensure_ascii=True, indent=2, sort_keys=True))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+
+
+class CachedResponse:
+    def __init__(self, headers, body):
+        self.headers = headers
+        self.body = body
+        self.etag = headers.get("ETag")
+        self.last_modified = headers.get("Last-Modified")
+
+    def validators(self):
+        validators = {}
+        if self.etag:
+            validators["If-None-Match"] = self.etag
+        if self.last_modified:
+            validators["If-Modified-Since"] = self.last_modified
+        return validators
+
+
+class ResponseCache:
+    # GET response bodies that came with an ETag or Last-Modified, keyed by URL and token,
+    # evicted least-recently-used once the bodies exceed max_bytes. The pool revalidates an
+    # entry with If-None-Match/If-Modified-Since and serves the body on 304; GitHub does not
+    # count 304s against the primary rate limit.
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+        self.counters = {"revalidated": 0, "changed": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def key(self, url, headers):
+        # Responses differ per token; the key keeps only a digest of it.
+        auth = (headers or {}).get("Authorization", "")
+        return url, hashlib.sha256(auth.encode("utf-8")).hexdigest()[:16]
+
+    def lookup(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.counters["misses"] += 1
+            else:
+                self.entries.move_to_end(key)
+            return entry
+
+    def not_modified(self, key, entry):
+        with self.lock:
+            self.counters["revalidated"] += 1
+            if key in self.entries:
+                self.entries.move_to_end(key)
+        return entry
+
+    def store(self, key, headers, body, revalidating=False):
+        if revalidating:
+            with self.lock:
+                self.counters["changed"] += 1
+        cache_control = (headers.get("Cache-Control") or "").lower()
+        entry = CachedResponse(headers, body)
+        storable = (entry.etag or entry.last_modified) and "no-store" not in cache_control
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old.body)
+            if not storable or len(body) > self.max_bytes:
+                return
+            self.entries[key] = entry
+            self.size += len(body)
+            self.counters["stores"] += 1
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted.body)
+                self.counters["evictions"] += 1
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats["entries"] = len(self.entries)
+            stats["bytes"] = self.size
+            stats["max_bytes"] = self.max_bytes
+        return stats
+
+
+CACHE = ResponseCache()
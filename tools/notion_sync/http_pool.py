@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+import http.client
+import io
+import json
+import socket
+import threading
+from urllib import error, parse
+
+import http_cache
+import rate_limit
+
+
+DEFAULT_MAX_PER_HOST = 4
+DEFAULT_TIMEOUT_SEC = 30
+
+# A reused connection may have been closed by the server while idle; the request is
+# sent again once on a fresh connection. Once the request is out, the server may already
+# have acted on it, so only methods that can safely run twice are sent again then (PATCH
+# here always targets an issue/page by id). A POST surfaces as URLError and the caller's
+# retry/search path decides.
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionResetError, BrokenPipeError)
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS", "PATCH"}
+# Followed for GET like urlopen() does (e.g. GitHub's 301 for a renamed repository).
+REDIRECT_STATUS = {301, 302, 303, 307, 308}
+MAX_REDIRECTS = 10
+
+
+class ConnectionPool:
+    def __init__(self, max_per_host=DEFAULT_MAX_PER_HOST, timeout=DEFAULT_TIMEOUT_SEC, limiter=None, cache=None):
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.limiter = limiter
+        self.cache = cache
+        self.lock = threading.Condition()
+        self.idle = {}
+        self.in_use = {}
+        self.counters = {"requests": 0, "connections_opened": 0, "connections_reused": 0, "connections_closed": 0}
+
+    def _count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def _acquire(self, host_key):
+        with self.lock:
+            while True:
+                idle = self.idle.setdefault(host_key, [])
+                if idle:
+                    self.in_use[host_key] = self.in_use.get(host_key, 0) + 1
+                    return idle.pop(), True
+                if self.in_use.get(host_key, 0) < self.max_per_host:
+                    self.in_use[host_key] = self.in_use.get(host_key, 0) + 1
+                    return None, False
+                self.lock.wait()
+
+    def _release(self, host_key, conn, reusable):
+        with self.lock:
+            self.in_use[host_key] -= 1
+            if reusable:
+                self.idle.setdefault(host_key, []).append(conn)
+            self.lock.notify()
+        if not reusable and conn is not None:
+            conn.close()
+            self._count("connections_closed")
+
+    def _connect(self, scheme, host, port, timeout):
+        self._count("connections_opened")
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port, timeout=timeout)
+        return http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def request(self, method, url, headers=None, body=None, timeout=None):
+        # Returns (status, headers, body bytes). Error statuses raise urllib.error.HTTPError and
+        # connection failures urllib.error.URLError, as urlopen() does.
+        for _ in range(MAX_REDIRECTS + 1):
+            status, resp_headers, data = self._request_once(method, url, headers, body, timeout)
+            if status not in REDIRECT_STATUS or method != "GET" or not resp_headers.get("Location"):
+                break
+            url = parse.urljoin(url, resp_headers["Location"])
+        if 300 <= status < 400:
+            # Too many redirects, or a redirect this pool does not follow: never return it as data.
+            raise error.HTTPError(url, status, "unfollowed redirect", resp_headers, io.BytesIO(data))
+        return status, resp_headers, data
+
+    def _request_once(self, method, url, headers, body, timeout):
+        parts = parse.urlsplit(url)
+        host_key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        headers = dict(headers or {})
+        self._count("requests")
+        cache_key = cached = None
+        if self.cache is not None and method == "GET":
+            cache_key = self.cache.key(url, headers)
+            cached = self.cache.lookup(cache_key)
+            if cached is not None:
+                headers.update(cached.validators())
+        if self.limiter is not None:
+            # Pace before taking a connection so a waiting request does not hold one.
+            self.limiter.wait(url)
+
+        conn, reused = self._acquire(host_key)
+        try:
+            while True:
+                if conn is None:
+                    conn = self._connect(parts.scheme, parts.hostname, parts.port, timeout or self.timeout)
+                    reused = False
+                else:
+                    self._count("connections_reused")
+                sent = False
+                try:
+                    conn.request(method, path, body=body, headers=headers)
+                    sent = True
+                    resp = conn.getresponse()
+                    data = resp.read()
+                    break
+                except STALE_CONNECTION_ERRORS:
+                    conn.close()
+                    conn = None
+                    if not reused or (sent and method not in IDEMPOTENT_METHODS):
+                        raise
+        except (socket.timeout, TimeoutError):
+            self._release(host_key, conn, False)
+            raise
+        except (OSError, http.client.HTTPException) as exc:
+            self._release(host_key, conn, False)
+            raise error.URLError(exc)
+
+        self._release(host_key, conn, not resp.will_close)
+        if self.limiter is not None:
+            self.limiter.observe(url, resp.status, resp.headers)
+        if cached is not None and resp.status == 304:
+            self.cache.not_modified(cache_key, cached)
+            return 200, cached.headers, cached.body
+        if resp.status >= 400:
+            raise error.HTTPError(url, resp.status, resp.reason, resp.headers, io.BytesIO(data))
+        if cache_key is not None:
+            self.cache.store(cache_key, resp.headers, data, revalidating=cached is not None)
+        return resp.status, resp.headers, data
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats["max_per_host"] = self.max_per_host
+            stats["idle"] = sum(len(conns) for conns in self.idle.values())
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        return stats
+
+    def close(self):
+        with self.lock:
+            conns = [c for idle in self.idle.values() for c in idle]
+            self.idle = {}
+        for conn in conns:
+            conn.close()
+
+
+POOL = ConnectionPool(limiter=rate_limit.LIMITER, cache=http_cache.CACHE)
+
+
+def request_json(method, url, headers, data=None, timeout=None):
+    body = None
+    if data is not None:
+        body = json.dumps(data).encode("utf-8")
+    _, _, payload = POOL.request(method, url, headers, body, timeout)
+    payload = payload.decode("utf-8")
+    return json.loads(payload) if payload else {}
+
+
+def stats():
+    return POOL.stats()
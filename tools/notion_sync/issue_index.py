@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+import re
+import threading
+import time
+
+import state_store
+
+
+DEFAULT_ISSUE_INDEX_PATH = "tools/notion_sync/.issue_index.sqlite3"
+DEFAULT_MAX_AGE_SEC = 300.0
+PAGE_SIZE = 100
+TASKKEY_LABEL_RE = re.compile(r"^taskkey:(TSK-[0-9]{8}-[0-9]{4})$")
+
+
+def task_keys_of(issue):
+    keys = []
+    for label in issue.get("labels", []):
+        name = label.get("name", "") if isinstance(label, dict) else label
+        match = TASKKEY_LABEL_RE.match(name) if isinstance(name, str) else None
+        if match:
+            keys.append(match.group(1))
+    return keys
+
+
+class IssueIndex:
+    # Every issue of one repository that carries a taskkey: label, kept in a state store
+    # (SQLite by default). The first refresh lists all issues; later ones only fetch issues
+    # updated since the newest updated_at seen (GitHub's clock, so local clock skew does not
+    # matter). record/forget are one upsert/delete each; a JSON path is written at the end of
+    # a refresh and on close().
+    def __init__(self, path, repo, max_age_sec=DEFAULT_MAX_AGE_SEC):
+        self.repo = repo
+        self.max_age_sec = max_age_sec
+        self.lock = threading.Lock()
+        self.counters = {"refreshes": 0, "full_scans": 0, "pages": 0, "issues_seen": 0, "lookups": 0}
+        self.store = state_store.open_cache(path, "issues")
+        self.issues = {}
+        self.numbers_by_key = {}
+        self.since = None
+        self.refreshed_at = 0.0
+        self._load()
+
+    def _load(self):
+        # An index built for another repository stays unused until the next full scan replaces it.
+        if self.store.get_meta("repo") != self.repo:
+            return
+        for number, entry in self.store.items():
+            if isinstance(entry, dict):
+                self._put(number, entry)
+        self.since = self.store.get_meta("since")
+        self.refreshed_at = self.store.get_meta("refreshed_at") or 0.0
+
+    def _put(self, number, entry):
+        # issues mirrors the store, keyed by number; numbers_by_key makes task key lookups O(1).
+        old = self.issues.pop(number, None)
+        for task_key in old["task_keys"] if old else []:
+            numbers = self.numbers_by_key.get(task_key, set())
+            numbers.discard(number)
+            if not numbers:
+                self.numbers_by_key.pop(task_key, None)
+        if entry is None:
+            return
+        self.issues[number] = entry
+        for task_key in entry["task_keys"]:
+            self.numbers_by_key.setdefault(task_key, set()).add(number)
+
+    def _apply(self, issue, advance=True):
+        number = str(issue["number"])
+        keys = task_keys_of(issue) if "pull_request" not in issue else []
+        if keys:
+            self._put(number, {"task_keys": keys, "state": issue.get("state", ""), "updated_at": issue.get("updated_at", "")})
+        else:
+            # The taskkey label was removed, or the number is a pull request.
+            self._put(number, None)
+        updated_at = issue.get("updated_at")
+        if advance and updated_at and (self.since is None or updated_at > self.since):
+            self.since = updated_at
+
+    def refresh(self, list_page, force=False):
+        # list_page(page, since) returns one page (up to PAGE_SIZE issues) of
+        # GET /repos/{owner}/{repo}/issues; since=None means a full listing. Errors propagate
+        # and leave the index as it was. Returns the number of pages fetched.
+        with self.lock:
+            if not force and self.since is not None and time.time() - self.refreshed_at < self.max_age_sec:
+                return 0
+            full = self.since is None
+            since = self.since
+            pages = 0
+            fetched = []
+            while True:
+                pages += 1
+                items = list_page(pages, since)
+                fetched.extend(i for i in items if isinstance(i, dict) and "number" in i)
+                if len(items) < PAGE_SIZE:
+                    break
+            if full:
+                self.issues = {}
+                self.numbers_by_key = {}
+            for issue in fetched:
+                self._apply(issue)
+            if self.since is None:
+                # An empty repository: later refreshes are still incremental.
+                self.since = "1970-01-01T00:00:00Z"
+            self.refreshed_at = time.time()
+            changes = self.issues.items() if full else [(str(i["number"]), self.issues.get(str(i["number"]))) for i in fetched]
+            self.store.update(changes, replace=full)
+            for name in ("repo", "since", "refreshed_at"):
+                self.store.set_meta(name, getattr(self, name))
+            self.store.flush()
+            self.counters["refreshes"] += 1
+            self.counters["full_scans"] += 1 if full else 0
+            self.counters["pages"] += pages
+            self.counters["issues_seen"] += len(fetched)
+            return pages
+
+    def lookup(self, task_key):
+        with self.lock:
+            self.counters["lookups"] += 1
+            return sorted(int(n) for n in self.numbers_by_key.get(task_key, ()))
+
+    def by_task_key(self):
+        with self.lock:
+            return {k: sorted(int(n) for n in v) for k, v in self.numbers_by_key.items()}
+
+    def record(self, issue):
+        # Our own create/update: no refresh needed to see it. `since` stays put so that
+        # other changes made since the last refresh are still fetched.
+        with self.lock:
+            self._apply(issue, advance=False)
+            number = str(issue["number"])
+            self.store.update([(number, self.issues.get(number))])
+
+    def forget(self, issue_number):
+        with self.lock:
+            if str(issue_number) in self.issues:
+                self._put(str(issue_number), None)
+                self.store.update([(str(issue_number), None)])
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats["issues"] = len(self.issues)
+            stats["since"] = self.since
+        return stats
+
+    def close(self):
+        with self.lock:
+            self.store.flush()
+            self.store.close()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+import threading
+import time
+
+import state_store
+
+
+DEFAULT_KNOWLEDGE_INDEX_PATH = "tools/notion_sync/.knowledge_index.sqlite3"
+DEFAULT_MAX_AGE_SEC = 300.0
+PAGE_SIZE = 100
+
+
+class KnowledgeIndex:
+    # Canonical link -> Knowledge page ids for one database, kept in a state store (SQLite by
+    # default). The first refresh queries every page; later ones only pages with
+    # last_edited_time on or after the newest one seen (Notion's clock, minute precision, so
+    # a few pages come back twice). record/forget are one upsert/delete each; a JSON path is
+    # written at the end of a refresh and on close().
+    def __init__(self, path, db_id, max_age_sec=DEFAULT_MAX_AGE_SEC):
+        self.db_id = db_id
+        self.max_age_sec = max_age_sec
+        self.lock = threading.Lock()
+        self.counters = {"refreshes": 0, "full_scans": 0, "pages_fetched": 0, "requests": 0, "hits": 0, "misses": 0}
+        self.store = state_store.open_cache(path, "pages")
+        self._reset()
+        self.link_property = None
+        self._load()
+
+    def _reset(self):
+        self.links = {}
+        self.page_links = {}
+        self.cursor = None
+        self.refreshed_at = 0.0
+
+    def _load(self):
+        # An index of another database stays unused until the next full scan replaces it.
+        if self.store.get_meta("db_id") != self.db_id:
+            return
+        for page_id, link in self.store.items():
+            self._put(page_id, link)
+        self.link_property = self.store.get_meta("link_property")
+        self.cursor = self.store.get_meta("cursor")
+        self.refreshed_at = self.store.get_meta("refreshed_at") or 0.0
+
+    def _put(self, page_id, link):
+        # page_links mirrors the store; links is the lookup direction.
+        old = self.page_links.pop(page_id, None)
+        if old is not None:
+            ids = self.links.get(old, set())
+            ids.discard(page_id)
+            if not ids:
+                self.links.pop(old, None)
+        if link:
+            self.page_links[page_id] = link
+            self.links.setdefault(link, set()).add(page_id)
+
+    def _apply(self, page):
+        link = None
+        if not page.get("archived") and not page.get("in_trash"):
+            prop = page.get("properties", {}).get(self.link_property)
+            link = prop.get("url") if isinstance(prop, dict) else None
+        self._put(page["id"], link)
+        edited = page.get("last_edited_time")
+        if edited and (self.cursor is None or edited > self.cursor):
+            self.cursor = edited
+
+    def refresh(self, query, link_property, force=False):
+        # query(body) is POST /v1/databases/{id}/query. Errors propagate and leave the
+        # index as it was. Returns the number of query requests sent.
+        with self.lock:
+            if link_property != self.link_property:
+                # The URL property was renamed or replaced: the stored links mean nothing.
+                self._reset()
+                self.link_property = link_property
+            if not force and self.cursor is not None and time.time() - self.refreshed_at < self.max_age_sec:
+                return 0
+            full = self.cursor is None
+            body = {"page_size": PAGE_SIZE}
+            if not full:
+                body["filter"] = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": self.cursor}}
+                body["sorts"] = [{"timestamp": "last_edited_time", "direction": "ascending"}]
+            requests = 0
+            fetched = []
+            while True:
+                requests += 1
+                result = query(body)
+                fetched.extend(p for p in result.get("results", []) if isinstance(p, dict) and "id" in p)
+                if not result.get("has_more") or not result.get("next_cursor"):
+                    break
+                body = dict(body, start_cursor=result["next_cursor"])
+            if full:
+                self.links = {}
+                self.page_links = {}
+            for page in fetched:
+                self._apply(page)
+            if self.cursor is None:
+                self.cursor = "1970-01-01T00:00:00.000Z"
+            self.refreshed_at = time.time()
+            changes = self.page_links.items() if full else [(p["id"], self.page_links.get(p["id"])) for p in fetched]
+            self.store.update(changes, replace=full)
+            for name in ("db_id", "link_property", "cursor", "refreshed_at"):
+                self.store.set_meta(name, getattr(self, name))
+            self.store.flush()
+            self.counters["refreshes"] += 1
+            self.counters["full_scans"] += 1 if full else 0
+            self.counters["requests"] += requests
+            self.counters["pages_fetched"] += len(fetched)
+            return requests
+
+    def lookup(self, link):
+        with self.lock:
+            ids = sorted(self.links.get(link, ()))
+            self.counters["hits" if ids else "misses"] += 1
+            return ids
+
+    def record(self, link, page_id):
+        # A page this script found by query or created; the cursor stays put.
+        with self.lock:
+            self._put(page_id, link)
+            self.store.update([(page_id, self.page_links.get(page_id))])
+
+    def forget(self, page_id):
+        with self.lock:
+            if page_id in self.page_links:
+                self._put(page_id, None)
+                self.store.update([(page_id, None)])
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats["links"] = len(self.links)
+            stats["cursor"] = self.cursor
+        return stats
+
+    def close(self):
+        with self.lock:
+            self.store.flush()
+            self.store.close()
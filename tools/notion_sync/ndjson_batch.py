@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+import asyncio
+import json
+import sys
+import time
+
+import async_executor
+import event_coalescer
+
+
+def open_events(path):
+    if path == "-":
+        return sys.stdin
+    return open(path, "r", encoding="utf-8")
+
+
+def emit(action):
+    print(json.dumps(action, ensure_ascii=True, sort_keys=True), flush=True)
+
+
+def parse_event(line):
+    event = json.loads(line)
+    if not isinstance(event, dict):
+        raise ValueError("event is not a JSON object")
+    return event
+
+
+def process_line(line_no, event, process, make_error, collapsed=None):
+    # event is the parsed object or the ValueError it failed with; collapsed lists the
+    # earlier lines the coalescing window folded into it.
+    if isinstance(event, ValueError):
+        action = make_error("invalid_event_json", {"detail": str(event)})
+    else:
+        try:
+            action = process(event)
+        except Exception as exc:
+            action = make_error("unexpected_error", {"detail": "{0}: {1}".format(type(exc).__name__, exc)})
+    action["line"] = line_no
+    if collapsed:
+        action["coalesced_lines"] = collapsed
+    return action
+
+
+def read_lines(stream):
+    for line_no, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_no, parse_event(line)
+        except ValueError as exc:
+            yield line_no, exc
+
+
+def _nothing_collapsed(line_no):
+    return None
+
+
+def _record(counts, action):
+    operation = action.get("operation", "")
+    counts[operation] = counts.get(operation, 0) + 1
+    emit(action)
+
+
+async def _run_concurrent(lines, process, make_error, key, concurrency, counts, collapsed_lines):
+    # Actions are printed as they finish; `line` ties each one to its input.
+    executor = async_executor.KeyedExecutor(concurrency)
+    loop = asyncio.get_running_loop()
+    pending = set()
+    try:
+        while True:
+            # Reading stdin blocks, so it happens on a thread too; at most 2*concurrency
+            # events are read ahead of the workers.
+            item = await loop.run_in_executor(None, next, lines, None)
+            if item is None:
+                break
+            line_no, event = item
+            event_key = None
+            if not isinstance(event, ValueError):
+                try:
+                    event_key = key(event)
+                except Exception:
+                    pass
+            task = executor.submit(
+                event_key, process_line, line_no, event, process, make_error, collapsed_lines(line_no)
+            )
+            task.add_done_callback(lambda done: _record(counts, done.result()))
+            pending.add(task)
+            if len(pending) >= 2 * concurrency:
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        if pending:
+            await asyncio.wait(pending)
+    finally:
+        executor.close()
+    return executor.stats()
+
+
+def run_batch(
+    path, target, process, make_error, summary_extra=None, key=None, concurrency=1, coalesce_window_sec=0, terminal=None
+):
+    # One action line per input line, then one summary line. A failing event only
+    # produces an error line; the stream keeps going. With concurrency > 1, events run
+    # on async_executor, ordered per key(event) (the idempotency key). With a coalescing
+    # window, bursts for one key collapse into their latest event, except terminal(event).
+    started = time.monotonic()
+    counts = {}
+    stream = open_events(path)
+    executor_stats = None
+    coalescer = None
+    lines = read_lines(stream)
+    collapsed_lines = _nothing_collapsed
+    if coalesce_window_sec > 0:
+        coalescer = event_coalescer.Coalescer(coalesce_window_sec, key or (lambda event: None), terminal)
+        lines = coalescer.run(lines)
+        collapsed_lines = coalescer.collapsed_lines
+    try:
+        if concurrency > 1:
+            executor_stats = asyncio.run(
+                _run_concurrent(
+                    lines, process, make_error, key or (lambda event: None), concurrency, counts, collapsed_lines
+                )
+            )
+        else:
+            for line_no, event in lines:
+                _record(counts, process_line(line_no, event, process, make_error, collapsed_lines(line_no)))
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+    summary = {
+        "target": target,
+        "operation": "summary",
+        "events": sum(counts.values()),
+        "operations": counts,
+        "errors": counts.get("error", 0),
+        "seconds": round(time.monotonic() - started, 6),
+    }
+    if executor_stats:
+        summary["executor"] = executor_stats
+    if coalescer is not None:
+        summary["coalesce"] = coalescer.stats()
+    if summary_extra:
+        summary.update(summary_extra())
+    emit(summary)
+    return 1 if summary["errors"] else 0
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+import email.utils
+import threading
+import time
+from urllib import parse
+
+
+# Notion allows an average of 3 requests per second per integration.
+DEFAULT_NOTION_RPS = 3.0
+# Longest single wait; a GitHub quota reset can be up to an hour away.
+DEFAULT_MAX_WAIT_SEC = 60.0
+# Below this many remaining GitHub requests, the rest are spread out until the reset.
+QUOTA_LOW_WATERMARK = 10
+
+
+def host_key(url):
+    parts = parse.urlsplit(url)
+    return parts.scheme, parts.hostname, parts.port
+
+
+def host_name(key):
+    scheme, host, port = key
+    return host if port is None else "{0}:{1}".format(host, port)
+
+
+def _header(headers, name):
+    if headers is None:
+        return None
+    return headers.get(name)
+
+
+def retry_after_sec(headers, now=None):
+    # Retry-After is either delta-seconds or an HTTP date.
+    value = _header(headers, "Retry-After")
+    if value is None:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when - (time.time() if now is None else now))
+
+
+def has_wait_hint(exc):
+    # The limiter already holds the host until then; callers skip their own backoff.
+    headers = getattr(exc, "headers", None)
+    return retry_after_sec(headers) is not None or _header(headers, "X-RateLimit-Remaining") == "0"
+
+
+def is_rate_limited(exc):
+    # GitHub signals an exhausted quota with 403 (or 429) and X-RateLimit-Remaining: 0.
+    return getattr(exc, "code", None) in (403, 429) and has_wait_hint(exc)
+
+
+class HostState:
+    def __init__(self, rate=0.0, burst=None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, float(int(rate)))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.block_reason = None
+        self.counters = {"requests": 0, "waits": 0, "waited_sec": 0.0, "throttled": 0}
+        self.quota = None
+
+
+class RateLimiter:
+    # One token bucket per API host, shared by every thread. Responses feed back
+    # Retry-After and X-RateLimit-* so the next requests wait instead of getting throttled.
+    def __init__(self, max_wait_sec=DEFAULT_MAX_WAIT_SEC):
+        self.max_wait_sec = max_wait_sec
+        self.lock = threading.Lock()
+        self.hosts = {}
+        self.local = threading.local()
+
+    def _host(self, key):
+        state = self.hosts.get(key)
+        if state is None:
+            state = self.hosts[key] = HostState()
+        return state
+
+    def configure(self, base_url, rate, burst=None):
+        # rate is requests per second; 0 only honors the response headers.
+        with self.lock:
+            state = self._host(host_key(base_url))
+            state.rate = rate
+            state.burst = burst if burst is not None else max(1.0, float(int(rate)))
+            state.tokens = state.burst
+
+    def _reserve(self, key):
+        now = time.monotonic()
+        with self.lock:
+            state = self._host(key)
+            state.counters["requests"] += 1
+            delay, reason = 0.0, None
+            if state.blocked_until > now:
+                delay, reason = state.blocked_until - now, state.block_reason
+            if state.rate > 0:
+                # Tokens may go negative: each caller reserves its slot, so concurrent
+                # callers are spaced 1/rate apart in arrival order.
+                state.tokens = min(state.burst, state.tokens + (now - state.updated) * state.rate)
+                state.updated = now
+                state.tokens -= 1
+                if state.tokens < 0 and -state.tokens / state.rate > delay:
+                    delay, reason = -state.tokens / state.rate, "pace"
+            capped = delay > self.max_wait_sec
+            delay = min(delay, self.max_wait_sec)
+            if delay > 0:
+                state.counters["waits"] += 1
+                state.counters["waited_sec"] += delay
+        return delay, reason, capped
+
+    def wait(self, url):
+        key = host_key(url)
+        delay, reason, capped = self._reserve(key)
+        if delay <= 0:
+            return 0.0
+        decision = {"host": host_name(key), "reason": reason, "wait_sec": round(delay, 3)}
+        if capped:
+            decision["capped"] = True
+        self._decisions().append(decision)
+        time.sleep(delay)
+        return delay
+
+    def observe(self, url, status, headers):
+        now = time.monotonic()
+        retry_after = retry_after_sec(headers)
+        remaining = _header(headers, "X-RateLimit-Remaining")
+        reset = _header(headers, "X-RateLimit-Reset")
+        with self.lock:
+            state = self._host(host_key(url))
+            if status == 429 or (status == 403 and (retry_after is not None or remaining == "0")):
+                state.counters["throttled"] += 1
+            if retry_after is not None:
+                self._block(state, now + retry_after, "retry_after")
+            if remaining is None or reset is None:
+                return
+            try:
+                remaining, reset_in = int(remaining), max(0.0, float(reset) - time.time())
+            except ValueError:
+                return
+            state.quota = {"remaining": remaining, "reset_in_sec": round(reset_in, 3)}
+            if remaining == 0:
+                self._block(state, now + reset_in, "quota_exhausted")
+            elif remaining < QUOTA_LOW_WATERMARK:
+                self._block(state, now + reset_in / remaining, "quota_low")
+
+    def _block(self, state, until, reason):
+        if until > state.blocked_until:
+            state.blocked_until = until
+            state.block_reason = reason
+
+    def _decisions(self):
+        if not hasattr(self.local, "decisions"):
+            self.local.decisions = []
+        return self.local.decisions
+
+    def report(self):
+        # Pacing decisions made on this thread since the last report (one action's worth).
+        decisions = self._decisions()
+        self.local.decisions = []
+        return {
+            "decisions": decisions,
+            "waited_sec": round(sum(d["wait_sec"] for d in decisions), 3),
+        }
+
+    def stats(self):
+        with self.lock:
+            stats = {}
+            for key, state in self.hosts.items():
+                host = dict(state.counters)
+                host["waited_sec"] = round(host["waited_sec"], 3)
+                host["rate"] = state.rate
+                host["burst"] = state.burst
+                if state.quota is not None:
+                    host["quota"] = dict(state.quota)
+                stats[host_name(key)] = host
+        return stats
+
+
+LIMITER = RateLimiter()
+
+
+def configure(base_url, rate, burst=None):
+    LIMITER.configure(base_url, rate, burst)
+
+
+def report():
+    return LIMITER.report()
+
+
+def stats():
+    return LIMITER.stats()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+import json
+import os
+import threading
+import time
+
+import state_store
+
+
+DEFAULT_SCHEMA_CACHE_PATH = "tools/notion_sync/.schema_cache.json"
+DEFAULT_SCHEMA_TTL_SEC = 3600.0
+
+
+class SchemaCache:
+    # Notion database metadata (GET /v1/databases/{id}) keyed by database id, kept in
+    # memory and in a JSON file shared by later runs. ttl_sec <= 0 disables caching.
+    def __init__(self, path=None, ttl_sec=DEFAULT_SCHEMA_TTL_SEC, refresh=False):
+        self.path = path
+        self.ttl_sec = ttl_sec
+        self.refresh = refresh
+        self.refreshed = set()
+        self.lock = threading.Lock()
+        self.entries = self._load()
+        self.counters = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        entries = data.get("databases") if isinstance(data, dict) else None
+        return entries if isinstance(entries, dict) else {}
+
+    def _save(self):
+        if not self.path:
+            return
+        state_store.write_json_atomic(self.path, {"databases": self.entries})
+
+    def _fresh(self, entry):
+        return isinstance(entry, dict) and time.time() - entry.get("fetched_at", 0) < self.ttl_sec
+
+    def get(self, db_id, fetch):
+        # Returns (db_info, hit). fetch() is only called on a miss; its errors propagate.
+        with self.lock:
+            entry = self.entries.get(db_id)
+            forced = self.refresh and db_id not in self.refreshed
+            if self.ttl_sec > 0 and not forced and self._fresh(entry):
+                self.counters["hits"] += 1
+                return entry["database"], True
+            self.counters["misses"] += 1
+        db_info = fetch()
+        with self.lock:
+            # --refresh-schema forces one fetch per database, not one per event.
+            self.refreshed.add(db_id)
+            if self.ttl_sec > 0:
+                self.entries[db_id] = {"fetched_at": time.time(), "database": db_info}
+                self._save()
+        return db_info, False
+
+    def invalidate(self, db_id):
+        with self.lock:
+            self.counters["invalidations"] += 1
+            if self.entries.pop(db_id, None) is not None:
+                self._save()
+
+    def stats(self, hit=None):
+        with self.lock:
+            stats = dict(self.counters)
+        stats["ttl_sec"] = self.ttl_sec
+        if hit is not None:
+            stats["hit"] = hit
+        return stats
+
+
+def is_schema_error(notion_error):
+    # Writes against a renamed/removed property fail with a validation_error naming it.
+    if not isinstance(notion_error, dict) or notion_error.get("code") != "validation_error":
+        return False
+    return "propert" in str(notion_error.get("message", "")).lower()
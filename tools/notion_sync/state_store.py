@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+
+SQLITE_SUFFIXES = (".sqlite3", ".sqlite", ".db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    map TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (map, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class JsonStateStore:
+    # One map (e.g. issue_number_by_task_key) plus top-level metadata in a JSON file, as
+    # the scripts have always kept it. The whole file is rewritten on flush(), so callers
+    # flush once per write batch or run; path None keeps everything in memory.
+    backend = "json"
+
+    def __init__(self, path, map_name):
+        self.path = path
+        self.map_name = map_name
+        self.lock = threading.Lock()
+        self.data = {map_name: {}}
+        self.meta_names = set()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                self.data = data
+                if not isinstance(data.get(map_name), dict):
+                    data[map_name] = {}
+        self.entries = self.data[map_name]
+
+    def get(self, key):
+        with self.lock:
+            return self.entries.get(key)
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+
+    def pop(self, key):
+        with self.lock:
+            return self.entries.pop(key, None)
+
+    def items(self):
+        with self.lock:
+            return sorted(self.entries.items())
+
+    def get_meta(self, name):
+        with self.lock:
+            return self.data.get(name)
+
+    def set_meta(self, name, value):
+        with self.lock:
+            self.data[name] = value
+            self.meta_names.add(name)
+
+    def update(self, changes, replace=False):
+        # (key, value) pairs, value None removes the key; replace=True drops every other key.
+        with self.lock:
+            if replace:
+                self.entries.clear()
+            for key, value in changes:
+                if value is None:
+                    self.entries.pop(key, None)
+                else:
+                    self.entries[key] = value
+
+    def flush(self):
+        # Other maps in the file (another scope or script sharing it) are kept as they are on
+        # disk now, not as they were when this store opened it.
+        if not self.path:
+            return
+        with self.lock:
+            data = {}
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                pass
+            if not isinstance(data, dict):
+                data = {}
+            data[self.map_name] = self.entries
+            for name in self.meta_names:
+                data[name] = self.data[name]
+            write_json_atomic(self.path, data)
+
+    def close(self):
+        return
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+
+class SqliteStateStore:
+    # The same map in SQLite (WAL): each put/pop is its own upsert/delete on the primary
+    # key and is durable when it returns, so flush() has nothing to do and several runners
+    # can share one file (writers wait up to 30 s for each other).
+    backend = "sqlite"
+
+    def __init__(self, path, map_name):
+        self.path = path
+        self.map_name = map_name
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def get(self, key):
+        with self.lock:
+            row = self.db.execute("SELECT value FROM entries WHERE map = ? AND key = ?", (self.map_name, key)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, value):
+        with self.lock:
+            self.db.execute(
+                "INSERT INTO entries (map, key, value, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (map, key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+                (self.map_name, key, json.dumps(value, ensure_ascii=True), time.time()),
+            )
+
+    def pop(self, key):
+        # No DELETE ... RETURNING: it needs SQLite 3.35, newer than some Python builds ship.
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.db.execute("SELECT value FROM entries WHERE map = ? AND key = ?", (self.map_name, key)).fetchone()
+                self.db.execute("DELETE FROM entries WHERE map = ? AND key = ?", (self.map_name, key))
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        return json.loads(row[0]) if row else None
+
+    def update(self, changes, replace=False):
+        # One transaction for a whole refresh, so other runners see all of it or none of it.
+        now = time.time()
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                if replace:
+                    self.db.execute("DELETE FROM entries WHERE map = ?", (self.map_name,))
+                for key, value in changes:
+                    if value is None:
+                        self.db.execute("DELETE FROM entries WHERE map = ? AND key = ?", (self.map_name, key))
+                    else:
+                        self.db.execute(
+                            "INSERT INTO entries (map, key, value, updated_at) VALUES (?, ?, ?, ?) "
+                            "ON CONFLICT (map, key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+                            (self.map_name, key, json.dumps(value, ensure_ascii=True), now),
+                        )
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def items(self):
+        with self.lock:
+            rows = self.db.execute("SELECT key, value FROM entries WHERE map = ? ORDER BY key", (self.map_name,)).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def get_meta(self, name):
+        with self.lock:
+            row = self.db.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_meta(self, name, value):
+        with self.lock:
+            self.db.execute(
+                "INSERT INTO meta (name, value) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value = excluded.value",
+                (name, json.dumps(value, ensure_ascii=True)),
+            )
+
+    def flush(self):
+        return
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM entries WHERE map = ?", (self.map_name,)).fetchone()[0]
+
+
+def write_json_atomic(path, data):
+    # Readers see the old file or the new one, never half of it.
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = "{0}.{1}.tmp".format(path, os.getpid())
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=True, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def is_sqlite_path(path):
+    return bool(path) and path.endswith(SQLITE_SUFFIXES)
+
+
+def open_store(path, map_name):
+    # The backend follows the file name: *.sqlite3 / *.sqlite / *.db is SQLite, anything else JSON.
+    if is_sqlite_path(path):
+        return SqliteStateStore(path, map_name)
+    return JsonStateStore(path, map_name)
+
+
+def open_cache(path, map_name):
+    # For data that can be rebuilt (indexes, fingerprints): an unreadable JSON file starts
+    # empty and is replaced on the next flush.
+    try:
+        return open_store(path, map_name)
+    except (OSError, ValueError):
+        store = JsonStateStore(None, map_name)
+        store.path = path
+        return store
+
+
+def remove(path):
+    # A SQLite store leaves -wal/-shm files next to it.
+    for name in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def migrate(src, dst):
+    # One-shot copy of a JSON state file into SQLite: every object-valued top-level key is a
+    # map, everything else metadata. One transaction, so a failure leaves dst unchanged.
+    with open(src, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError("state file is not a JSON object")
+    store = SqliteStateStore(dst, "")
+    now = time.time()
+    counts = {}
+    try:
+        store.db.execute("BEGIN IMMEDIATE")
+        for name, value in sorted(data.items()):
+            if isinstance(value, dict):
+                store.db.executemany(
+                    "INSERT OR REPLACE INTO entries (map, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                    [(name, key, json.dumps(v, ensure_ascii=True), now) for key, v in value.items()],
+                )
+                counts[name] = len(value)
+            else:
+                store.db.execute(
+                    "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, json.dumps(value, ensure_ascii=True))
+                )
+        store.db.execute("COMMIT")
+    except BaseException:
+        store.db.execute("ROLLBACK")
+        raise
+    finally:
+        store.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="notion_sync state store tools")
+    parser.add_argument("command", choices=["migrate"])
+    parser.add_argument("src", help="JSON state file (.live_state.json / .dry_run_state.json)")
+    parser.add_argument("dst", help="SQLite state file to create or update (*.sqlite3)")
+    args = parser.parse_args()
+
+    if not is_sqlite_path(args.dst):
+        print(json.dumps({"operation": "error", "reason": "dst_not_sqlite_path"}, ensure_ascii=True, indent=2))
+        return 2
+    try:
+        counts = migrate(args.src, args.dst)
+    except (OSError, ValueError) as exc:
+        print(json.dumps({"operation": "error", "reason": "migrate_failed", "detail": str(exc)}, ensure_ascii=True, indent=2))
+        return 1
+    print(json.dumps({"operation": "migrate", "src": args.src, "dst": args.dst, "entries": counts}, ensure_ascii=True, indent=2, sort_keys=True))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from urllib import error
+
+import event1_sync
+import event3_sync
+import event_queue
+import rate_limit
+import state_store
+
+
+DEFAULT_FEED_STATE_PATH = "tools/notion_sync/.task_feed.json"
+DEFAULT_INTERVAL_SEC = 60.0
+PAGE_SIZE = 100
+# Notion reports last_edited_time to the minute. A page is only marked as seen once its
+# minute is over (plus clock skew); until then a refetch may hide a later edit.
+SETTLE_SEC = 120.0
+CANDIDATE_SUMMARY_PROPERTIES = ["Summary", "要約", "Description", "説明"]
+
+
+def make_error(reason, extra=None):
+    output = {
+        "target": "notion.task_feed",
+        "operation": "error",
+        "reason": reason,
+    }
+    if extra:
+        output.update(extra)
+    return output
+
+
+def _epoch(timestamp):
+    return datetime.fromisoformat(timestamp.replace("Z", "+00:00")).timestamp()
+
+
+def _property(properties, names, prop_type):
+    for name in names:
+        prop = properties.get(name)
+        if isinstance(prop, dict) and prop.get("type") == prop_type:
+            return prop
+    for prop in properties.values():
+        if isinstance(prop, dict) and prop.get("type") == prop_type:
+            return prop
+    return None
+
+
+def page_event(page):
+    # A Tasks page as the event1 input it replaces. The property objects are passed as
+    # they are; event1's normalize_event reads Notion rich_text/title values.
+    properties = page.get("properties") if isinstance(page.get("properties"), dict) else {}
+    task_id = _property(properties, event3_sync.CANDIDATE_TASK_ID_PROPERTIES, "rich_text")
+    title = _property(properties, event3_sync.CANDIDATE_TITLE_PROPERTIES, "title")
+    summary = None
+    for name in CANDIDATE_SUMMARY_PROPERTIES:
+        if isinstance(properties.get(name), dict):
+            summary = properties[name]
+            break
+    created = page.get("created_time") == page.get("last_edited_time")
+    return {
+        "event_type": "notion.task.created" if created else "notion.task.updated",
+        "source_id": page["id"],
+        "payload": {"task_key": task_id, "title": title, "summary": summary, "last_edited_time": page.get("last_edited_time")},
+    }
+
+
+class TaskFeed:
+    # A change feed over one Tasks database. Each poll queries the pages with
+    # last_edited_time on or after the cursor (the newest one seen), ascending, and yields
+    # the ones not already seen with the same last_edited_time. The first poll, without a
+    # cursor, returns every page (or those edited since `since`).
+    def __init__(self, path, db_id, since=None):
+        self.path = path
+        self.db_id = db_id
+        self.lock = threading.Lock()
+        self.cursor = since
+        self.seen = {}
+        self.polled_at = 0.0
+        self.counters = {"polls": 0, "requests": 0, "pages_fetched": 0, "events": 0, "duplicates": 0, "skipped": 0}
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not isinstance(data, dict) or data.get("db_id") != self.db_id or not isinstance(data.get("seen"), dict):
+            return
+        self.cursor = data.get("cursor")
+        self.seen = data["seen"]
+        self.polled_at = data.get("polled_at", 0.0)
+
+    def _save(self):
+        if not self.path:
+            return
+        data = {"db_id": self.db_id, "cursor": self.cursor, "polled_at": self.polled_at, "seen": self.seen}
+        state_store.write_json_atomic(self.path, data)
+
+    def poll(self, query):
+        # query(body) is POST /v1/databases/{id}/query; errors propagate and nothing is
+        # marked as seen. Returns [(page, event)]; pass them to commit() once handed off.
+        with self.lock:
+            body = {"page_size": PAGE_SIZE, "sorts": [{"timestamp": "last_edited_time", "direction": "ascending"}]}
+            if self.cursor is not None:
+                body["filter"] = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": self.cursor}}
+            latest = {}
+            while True:
+                self.counters["requests"] += 1
+                result = query(body)
+                for page in result.get("results", []):
+                    if isinstance(page, dict) and "id" in page and page.get("last_edited_time"):
+                        latest[page["id"]] = page
+                if not result.get("has_more") or not result.get("next_cursor"):
+                    break
+                body = dict(body, start_cursor=result["next_cursor"])
+            self.counters["polls"] += 1
+            self.counters["pages_fetched"] += len(latest)
+            changes = []
+            for page in sorted(latest.values(), key=lambda p: (p["last_edited_time"], p["id"])):
+                if self.seen.get(page["id"]) == page["last_edited_time"]:
+                    self.counters["duplicates"] += 1
+                    continue
+                event = page_event(page)
+                if page.get("archived") or page.get("in_trash") or event1_sync.normalize_event(event)[1] is not None:
+                    # Deleted, or no valid TaskKey: event1 cannot use it. Mark it seen without an event.
+                    self.counters["skipped"] += 1
+                    event = None
+                changes.append((page, event))
+            return changes
+
+    def commit(self, changes):
+        with self.lock:
+            now = time.time()
+            for page, event in changes:
+                edited = page["last_edited_time"]
+                if now - _epoch(edited) >= SETTLE_SEC:
+                    self.seen[page["id"]] = edited
+                if self.cursor is None or _epoch(edited) > _epoch(self.cursor):
+                    self.cursor = edited
+                if event is not None:
+                    self.counters["events"] += 1
+            # The query never returns pages edited before the cursor again.
+            if self.cursor is not None:
+                floor = _epoch(self.cursor)
+                self.seen = {page_id: edited for page_id, edited in self.seen.items() if _epoch(edited) >= floor}
+            self.polled_at = now
+            self._save()
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats["cursor"] = self.cursor
+            stats["seen"] = len(self.seen)
+        return stats
+
+
+def run_poll(feed, query, deliver):
+    started = time.monotonic()
+    try:
+        changes = feed.poll(query)
+    except error.HTTPError as exc:
+        return make_error("notion_query_http_error", {"http_status": exc.code})
+    except Exception as exc:
+        return make_error("notion_query_error", {"detail": str(exc)})
+    events = [event for _, event in changes if event is not None]
+    deliver(events)
+    feed.commit(changes)
+    summary = {"target": "notion.task_feed", "operation": "poll", "new_events": len(events), "seconds": round(time.monotonic() - started, 6)}
+    summary.update(feed.stats())
+    summary["rate_limit"] = rate_limit.stats()
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Poll the Notion Tasks database for changed pages and emit event1 input events "
+        "(NDJSON on stdout, or --enqueue into the durable queue)"
+    )
+    parser.add_argument(
+        "--feed-state",
+        default=DEFAULT_FEED_STATE_PATH,
+        help="JSON file with the last_edited_time cursor and the pages already emitted",
+    )
+    parser.add_argument("--since", help="Without a saved cursor: start at this last_edited_time (ISO 8601) instead of every page")
+    parser.add_argument(
+        "--interval-sec",
+        type=float,
+        default=0.0,
+        help="Poll again every this many seconds (0: poll once and exit; e.g. {0})".format(DEFAULT_INTERVAL_SEC),
+    )
+    parser.add_argument(
+        "--enqueue",
+        nargs="?",
+        const=event_queue.DEFAULT_QUEUE_PATH,
+        help="Add the events to this durable queue (topic github.issue) for event1_sync.py --drain "
+        "(default path: {0})".format(event_queue.DEFAULT_QUEUE_PATH),
+    )
+    parser.add_argument("--max-retries", type=int, default=event3_sync.DEFAULT_MAX_RETRIES)
+    parser.add_argument("--backoff-base-sec", type=float, default=event3_sync.DEFAULT_BACKOFF_BASE_SEC)
+    parser.add_argument("--backoff-factor", type=float, default=event3_sync.DEFAULT_BACKOFF_FACTOR)
+    parser.add_argument("--notion-api-base", default=event3_sync.DEFAULT_NOTION_API_BASE)
+    parser.add_argument(
+        "--notion-rps",
+        type=float,
+        default=rate_limit.DEFAULT_NOTION_RPS,
+        help="Average Notion requests per second (0 only honors Retry-After)",
+    )
+    args = parser.parse_args()
+
+    # Summaries and errors go to stderr: stdout carries only events, for event1_sync.py --events-ndjson -.
+    if args.max_retries < 0 or args.backoff_base_sec <= 0 or args.backoff_factor <= 0 or args.notion_rps < 0:
+        print(json.dumps(make_error("invalid_retry_options"), ensure_ascii=True, indent=2), file=sys.stderr)
+        return 2
+    if args.interval_sec < 0:
+        print(json.dumps(make_error("invalid_interval"), ensure_ascii=True, indent=2), file=sys.stderr)
+        return 2
+    if args.since:
+        try:
+            _epoch(args.since)
+        except ValueError:
+            print(json.dumps(make_error("invalid_since"), ensure_ascii=True, indent=2), file=sys.stderr)
+            return 2
+    cfg, missing = event3_sync.read_live_config()
+    if missing:
+        print(json.dumps(make_error("missing_live_config", {"missing": missing}), ensure_ascii=True, indent=2), file=sys.stderr)
+        return 1
+    rate_limit.configure(args.notion_api_base, args.notion_rps)
+
+    retry_policy = {
+        "max_retries": args.max_retries,
+        "backoff_base_sec": args.backoff_base_sec,
+        "backoff_factor": args.backoff_factor,
+    }
+    url = "{0}/v1/databases/{1}/query".format(args.notion_api_base.rstrip("/"), cfg["notion_tasks_db_id"])
+
+    def query(body):
+        return event3_sync._request_with_retry("POST", url, cfg["notion_token"], retry_policy, body)[0]
+
+    queue = event_queue.EventQueue(args.enqueue) if args.enqueue else None
+
+    def deliver(events):
+        for event in events:
+            if queue is not None:
+                queue.enqueue("github.issue", event, event1_sync.idempotency_key(event))
+            else:
+                print(json.dumps(event, ensure_ascii=True, sort_keys=True), flush=True)
+
+    feed = TaskFeed(args.feed_state, cfg["notion_tasks_db_id"], args.since)
+    try:
+        while True:
+            summary = run_poll(feed, query, deliver)
+            if queue is not None and summary.get("operation") != "error":
+                summary["queue"] = queue.stats("github.issue")
+            print(json.dumps(summary, ensure_ascii=True, sort_keys=True), file=sys.stderr, flush=True)
+            if args.interval_sec <= 0:
+                return 0 if summary.get("operation") != "error" else 1
+            time.sleep(args.interval_sec)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        if queue is not None:
+            queue.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
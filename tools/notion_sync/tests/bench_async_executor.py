@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from test_async_executor import SlowTaskState, build_handler  # noqa: E402
+
+SYNC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def drain(base, cache_path, events, concurrency):
+    env = dict(os.environ, NOTION_TOKEN="dummy", NOTION_TASKS_DB_ID="db-tasks")
+    start = time.perf_counter()
+    out = subprocess.check_output(
+        ["python3", os.path.join(SYNC_DIR, "event3_sync.py"), "--mode", "live", "--events-ndjson", "-",
+         "--concurrency", str(concurrency), "--notion-api-base", base, "--schema-cache", cache_path, "--max-retries", "0",
+         "--notion-rps", "0"],
+        input="".join(json.dumps(e) + "\n" for e in events),
+        env=env,
+        text=True,
+    )
+    seconds = time.perf_counter() - start
+    summary = json.loads(out.splitlines()[-1])
+    assert summary["errors"] == 0 and summary["events"] == len(events), summary
+    return {"seconds": round(seconds, 3), "events_per_sec": round(len(events) / seconds, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drain an event3 backlog serially vs with --concurrency")
+    parser.add_argument("--events", type=int, default=500)
+    parser.add_argument("--keys", type=int, default=100, help="Distinct task keys in the backlog")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Mock Notion latency per query/PATCH")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 16, 32])
+    args = parser.parse_args()
+
+    state = SlowTaskState(args.latency_ms / 1000.0)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), build_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = "http://127.0.0.1:{0}".format(server.server_address[1])
+    events = [
+        {"event_type": "github.ci.failed" if i % 3 else "github.pr.merged", "payload": {"task_key": "TSK-20260401-{0:04d}".format(i % args.keys)}}
+        for i in range(args.events)
+    ]
+    try:
+        with tempfile.TemporaryDirectory() as td:
+            cache_path = os.path.join(td, "schema.json")
+            results = {"serial": drain(base, cache_path, events, 1)}
+            for concurrency in args.concurrency:
+                row = drain(base, cache_path, events, concurrency)
+                row["speedup"] = round(results["serial"]["seconds"] / row["seconds"], 2)
+                results["concurrency_{0}".format(concurrency)] = row
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    print(json.dumps({"events": args.events, "keys": args.keys, "latency_ms": args.latency_ms, "results": results},
+                     ensure_ascii=True, indent=2, sort_keys=True))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from urllib import request
+
+SYNC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, SYNC_DIR)
+sys.path.insert(0, os.path.dirname(__file__))
+
+import event1_sync  # noqa: E402
+import event2_sync  # noqa: E402
+import http_pool  # noqa: E402
+import state_store  # noqa: E402
+import test_event1_live_mock  # noqa: E402
+import test_event2_live_mock  # noqa: E402
+
+RETRY_POLICY = {"max_retries": 0, "backoff_base_sec": 0.01, "backoff_factor": 2.0}
+
+
+def urlopen_json(method, url, headers, data=None, timeout=None):
+    # The per-call urlopen() the scripts used before http_pool: one TCP connection per request.
+    body = None
+    if data is not None:
+        body = json.dumps(data).encode("utf-8")
+    req = request.Request(url=url, method=method, headers=headers, data=body)
+    with request.urlopen(req, timeout=timeout) as resp:
+        payload = resp.read().decode("utf-8")
+        return json.loads(payload) if payload else {}
+
+
+def keep_alive(handler):
+    # Like a real API front end: HTTP/1.1 keep-alive, and no Nagle delay between the
+    # handler's separate header and body writes.
+    class Handler(handler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+    return Handler
+
+
+def serve(handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:{0}".format(server.server_address[1])
+
+
+def run_event1(base, count, offset):
+    cfg = {"github_token": "dummy", "github_owner": "o", "github_repo": "r"}
+    live_state = state_store.JsonStateStore(None, "issue_number_by_task_key")
+    for i in range(count):
+        event = {"event_type": "notion.task.updated", "payload": {"task_key": "TSK-20260101-{0:04d}".format(offset + i), "title": "t"}}
+        norm, _ = event1_sync.normalize_event(event)
+        # create (list + search + POST), then update through the live-state mapping (list + PATCH)
+        for _ in range(2):
+            action = event1_sync.live_action(norm, cfg, RETRY_POLICY, base, live_state)
+            assert action["operation"] in {"create", "update"}, action
+
+
+def run_event2(base, count, offset):
+    cfg = {"notion_token": "dummy", "notion_knowledge_db_id": "db-knowledge"}
+    for i in range(count):
+        event = {"event_type": "github.pr.opened", "payload": {"url": "https://github.com/o/r/pull/{0}".format(offset + i), "number": i}}
+        norm, _ = event2_sync.normalize_event(event)
+        for _ in range(2):
+            action = event2_sync.live_action(norm, cfg, RETRY_POLICY, base, "GitHub Canonical Link")
+            assert action["operation"] in {"create", "update"}, action
+
+
+def measure(run, base, count, offset, pooled):
+    http_pool.POOL = http_pool.ConnectionPool()
+    original = http_pool.request_json
+    if not pooled:
+        http_pool.request_json = urlopen_json
+    try:
+        start = time.perf_counter()
+        run(base, count, offset)
+        seconds = time.perf_counter() - start
+    finally:
+        http_pool.request_json = original
+    stats = http_pool.stats()
+    result = {"events": count * 2, "seconds": round(seconds, 4), "events_per_sec": round(count * 2 / seconds, 1)}
+    if pooled:
+        result.update({k: stats[k] for k in ("requests", "connections_opened", "connections_reused")})
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark urlopen vs http_pool against the local mock servers")
+    parser.add_argument("--events", type=int, default=200)
+    args = parser.parse_args()
+
+    github_state = test_event1_live_mock.MockGitHubState()
+    github_state.fail_first_list = False
+    notion_state = test_event2_live_mock.MockNotionState()
+    notion_state.fail_first_query = False
+    github, github_base = serve(keep_alive(test_event1_live_mock.build_handler(github_state)))
+    notion, notion_base = serve(keep_alive(test_event2_live_mock.build_handler(notion_state)))
+
+    results = {}
+    try:
+        for name, run, base in (("event1", run_event1, github_base), ("event2", run_event2, notion_base)):
+            urlopen_result = measure(run, base, args.events, 0, False)
+            pooled_result = measure(run, base, args.events, args.events, True)
+            results[name] = {
+                "urlopen": urlopen_result,
+                "pooled": pooled_result,
+                "speedup": round(pooled_result["events_per_sec"] / urlopen_result["events_per_sec"], 2),
+            }
+    finally:
+        for server in (github, notion):
+            server.shutdown()
+            server.server_close()
+
+    print(json.dumps(results, ensure_ascii=True, indent=2, sort_keys=True))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+SYNC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, SYNC_DIR)
+
+import state_store  # noqa: E402
+
+
+def task_key(n):
+    return "TSK-20260101-{0:06d}".format(n)
+
+
+def seed(path, keys):
+    # Both backends start from the same JSON file; the SQLite one goes through migrate().
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"issue_number_by_task_key": {task_key(n): n + 1 for n in range(keys)}}, f)
+
+
+def measure(store, keys, writes):
+    # One event as event1 handles it: look the task key up, write the mapping, persist.
+    rng = random.Random(1)
+    start = time.perf_counter()
+    for i in range(writes):
+        key = task_key(rng.randrange(keys * 2))
+        store.get(key)
+        store.put(key, keys + i)
+        store.flush()
+    seconds = time.perf_counter() - start
+    return {"writes": writes, "seconds": round(seconds, 4), "writes_per_sec": round(writes / seconds, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the JSON vs SQLite state backends at a large task-key count")
+    parser.add_argument("--keys", type=int, default=100000)
+    parser.add_argument("--writes", type=int, default=200)
+    args = parser.parse_args()
+
+    results = {"keys": args.keys}
+    with tempfile.TemporaryDirectory() as td:
+        json_path = os.path.join(td, "live.json")
+        sqlite_path = os.path.join(td, "live.sqlite3")
+        seed(json_path, args.keys)
+
+        start = time.perf_counter()
+        state_store.migrate(json_path, sqlite_path)
+        results["migrate_seconds"] = round(time.perf_counter() - start, 4)
+
+        for name, path in (("json", json_path), ("sqlite", sqlite_path)):
+            start = time.perf_counter()
+            store = state_store.open_store(path, "issue_number_by_task_key")
+            opened = time.perf_counter() - start
+            results[name] = measure(store, args.keys, args.writes)
+            results[name]["open_seconds"] = round(opened, 4)
+            results[name]["file_bytes"] = os.path.getsize(path)
+            store.close()
+    results["speedup"] = round(results["sqlite"]["writes_per_sec"] / results["json"]["writes_per_sec"], 2)
+
+    print(json.dumps(results, ensure_ascii=True, indent=2, sort_keys=True))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
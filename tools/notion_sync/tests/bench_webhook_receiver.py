@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from urllib import request
+
+SYNC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import test_event2_live_mock  # noqa: E402
+
+
+def pr_event(n):
+    return {"event_type": "github.pr.synchronize", "payload": {"url": "https://github.com/o/r/pull/{0}".format(n), "number": n}}
+
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+
+    def pick(q):
+        return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 1)
+
+    return {"events": len(latencies), "p50_ms": pick(0.5), "p95_ms": pick(0.95)}
+
+
+def per_event_subprocess(common, env, td, count):
+    # What the external relay does today: one JSON file and one interpreter per webhook.
+    latencies = []
+    path = os.path.join(td, "event.json")
+    for i in range(count):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(pr_event(i), f)
+        start = time.perf_counter()
+        subprocess.check_output(["python3", os.path.join(SYNC_DIR, "event2_sync.py"), "--event", path] + common, env=env)
+        latencies.append(time.perf_counter() - start)
+    return percentiles(latencies)
+
+
+def receiver(common, env, count):
+    proc = subprocess.Popen(
+        ["python3", os.path.join(SYNC_DIR, "webhook_receiver.py"), "--port", "0"] + common,
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    try:
+        while True:
+            line = json.loads(proc.stderr.readline())
+            if line["operation"] == "listening":
+                break
+        url = "http://127.0.0.1:{0}/events?wait=1".format(line["port"])
+        latencies = []
+        for i in range(count):
+            body = json.dumps(pr_event(i)).encode("utf-8")
+            start = time.perf_counter()
+            with request.urlopen(request.Request(url, data=body, method="POST"), timeout=30) as resp:
+                assert resp.status == 200, resp.status
+                resp.read()
+            latencies.append(time.perf_counter() - start)
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+    return percentiles(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Webhook-to-action latency: one subprocess per event vs webhook_receiver.py")
+    parser.add_argument("--events", type=int, default=50)
+    args = parser.parse_args()
+
+    state = test_event2_live_mock.MockNotionState()
+    state.fail_first_query = False
+    server = ThreadingHTTPServer(("127.0.0.1", 0), test_event2_live_mock.build_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    env = dict(os.environ, NOTION_TOKEN="dummy", NOTION_KNOWLEDGE_DB_ID="db-knowledge", GITHUB_TOKEN="dummy",
+               GITHUB_OWNER="o", GITHUB_REPO="r", NOTION_TASKS_DB_ID="db-tasks")
+    try:
+        with tempfile.TemporaryDirectory() as td:
+            common = ["--mode", "live", "--notion-api-base", "http://127.0.0.1:{0}".format(server.server_address[1]),
+                      "--notion-rps", "0", "--schema-cache", os.path.join(td, "schema.json")]
+            results = {"subprocess": per_event_subprocess(common, env, td, args.events), "receiver": receiver(common, env, args.events)}
+    finally:
+        server.shutdown()
+        server.server_close()
+    results["p50_speedup"] = round(results["subprocess"]["p50_ms"] / results["receiver"]["p50_ms"], 2)
+
+    print(json.dumps(results, ensure_ascii=True, indent=2, sort_keys=True))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SYNC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, SYNC_DIR)
+
+import async_executor  # noqa: E402
+
+
+class SlowTaskState:
+    def __init__(self, latency_sec):
+        self.lock = threading.Lock()
+        self.latency_sec = latency_sec
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.states = {}
+
+    def enter(self):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+
+def build_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length", "0"))
+            return json.loads(self.rfile.read(length).decode("utf-8") if length else "{}")
+
+        def _slow(self):
+            state.enter()
+            try:
+                time.sleep(state.latency_sec)
+            finally:
+                state.leave()
+
+        def do_GET(self):
+            self._send(200, {"properties": {"Task Name": {"type": "title"}, "Task ID": {"type": "rich_text"},
+                                            "Execution State": {"type": "select"}}})
+
+        def do_POST(self):
+            payload = self._read_json()
+            self._slow()
+            task_key = payload["filter"]["rich_text"]["equals"]
+            self._send(200, {"results": [{"id": "page-" + task_key}]})
+
+        def do_PATCH(self):
+            payload = self._read_json()
+            self._slow()
+            task_key = self.path.rsplit("/", 1)[-1][len("page-"):]
+            with state.lock:
+                state.states.setdefault(task_key, []).append(payload["properties"]["Execution State"]["select"]["name"])
+            self._send(200, {"id": "page-" + task_key})
+
+        def log_message(self, fmt, *args):
+            return
+
+    return Handler
+
+
+async def executor_order():
+    executor = async_executor.KeyedExecutor(concurrency=3)
+    log = []
+    active = []
+
+    def job(key, n):
+        active.append(1)
+        peak = len(active)
+        time.sleep(0.01 * (3 - n % 3))
+        active.pop()
+        log.append((key, n))
+        if n == 4:
+            raise RuntimeError("job failed")
+        return peak
+
+    tasks = [executor.submit("k{0}".format(n % 2), job, "k{0}".format(n % 2), n) for n in range(10)]
+    tasks.append(executor.submit(None, job, None, 10))
+    await asyncio.wait(tasks)
+    executor.close()
+    peaks = [t.result() for t in tasks if t.exception() is None]
+    assert max(peaks) <= 3, peaks
+    for key in ("k0", "k1"):
+        assert [n for k, n in log if k == key] == [n for n in range(10) if "k{0}".format(n % 2) == key], log
+    assert isinstance(tasks[4].exception(), RuntimeError) and executor.tails == {}, executor.tails
+    stats = executor.stats()
+    assert stats["submitted"] == 11 and stats["waited_on_key"] == 8 and stats["max_in_flight"] <= 3, stats
+
+
+def main():
+    asyncio.run(executor_order())
+    print("PASS: same-key jobs keep submission order, a failed job does not block its key")
+
+    state = SlowTaskState(0.03)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), build_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = "http://127.0.0.1:{0}".format(server.server_address[1])
+    try:
+        keys = ["TSK-20260401-{0:04d}".format(i) for i in range(6)]
+        events = []
+        for i in range(36):
+            event_type = "github.pr.merged" if i % 4 in (0, 3) else "github.ci.failed"
+            events.append({"event_type": event_type, "payload": {"task_key": keys[i % len(keys)]}})
+        env = dict(os.environ, NOTION_TOKEN="dummy", NOTION_TASKS_DB_ID="db-tasks")
+        proc = subprocess.run(
+            ["python3", os.path.join(SYNC_DIR, "event3_sync.py"), "--mode", "live", "--events-ndjson", "-",
+             "--concurrency", "6", "--notion-api-base", base, "--schema-ttl-sec", "0", "--notion-rps", "0"],
+            input="".join(json.dumps(e) + "\n" for e in events),
+            env=env,
+            text=True,
+            capture_output=True,
+        )
+        assert proc.returncode == 0, (proc.stdout, proc.stderr)
+        lines = [json.loads(line) for line in proc.stdout.splitlines()]
+        actions, summary = lines[:-1], lines[-1]
+        assert sorted(a["line"] for a in actions) == list(range(1, 37)), actions
+        for key in keys:
+            expected = [("Merged" if e["event_type"] == "github.pr.merged" else "CI Failed") for e in events if e["payload"]["task_key"] == key]
+            assert state.states[key] == expected, (key, state.states[key], expected)
+        assert 1 < state.max_in_flight <= 6, state.max_in_flight
+        assert summary["executor"]["concurrency"] == 6 and summary["executor"]["waited_on_key"] > 0, summary
+        assert summary["http"]["connections_opened"] <= 6, summary
+        print("PASS: event3 --concurrency runs keys in parallel and keeps per-key order")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import urllib.parse
+from http.server import ThreadingHTTPServer
+
+SYNC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import test_event1_live_mock  # noqa: E402
+
+
+def build_handler(state, requests):
+    base = test_event1_live_mock.build_handler(state)
+
+    class CountingGitHub(base):
+        def _count(self):
+            with state.lock:
+                requests.append("{0} {1}".format(self.command, urllib.parse.urlparse(self.path).path))
+
+        def do_GET(self):
+            self._count()
+            parsed = urllib.parse.urlparse(self.path)
+            q = urllib.parse.parse_qs(parsed.query)
+            if parsed.path.startswith("/repos/") and parsed.path.endswith("/issues") and "labels" not in q:
+                # Unfiltered listing for --reconcile, two issues per page.
+                page = int(q.get("page", ["1"])[0])
+                per_page = int(q.get("per_page", ["30"])[0])
+                with state.lock:
+                    items = state.issues[(page - 1) * per_page : page * per_page]
+                self._send_json(200, items)
+                return
+            base.do_GET(self)
+
+        def do_POST(self):
+            self._count()
+            base.do_POST(self)
+
+        def do_PATCH(self):
+            self._count()
+            base.do_PATCH(self)
+
+    return CountingGitHub
+
+
+def main():
+    state = test_event1_live_mock.MockGitHubState()
+    state.fail_first_list = False
+    requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), build_handler(state, requests))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = "http://127.0.0.1:{0}".format(server.server_address[1])
+    env = dict(os.environ, GITHUB_TOKEN="dummy", GITHUB_OWNER="o", GITHUB_REPO="r")
+
+    try:
+        with tempfile.TemporaryDirectory() as td:
+            live_state = os.path.join(td, "live.json")
+
+            def run(task_key, extra, expect_status=0):
+                event_path = os.path.join(td, "event.json")
+                with open(event_path, "w", encoding="utf-8") as f:
+                    json.dump({"event_type": "notion.task.updated", "payload": {"task_key": task_key, "title": "t"}}, f)
+                del requests[:]
+                proc = subprocess.run(
+                    ["python3", os.path.join(SYNC_DIR, "event1_sync.py"), "--mode", "live", "--event", event_path,
+                     "--github-api-base", base, "--live-state", live_state, "--backoff-base-sec", "0.01"] + extra,
+                    env=env,
+                    text=True,
+                    capture_output=True,
+                )
+                assert proc.returncode == expect_status, (proc.stdout, proc.stderr)
+                return json.loads(proc.stdout)
+
+            created = run("TSK-20260401-0001", ["--cache-first"])
+            assert created["operation"] == "create" and created["lookup"] == "search", created
+            updated = run("TSK-20260401-0001", ["--cache-first"])
+            assert updated["operation"] == "update" and updated["lookup"] == "cache", updated
+            assert requests == ["PATCH /repos/o/r/issues/1"], requests
+            assert updated["retry"] == {"list": 0, "search": 0, "write": 0, "policy": updated["retry"]["policy"]}, updated
+            updated = run("TSK-20260401-0001", [])
+            assert updated["lookup"] == "search" and len(requests) == 2, requests
+            print("PASS: --cache-first updates a known task key with a single PATCH")
+
+            # The mapped issue is gone (deleted on GitHub): 404 -> list/search -> create.
+            with state.lock:
+                state.issues = []
+            recreated = run("TSK-20260401-0001", ["--cache-first"])
+            assert recreated["operation"] == "create" and recreated["cache_fallback"] == "not_found", recreated
+            assert [r.split()[0] for r in requests] == ["PATCH", "GET", "GET", "POST"], requests
+            with open(live_state, encoding="utf-8") as f:
+                assert json.load(f)["issue_number_by_task_key"]["TSK-20260401-0001"] == recreated["issue_number"]
+            print("PASS: a 404 on the cached issue falls back to list/search and remaps")
+
+            # Issues made outside this script: a duplicate for 0001, and 0002/0003 never mapped.
+            for key in ("TSK-20260401-0001", "TSK-20260401-0002", "TSK-20260401-0003"):
+                state.create_issue({"title": key, "labels": ["taskkey:" + key, "status:draft"]})
+            with open(live_state, encoding="utf-8") as f:
+                data = json.load(f)
+            data["issue_number_by_task_key"]["TSK-20260401-0003"] = 99
+            data["issue_number_by_task_key"]["TSK-20260401-0009"] = 7
+            with open(live_state, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+
+            env_args = ["python3", os.path.join(SYNC_DIR, "event1_sync.py"), "--mode", "live", "--reconcile",
+                        "--github-api-base", base, "--live-state", live_state]
+            del requests[:]
+            proc = subprocess.run(env_args, env=env, text=True, capture_output=True)
+            assert proc.returncode == 1, (proc.stdout, proc.stderr)
+            report = json.loads(proc.stdout)
+            assert report["operation"] == "reconcile" and report["issues_scanned"] == 4, report
+            assert report["duplicates"] == {"TSK-20260401-0001": [2, 3]}, report
+            assert report["added"] == ["TSK-20260401-0002"] and report["dropped"] == ["TSK-20260401-0009"], report
+            assert report["remapped"] == {"TSK-20260401-0003": {"from": 99, "to": 5}}, report
+            assert requests == ["GET /repos/o/r/issues"], requests
+            with open(live_state, encoding="utf-8") as f:
+                mapping = json.load(f)["issue_number_by_task_key"]
+            assert mapping == {"TSK-20260401-0001": 2, "TSK-20260401-0002": 4, "TSK-20260401-0003": 5}, mapping
+            print("PASS: --reconcile reports duplicate taskkey labels and repairs the mapping")
+
+            updated = run("TSK-20260401-0002", ["--cache-first"])
+            assert updated["lookup"] == "cache" and updated["issue_number"] == 4 and len(requests) == 1, (updated, requests)
+            print("PASS: reconciled mappings feed the cache-first path")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
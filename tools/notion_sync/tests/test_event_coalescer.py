@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+SYNC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, SYNC_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import event_coalescer  # noqa: E402
+import test_event2_live_mock  # noqa: E402
+
+
+def keyed(key, n, kind="update"):
+    return {"key": key, "n": n, "kind": kind}
+
+
+def run_coalescer(window_sec, items):
+    coalescer = event_coalescer.Coalescer(window_sec, lambda e: e["key"], lambda e: e["kind"] == "terminal")
+    out = [(line_no, coalescer.collapsed_lines(line_no)) for line_no, _ in coalescer.run(iter(items))]
+    return out, coalescer.stats()
+
+
+def pr_event(n, title):
+    url = "https://github.com/o/r/pull/{0}".format(n)
+    return {"event_type": "github.pr.synchronize", "payload": {"url": url, "number": n, "title": title}}
+
+
+def run_script(script, events, extra, env=None):
+    out = subprocess.check_output(
+        ["python3", os.path.join(SYNC_DIR, script), "--events-ndjson", "-"] + extra,
+        input="".join(json.dumps(e) + "\n" for e in events),
+        env=env,
+        text=True,
+    )
+    lines = [json.loads(line) for line in out.splitlines()]
+    return lines[:-1], lines[-1]
+
+
+def main():
+    items = [(1, keyed("a", 1)), (2, keyed("a", 2)), (3, keyed("b", 3)), (4, ValueError("bad")),
+             (5, keyed("a", 4)), (6, keyed("b", 5, "terminal")), (7, keyed("b", 6))]
+    out, stats = run_coalescer(60, items)
+    # Invalid lines and terminal events pass at once; b's pending event goes out before its terminal one.
+    assert out == [(4, None), (3, None), (6, None), (5, [1, 2]), (7, None)], out
+    assert stats["collapsed"] == 2 and stats["terminal"] == 1 and stats["held"] == 3, stats
+    print("PASS: latest event per key wins; terminal events flush their key and are never dropped")
+
+    gate = threading.Event()
+
+    def slow_input():
+        yield 1, keyed("a", 1)
+        yield 2, keyed("a", 2)
+        gate.wait(5)
+        yield 3, keyed("a", 3)
+
+    coalescer = event_coalescer.Coalescer(0.1, lambda e: e["key"])
+    released = coalescer.run(slow_input())
+    started = time.monotonic()
+    first = next(released)
+    assert first[0] == 2 and time.monotonic() - started < 2, first
+    gate.set()
+    assert [line_no for line_no, _ in released] == [3], coalescer.stats()
+    print("PASS: a held event is released when its window ends, while the input is still open")
+
+    state = test_event2_live_mock.MockNotionState()
+    state.fail_first_query = False
+    server = ThreadingHTTPServer(("127.0.0.1", 0), test_event2_live_mock.build_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    env = dict(os.environ, NOTION_TOKEN="dummy", NOTION_KNOWLEDGE_DB_ID="db-knowledge")
+    live = ["--mode", "live", "--notion-api-base", "http://127.0.0.1:{0}".format(server.server_address[1]),
+            "--notion-rps", "0", "--schema-ttl-sec", "0"]
+    try:
+        # A force-push series: 20 synchronize events for one PR, 10 for another.
+        events = [pr_event(1, "push {0}".format(n)) for n in range(20)] + [pr_event(2, "push {0}".format(n)) for n in range(10)]
+        actions, summary = run_script("event2_sync.py", events, live + ["--coalesce-window-sec", "5"], env)
+        assert [a["operation"] for a in actions] == ["create", "create"], actions
+        assert [a["line"] for a in actions] == [20, 30] and actions[0]["coalesced_lines"] == list(range(1, 20)), actions
+        assert summary["coalesce"]["collapsed"] == 28 and summary["http"]["requests"] == 6, summary
+        titles = sorted(p["properties"]["Name"]["title"][0]["text"]["content"] for p in state.pages)
+        assert titles == ["PR #1: push 19", "PR #2: push 9"], titles
+        _, summary = run_script("event2_sync.py", events, live, env)
+        assert summary["events"] == 30 and summary["http"]["requests"] == 90, summary
+        print("PASS: event2 applies one write per PR for a burst (6 requests instead of 90)")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    task = {"task_key": "TSK-20260401-0001"}
+    events = [{"event_type": "github.ci.failed", "payload": task}, {"event_type": "github.pr.merged", "payload": task},
+              {"event_type": "github.ci.failed", "payload": task}]
+    actions, summary = run_script("event3_sync.py", events, ["--mode", "dry-run", "--coalesce-window-sec", "5"])
+    assert [a["fields"]["Execution State"] for a in actions] == ["CI Failed", "Merged", "CI Failed"], actions
+    assert summary["coalesce"]["terminal"] == 3 and summary["coalesce"]["collapsed"] == 0, summary
+    print("PASS: event3 merge/CI-failure events pass the window unchanged and in order")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+SYNC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, SYNC_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import event_queue  # noqa: E402
+import test_event1_live_mock  # noqa: E402
+
+
+def task_event(n, title="t", event_type="notion.task.updated"):
+    return {"event_type": event_type, "payload": {"task_key": "TSK-20260401-{0:04d}".format(n), "title": title}}
+
+
+def ids(leased):
+    return [event_id for event_id, _, _ in leased]
+
+
+def run(args, stdin=None, env=None):
+    proc = subprocess.run(["python3"] + args, input=stdin, env=env, text=True, capture_output=True)
+    lines = [json.loads(line) for line in proc.stdout.splitlines()]
+    assert lines, proc.stderr
+    return proc.returncode, lines
+
+
+def main():
+    with tempfile.TemporaryDirectory() as td:
+        queue = event_queue.EventQueue(os.path.join(td, "q.sqlite3"))
+        for key in ("a", "a", "b", None):
+            queue.enqueue("t", {"key": key}, key)
+        queue.enqueue("other", {"key": "a"}, "a")
+        # The second "a" waits until the first one is acked or dead.
+        assert ids(queue.lease("t", "w1", limit=10)) == [1, 3, 4]
+        assert queue.lease("t", "w2", limit=10) == []
+        assert queue.nack(1, "w1", "boom", 0) and queue.ack(4, "w1")
+        assert queue.lease("t", "w1", limit=10) == [(1, {"key": "a"}, 2)]
+        assert queue.ack(1, "w1")
+        assert ids(queue.lease("t", "w1", limit=10)) == [2]
+        stats = queue.stats("t")
+        assert stats["leased"] == 2 and stats["done"] == 2 and stats["depth"] == 2, stats
+        print("PASS: lease keeps per-key order; nack retries; ack completes")
+
+        queue.enqueue("t", {"key": "c"}, "c")
+        assert ids(queue.lease("t", "crashed", lease_sec=0.05, limit=10)) == [6]
+        time.sleep(0.1)
+        # The worker never acked: the event is delivered again once the lease runs out.
+        assert queue.lease("t", "w3", limit=10) == [(6, {"key": "c"}, 2)]
+        # The crashed worker comes back late: its ack must not complete w3's lease.
+        assert not queue.ack(6, "crashed") and not queue.nack(6, "crashed", "late")
+        assert queue.nack(6, "w3", "gave_up")
+        assert queue.stats("t")["dead"] == 1 and queue.replay("t", 5, 6) == 1
+        assert queue.lease("t", "w3", limit=10) == [(6, {"key": "c"}, 1)]
+        assert queue.ack(6, "w3")
+        print("PASS: an expired lease is redelivered (at-least-once); a stale ack/nack is refused; dead events replay by id range")
+
+        queue.enqueue("t", {"key": "d"}, "d")
+        assert ids(queue.lease("t", "crashed", lease_sec=0.05, limit=10, max_attempts=2)) == [7]
+        time.sleep(0.1)
+        assert ids(queue.lease("t", "crashed", lease_sec=0.05, limit=10, max_attempts=2)) == [7]
+        time.sleep(0.1)
+        # Two leases ran out: the event is dead instead of crashing a worker forever.
+        assert queue.lease("t", "w4", limit=10, max_attempts=2) == []
+        assert queue.events("t", "dead")[-1]["last_error"] == "lease_expired"
+        queue.close()
+        print("PASS: an expired lease that used max attempts is dead-lettered")
+
+        github = test_event1_live_mock.MockGitHubState()
+        server = ThreadingHTTPServer(("127.0.0.1", 0), test_event1_live_mock.build_handler(github))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        env = dict(os.environ, GITHUB_TOKEN="dummy", GITHUB_OWNER="o", GITHUB_REPO="r")
+        qpath = os.path.join(td, "events.sqlite3")
+        script = os.path.join(SYNC_DIR, "event1_sync.py")
+        common = ["--queue", qpath, "--live-state", os.path.join(td, "live.json")]
+        live = ["--mode", "live", "--github-api-base", "http://127.0.0.1:{0}".format(server.server_address[1]),
+                "--max-retries", "0", "--queue-max-attempts", "1"]
+        try:
+            lines = [task_event(1, "first"), task_event(2), task_event(1, "second"), task_event(3, event_type="unknown")]
+            stdin = "".join(json.dumps(e) + "\n" for e in lines) + "not json\n"
+            code, out = run([script, "--enqueue", "-"] + common, stdin, env)
+            assert code == 1 and out[0]["reason"] == "invalid_event_json" and out[0]["line"] == 5, out
+            assert out[-1]["enqueued"] == 4 and out[-1]["queue"]["ready"] == 4, out
+            assert not github.issues
+            print("PASS: --enqueue stores events without calling the API")
+
+            # The first list request gets a 503 and there are no retries: event 1 goes dead,
+            # the unsupported event is dead at once, the rest are acked.
+            code, out = run([script, "--drain"] + common + live, env=env)
+            assert code == 1, out
+            assert [(a["queue_id"], a["queue"]) for a in out[:-1]] == [(1, "dead"), (2, "acked"), (3, "acked"), (4, "dead")], out
+            summary = out[-1]
+            assert summary["acked"] == 2 and summary["dead"] == 2 and summary["queue"]["depth"] == 0, summary
+            assert [i["title"] for i in github.issues] == ["[TSK-20260401-0002] t", "[TSK-20260401-0001] second"], github.issues
+
+            admin = ["python3", os.path.join(SYNC_DIR, "event_queue.py"), "--queue", qpath, "--topic", "github.issue"]
+            dead = json.loads(subprocess.check_output(admin + ["list", "--status", "dead"], text=True))["events"]
+            assert [(e["id"], e["last_error"]) for e in dead] == [(1, "github_search_http_error"), (4, "unsupported_event_type")], dead
+            out = json.loads(subprocess.check_output(admin + ["replay", "--from-id", "2", "--to-id", "3", "--include", "done"], text=True))
+            assert out["replayed"] == 2 and out["queue"]["ready"] == 2, out
+            code, out = run([script, "--drain"] + common + live, env=env)
+            assert code == 0 and [a["operation"] for a in out[:-1]] == ["update", "update"], out
+            print("PASS: --drain acks or dead-letters; event_queue.py lists dead events and replays a range")
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
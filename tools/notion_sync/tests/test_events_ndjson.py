@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import test_event1_live_mock  # noqa: E402
+import test_event2_live_mock  # noqa: E402
+import test_event3_live_mock  # noqa: E402
+
+SYNC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def serve(handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:{0}".format(server.server_address[1])
+
+
+def run_batch(script, lines, args, env=None, expect_status=None):
+    proc = subprocess.run(
+        ["python3", os.path.join(SYNC_DIR, script), "--events-ndjson", "-"] + args,
+        input="\n".join(lines) + "\n",
+        env=dict(os.environ, **(env or {})),
+        text=True,
+        capture_output=True,
+    )
+    if expect_status is not None:
+        assert proc.returncode == expect_status, (proc.returncode, proc.stdout, proc.stderr)
+    outputs = [json.loads(line) for line in proc.stdout.splitlines()]
+    return outputs[:-1], outputs[-1]
+
+
+def task_event(task_key, event_type="notion.task.updated"):
+    return json.dumps({"event_type": event_type, "payload": {"task_key": task_key, "title": "Batch " + task_key}})
+
+
+def main():
+    retry_args = ["--max-retries", "3", "--backoff-base-sec", "0.01"]
+    github_state = test_event1_live_mock.MockGitHubState()
+    server, base = serve(test_event1_live_mock.build_handler(github_state))
+    try:
+        with tempfile.TemporaryDirectory() as td:
+            lines = [
+                task_event("TSK-20260301-0001"),
+                "{not json",
+                task_event("TSK-20260301-0002"),
+                "",
+                task_event("TSK-20260301-0001"),
+                json.dumps({"event_type": "notion.page.deleted", "payload": {}}),
+                json.dumps([1, 2]),
+            ]
+            env = {"GITHUB_TOKEN": "dummy", "GITHUB_OWNER": "o", "GITHUB_REPO": "r"}
+            actions, summary = run_batch(
+                "event1_sync.py",
+                lines,
+                ["--mode", "live", "--github-api-base", base, "--live-state", os.path.join(td, "live.json")] + retry_args,
+                env,
+                expect_status=1,
+            )
+            ops = [(a["line"], a["operation"], a.get("reason")) for a in actions]
+            assert ops == [
+                (1, "create", None),
+                (2, "error", "invalid_event_json"),
+                (3, "create", None),
+                (5, "update", None),
+                (6, "error", "unsupported_event_type"),
+                (7, "error", "invalid_event_json"),
+            ], ops
+            assert actions[3]["issue_number"] == actions[0]["issue_number"], actions
+            assert summary["operation"] == "summary" and summary["events"] == 6 and summary["errors"] == 3, summary
+            assert summary["operations"] == {"create": 2, "update": 1, "error": 3}, summary
+            assert summary["http"]["requests"] >= 7, summary
+            with open(os.path.join(td, "live.json"), encoding="utf-8") as f:
+                assert sorted(json.load(f)["issue_number_by_task_key"]) == ["TSK-20260301-0001", "TSK-20260301-0002"]
+            print("PASS: event1 NDJSON batch isolates bad events and keeps live state across events")
+
+            state = os.path.join(td, "dry.json")
+            actions, summary = run_batch(
+                "event1_sync.py", [task_event("TSK-20260301-0003")] * 2, ["--mode", "dry-run", "--state", state], expect_status=0
+            )
+            assert [a["operation"] for a in actions] == ["create", "update"] and "http" not in summary, (actions, summary)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    notion_state = test_event2_live_mock.MockNotionState()
+    server, base = serve(test_event2_live_mock.build_handler(notion_state))
+    try:
+        pr = {"event_type": "github.pr.synchronize", "payload": {"url": "https://github.com/o/r/pull/9", "number": 9}}
+        lines = [json.dumps(pr), json.dumps(dict(pr, payload={"number": 10})), json.dumps(pr)]
+        env = {"NOTION_TOKEN": "dummy", "NOTION_KNOWLEDGE_DB_ID": "db-knowledge"}
+        actions, summary = run_batch(
+            "event2_sync.py", lines, ["--mode", "live", "--notion-api-base", base, "--schema-ttl-sec", "0", "--notion-rps", "0"] + retry_args, env
+        )
+        assert [(a["operation"], a.get("reason")) for a in actions] == [("create", None), ("error", "missing_pr_url"), ("update", None)], actions
+        assert summary["target"] == "notion.knowledge" and summary["errors"] == 1, summary
+        print("PASS: event2 NDJSON batch")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    task_state = test_event3_live_mock.MockNotionTaskState()
+    server, base = serve(test_event3_live_mock.build_handler(task_state))
+    try:
+        lines = [
+            json.dumps({"event_type": "github.pr.merged", "payload": {"task_key": "TSK-20260219-0004"}}),
+            json.dumps({"event_type": "github.ci.failed", "payload": {"task_key": "TSK-20260219-0004"}}),
+        ]
+        env = {"NOTION_TOKEN": "dummy", "NOTION_TASKS_DB_ID": "db-tasks"}
+        actions, summary = run_batch(
+            "event3_sync.py", lines, ["--mode", "live", "--notion-api-base", base, "--schema-ttl-sec", "0", "--notion-rps", "0"] + retry_args, env, expect_status=0
+        )
+        assert [a["fields"]["Execution State"] for a in actions] == ["Merged", "CI Failed"], actions
+        assert [p for p, _ in task_state.updates] == ["task-page-1", "task-page-1"], task_state.updates
+        assert summary["operations"] == {"update": 2} and summary["errors"] == 0, summary
+        print("PASS: event3 NDJSON batch")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
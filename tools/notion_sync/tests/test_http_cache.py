@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SYNC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, SYNC_DIR)
+
+import http_cache  # noqa: E402
+import http_pool  # noqa: E402
+
+
+class MockETagState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.resources = {
+            "/v1/databases/db-tasks": {"properties": {"Task Name": {"type": "title"}, "Task ID": {"type": "rich_text"},
+                                                      "Execution State": {"type": "select"}}},
+        }
+        self.statuses = []
+
+    def put(self, path, payload):
+        with self.lock:
+            self.resources[path] = payload
+
+
+def build_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def _send(self, status, body=b"", headers=None):
+            # Recorded before the response goes out, so the client never sees it first.
+            with state.lock:
+                state.statuses.append((self.command, status))
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read(self):
+            length = int(self.headers.get("Content-Length", "0"))
+            return self.rfile.read(length)
+
+        def do_GET(self):
+            with state.lock:
+                payload = state.resources.get(self.path)
+            if payload is None:
+                self._send(404, b'{"message": "not found"}')
+                return
+            # The ETag depends on the token too, like GitHub's per-user responses.
+            body = json.dumps(payload).encode("utf-8")
+            etag = '"{0}"'.format(hashlib.sha1(body + self.headers.get("Authorization", "").encode()).hexdigest())
+            if self.headers.get("If-None-Match") == etag:
+                self._send(304, headers={"ETag": etag})
+                return
+            self._send(200, body, {"Content-Type": "application/json", "ETag": etag})
+
+        def do_POST(self):
+            self._read()
+            self._send(200, b'{"results": [{"id": "page-1"}]}', {"Content-Type": "application/json"})
+
+        def do_PATCH(self):
+            self._read()
+            self._send(200, b'{"id": "page-1"}', {"Content-Type": "application/json"})
+
+        def log_message(self, fmt, *args):
+            return
+
+    return Handler
+
+
+def main():
+    cache = http_cache.ResponseCache(max_bytes=100)
+    for n in range(3):
+        cache.store(("u{0}".format(n), ""), {"ETag": '"{0}"'.format(n)}, b"x" * 40)
+    assert cache.lookup(("u0", "")) is None and cache.lookup(("u2", "")) is not None, cache.entries.keys()
+    cache.store(("big", ""), {"ETag": '"b"'}, b"x" * 101)
+    cache.store(("plain", ""), {}, b"x")
+    cache.store(("private", ""), {"ETag": '"p"', "Cache-Control": "no-store"}, b"x")
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["bytes"] == 80 and stats["evictions"] == 1, stats
+    print("PASS: LRU eviction by body size; no validator or no-store is not cached")
+
+    state = MockETagState()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), build_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = "http://127.0.0.1:{0}".format(server.server_address[1])
+    try:
+        pool = http_pool.ConnectionPool(cache=http_cache.ResponseCache())
+        url = base + "/v1/databases/db-tasks"
+        bodies = [pool.request("GET", url, {"Authorization": "Bearer a"})[2] for _ in range(3)]
+        assert len(set(bodies)) == 1 and [s for _, s in state.statuses] == [200, 304, 304], state.statuses
+        pool.request("GET", url, {"Authorization": "Bearer b"})
+        state.put("/v1/databases/db-tasks", {"properties": {}})
+        status, _, body = pool.request("GET", url, {"Authorization": "Bearer a"})
+        assert status == 200 and json.loads(body) == {"properties": {}}, body
+        assert [s for _, s in state.statuses][3:] == [200, 200], state.statuses
+        stats = pool.stats()["cache"]
+        assert stats["revalidated"] == 2 and stats["changed"] == 1 and stats["misses"] == 2 and stats["entries"] == 2, stats
+        print("PASS: GETs revalidate with If-None-Match and a 304 is served from the cache")
+
+        # event3 without the schema cache fetches the database once per event; the
+        # repeats are 304s.
+        state.put("/v1/databases/db-tasks", MockETagState().resources["/v1/databases/db-tasks"])
+        del state.statuses[:]
+        events = [{"event_type": "github.pr.merged", "payload": {"task_key": "TSK-20260401-{0:04d}".format(n)}} for n in range(5)]
+        env = dict(os.environ, NOTION_TOKEN="dummy", NOTION_TASKS_DB_ID="db-tasks")
+        out = subprocess.check_output(
+            ["python3", os.path.join(SYNC_DIR, "event3_sync.py"), "--mode", "live", "--events-ndjson", "-",
+             "--notion-api-base", base, "--schema-ttl-sec", "0", "--notion-rps", "0"],
+            input="".join(json.dumps(e) + "\n" for e in events),
+            env=env,
+            text=True,
+        )
+        summary = json.loads(out.splitlines()[-1])
+        assert summary["errors"] == 0 and summary["http"]["cache"]["revalidated"] == 4, summary
+        assert [s for m, s in state.statuses if m == "GET"] == [200, 304, 304, 304, 304], state.statuses
+        print("PASS: event3 database GETs are revalidated through the shared pool")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import error
+
+SYNC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, SYNC_DIR)
+sys.path.insert(0, os.path.dirname(__file__))
+
+import http_pool  # noqa: E402
+from test_event2_live_mock import MockNotionState, build_handler as build_notion_handler  # noqa: E402
+
+
+class ConnectionCounter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.opened = 0
+        self.active = 0
+        self.max_active = 0
+        self.posts = 0
+
+    def enter(self):
+        with self.lock:
+            self.opened += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+
+    def leave(self):
+        with self.lock:
+            self.active -= 1
+
+
+def build_handler(counter):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            super().setup()
+            counter.enter()
+
+        def finish(self):
+            super().finish()
+            counter.leave()
+
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.startswith("/slow"):
+                threading.Event().wait(0.05)
+            if self.path.startswith("/missing"):
+                self._send(404, {"object": "error", "code": "object_not_found"})
+                return
+            if self.path.startswith("/moved"):
+                # Like GitHub for a renamed repository: 301 with a JSON body.
+                self.send_response(301)
+                self.send_header("Location", "/item/moved")
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"{}")
+                return
+            if self.path.startswith("/loop"):
+                self.send_response(302)
+                self.send_header("Location", self.path)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self._send(200, {"path": self.path})
+            if self.path.startswith("/drop"):
+                # Keep-alive response, then the server goes away while the client holds it idle.
+                self.close_connection = True
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", "0")))
+            with counter.lock:
+                counter.posts += 1
+            if self.path.startswith("/moved"):
+                self.do_GET()
+                return
+            if self.path.startswith("/lost"):
+                # The request is processed, then the connection drops before the response.
+                self.close_connection = True
+                return
+            self._send(201, {"path": self.path})
+
+        def log_message(self, fmt, *args):
+            return
+
+    return Handler
+
+
+def serve(handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:{0}".format(server.server_address[1])
+
+
+def main():
+    counter = ConnectionCounter()
+    server, base = serve(build_handler(counter))
+    try:
+        pool = http_pool.ConnectionPool(max_per_host=2)
+        for i in range(10):
+            status, _, body = pool.request("GET", "{0}/item/{1}?q=1".format(base, i))
+            assert status == 200 and json.loads(body)["path"] == "/item/{0}?q=1".format(i), body
+        stats = pool.stats()
+        assert stats["requests"] == 10 and stats["connections_opened"] == 1 and stats["connections_reused"] == 9, stats
+        assert counter.opened == 1, counter.opened
+
+        try:
+            pool.request("GET", base + "/missing")
+            raise AssertionError("expected HTTPError")
+        except error.HTTPError as exc:
+            assert exc.code == 404 and json.loads(exc.read())["code"] == "object_not_found"
+        assert pool.stats()["connections_opened"] == 1, pool.stats()
+        print("PASS: sequential requests share one keep-alive connection")
+
+        pool.request("GET", base + "/drop")
+        status, _, _ = pool.request("GET", base + "/after-drop")
+        assert status == 200 and pool.stats()["connections_opened"] == 2, pool.stats()
+        print("PASS: a connection closed by the server is replaced transparently")
+
+        pool.request("GET", base + "/warm")
+        try:
+            pool.request("POST", base + "/lost", body=b"{}")
+            raise AssertionError("expected URLError")
+        except error.URLError as exc:
+            assert not isinstance(exc, error.HTTPError), exc
+        assert counter.posts == 1, counter.posts
+        print("PASS: a POST whose response is lost is not sent again by the pool")
+
+        status, _, body = pool.request("GET", base + "/moved")
+        assert status == 200 and json.loads(body)["path"] == "/item/moved", body
+        for method, path in (("POST", "/moved"), ("GET", "/loop")):
+            try:
+                pool.request(method, base + path, body=b"{}" if method == "POST" else None)
+                raise AssertionError("expected HTTPError")
+            except error.HTTPError as exc:
+                assert exc.code in (301, 302), exc
+        print("PASS: GET follows redirects; other 3xx raise HTTPError instead of returning the body")
+
+        threads = [threading.Thread(target=pool.request, args=("GET", base + "/slow")) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert counter.max_active <= 2 and pool.stats()["idle"] <= 2, (counter.max_active, pool.stats())
+        print("PASS: concurrent callers stay within max_per_host connections")
+        pool.close()
+
+        dead = http_pool.ConnectionPool()
+        try:
+            dead.request("GET", "http://127.0.0.1:9/")
+            raise AssertionError("expected URLError")
+        except error.URLError as exc:
+            assert not isinstance(exc, error.HTTPError), exc
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # The sync scripts report pool usage in their action output.
+    notion = MockNotionState()
+    notion.fail_first_query = False
+
+    class KeepAliveNotion(build_notion_handler(notion)):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+    server, base = serve(KeepAliveNotion)
+    try:
+        with tempfile.TemporaryDirectory() as td:
+            event_path = os.path.join(td, "event2.json")
+            with open(event_path, "w", encoding="utf-8") as f:
+                json.dump({"event_type": "github.pr.opened", "payload": {"url": "https://github.com/o/r/pull/1", "number": 1}}, f)
+            env = dict(os.environ, NOTION_TOKEN="dummy", NOTION_KNOWLEDGE_DB_ID="db-knowledge")
+            out = subprocess.check_output(
+                ["python3", os.path.join(SYNC_DIR, "event2_sync.py"), "--mode", "live", "--event", event_path, "--notion-api-base", base,
+                 "--schema-cache", os.path.join(td, "schema.json")],
+                env=env,
+                text=True,
+            )
+            action = json.loads(out)
+            assert action["operation"] == "create", action
+            assert action["http"]["requests"] == 3 and action["http"]["connections_opened"] == 1, action["http"]
+            assert action["http"]["connections_reused"] == 2, action["http"]
+            print("PASS: event2 live run reuses one connection for db, query and create")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
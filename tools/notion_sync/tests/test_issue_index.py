@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import urllib.parse
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SYNC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CLOCK_BASE = datetime(2026, 4, 1, tzinfo=timezone.utc)
+sys.path.insert(0, SYNC_DIR)
+
+import state_store  # noqa: E402
+
+
+class MockRepoState:
+    # Issues with updated_at, so that since/sort/page can be served like GitHub does.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.issues = {}
+        self.clock = 0
+        self.requests = []
+
+    def _touch(self, issue):
+        self.clock += 1
+        issue["updated_at"] = (CLOCK_BASE + timedelta(seconds=self.clock)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def create(self, payload, pull_request=False):
+        with self.lock:
+            number = max(self.issues, default=0) + 1
+            issue = {"number": number, "state": "open", "title": payload.get("title", ""),
+                     "labels": [{"name": name} for name in payload.get("labels", [])],
+                     "html_url": "http://mock.local/issues/{0}".format(number)}
+            if pull_request:
+                issue["pull_request"] = {"url": "http://mock.local/pulls/{0}".format(number)}
+            self._touch(issue)
+            self.issues[number] = issue
+            return dict(issue)
+
+    def update(self, number, payload):
+        with self.lock:
+            issue = self.issues.get(number)
+            if issue is None:
+                return None
+            if "labels" in payload:
+                issue["labels"] = [{"name": name} for name in payload["labels"]]
+            issue["title"] = payload.get("title", issue["title"])
+            self._touch(issue)
+            return dict(issue)
+
+    def delete(self, number):
+        with self.lock:
+            del self.issues[number]
+
+    def listing(self, query):
+        per_page = int(query.get("per_page", ["30"])[0])
+        page = int(query.get("page", ["1"])[0])
+        since = query.get("since", [None])[0]
+        label = query.get("labels", [None])[0]
+        with self.lock:
+            items = [dict(i) for i in self.issues.values() if since is None or i["updated_at"] >= since]
+        if label:
+            items = [i for i in items if label in [l["name"] for l in i["labels"]]]
+        # GitHub's defaults: sort=created, direction=desc.
+        key = (lambda i: i["updated_at"]) if query.get("sort", [""])[0] == "updated" else (lambda i: i["number"])
+        items.sort(key=key, reverse=query.get("direction", ["desc"])[0] == "desc")
+        return items[(page - 1) * per_page : page * per_page]
+
+
+def build_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length", "0"))
+            return json.loads(self.rfile.read(length).decode("utf-8") if length else "{}")
+
+        def do_GET(self):
+            parsed = urllib.parse.urlparse(self.path)
+            query = urllib.parse.parse_qs(parsed.query)
+            with state.lock:
+                state.requests.append(("GET", parsed.path, query))
+            if parsed.path == "/repos/o/r/issues":
+                self._send(200, state.listing(query))
+                return
+            if parsed.path == "/search/issues":
+                labels = [t[len("label:"):] for t in query["q"][0].split() if t.startswith("label:")]
+                items = state.listing({"labels": labels, "per_page": ["100"]})
+                self._send(200, {"total_count": len(items), "items": items})
+                return
+            self._send(404, {"message": "only the issue listing is served"})
+
+        def do_POST(self):
+            with state.lock:
+                state.requests.append(("POST", self.path, None))
+            self._send(201, state.create(self._read_json()))
+
+        def do_PATCH(self):
+            with state.lock:
+                state.requests.append(("PATCH", self.path, None))
+            issue = state.update(int(self.path.rsplit("/", 1)[-1]), self._read_json())
+            self._send(200 if issue else 404, issue or {"message": "Not Found"})
+
+        def log_message(self, fmt, *args):
+            return
+
+    return Handler
+
+
+def task_event(task_key):
+    return {"event_type": "notion.task.updated", "payload": {"task_key": task_key, "title": "t"}}
+
+
+def main():
+    state = MockRepoState()
+    for n in range(1, 241):
+        labels = ["bug"] if n % 3 == 0 else ["taskkey:TSK-20260401-{0:04d}".format(n), "status:draft"]
+        state.create({"title": "issue {0}".format(n), "labels": labels})
+    state.create({"title": "pr", "labels": ["taskkey:TSK-20260401-0900"]}, pull_request=True)
+    state.create({"title": "dup", "labels": ["taskkey:TSK-20260401-0001"]})
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), build_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = "http://127.0.0.1:{0}".format(server.server_address[1])
+    env = dict(os.environ, GITHUB_TOKEN="dummy", GITHUB_OWNER="o", GITHUB_REPO="r")
+
+    try:
+        with tempfile.TemporaryDirectory() as td:
+            index_path = os.path.join(td, "index.json")
+
+            def run(events, extra=()):
+                del state.requests[:]
+                proc = subprocess.run(
+                    ["python3", os.path.join(SYNC_DIR, "event1_sync.py"), "--mode", "live", "--events-ndjson", "-",
+                     "--github-api-base", base, "--live-state", os.path.join(td, "live.json"),
+                     "--issue-index", index_path, "--max-retries", "0"] + list(extra),
+                    input="".join(json.dumps(e) + "\n" for e in events),
+                    env=env,
+                    text=True,
+                    capture_output=True,
+                )
+                lines = [json.loads(line) for line in proc.stdout.splitlines()]
+                assert lines, proc.stderr
+                return {a["line"]: a for a in lines[:-1]}
+
+            actions = run([task_event("TSK-20260401-0002"), task_event("TSK-20260401-0500"),
+                           task_event("TSK-20260401-0001"), task_event("TSK-20260401-0900")])
+            assert actions[1]["operation"] == "update" and actions[1]["issue_number"] == 2, actions[1]
+            assert actions[1]["lookup"] == "index", actions[1]
+            assert actions[2]["operation"] == "create" and actions[2]["issue_number"] == 243, actions[2]
+            assert actions[3]["reason"] == "duplicate_issue_match" and actions[3]["match_count"] == 2, actions[3]
+            # The pull request with a taskkey label is not an issue: a new one is created.
+            assert actions[4]["operation"] == "create", actions[4]
+            gets = [r for r in state.requests if r[0] == "GET"]
+            assert len(gets) == 3 and all("since" not in q for _, _, q in gets), gets
+            assert all(q["sort"] == ["created"] and q["direction"] == ["asc"] for _, _, q in gets), gets
+            assert not any(path.startswith("/search") for _, path, _ in state.requests), state.requests
+            assert [r[0] for r in state.requests if r[0] != "GET"] == ["PATCH", "POST", "POST"], state.requests
+            stats = actions[4]["issue_index"]
+            assert stats["full_scans"] == 1 and stats["pages"] == 3 and stats["issues"] == 163, stats
+            print("PASS: one paginated scan builds the index; lookups and duplicate checks cost no API calls")
+
+            # Changed on GitHub since: a new labeled issue, and 0004 loses its taskkey label.
+            state.create({"title": "external", "labels": ["taskkey:TSK-20260401-0600"]})
+            state.update(4, {"labels": ["bug"]})
+            actions = run([task_event("TSK-20260401-0600"), task_event("TSK-20260401-0004"),
+                           task_event("TSK-20260401-0500")], ["--issue-index-max-age-sec", "0"])
+            gets = [q for method, _, q in state.requests if method == "GET"]
+            # Max age 0: every event refreshes, each time only since the newest updated_at.
+            assert len(gets) == 3 and all(q["sort"] == ["updated"] and "since" in q for q in gets), gets
+            assert actions[1]["operation"] == "update" and actions[1]["issue_number"] == 245, actions[1]
+            assert actions[2]["operation"] == "create", actions[2]
+            assert actions[3]["operation"] == "update" and actions[3]["issue_number"] == 243, actions[3]
+            assert actions[3]["issue_index"]["full_scans"] == 0 and actions[3]["issue_index"]["issues_seen"] < 20, actions[3]
+            actions = run([task_event("TSK-20260401-0005")])
+            assert not [r for r in state.requests if r[0] == "GET"] and actions[1]["operation"] == "update", state.requests
+            print("PASS: later runs refresh incrementally with since= and skip the refresh while the index is fresh")
+
+            with open(index_path, encoding="utf-8") as f:
+                data = json.load(f)
+            assert data["repo"] == "o/r" and "4" not in data["issues"] and "245" in data["issues"], sorted(data["issues"])[:5]
+
+            del state.requests[:]
+            proc = subprocess.run(
+                ["python3", os.path.join(SYNC_DIR, "event1_sync.py"), "--mode", "live", "--reconcile",
+                 "--github-api-base", base, "--live-state", os.path.join(td, "live.json"), "--issue-index", index_path],
+                env=env,
+                text=True,
+                capture_output=True,
+            )
+            report = json.loads(proc.stdout)
+            assert proc.returncode == 1 and report["duplicates"] == {"TSK-20260401-0001": [1, 242]}, report
+            assert len(state.requests) == 1 and "since" in state.requests[0][2], state.requests
+            print("PASS: --reconcile with --issue-index only fetches what changed")
+
+            # Deleted on GitHub while the index is still fresh: 0007 was recreated, 0008 was not.
+            state.delete(7)
+            recreated = state.create({"title": "recreated", "labels": ["taskkey:TSK-20260401-0007"]})
+            state.delete(8)
+            actions = run([task_event("TSK-20260401-0007"), task_event("TSK-20260401-0008")])
+            assert actions[1]["operation"] == "update" and actions[1]["issue_number"] == recreated["number"], actions[1]
+            assert actions[1]["lookup"] == "search", actions[1]
+            assert actions[2]["operation"] == "create" and actions[2]["lookup"] == "search", actions[2]
+            labeled = [q["labels"] for method, _, q in state.requests if method == "GET" and "labels" in q]
+            assert labeled == [["taskkey:TSK-20260401-0007"], ["taskkey:TSK-20260401-0008"]], state.requests
+            assert [path for method, path, _ in state.requests if path == "/search/issues"] == ["/search/issues"]
+            with open(index_path, encoding="utf-8") as f:
+                data = json.load(f)
+            assert "7" not in data["issues"] and "8" not in data["issues"] and str(recreated["number"]) in data["issues"]
+            print("PASS: an indexed issue that is gone is evicted and looked up by label instead")
+
+            # SQLite: the issues a run creates or updates are upserted one by one, no file rewrite.
+            sqlite_path = os.path.join(td, "index.sqlite3")
+            actions = run([task_event("TSK-20260401-0005"), task_event("TSK-20260401-0901")], ["--issue-index", sqlite_path])
+            assert actions[1]["operation"] == "update" and actions[2]["operation"] == "create", actions
+            store = state_store.SqliteStateStore(sqlite_path, "issues")
+            assert store.get_meta("repo") == "o/r" and len(store) == actions[2]["issue_index"]["issues"], len(store)
+            assert store.get(str(actions[2]["issue_number"]))["task_keys"] == ["TSK-20260401-0901"]
+            store.close()
+            actions = run([task_event("TSK-20260401-0901")], ["--issue-index", sqlite_path])
+            assert not [r for r in state.requests if r[0] == "GET"] and actions[1]["lookup"] == "index", state.requests
+            print("PASS: a SQLite index keeps each recorded issue and is reused by the next run")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
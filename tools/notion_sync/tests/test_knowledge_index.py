@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SYNC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CLOCK_BASE = datetime(2026, 4, 1, tzinfo=timezone.utc)
+LINK = "GitHub Canonical Link"
+sys.path.insert(0, SYNC_DIR)
+
+import state_store  # noqa: E402
+
+
+def pr_url(n):
+    return "https://github.com/o/r/pull/{0}".format(n)
+
+
+class MockKnowledgeState:
+    # Pages with last_edited_time at Notion's minute precision, served with
+    # start_cursor/has_more paging and the last_edited_time timestamp filter.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pages = {}
+        self.clock = 0
+        self.next_id = 1
+        self.queries = []
+        self.writes = []
+
+    def _touch(self, page):
+        self.clock += 1
+        page["last_edited_time"] = (CLOCK_BASE + timedelta(seconds=self.clock)).strftime("%Y-%m-%dT%H:%M:00.000Z")
+
+    def create(self, properties):
+        with self.lock:
+            page = {"id": "page-{0}".format(self.next_id), "archived": False, "properties": properties}
+            self.next_id += 1
+            self._touch(page)
+            self.pages[page["id"]] = page
+            return dict(page)
+
+    def update(self, page_id, properties=None, archived=None):
+        with self.lock:
+            page = self.pages.get(page_id)
+            if page is None or (page["archived"] and archived is None):
+                return page
+            page["properties"].update(properties or {})
+            if archived is not None:
+                page["archived"] = archived
+            self._touch(page)
+            return dict(page)
+
+    def query(self, body):
+        with self.lock:
+            self.queries.append(body)
+            flt = body.get("filter", {})
+            items = [dict(p) for p in self.pages.values()]
+        if "url" in flt:
+            items = [p for p in items if not p["archived"] and p["properties"].get(LINK, {}).get("url") == flt["url"]["equals"]]
+        elif "last_edited_time" in flt:
+            items = [p for p in items if p["last_edited_time"] >= flt["last_edited_time"]["on_or_after"]]
+        else:
+            items = [p for p in items if not p["archived"]]
+        items.sort(key=lambda p: p["last_edited_time"])
+        start = int(body.get("start_cursor", "0"))
+        size = body.get("page_size", 100)
+        more = start + size < len(items)
+        return {"results": items[start : start + size], "has_more": more, "next_cursor": str(start + size) if more else None}
+
+
+def build_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length", "0"))
+            return json.loads(self.rfile.read(length).decode("utf-8") if length else "{}")
+
+        def do_GET(self):
+            properties = {"Name": {"type": "title"}, LINK: {"type": "url"}, "Summary": {"type": "rich_text"}}
+            self._send(200, {"properties": properties})
+
+        def do_POST(self):
+            payload = self._read_json()
+            if self.path.endswith("/query"):
+                self._send(200, state.query(payload))
+                return
+            with state.lock:
+                state.writes.append(("POST", None))
+            self._send(200, state.create(payload["properties"]))
+
+        def do_PATCH(self):
+            page_id = self.path.rsplit("/", 1)[-1]
+            with state.lock:
+                state.writes.append(("PATCH", page_id))
+            page = state.update(page_id, self._read_json().get("properties"))
+            if page is None:
+                self._send(404, {"object": "error", "code": "object_not_found", "message": "Could not find page"})
+            elif page["archived"]:
+                self._send(400, {"object": "error", "code": "validation_error",
+                                 "message": "Can't edit block that is archived. You must unarchive the block before editing."})
+            else:
+                self._send(200, page)
+
+        def log_message(self, fmt, *args):
+            return
+
+    return Handler
+
+
+def pr_event(n):
+    return {"event_type": "github.pr.opened", "payload": {"url": pr_url(n), "number": n, "title": "t"}}
+
+
+def main():
+    state = MockKnowledgeState()
+    for n in range(1, 251):
+        state.create({LINK: {"url": pr_url(n)}})
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), build_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = "http://127.0.0.1:{0}".format(server.server_address[1])
+    env = dict(os.environ, NOTION_TOKEN="dummy", NOTION_KNOWLEDGE_DB_ID="db-knowledge")
+
+    try:
+        with tempfile.TemporaryDirectory() as td:
+            index_path = os.path.join(td, "knowledge.json")
+
+            def run(events, extra=()):
+                del state.queries[:]
+                del state.writes[:]
+                proc = subprocess.run(
+                    ["python3", os.path.join(SYNC_DIR, "event2_sync.py"), "--mode", "live", "--events-ndjson", "-",
+                     "--notion-api-base", base, "--knowledge-index", index_path, "--max-retries", "0",
+                     "--notion-rps", "0", "--schema-ttl-sec", "0"] + list(extra),
+                    input="".join(json.dumps(e) + "\n" for e in events),
+                    env=env,
+                    text=True,
+                    capture_output=True,
+                )
+                lines = [json.loads(line) for line in proc.stdout.splitlines()]
+                assert lines and lines[-1]["errors"] == 0, (proc.stdout, proc.stderr)
+                return {a["line"]: a for a in lines[:-1]}
+
+            actions = run([pr_event(5), pr_event(900), pr_event(120)])
+            assert [actions[n]["operation"] for n in (1, 2, 3)] == ["update", "create", "update"], actions
+            assert [actions[n]["lookup"] for n in (1, 2, 3)] == ["index", "query", "index"], actions
+            assert actions[1]["notion_page_id"] == "page-5" and actions[3]["notion_page_id"] == "page-120", actions
+            scans = [q for q in state.queries if "filter" not in q]
+            assert len(scans) == 3 and [q.get("start_cursor") for q in scans] == [None, "100", "200"], scans
+            assert [q["filter"]["url"]["equals"] for q in state.queries if "filter" in q] == [pr_url(900)], state.queries
+            stats = actions[3]["knowledge_index"]
+            assert stats["full_scans"] == 1 and stats["links"] == 251 and stats["hits"] == 2, stats
+            print("PASS: one paged query builds the index; known links are patched without a query")
+
+            # Changed in Notion since: a page created by someone else, page-7 archived,
+            # page-9 deleted outright (it never shows up in an incremental query).
+            state.create({LINK: {"url": pr_url(600)}})
+            state.update("page-7", archived=True)
+            with state.lock:
+                del state.pages["page-9"]
+            actions = run([pr_event(600), pr_event(7), pr_event(9), pr_event(5)], ["--knowledge-index-max-age-sec", "0"])
+            assert actions[1]["operation"] == "update" and actions[1]["lookup"] == "index", actions[1]
+            assert actions[1]["notion_page_id"] == "page-252", actions[1]
+            assert actions[2]["operation"] == "create" and actions[2]["lookup"] == "query", actions[2]
+            assert actions[3]["operation"] == "create" and actions[3]["lookup"] == "query", actions[3]
+            assert ("PATCH", "page-9") in state.writes and ("PATCH", "page-7") not in state.writes, state.writes
+            assert actions[4]["operation"] == "update" and actions[4]["notion_page_id"] == "page-5", actions[4]
+            incremental = [q for q in state.queries if "last_edited_time" in q.get("filter", {})]
+            assert incremental and all(q["sorts"][0]["direction"] == "ascending" for q in incremental), state.queries
+            # Minute precision: each refresh refetches the pages of the newest minute, not all 250.
+            assert len(incremental) + 2 == len(state.queries), state.queries
+            stats = actions[4]["knowledge_index"]
+            assert stats["full_scans"] == 0 and stats["pages_fetched"] < 100, stats
+            print("PASS: incremental refreshes by last_edited_time; archived and deleted pages fall back to a query")
+
+            with open(index_path, encoding="utf-8") as f:
+                data = json.load(f)
+            assert data["db_id"] == "db-knowledge" and data["link_property"] == LINK, data["cursor"]
+            assert "page-7" not in data["pages"] and "page-9" not in data["pages"], sorted(data["pages"])[:5]
+            actions = run([pr_event(7)])
+            assert not state.queries and actions[1]["lookup"] == "index", state.queries
+            print("PASS: a fresh index is reused across runs without any query")
+
+            # SQLite: the pages a run finds or creates are upserted one by one, no file rewrite.
+            sqlite_path = os.path.join(td, "knowledge.sqlite3")
+            actions = run([pr_event(5), pr_event(901)], ["--knowledge-index", sqlite_path])
+            assert actions[1]["lookup"] == "index" and actions[2]["operation"] == "create", actions
+            store = state_store.SqliteStateStore(sqlite_path, "pages")
+            assert store.get_meta("db_id") == "db-knowledge" and store.get_meta("link_property") == LINK
+            assert store.get(actions[2]["notion_page_id"]) == pr_url(901) and store.get("page-5") == pr_url(5)
+            store.close()
+            actions = run([pr_event(901)], ["--knowledge-index", sqlite_path])
+            assert not state.queries and actions[1]["lookup"] == "index", state.queries
+            print("PASS: a SQLite index keeps each recorded page and is reused by the next run")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SYNC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, SYNC_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import rate_limit  # noqa: E402
+import test_event1_live_mock  # noqa: E402
+
+
+class MockNotionTasks:
+    def __init__(self, throttle_first_query):
+        self.lock = threading.Lock()
+        self.throttle_first_query = throttle_first_query
+        self.requests = []
+
+
+def build_notion_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, payload, headers=None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _record(self):
+            length = int(self.headers.get("Content-Length", "0"))
+            self.rfile.read(length)
+            with state.lock:
+                state.requests.append((self.command, time.monotonic()))
+
+        def do_GET(self):
+            self._record()
+            self._send(200, {"properties": {"Task Name": {"type": "title"}, "Task ID": {"type": "rich_text"},
+                                            "Execution State": {"type": "select"}}})
+
+        def do_POST(self):
+            self._record()
+            with state.lock:
+                throttle, state.throttle_first_query = state.throttle_first_query, False
+            if throttle:
+                self._send(429, {"object": "error", "status": 429, "code": "rate_limited"}, {"Retry-After": "1"})
+                return
+            self._send(200, {"results": [{"id": "page-1"}]})
+
+        def do_PATCH(self):
+            self._record()
+            self._send(200, {"id": "page-1"})
+
+        def log_message(self, fmt, *args):
+            return
+
+    return Handler
+
+
+def serve(handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:{0}".format(server.server_address[1])
+
+
+def run_event3(base, events, extra):
+    env = dict(os.environ, NOTION_TOKEN="dummy", NOTION_TASKS_DB_ID="db-tasks")
+    start = time.monotonic()
+    proc = subprocess.run(
+        ["python3", os.path.join(SYNC_DIR, "event3_sync.py"), "--mode", "live", "--events-ndjson", "-",
+         "--notion-api-base", base, "--schema-ttl-sec", "0"] + extra,
+        input="".join(json.dumps(e) + "\n" for e in events),
+        env=env,
+        text=True,
+        capture_output=True,
+    )
+    lines = [json.loads(line) for line in proc.stdout.splitlines()]
+    assert proc.returncode == 0, (proc.stdout, proc.stderr)
+    return lines[:-1], lines[-1], time.monotonic() - start
+
+
+def task_event(n):
+    return {"event_type": "github.ci.failed", "payload": {"task_key": "TSK-20260401-{0:04d}".format(n)}}
+
+
+def main():
+    limiter = rate_limit.RateLimiter()
+    limiter.configure("http://paced.local", 20)
+    start = time.monotonic()
+    for _ in range(25):
+        limiter.wait("http://paced.local/v1/pages")
+    elapsed = time.monotonic() - start
+    decisions = limiter.report()["decisions"]
+    assert elapsed >= 0.2 and decisions and all(d["reason"] == "pace" for d in decisions), (elapsed, decisions)
+    assert limiter.report()["decisions"] == [], "report() starts a new action"
+    limiter.observe("http://api.github.local/x", 200, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(time.time() + 0.3)})
+    start = time.monotonic()
+    limiter.wait("http://api.github.local/y")
+    assert time.monotonic() - start >= 0.2 and limiter.report()["decisions"][0]["reason"] == "quota_exhausted"
+    assert rate_limit.retry_after_sec({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}) == 0.0
+    print("PASS: token bucket paces a burst and X-RateLimit-Remaining: 0 holds the host until reset")
+
+    state = MockNotionTasks(throttle_first_query=True)
+    server, base = serve(build_notion_handler(state))
+    try:
+        # A 10s backoff would dominate; Retry-After: 1 is what the retry waits for.
+        actions, summary, elapsed = run_event3(base, [task_event(1)], ["--backoff-base-sec", "10", "--notion-rps", "0"])
+        action = actions[0]
+        assert action["operation"] == "update" and action["retry"]["query"] == 1, action
+        assert 0.9 <= action["rate_limit"]["waited_sec"] <= 1.1 and elapsed < 5, (action, elapsed)
+        assert [d["reason"] for d in action["rate_limit"]["decisions"]] == ["retry_after"], action
+        host = list(summary["rate_limit"].values())[0]
+        assert host["throttled"] == 1 and host["waits"] == 1, summary
+        print("PASS: a 429 with Retry-After is retried after Retry-After instead of the exponential backoff")
+
+        # 6 events x (schema GET, query, PATCH) at 4 req/s with a burst of 4.
+        state.requests = []
+        actions, summary, elapsed = run_event3(base, [task_event(n) for n in range(6)], ["--notion-rps", "4", "--concurrency", "3"])
+        times = sorted(t for _, t in state.requests)
+        assert len(times) == 18 and times[-1] - times[0] >= (18 - 4) / 4.0 - 0.1, (len(times), times[-1] - times[0])
+        host = list(summary["rate_limit"].values())[0]
+        assert host["rate"] == 4 and host["waits"] >= 8 and host["throttled"] == 0, summary
+        assert any(d["reason"] == "pace" for a in actions for d in a["rate_limit"]["decisions"]), actions
+        print("PASS: --notion-rps paces concurrent workers through one shared bucket")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    github = test_event1_live_mock.MockGitHubState()
+    github.fail_first_list = False
+    throttled = [True]
+
+    class ThrottledGitHub(test_event1_live_mock.build_handler(github)):
+        def do_GET(self):
+            if throttled[0]:
+                throttled[0] = False
+                body = b'{"message": "API rate limit exceeded"}'
+                self.send_response(403)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("X-RateLimit-Remaining", "0")
+                self.send_header("X-RateLimit-Reset", str(int(time.time()) + 2))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            super().do_GET()
+
+    server, base = serve(ThrottledGitHub)
+    try:
+        with tempfile.TemporaryDirectory() as td:
+            event_path = os.path.join(td, "event.json")
+            with open(event_path, "w", encoding="utf-8") as f:
+                json.dump({"event_type": "notion.task.updated", "payload": {"task_key": "TSK-20260401-0001", "title": "t"}}, f)
+            env = dict(os.environ, GITHUB_TOKEN="dummy", GITHUB_OWNER="o", GITHUB_REPO="r")
+            out = subprocess.check_output(
+                ["python3", os.path.join(SYNC_DIR, "event1_sync.py"), "--mode", "live", "--event", event_path,
+                 "--github-api-base", base, "--live-state", os.path.join(td, "live.json"), "--backoff-base-sec", "10"],
+                env=env,
+                text=True,
+            )
+            action = json.loads(out)
+            assert action["operation"] == "create" and action["retry"]["list"] == 1, action
+            decisions = action["rate_limit"]["decisions"]
+            assert [d["reason"] for d in decisions] == ["quota_exhausted"] and 0 < decisions[0]["wait_sec"] <= 2, action
+            print("PASS: a GitHub 403 with X-RateLimit-Remaining: 0 waits for X-RateLimit-Reset and retries")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+import json
+import os
+import subprocess
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SYNC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+class MockNotionSchemaState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.schemas = {
+            "db-knowledge": {"Name": {"type": "title"}, "GitHub URL": {"type": "url"}, "Summary": {"type": "rich_text"}},
+            "db-tasks": {"Task Name": {"type": "title"}, "Task ID": {"type": "rich_text"}, "Execution State": {"type": "select"}},
+        }
+        self.schema_gets = 0
+        self.pages = []
+
+    def rename(self, db_id, old, new):
+        with self.lock:
+            self.schemas[db_id][new] = self.schemas[db_id].pop(old)
+
+
+def build_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length", "0"))
+            return json.loads(self.rfile.read(length).decode("utf-8") if length else "{}")
+
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _validation_error(self, name):
+            self._send(400, {"object": "error", "status": 400, "code": "validation_error",
+                             "message": "{0} is not a property that exists.".format(name)})
+
+        def do_GET(self):
+            db_id = self.path.rsplit("/", 1)[-1]
+            with state.lock:
+                state.schema_gets += 1
+                schema = dict(state.schemas.get(db_id, {}))
+            self._send(200, {"id": db_id, "properties": schema})
+
+        def do_POST(self):
+            payload = self._read_json()
+            if self.path.endswith("/query"):
+                db_id = self.path.split("/")[-2]
+                prop = payload["filter"]["property"]
+                if prop not in state.schemas[db_id]:
+                    self._validation_error(prop)
+                    return
+                value = list(payload["filter"].values())[-1]["equals"]
+                with state.lock:
+                    results = [p for p in state.pages if p["db"] == db_id and value in json.dumps(p["properties"])]
+                self._send(200, {"results": [{"id": p["id"]} for p in results]})
+                return
+            db_id = payload["parent"]["database_id"]
+            for name in payload["properties"]:
+                if name not in state.schemas[db_id]:
+                    self._validation_error(name)
+                    return
+            with state.lock:
+                page = {"id": "page-{0}".format(len(state.pages) + 1), "db": db_id, "properties": payload["properties"]}
+                state.pages.append(page)
+            self._send(200, {"id": page["id"]})
+
+        def do_PATCH(self):
+            self._read_json()
+            self._send(200, {"id": self.path.rsplit("/", 1)[-1]})
+
+        def log_message(self, fmt, *args):
+            return
+
+    return Handler
+
+
+def pr_event(number):
+    return {"event_type": "github.pr.opened", "payload": {"url": "https://github.com/o/r/pull/{0}".format(number), "number": number}}
+
+
+def run(script, args, events):
+    env = dict(os.environ, NOTION_TOKEN="dummy", NOTION_KNOWLEDGE_DB_ID="db-knowledge", NOTION_TASKS_DB_ID="db-tasks")
+    proc = subprocess.run(
+        ["python3", os.path.join(SYNC_DIR, script), "--mode", "live", "--events-ndjson", "-", "--max-retries", "0"] + args,
+        input="".join(json.dumps(e) + "\n" for e in events),
+        env=env,
+        text=True,
+        capture_output=True,
+    )
+    lines = [json.loads(line) for line in proc.stdout.splitlines()]
+    assert lines and lines[-1]["errors"] == 0, (proc.stdout, proc.stderr)
+    return lines[:-1]
+
+
+def main():
+    state = MockNotionSchemaState()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), build_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = "http://127.0.0.1:{0}".format(server.server_address[1])
+
+    try:
+        with tempfile.TemporaryDirectory() as td:
+            cache_path = os.path.join(td, "schema.json")
+            args = ["--notion-api-base", base, "--schema-cache", cache_path, "--notion-rps", "0"]
+
+            actions = run("event2_sync.py", args, [pr_event(1), pr_event(2), pr_event(1)])
+            assert [a["operation"] for a in actions] == ["create", "create", "update"], actions
+            caches = [a["retry"]["schema_cache"] for a in actions]
+            assert [c["hit"] for c in caches] == [False, True, True] and caches[-1]["hits"] == 2, caches
+            assert caches[-1]["misses"] == 1 and state.schema_gets == 1, (caches, state.schema_gets)
+            print("PASS: one schema fetch per database within a process")
+
+            actions = run("event2_sync.py", args, [pr_event(3)])
+            assert actions[0]["retry"]["schema_cache"]["hit"] and state.schema_gets == 1, (actions, state.schema_gets)
+            actions = run("event2_sync.py", args + ["--refresh-schema"], [pr_event(3), pr_event(4)])
+            assert [a["retry"]["schema_cache"]["hit"] for a in actions] == [False, True] and state.schema_gets == 2
+            actions = run("event2_sync.py", args + ["--schema-ttl-sec", "0"], [pr_event(3), pr_event(4)])
+            assert state.schema_gets == 4 and not any(a["retry"]["schema_cache"]["hit"] for a in actions), state.schema_gets
+
+            with open(cache_path, encoding="utf-8") as f:
+                cached = json.load(f)
+            cached["databases"]["db-knowledge"]["fetched_at"] -= 7200
+            with open(cache_path, "w", encoding="utf-8") as f:
+                json.dump(cached, f)
+            actions = run("event2_sync.py", args, [pr_event(5)])
+            assert not actions[0]["retry"]["schema_cache"]["hit"] and state.schema_gets == 5, state.schema_gets
+            print("PASS: the on-disk cache is shared across runs and honors TTL and --refresh-schema")
+
+            # The URL property is renamed in Notion: the cached schema makes the query fail with a
+            # validation_error, the cache entry is dropped and the event succeeds on a fresh schema.
+            state.rename("db-knowledge", "GitHub URL", "PR Link")
+            actions = run("event2_sync.py", args, [pr_event(6), pr_event(7)])
+            first = actions[0]
+            assert first["operation"] == "create" and first["link_property_name"] == "PR Link", first
+            assert first["retry"]["schema_cache"]["invalidations"] == 1 and not first["retry"]["schema_cache"]["hit"], first
+            assert actions[1]["retry"]["schema_cache"]["hit"] and state.schema_gets == 6, (actions, state.schema_gets)
+            with open(cache_path, encoding="utf-8") as f:
+                assert "PR Link" in json.load(f)["databases"]["db-knowledge"]["database"]["properties"]
+            print("PASS: a property validation_error invalidates the cached schema and retries once")
+
+            task = {"event_type": "github.pr.merged", "payload": {"task_key": "TSK-20260219-0009"}}
+            actions = run("event3_sync.py", args, [task, task])
+            assert [a["operation"] for a in actions] == ["create", "update"], actions
+            assert [a["retry"]["schema_cache"]["hit"] for a in actions] == [False, True] and state.schema_gets == 7
+            state.rename("db-tasks", "Task ID", "TaskKey")
+            actions = run("event3_sync.py", args, [task])
+            assert actions[0]["retry"]["schema_cache"]["invalidations"] == 1 and state.schema_gets == 8, actions
+            print("PASS: event3 shares the schema cache")
+
+            # bootstrap_notion_schema.py adds missing properties and drops the stale entries.
+            env = dict(os.environ, NOTION_TOKEN="dummy", NOTION_KNOWLEDGE_DB_ID="db-knowledge", NOTION_TASKS_DB_ID="db-tasks")
+            out = subprocess.check_output(
+                ["python3", os.path.join(SYNC_DIR, "bootstrap_notion_schema.py"), "--mode", "live",
+                 "--notion-api-base", base, "--schema-cache", cache_path],
+                env=env,
+                text=True,
+            )
+            assert json.loads(out)["knowledge_db"]["updated"], out
+            with open(cache_path, encoding="utf-8") as f:
+                assert json.load(f)["databases"] == {}
+            print("PASS: bootstrap invalidates the schema cache for databases it changes")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
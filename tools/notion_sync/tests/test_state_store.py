@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer
+
+SYNC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, SYNC_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import state_store  # noqa: E402
+import test_event1_live_mock  # noqa: E402
+
+
+def task_event(n, title="t"):
+    return {"event_type": "notion.task.updated", "payload": {"task_key": "TSK-20260501-{0:04d}".format(n), "title": title}}
+
+
+def exercise(store):
+    store.put("b", 2)
+    store.put("a", {"issue_number": 1})
+    store.put("b", 3)
+    assert store.get("b") == 3 and store.get("missing") is None
+    assert store.pop("b") == 3 and store.pop("b") is None
+    store.set_meta("reconciled_at_utc", "2026-05-01T00:00:00Z")
+    store.flush()
+    assert store.items() == [("a", {"issue_number": 1})] and len(store) == 1
+
+
+def main():
+    with tempfile.TemporaryDirectory() as td:
+        json_path = os.path.join(td, "live.json")
+        sqlite_path = os.path.join(td, "live.sqlite3")
+        for path in (json_path, sqlite_path):
+            store = state_store.open_store(path, "issue_number_by_task_key")
+            exercise(store)
+            store.close()
+            reopened = state_store.open_store(path, "issue_number_by_task_key")
+            assert reopened.items() == [("a", {"issue_number": 1})], path
+            assert reopened.get_meta("reconciled_at_utc") == "2026-05-01T00:00:00Z", path
+            reopened.close()
+        with open(json_path, encoding="utf-8") as f:
+            assert json.load(f)["issue_number_by_task_key"] == {"a": {"issue_number": 1}}
+        print("PASS: JSON and SQLite stores behave the same and persist across opens")
+
+        for path in (os.path.join(td, "batch.json"), os.path.join(td, "batch.sqlite3")):
+            store = state_store.open_store(path, "m")
+            store.update([("a", 1), ("b", 2), ("c", 3)])
+            store.update([("b", None), ("d", 4)])
+            assert store.items() == [("a", 1), ("c", 3), ("d", 4)], path
+            store.update([("e", 5)], replace=True)
+            store.flush()
+            store.close()
+            reopened = state_store.open_store(path, "m")
+            assert reopened.items() == [("e", 5)], path
+            reopened.close()
+        broken = os.path.join(td, "broken.json")
+        with open(broken, "w", encoding="utf-8") as f:
+            f.write("{")
+        cache = state_store.open_cache(broken, "m")
+        cache.put("a", 1)
+        cache.flush()
+        with open(broken, encoding="utf-8") as f:
+            assert json.load(f) == {"m": {"a": 1}}
+        print("PASS: update() applies a batch at once; an unreadable JSON cache starts empty")
+
+        # Eight writers on one file, each with its own connection, as separate runners would be.
+        shared = os.path.join(td, "shared.sqlite3")
+        state_store.open_store(shared, "m").close()
+
+        def writer(n):
+            store = state_store.SqliteStateStore(shared, "m")
+            for i in range(200):
+                store.put("k{0}-{1}".format(n, i), i)
+            store.close()
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        store = state_store.SqliteStateStore(shared, "m")
+        assert len(store) == 1600 and store.get("k7-199") == 199
+        store.close()
+        print("PASS: concurrent writers on one SQLite file lose no entries")
+
+        legacy = os.path.join(td, "legacy.json")
+        with open(legacy, "w", encoding="utf-8") as f:
+            json.dump({"issue_number_by_task_key": {"TSK-20260501-0001": 1, "TSK-20260501-0002": 2},
+                       "reconciled_at_utc": "2026-04-30T00:00:00Z"}, f)
+        migrated = os.path.join(td, "migrated.sqlite3")
+        script = os.path.join(SYNC_DIR, "state_store.py")
+        out = json.loads(subprocess.check_output(["python3", script, "migrate", legacy, migrated], text=True))
+        assert out["entries"] == {"issue_number_by_task_key": 2}, out
+        store = state_store.open_store(migrated, "issue_number_by_task_key")
+        assert store.get("TSK-20260501-0002") == 2 and store.get_meta("reconciled_at_utc") == "2026-04-30T00:00:00Z"
+        store.close()
+        proc = subprocess.run(["python3", script, "migrate", legacy, os.path.join(td, "x.json")], capture_output=True, text=True)
+        assert proc.returncode == 2 and json.loads(proc.stdout)["reason"] == "dst_not_sqlite_path", proc.stdout
+        print("PASS: state_store.py migrate copies a JSON state file into SQLite")
+
+        github = test_event1_live_mock.MockGitHubState()
+        github.fail_first_list = False
+        server = ThreadingHTTPServer(("127.0.0.1", 0), test_event1_live_mock.build_handler(github))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        env = dict(os.environ, GITHUB_TOKEN="dummy", GITHUB_OWNER="o", GITHUB_REPO="r")
+        cmd = ["python3", os.path.join(SYNC_DIR, "event1_sync.py"), "--events-ndjson", "-", "--mode", "live",
+               "--github-api-base", "http://127.0.0.1:{0}".format(server.server_address[1]),
+               "--live-state", migrated, "--cache-first", "--concurrency", "4"]
+        try:
+            events = [task_event(n) for n in range(11, 21)]
+            out = subprocess.check_output(cmd, input="".join(json.dumps(e) + "\n" for e in events), env=env, text=True)
+            actions = [json.loads(line) for line in out.splitlines()][:-1]
+            assert sorted(a["operation"] for a in actions) == ["create"] * 10, actions
+            store = state_store.open_store(migrated, "issue_number_by_task_key")
+            # The two migrated entries are still there next to the ten new ones.
+            assert len(store) == 12 and store.get("TSK-20260501-0015") is not None
+            store.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+        print("PASS: event1 live mode keeps its idempotency cache in SQLite (--live-state *.sqlite3)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SYNC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, SYNC_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import event1_sync  # noqa: E402
+import task_feed  # noqa: E402
+import test_event1_live_mock  # noqa: E402
+
+
+def minute(epoch):
+    # Notion's last_edited_time: UTC, to the minute.
+    return time.strftime("%Y-%m-%dT%H:%M:00.000Z", time.gmtime(epoch))
+
+
+class MockTasksState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pages = {}
+        self.queries = []
+
+    def put(self, n, edited, task_key=True, archived=False):
+        with self.lock:
+            page = self.pages.get("page-{0}".format(n))
+            created = page["created_time"] if page else edited
+            self.pages["page-{0}".format(n)] = {
+                "id": "page-{0}".format(n),
+                "created_time": created,
+                "last_edited_time": edited,
+                "archived": archived,
+                "properties": {
+                    "Name": {"type": "title", "title": [{"plain_text": "task {0} @ {1}".format(n, edited)}]},
+                    "Task ID": {"type": "rich_text", "rich_text": [{"plain_text": "TSK-20260701-{0:04d}".format(n)}] if task_key else []},
+                    "Summary": {"type": "rich_text", "rich_text": [{"plain_text": "summary {0}".format(n)}]},
+                },
+            }
+
+    def query(self, body):
+        with self.lock:
+            self.queries.append(body)
+            items = list(self.pages.values())
+        flt = body.get("filter", {})
+        if "last_edited_time" in flt:
+            items = [p for p in items if p["last_edited_time"] >= flt["last_edited_time"]["on_or_after"]]
+        items.sort(key=lambda p: p["last_edited_time"])
+        start = int(body.get("start_cursor", "0"))
+        size = body.get("page_size", 100)
+        more = start + size < len(items)
+        return {"results": items[start : start + size], "has_more": more, "next_cursor": str(start + size) if more else None}
+
+
+def build_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", "0"))
+            body = json.dumps(state.query(json.loads(self.rfile.read(length) or b"{}"))).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            return
+
+    return Handler
+
+
+def poll(feed, state):
+    before = len(state.queries)
+    changes = feed.poll(state.query)
+    return changes, len(state.queries) - before
+
+
+def main():
+    old = time.time() - 86400
+    state = MockTasksState()
+    for n in range(150):
+        # Two pages per minute, as bursts of edits come in.
+        state.put(n, minute(old + (n // 2) * 60))
+    state.put(900, minute(old), task_key=False)
+    state.put(901, minute(old), archived=True)
+
+    with tempfile.TemporaryDirectory() as td:
+        path = os.path.join(td, "feed.json")
+        feed = task_feed.TaskFeed(path, "db-tasks")
+        changes, requests = poll(feed, state)
+        events = [e for _, e in changes if e is not None]
+        assert requests == 2 and len(events) == 150 and feed.stats()["skipped"] == 2, feed.stats()
+        assert all(event1_sync.normalize_event(e)[1] is None for e in events)
+        assert event1_sync.normalize_event(events[0])[0]["title"].startswith("[TSK-20260701-0000] task 0"), events[0]
+        feed.commit(changes)
+        assert feed.stats()["cursor"] == minute(old + 74 * 60) and feed.stats()["seen"] == 2, feed.stats()
+
+        changes, requests = poll(feed, state)
+        assert changes == [] and requests == 1 and state.queries[-1]["filter"]["last_edited_time"]["on_or_after"] == feed.cursor
+        assert feed.stats()["duplicates"] == 2, feed.stats()
+        print("PASS: first poll pages through every task; the next one sends one query and emits nothing")
+
+        now = minute(time.time())
+        state.put(3, now)
+        state.put(4, now)
+        changes, _ = poll(feed, state)
+        assert [e["payload"]["task_key"]["rich_text"][0]["plain_text"] for _, e in changes] == ["TSK-20260701-0003", "TSK-20260701-0004"]
+        assert changes[0][1]["event_type"] == "notion.task.updated"
+        feed.commit(changes)
+        # Their minute is not over, so a later edit could still share the timestamp: emitted again.
+        assert len(poll(feed, state)[0]) == 2
+        task_feed.SETTLE_SEC = 0
+        feed.commit(poll(feed, state)[0])
+        assert poll(feed, state)[0] == []
+        reopened = task_feed.TaskFeed(path, "db-tasks")
+        assert reopened.cursor == now and poll(reopened, state)[0] == []
+        assert task_feed.TaskFeed(path, "db-other").cursor is None
+        print("PASS: pages are deduplicated by id + last_edited_time once their minute is settled; the cursor persists")
+
+    state = MockTasksState()
+    for n in range(1, 6):
+        state.put(n, minute(old + n * 60))
+    notion = ThreadingHTTPServer(("127.0.0.1", 0), build_handler(state))
+    github = test_event1_live_mock.MockGitHubState()
+    github.fail_first_list = False
+    github_server = ThreadingHTTPServer(("127.0.0.1", 0), test_event1_live_mock.build_handler(github))
+    for server in (notion, github_server):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    env = dict(os.environ, NOTION_TOKEN="dummy", NOTION_TASKS_DB_ID="db-tasks", GITHUB_TOKEN="dummy", GITHUB_OWNER="o", GITHUB_REPO="r")
+    try:
+        with tempfile.TemporaryDirectory() as td:
+            feed_cmd = ["python3", os.path.join(SYNC_DIR, "task_feed.py"), "--feed-state", os.path.join(td, "feed.json"),
+                        "--notion-api-base", "http://127.0.0.1:{0}".format(notion.server_address[1]), "--notion-rps", "0"]
+            event1 = ["python3", os.path.join(SYNC_DIR, "event1_sync.py"), "--mode", "live", "--live-state", os.path.join(td, "live.json"),
+                      "--github-api-base", "http://127.0.0.1:{0}".format(github_server.server_address[1])]
+            feed_proc = subprocess.run(feed_cmd, env=env, capture_output=True, text=True, check=True)
+            summary = json.loads(feed_proc.stderr.splitlines()[-1])
+            assert summary["new_events"] == 5 and summary["requests"] == 1, summary
+            out = subprocess.check_output(event1 + ["--events-ndjson", "-"], input=feed_proc.stdout, env=env, text=True)
+            actions = [json.loads(line) for line in out.splitlines()][:-1]
+            assert [a["operation"] for a in actions] == ["create"] * 5, actions
+            print("PASS: task_feed.py | event1_sync.py --events-ndjson - creates one issue per task")
+
+            state.put(2, minute(old + 600))
+            queue = os.path.join(td, "q.sqlite3")
+            feed_proc = subprocess.run(feed_cmd + ["--enqueue", queue], env=env, capture_output=True, text=True, check=True)
+            summary = json.loads(feed_proc.stderr.splitlines()[-1])
+            assert feed_proc.stdout == "" and summary["new_events"] == 1 and summary["queue"]["ready"] == 1, summary
+            out = subprocess.check_output(event1 + ["--drain", "--queue", queue], env=env, text=True)
+            actions = [json.loads(line) for line in out.splitlines()][:-1]
+            assert [(a["operation"], a["task_key"]) for a in actions] == [("update", "TSK-20260701-0002")], actions
+            assert github.issues[1]["title"].endswith(minute(old + 600)), github.issues[1]
+            print("PASS: --enqueue hands changed tasks to event1_sync.py --drain")
+    finally:
+        for server in (notion, github_server):
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+import contextlib
+import hashlib
+import hmac
+import io
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer
+from urllib import error, request
+
+SYNC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, SYNC_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import event1_sync  # noqa: E402
+import event_queue  # noqa: E402
+import test_event1_live_mock  # noqa: E402
+import test_event2_live_mock  # noqa: E402
+import webhook_receiver  # noqa: E402
+
+SECRET = "s3cret"
+
+
+def task_event(n, title="t"):
+    return {"event_type": "notion.task.updated", "payload": {"task_key": "TSK-20260601-{0:04d}".format(n), "title": title}}
+
+
+def pr_event(n):
+    return {"event_type": "github.pr.opened", "payload": {"url": "https://github.com/o/r/pull/{0}".format(n), "number": n}}
+
+
+def post(base, event, wait=True, secret=SECRET):
+    body = json.dumps(event).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    if secret:
+        headers["X-Hub-Signature-256"] = "sha256=" + hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    url = base + "/events" + ("?wait=1" if wait else "")
+    try:
+        with request.urlopen(request.Request(url, data=body, headers=headers, method="POST"), timeout=10) as resp:
+            return resp.status, json.loads(resp.read())
+    except error.HTTPError as exc:
+        return exc.code, json.loads(exc.read())
+
+
+def serve(handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:{0}".format(server.server_address[1])
+
+
+def main():
+    gate = threading.Event()
+    order = []
+    dispatcher = webhook_receiver.Dispatcher(2, 3)
+    futures = [dispatcher.submit("a", lambda: (gate.wait(5), order.append("a1"))),
+               dispatcher.submit("a", lambda: order.append("a2")),
+               dispatcher.submit("b", lambda: order.append("b1"))]
+    assert all(futures) and dispatcher.submit("c", lambda: None) is None
+    futures[2].result(5)
+    assert order == ["b1"], order
+    gate.set()
+    dispatcher.close()
+    assert order == ["b1", "a1", "a2"], order
+    stats = dispatcher.stats()
+    assert stats["rejected"] == 1 and stats["completed"] == 3 and stats["backlog"] == 0, stats
+    print("PASS: the dispatcher keeps per-key order and refuses events beyond --max-backlog")
+
+    def boom():
+        raise BrokenPipeError("stdout closed")
+
+    dispatcher = webhook_receiver.Dispatcher(1, 3)
+    failed = dispatcher.submit("a", boom)
+    after = dispatcher.submit("a", lambda: "a2")
+    assert after.result(5) == "a2" and isinstance(failed.exception(5), BrokenPipeError)
+    dispatcher.close()
+    stats = dispatcher.stats()
+    assert stats["failed"] == 1 and stats["completed"] == 2 and stats["backlog"] == 0, stats
+    print("PASS: a job that raises fails its future; the worker and the key's later jobs go on")
+
+    with tempfile.TemporaryDirectory() as td:
+        release = threading.Event()
+        handler = {"target": "github.issue", "module": event1_sync,
+                   "process": lambda event: (release.wait(5), {"target": "github.issue", "operation": "update"})[1],
+                   "make_error": lambda reason, extra=None: {"operation": "error", "reason": reason}}
+        spill = event_queue.EventQueue(os.path.join(td, "spill.sqlite3"))
+        receiver = webhook_receiver.Receiver({"notion.task.updated": handler}, webhook_receiver.Dispatcher(1, 1), spill=spill)
+        server, base = serve(webhook_receiver.build_handler(receiver))
+        # Actions go to stdout as NDJSON; keep them out of the test output.
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            try:
+                assert post(base, task_event(1), wait=False, secret=None)[0] == 202
+                status, body = post(base, task_event(2), wait=False, secret=None)
+                assert status == 202 and body["operation"] == "spilled", body
+                receiver.spill = None
+                status, body = post(base, task_event(3), wait=False, secret=None)
+                assert status == 503 and body["reason"] == "backlog_full", body
+                release.set()
+                assert spill.events("github.issue")[0]["event_key"] == "TSK-20260601-0002"
+            finally:
+                server.shutdown()
+                server.server_close()
+                receiver.dispatcher.close()
+                spill.close()
+        assert [json.loads(line) for line in out.getvalue().splitlines()] == [
+            {"operation": "update", "request_id": 1, "target": "github.issue"}], out.getvalue()
+        print("PASS: a full backlog spills to the durable queue, or answers 503 + Retry-After")
+
+        github = test_event1_live_mock.MockGitHubState()
+        github.fail_first_list = False
+        notion = test_event2_live_mock.MockNotionState()
+        notion.fail_first_query = False
+        github_server, github_base = serve(test_event1_live_mock.build_handler(github))
+        notion_server, notion_base = serve(test_event2_live_mock.build_handler(notion))
+        env = dict(os.environ, GITHUB_TOKEN="dummy", GITHUB_OWNER="o", GITHUB_REPO="r", NOTION_TOKEN="dummy",
+                   NOTION_KNOWLEDGE_DB_ID="db-knowledge", NOTION_SYNC_WEBHOOK_SECRET=SECRET)
+        proc = subprocess.Popen(
+            ["python3", os.path.join(SYNC_DIR, "webhook_receiver.py"), "--port", "0", "--mode", "live",
+             "--github-api-base", github_base, "--notion-api-base", notion_base, "--notion-rps", "0",
+             "--live-state", os.path.join(td, "live.sqlite3"), "--cache-first",
+             "--schema-cache", os.path.join(td, "schema.json")],
+            env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        )
+        try:
+            # The first stderr lines are the missing event3 config warning and the listening line.
+            while True:
+                line = json.loads(proc.stderr.readline())
+                if line["operation"] == "listening":
+                    break
+            base = "http://127.0.0.1:{0}".format(line["port"])
+            status, action = post(base, task_event(1))
+            assert status == 200 and action["operation"] == "create", action
+            status, action = post(base, task_event(1, "renamed"))
+            assert status == 200 and action["operation"] == "update" and action["lookup"] == "cache", action
+            status, action = post(base, pr_event(7))
+            assert status == 200 and action["target"] == "notion.knowledge" and action["operation"] == "create", action
+            assert post(base, {"event_type": "nope", "payload": {}})[0] == 400
+            status, action = post(base, {"event_type": "notion.task.updated", "payload": {}})
+            assert status == 400 and action["target"] == "github.issue", action
+            assert post(base, task_event(2), secret="wrong")[0] == 401
+            with request.urlopen(base + "/healthz", timeout=10) as resp:
+                health = json.loads(resp.read())
+            assert health["operations"] == {"github.issue:create": 1, "github.issue:update": 1, "notion.knowledge:create": 1}, health
+            assert health["invalid"] == 2 and health["unauthorized"] == 1, health
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            out, _ = proc.communicate(timeout=30)
+            github_server.shutdown()
+            github_server.server_close()
+            notion_server.shutdown()
+            notion_server.server_close()
+        lines = [json.loads(line) for line in out.splitlines()]
+        assert [a["request_id"] for a in lines[:-1]] == [1, 2, 3], lines
+        assert proc.returncode == 0 and lines[-1]["operation"] == "summary" and lines[-1]["dispatcher"]["completed"] == 3, lines[-1]
+        print("PASS: one receiver process routes event1/event2 webhooks in-process with warm state")
+
+
+if __name__ == "__main__":
+    main()
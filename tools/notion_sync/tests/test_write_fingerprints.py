@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer
+
+SYNC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, SYNC_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import state_store  # noqa: E402
+import test_event1_live_mock  # noqa: E402
+import test_event2_live_mock  # noqa: E402
+
+
+def task_event(title, summary="s"):
+    return {"event_type": "notion.task.updated", "payload": {"task_key": "TSK-20260401-0001", "title": title, "summary": summary}}
+
+
+def pr_event(n, title):
+    url = "https://github.com/o/r/pull/{0}".format(n)
+    return {"event_type": "github.pr.synchronize", "payload": {"url": url, "number": n, "title": title}}
+
+
+def run_batch(script, events, extra, env):
+    out = subprocess.check_output(
+        ["python3", os.path.join(SYNC_DIR, script), "--mode", "live", "--events-ndjson", "-", "--max-retries", "0"] + extra,
+        input="".join(json.dumps(e) + "\n" for e in events),
+        env=env,
+        text=True,
+    )
+    lines = [json.loads(line) for line in out.splitlines()]
+    return lines[:-1], lines[-1]
+
+
+def serve(state, build_handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), build_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:{0}".format(server.server_address[1])
+
+
+def main():
+    github = test_event1_live_mock.MockGitHubState()
+    github.fail_first_list = False
+    notion = test_event2_live_mock.MockNotionState()
+    notion.fail_first_query = False
+    github_server, github_base = serve(github, test_event1_live_mock.build_handler)
+    notion_server, notion_base = serve(notion, test_event2_live_mock.build_handler)
+    env = dict(os.environ, GITHUB_TOKEN="dummy", GITHUB_OWNER="o", GITHUB_REPO="r",
+               NOTION_TOKEN="dummy", NOTION_KNOWLEDGE_DB_ID="db-knowledge")
+
+    try:
+        with tempfile.TemporaryDirectory() as td:
+            fingerprints = os.path.join(td, "fingerprints.json")
+            event1 = ["--github-api-base", github_base, "--live-state", os.path.join(td, "live.json"),
+                      "--skip-unchanged", fingerprints]
+            # The repeats differ only in SyncedAtUTC.
+            actions, summary = run_batch("event1_sync.py", [task_event("a"), task_event("a"), task_event("b")], event1, env)
+            assert [a["operation"] for a in actions] == ["create", "noop", "update"], actions
+            assert actions[1]["issue_number"] == 1 and actions[1]["fingerprints"]["unchanged"] == 1, actions[1]
+            # create = list + search + POST, update = list + PATCH; the noop sends nothing.
+            assert summary["http"]["requests"] == 5, summary
+            actions, summary = run_batch("event1_sync.py", [task_event("b"), task_event("b", "new summary")], event1, env)
+            assert [a["operation"] for a in actions] == ["noop", "update"], actions
+            assert summary["http"]["requests"] == 2 and "new summary" in github.issues[0]["body"], summary
+            print("PASS: event1 skips issue writes whose title/body/labels match the last write")
+
+            event2 = ["--notion-api-base", notion_base, "--notion-rps", "0", "--schema-ttl-sec", "0",
+                      "--skip-unchanged", fingerprints]
+            events = [pr_event(1, "x"), pr_event(1, "x"), pr_event(2, "y"), pr_event(1, "x2")]
+            actions, summary = run_batch("event2_sync.py", events, event2, env)
+            assert [a["operation"] for a in actions] == ["create", "noop", "create", "update"], actions
+            assert actions[1]["notion_page_id"] == actions[0]["notion_page_id"], actions
+            # Three writes, each with a schema GET and a query.
+            assert summary["http"]["requests"] == 9 and summary["operations"]["noop"] == 1, summary
+            actions, summary = run_batch("event2_sync.py", [pr_event(2, "y"), pr_event(1, "x2")], event2, env)
+            assert [a["operation"] for a in actions] == ["noop", "noop"] and summary["http"]["requests"] == 0, summary
+            print("PASS: event2 skips page writes whose fields other than Last Sync match the last write")
+
+            with open(fingerprints, encoding="utf-8") as f:
+                scopes = json.load(f)
+            assert sorted(scopes) == ["github.issue:o/r", "notion.knowledge:db-knowledge"], scopes
+            assert sorted(scopes["notion.knowledge:db-knowledge"]) == [pr_event(n, "")["payload"]["url"] for n in (1, 2)], scopes
+            print("PASS: event1 and event2 share the fingerprint file, one scope each")
+
+            # Both scripts at once on one SQLite file: each write is its own upsert.
+            shared = os.path.join(td, "fingerprints.sqlite3")
+            runs = {
+                "event1_sync.py": ([task_event("c")], event1[:-1] + [shared]),
+                "event2_sync.py": ([pr_event(3, "z")], event2[:-1] + [shared]),
+            }
+            results = {}
+            threads = [
+                threading.Thread(target=lambda script=script: results.update({script: run_batch(script, *runs[script], env)}))
+                for script in runs
+            ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            assert results["event1_sync.py"][0][0]["operation"] == "update", results
+            assert results["event2_sync.py"][0][0]["operation"] == "create", results
+            for scope, key in (("github.issue:o/r", "TSK-20260401-0001"), ("notion.knowledge:db-knowledge", pr_event(3, "")["payload"]["url"])):
+                store = state_store.SqliteStateStore(shared, scope)
+                assert store.get(key)["fingerprint"], (scope, store.items())
+                store.close()
+            for script in runs:
+                actions, summary = run_batch(script, *runs[script], env)
+                assert [a["operation"] for a in actions] == ["noop"] and summary["http"]["requests"] == 0, (script, actions)
+            print("PASS: event1 and event2 running at once keep their fingerprints in one SQLite file")
+    finally:
+        for server in (github_server, notion_server):
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
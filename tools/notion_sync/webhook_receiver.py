@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import event1_sync
+import event2_sync
+import event3_sync
+import event_queue
+import http_pool
+import ndjson_batch
+import rate_limit
+import schema_cache
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8787
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_BACKLOG = 256
+DEFAULT_RETRY_AFTER_SEC = 5
+DEFAULT_WAIT_TIMEOUT_SEC = 60.0
+MAX_BODY_BYTES = 1024 * 1024
+SECRET_ENV = "NOTION_SYNC_WEBHOOK_SECRET"
+SIGNATURE_HEADERS = ("X-Hub-Signature-256", "X-Notion-Signature")
+
+
+def make_error(reason, extra=None):
+    output = {
+        "target": "webhook",
+        "operation": "error",
+        "reason": reason,
+    }
+    if extra:
+        output.update(extra)
+    return output
+
+
+class Dispatcher:
+    # A bounded backlog in front of `concurrency` worker threads. Events that share a key
+    # run one at a time in arrival order, others in parallel. submit() refuses an event
+    # once max_backlog events are queued or running; the receiver answers 503 then.
+    def __init__(self, concurrency, max_backlog):
+        self.max_backlog = max_backlog
+        self.cond = threading.Condition()
+        self.runnable = deque()
+        self.waiting = {}
+        self.backlog = 0
+        self.closed = False
+        self.counters = {"accepted": 0, "rejected": 0, "completed": 0, "failed": 0, "max_backlog_seen": 0}
+        self.workers = [threading.Thread(target=self._work, daemon=True) for _ in range(concurrency)]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, key, fn):
+        future = Future()
+        job = (key, fn, future)
+        with self.cond:
+            if self.closed or self.backlog >= self.max_backlog:
+                self.counters["rejected"] += 1
+                return None
+            self.backlog += 1
+            self.counters["accepted"] += 1
+            self.counters["max_backlog_seen"] = max(self.counters["max_backlog_seen"], self.backlog)
+            # waiting[key] exists while an event of that key is runnable or running.
+            if key is not None and key in self.waiting:
+                self.waiting[key].append(job)
+            else:
+                if key is not None:
+                    self.waiting[key] = deque()
+                self.runnable.append(job)
+                self.cond.notify()
+        return future
+
+    def _work(self):
+        while True:
+            with self.cond:
+                while not self.runnable and not (self.closed and self.backlog == 0):
+                    self.cond.wait()
+                if not self.runnable:
+                    return
+                key, fn, future = self.runnable.popleft()
+            try:
+                future.set_result(fn())
+            except Exception as exc:
+                # e.g. BrokenPipeError writing the action: the worker and the key's queue go on.
+                future.set_exception(exc)
+                with self.cond:
+                    self.counters["failed"] += 1
+            finally:
+                with self.cond:
+                    self.backlog -= 1
+                    self.counters["completed"] += 1
+                    if key is not None:
+                        if self.waiting[key]:
+                            self.runnable.append(self.waiting[key].popleft())
+                        else:
+                            del self.waiting[key]
+                    self.cond.notify_all()
+
+    def stats(self):
+        with self.cond:
+            stats = dict(self.counters)
+            stats["backlog"] = self.backlog
+        stats["max_backlog"] = self.max_backlog
+        stats["concurrency"] = len(self.workers)
+        return stats
+
+    def close(self):
+        # Stops accepting events and waits for the backlog to finish.
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        for worker in self.workers:
+            worker.join()
+
+
+def script_args(module, mode, argv):
+    # Each script parses the receiver's extra options with its own CLI; options another
+    # script owns (e.g. --issue-index for event2) are left over.
+    args, unknown = module.build_parser().parse_known_args(["--event", "-", "--mode", mode] + argv)
+    return args, {arg for arg in unknown if arg.startswith("--")}
+
+
+def retry_policy_of(args):
+    return {
+        "max_retries": args.max_retries,
+        "backoff_base_sec": args.backoff_base_sec,
+        "backoff_factor": args.backoff_factor,
+    }
+
+
+def build_routes(mode, argv):
+    # event_type -> handler; the scripts' ALLOWED_EVENTS do not overlap.
+    args1, unknown1 = script_args(event1_sync, mode, argv)
+    args2, unknown2 = script_args(event2_sync, mode, argv)
+    args3, unknown3 = script_args(event3_sync, mode, argv)
+    if unknown1 & unknown2 & unknown3:
+        return None, "unrecognized_arguments"
+    for args in (args1, args2, args3):
+        if args.max_retries < 0:
+            return None, "invalid_max_retries"
+        if args.backoff_base_sec <= 0 or args.backoff_factor <= 0:
+            return None, "invalid_backoff_values"
+    for args in (args2, args3):
+        if args.notion_rps < 0:
+            return None, "invalid_notion_rps"
+        rate_limit.configure(args.notion_api_base, args.notion_rps)
+
+    # Warm state shared by every request: event1's state stores and indexes (context),
+    # and one schema cache for the Knowledge and Tasks databases.
+    context = {}
+    cache = schema_cache.SchemaCache(args2.schema_cache, args2.schema_ttl_sec, args2.refresh_schema)
+    handlers = [
+        {
+            "target": "github.issue",
+            "module": event1_sync,
+            "process": lambda event: event1_sync.run_event(event, args1, retry_policy_of(args1), context),
+            "make_error": lambda reason, extra=None: event1_sync.make_error("", reason, extra),
+            "close": lambda: event1_sync.close_stores(context),
+        },
+        {
+            "target": "notion.knowledge",
+            "module": event2_sync,
+            "process": lambda event: event2_sync.run_event(event, args2, retry_policy_of(args2), cache),
+            "make_error": event2_sync.make_error,
+            "close": event2_sync.close_stores,
+        },
+        {
+            "target": "notion.task",
+            "module": event3_sync,
+            "process": lambda event: event3_sync.run_event(event, args3, retry_policy_of(args3), cache),
+            "make_error": lambda reason, extra=None: event3_sync.make_error("", reason, extra),
+        },
+    ]
+    routes = {}
+    for handler in handlers:
+        for event_type in handler["module"].ALLOWED_EVENTS:
+            routes[event_type] = handler
+    return routes, None
+
+
+def close_routes(routes):
+    # After the dispatcher has drained: write out and close the scripts' indexes.
+    for handler in {handler["target"]: handler for handler in routes.values()}.values():
+        if "close" in handler:
+            handler["close"]()
+
+
+class Receiver:
+    def __init__(self, routes, dispatcher, secret=None, spill=None, retry_after_sec=DEFAULT_RETRY_AFTER_SEC,
+                 wait_timeout_sec=DEFAULT_WAIT_TIMEOUT_SEC):
+        self.routes = routes
+        self.dispatcher = dispatcher
+        self.secret = secret
+        self.spill = spill
+        self.retry_after_sec = retry_after_sec
+        self.wait_timeout_sec = wait_timeout_sec
+        self.lock = threading.Lock()
+        self.next_id = 0
+        self.operations = {}
+        self.counters = {"requests": 0, "invalid": 0, "unauthorized": 0, "rejected": 0, "spilled": 0}
+        self.started = time.monotonic()
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def _request_id(self):
+        with self.lock:
+            self.next_id += 1
+            return self.next_id
+
+    def _run(self, request_id, handler, event):
+        action = ndjson_batch.process_line(request_id, event, handler["process"], handler["make_error"])
+        action["request_id"] = action.pop("line")
+        operation = "{0}:{1}".format(handler["target"], action.get("operation", ""))
+        with self.lock:
+            self.operations[operation] = self.operations.get(operation, 0) + 1
+        ndjson_batch.emit(action)
+        return action
+
+    def verify(self, body, headers):
+        if not self.secret:
+            return True
+        expected = "sha256=" + hmac.new(self.secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+        return any(hmac.compare_digest(expected, headers.get(name, "")) for name in SIGNATURE_HEADERS)
+
+    def accept(self, body, headers, wait):
+        # Returns (http_status, response, extra_headers).
+        self.count("requests")
+        if not self.verify(body, headers):
+            self.count("unauthorized")
+            return 401, make_error("invalid_signature"), {}
+        try:
+            event = ndjson_batch.parse_event(body.decode("utf-8"))
+        except ValueError as exc:
+            self.count("invalid")
+            return 400, make_error("invalid_event_json", {"detail": str(exc)}), {}
+        handler = self.routes.get(event.get("event_type"))
+        if handler is None:
+            self.count("invalid")
+            return 400, make_error("unsupported_event_type", {"event_type": event.get("event_type")}), {}
+        _, err = handler["module"].normalize_event(event)
+        if err:
+            self.count("invalid")
+            return 400, err, {}
+
+        key = handler["module"].idempotency_key(event)
+        request_id = self._request_id()
+        future = self.dispatcher.submit((handler["target"], key), lambda: self._run(request_id, handler, event))
+        if future is None:
+            if self.spill is not None:
+                # Overloaded: keep the event in the durable queue for a later --drain.
+                queue_id = self.spill.enqueue(handler["target"], event, key)
+                self.count("spilled")
+                return 202, {"target": handler["target"], "operation": "spilled", "queue_id": queue_id}, {}
+            self.count("rejected")
+            response = make_error("backlog_full", {"retry_after_sec": self.retry_after_sec})
+            return 503, response, {"Retry-After": str(self.retry_after_sec)}
+        if not wait:
+            response = {"target": handler["target"], "operation": "accepted", "request_id": request_id}
+            return 202, response, {}
+        try:
+            action = future.result(timeout=self.wait_timeout_sec)
+        except FutureTimeout:
+            # Still running; the action goes to stdout when it finishes.
+            response = {"target": handler["target"], "operation": "accepted", "request_id": request_id}
+            return 202, response, {}
+        except Exception as exc:
+            detail = "{0}: {1}".format(type(exc).__name__, exc)
+            return 500, make_error("unexpected_error", {"detail": detail, "request_id": request_id}), {}
+        return (200 if action.get("operation") != "error" else 500), action, {}
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats["operations"] = dict(self.operations)
+        stats["dispatcher"] = self.dispatcher.stats()
+        stats["uptime_sec"] = round(time.monotonic() - self.started, 3)
+        stats["http"] = http_pool.stats()
+        stats["rate_limit"] = rate_limit.stats()
+        if self.spill is not None:
+            stats["spill_queue"] = {target: self.spill.stats(target) for target in sorted({h["target"] for h in self.routes.values()})}
+        return stats
+
+
+def build_handler(receiver):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status, payload, headers=None):
+            body = json.dumps(payload, ensure_ascii=True, sort_keys=True).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if urlsplit(self.path).path != "/healthz":
+                self._send(404, make_error("not_found"))
+                return
+            stats = receiver.stats()
+            stats.update({"target": "webhook", "operation": "health"})
+            self._send(200, stats)
+
+        def do_POST(self):
+            url = urlsplit(self.path)
+            if url.path != "/events":
+                self._send(404, make_error("not_found"))
+                return
+            length = self.headers.get("Content-Length")
+            if length is None or not length.isdigit():
+                self.close_connection = True
+                self._send(411, make_error("length_required"))
+                return
+            if int(length) > MAX_BODY_BYTES:
+                self.close_connection = True
+                self._send(413, make_error("body_too_large", {"max_bytes": MAX_BODY_BYTES}))
+                return
+            body = self.rfile.read(int(length))
+            wait = parse_qs(url.query).get("wait", ["0"])[0] not in ("", "0", "false")
+            status, payload, headers = receiver.accept(body, self.headers, wait)
+            self._send(status, payload, headers)
+
+        def log_message(self, fmt, *args):
+            return
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Receive webhook events over HTTP and run them through event1/2/3 in-process",
+        epilog="Other options (--live-state, --skip-unchanged, --notion-api-base, ...) are passed to the script that defines them.",
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--mode", choices=["dry-run", "live"], default="dry-run")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help="Events with different idempotency keys processed at once (same key stays in order)",
+    )
+    parser.add_argument(
+        "--max-backlog",
+        type=int,
+        default=DEFAULT_MAX_BACKLOG,
+        help="Events queued or running before new ones are refused with 503 + Retry-After",
+    )
+    parser.add_argument("--retry-after-sec", type=int, default=DEFAULT_RETRY_AFTER_SEC, help="Retry-After sent with 503")
+    parser.add_argument(
+        "--spill-queue",
+        nargs="?",
+        const=event_queue.DEFAULT_QUEUE_PATH,
+        help="When the backlog is full, store events in this durable queue (202) instead of refusing them; "
+        "process them later with --drain (default path: {0})".format(event_queue.DEFAULT_QUEUE_PATH),
+    )
+    parser.add_argument(
+        "--wait-timeout-sec",
+        type=float,
+        default=DEFAULT_WAIT_TIMEOUT_SEC,
+        help="POST /events?wait=1: seconds to wait for the action before answering 202",
+    )
+    args, rest = parser.parse_known_args()
+
+    if args.concurrency < 1 or args.max_backlog < 1 or args.retry_after_sec < 0 or args.wait_timeout_sec <= 0:
+        print(json.dumps(make_error("invalid_receiver_options"), ensure_ascii=True, indent=2))
+        return 2
+    routes, reason = build_routes(args.mode, rest)
+    if reason:
+        print(json.dumps(make_error(reason), ensure_ascii=True, indent=2))
+        return 2
+    if args.mode == "live":
+        missing = sorted(
+            set(event1_sync.read_live_config()[1]) | set(event2_sync.read_live_config()[1]) | set(event3_sync.read_live_config()[1])
+        )
+        if missing:
+            # Not fatal: events of a script whose config is set still go through.
+            print(json.dumps(make_error("missing_live_config", {"missing": missing}), ensure_ascii=True), file=sys.stderr)
+    http_pool.POOL.max_per_host = max(http_pool.POOL.max_per_host, args.concurrency)
+
+    dispatcher = Dispatcher(args.concurrency, args.max_backlog)
+    spill = event_queue.EventQueue(args.spill_queue) if args.spill_queue else None
+    receiver = Receiver(routes, dispatcher, os.getenv(SECRET_ENV, ""), spill, args.retry_after_sec, args.wait_timeout_sec)
+    server = ThreadingHTTPServer((args.host, args.port), build_handler(receiver))
+    server.daemon_threads = True
+
+    def stop(signum, frame):
+        # shutdown() blocks until serve_forever() returns, so it cannot run on this thread.
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print(
+        json.dumps(
+            {"target": "webhook", "operation": "listening", "host": args.host, "port": server.server_address[1], "mode": args.mode},
+            ensure_ascii=True,
+            sort_keys=True,
+        ),
+        file=sys.stderr,
+        flush=True,
+    )
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        dispatcher.close()
+        close_routes(routes)
+        if spill is not None:
+            spill.close()
+    summary = receiver.stats()
+    summary.update({"target": "webhook", "operation": "summary"})
+    ndjson_batch.emit(summary)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import threading
+
+import state_store
+
+
+DEFAULT_FINGERPRINTS_PATH = "tools/notion_sync/.write_fingerprints.sqlite3"
+
+
+def digest(content):
+    # content must already exclude volatile fields (sync timestamps); key order is irrelevant.
+    canonical = json.dumps(content, ensure_ascii=True, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class FingerprintStore:
+    # Digest of the last content written per idempotency key, within one scope (a repository
+    # or a database), kept as one state store map per scope (SQLite by default). Several
+    # scripts can share the file. In SQLite each record/forget is one upsert/delete; a JSON
+    # file is written once, on close().
+    def __init__(self, path, scope):
+        self.scope = scope
+        self.lock = threading.Lock()
+        self.store = state_store.open_cache(path, scope)
+        self.entries = {key: entry for key, entry in self.store.items() if isinstance(entry, dict)}
+        self.counters = {"unchanged": 0, "changed": 0, "recorded": 0}
+
+    def unchanged(self, key, fingerprint):
+        # Returns the entry of the last write when it had this fingerprint, else None.
+        with self.lock:
+            entry = self.entries.get(key)
+            if isinstance(entry, dict) and entry.get("fingerprint") == fingerprint:
+                self.counters["unchanged"] += 1
+                return dict(entry)
+            self.counters["changed"] += 1
+            return None
+
+    def record(self, key, fingerprint, target, url=""):
+        with self.lock:
+            self.entries[key] = {"fingerprint": fingerprint, "target": target, "url": url}
+            self.store.put(key, self.entries[key])
+            self.counters["recorded"] += 1
+
+    def forget(self, key):
+        with self.lock:
+            if self.entries.pop(key, None) is not None:
+                self.store.pop(key)
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats["keys"] = len(self.entries)
+        return stats
+
+    def close(self):
+        with self.lock:
+            self.store.flush()
+            self.store.close()